@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark gathering probe covers into the sets of SetCoverFilter.
+
+This times the two steps of SetCoverFilter._make_sets() that handle the
+covers found in the target genomes:
+  - 'find covers': SetCoverFilter._find_covers(), which scans the target
+    genomes and gathers the ranges that the workers find into flat
+    arrays
+  - 'make sets': turning those arrays into the sets (one per candidate
+    probe, with an interval set per target genome) given to set cover
+Most of the time of finding covers is in scanning; the time to gather
+and transfer the results grows with the number of covers, which is large
+when many genomes are similar.
+
+The target genomes are copies of one genome with random substitutions,
+and the candidate probes are taken from it. With --num-distinct-genomes,
+the genomes repeat that many distinct ones (as identical isolates do in
+many datasets), which are each scanned once. Run, for example, as:
+  python benchmarks/benchmark_cover_results.py --num-genomes 1000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import genome
+from catch import probe
+from catch.filter import set_cover_filter
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+    seq = np.random.choice(bases, size=args.genome_length)
+    probes = [probe.Probe.from_str(''.join(seq[i:(i + 100)]))
+              for i in range(0, args.genome_length - 100, 25)]
+
+    num_distinct = args.num_distinct_genomes or args.num_genomes
+    distinct_seqs = []
+    for _ in range(num_distinct):
+        mutated = seq.copy()
+        j = np.flatnonzero(np.random.random(len(mutated)) < args.divergence)
+        mutated[j] = bases[np.random.randint(0, 4, size=len(j))]
+        distinct_seqs += [''.join(mutated)]
+    genomes = [genome.Genome.from_one_seq(distinct_seqs[i % num_distinct])
+               for i in range(args.num_genomes)]
+
+    f = set_cover_filter.SetCoverFilter(mismatches=args.mismatches,
+                                        lcf_thres=100,
+                                        cover_extension=args.cover_extension)
+    f.target_genomes = [genomes]
+    probe.set_max_num_processes_for_probe_finding_pools(args.num_processes)
+
+    start = time.time()
+    covers = f._find_covers(probes)
+    find_time = time.time() - start
+    start = time.time()
+    sets = f._make_sets(probes, covers=covers)
+    make_time = time.time() - start
+
+    print("genomes=%d, probes=%d, covers=%d, sets with covers=%d" % (
+        len(genomes), len(probes), len(covers['cover_set_id']),
+        sum(1 for s in sets.values() if len(s) > 0)))
+    print("%-12s %10s" % ("step", "time (s)"))
+    print("%-12s %10.2f" % ("find covers", find_time))
+    print("%-12s %10.2f" % ("make sets", make_time))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-genomes', type=int, default=500)
+    parser.add_argument('--genome-length', type=int, default=10000)
+    parser.add_argument('--num-distinct-genomes', type=int, default=None)
+    parser.add_argument('--divergence', type=float, default=0.01)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('--cover-extension', type=int, default=50)
+    parser.add_argument('--num-processes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Benchmark reading FASTA files with seq_io.read_fasta.
+
+This compares seq_io.read_fasta against a reference reader that parses
+the way read_fasta used to: reading text lines, changing each line with
+str.upper() and a regex, and concatenating the lines of a sequence one
+by one. It reports the throughput of each, in MB (of uncompressed FASTA)
+per second, and checks that both read the same sequences.
+
+By default it reads the bundled probe-designs/*.fasta.gz files. Run, for
+example, as:
+  python benchmarks/benchmark_fasta_read.py
+  python benchmarks/benchmark_fasta_read.py --fasta genomes.fasta.gz
+"""
+
+import argparse
+from collections import OrderedDict
+import glob
+import gzip
+import logging
+import os
+import re
+import time
+
+from catch.utils import seq_io
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def reference_read_fasta(fn):
+    degenerate_pattern = re.compile('[YRWSMKBDHV]')
+    m = OrderedDict()
+    curr_seq_name = ""
+    opener = gzip.open if fn.endswith('.gz') else open
+    with opener(fn, 'rt') as f:
+        for line in f:
+            line = line.rstrip()
+            if len(line) == 0:
+                curr_seq_name = ""
+                continue
+            if line.startswith('>'):
+                curr_seq_name = line[1:]
+                m[curr_seq_name] = ''
+            else:
+                line = line.upper()
+                line = degenerate_pattern.sub('N', line)
+                line = line.replace('-', '')
+                m[curr_seq_name] += line
+    return m
+
+
+def uncompressed_size(fn):
+    opener = gzip.open if fn.endswith('.gz') else open
+    size = 0
+    with opener(fn, 'rb') as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            size += len(chunk)
+    return size
+
+
+def main(args):
+    if args.fasta:
+        fns = args.fasta
+    else:
+        design_dir = os.path.join(os.path.dirname(__file__), '..',
+                                  'probe-designs')
+        fns = sorted(glob.glob(os.path.join(design_dir, '*.fasta.gz')))
+
+    print("%-32s %10s %16s %16s" % ("file", "MB", "reference MB/s",
+                                    "read_fasta MB/s"))
+    for fn in fns:
+        mb = uncompressed_size(fn) / 1e6
+        times = {}
+        outputs = {}
+        for name, fn_read in [('reference', reference_read_fasta),
+                              ('read_fasta', seq_io.read_fasta)]:
+            best = float('inf')
+            for _ in range(args.repeats):
+                start = time.time()
+                outputs[name] = fn_read(fn)
+                best = min(best, time.time() - start)
+            times[name] = best
+        print("%-32s %10.1f %16.1f %16.1f" % (
+            os.path.basename(fn), mb, mb / times['reference'],
+            mb / times['read_fasta']))
+        if outputs['reference'] != outputs['read_fasta']:
+            print("WARNING: the readers gave different sequences")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fasta', nargs='+',
+        help=("FASTA files to read; by default, the bundled "
+              "probe-designs/*.fasta.gz"))
+    parser.add_argument('--repeats', type=int, default=3)
+    logging.disable(logging.INFO)
+    main(parser.parse_args())
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Benchmark the prefilter in front of lookups in the k-mer probe map.
+
+This builds a k-mer probe map from probes taken from one genome and
+scans a second, unrelated, genome -- as when scanning a blacklisted
+genome, where nearly all k-mers are not in the map -- as well as a
+mutated copy of the first genome. For each scan, it reports the time of
+SharedKmerProbeMap.find_hits() without a prefilter and with prefilters
+of each kind and number of bits per key, along with the fraction of
+k-mers that the prefilter passes and the fraction of those that are in
+the map (the rest being false positives).
+
+Run, for example, as:
+  python benchmarks/benchmark_kmer_prefilter.py --num-probes 100000 -k 20
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import probe
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def random_genome(length):
+    return ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=length))
+
+
+def time_scan(kmer_probe_map, sequence, num_repeats):
+    end = len(sequence) - kmer_probe_map.k + 1
+    kmer_probe_map.prefilter_stats = {'queried': 0, 'passed': 0, 'found': 0}
+    start = time.time()
+    for _ in range(num_repeats):
+        kmer_probe_map.find_hits(sequence, 0, end)
+    elapsed = (time.time() - start) / num_repeats
+    stats = {name: count / num_repeats
+             for name, count in kmer_probe_map.prefilter_stats.items()}
+    return elapsed, stats
+
+
+def main(args):
+    np.random.seed(args.seed)
+    genome = random_genome(args.genome_length)
+    probes = [probe.Probe.from_str(genome[i:(i + args.probe_length)])
+              for i in np.random.randint(
+                  0, args.genome_length - args.probe_length,
+                  size=args.num_probes)]
+
+    # Scan an unrelated genome, and a copy of the probes' genome with
+    # substitutions
+    unrelated = random_genome(args.scan_length)
+    mutated = np.array(list(genome[:args.scan_length]))
+    for j in np.random.choice(len(mutated), size=len(mutated) // 50,
+                              replace=False):
+        mutated[j] = 'A' if mutated[j] != 'A' else 'C'
+    scans = [('unrelated', unrelated), ('related', ''.join(mutated))]
+
+    kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+        probes, args.mismatches, args.probe_length, min_k=args.k, k=args.k,
+        include_reverse_complements=True)
+    print("probes=%d, k=%d, entries in map=%d, distinct keys=%d" % (
+        len(probes), kmer_probe_map.k, len(kmer_probe_map.keys),
+        len(np.unique(kmer_probe_map.keys))))
+
+    configs = [('none', None, None)]
+    for bits_per_key in args.bits_per_key:
+        configs += [('bloom', 'bloom', bits_per_key),
+                    ('bitmap', 'bitmap', bits_per_key)]
+
+    print("%-8s %6s %8s %10s | %-10s %10s %10s %10s" % (
+        "kind", "bits", "MB", "build (s)", "scan", "time (s)", "passed",
+        "in map"))
+    for name, kind, bits_per_key in configs:
+        if kind is None:
+            kmer_probe_map.prefilter = None
+            nbytes, build_time = 0, 0
+        else:
+            start = time.time()
+            kmer_probe_map.add_prefilter(bits_per_key=bits_per_key,
+                                         kind=kind)
+            build_time = time.time() - start
+            nbytes = kmer_probe_map.prefilter.words.nbytes
+        for scan_name, sequence in scans:
+            elapsed, stats = time_scan(kmer_probe_map, sequence,
+                                       args.num_repeats)
+            if kind is None:
+                passed = in_map = float('nan')
+            else:
+                passed = stats['passed'] / max(1, stats['queried'])
+                in_map = stats['found'] / max(1, stats['passed'])
+            print("%-8s %6s %8.1f %10.2f | %-10s %10.3f %10.4f %10.4f" % (
+                name, '' if bits_per_key is None else bits_per_key,
+                nbytes / 2**20, build_time, scan_name, elapsed, passed,
+                in_map))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-probes', type=int, default=100000)
+    parser.add_argument('--probe-length', type=int, default=100)
+    parser.add_argument('--genome-length', type=int, default=1000000)
+    parser.add_argument('--scan-length', type=int, default=1000000)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('-k', type=int, default=20)
+    parser.add_argument('--bits-per-key', type=float, nargs='+',
+                        default=[4, 10, 16])
+    parser.add_argument('--num-repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
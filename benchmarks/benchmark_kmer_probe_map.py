@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Benchmark probe.SharedKmerProbeMap against the bisect-based structure.
+
+The previous implementation of SharedKmerProbeMap stored k-mers as
+encoded strings in a RawArray of c_char_p and looked them up with
+bisect. This benchmark reimplements that structure (LegacyKmerProbeMap)
+and compares it with the current one, which packs k-mers into sorted
+uint64 keys, on: time to build, memory held by the structure, and
+latency of lookups (both for k-mers that are present and for those
+that are not). It also compares the time to build the current structure
+from the probes by way of a kmer_probe_map dict with the time to build
+it directly with SharedKmerProbeMap.construct_from_probes().
+
+Run, for example, as:
+  python benchmarks/benchmark_kmer_probe_map.py --num-probes 50000
+"""
+
+import argparse
+import bisect
+import ctypes
+from multiprocessing import sharedctypes
+import sys
+import time
+
+import numpy as np
+
+from catch import probe
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class LegacyKmerProbeMap:
+    """Structure previously used by SharedKmerProbeMap.
+    """
+
+    def __init__(self, kmer_probe_map):
+        unique_probe_seqs = {}
+        for kmer, kmer_alignments in kmer_probe_map.items():
+            for p, pos in kmer_alignments:
+                unique_probe_seqs[p.seq_str] = True
+        self.probe_seqs = sharedctypes.RawArray(
+            ctypes.c_char_p, len(unique_probe_seqs))
+        # Hold references to the encoded strings, since c_char_p does not
+        self._probe_seqs_bytes = []
+        for i, seq in enumerate(unique_probe_seqs.keys()):
+            b = seq.encode()
+            self._probe_seqs_bytes += [b]
+            self.probe_seqs[i] = b
+            unique_probe_seqs[seq] = i
+
+        num_keys = sum(len(v) for v in kmer_probe_map.values())
+        self.keys = sharedctypes.RawArray(ctypes.c_char_p, num_keys)
+        self.probe_seqs_ind = sharedctypes.RawArray(ctypes.c_uint, num_keys)
+        self.probe_pos = sharedctypes.RawArray(ctypes.c_uint, num_keys)
+        self._keys_bytes = []
+        i = 0
+        for kmer in sorted(kmer_probe_map.keys()):
+            b = kmer.encode()
+            self._keys_bytes += [b]
+            for p, pos in kmer_probe_map[kmer]:
+                self.keys[i] = b
+                self.probe_seqs_ind[i] = unique_probe_seqs[p.seq_str]
+                self.probe_pos[i] = pos
+                i += 1
+
+    def get(self, kmer):
+        kmer_bytes = kmer.encode()
+        i = bisect.bisect_left(self.keys, kmer_bytes)
+        if i == len(self.keys) or self.keys[i] != kmer_bytes:
+            return None
+        matches = []
+        while i < len(self.keys) and self.keys[i] == kmer_bytes:
+            seq = self.probe_seqs[self.probe_seqs_ind[i]].decode()
+            matches += [(seq, self.probe_pos[i])]
+            i += 1
+        return matches
+
+    def nbytes(self):
+        n = ctypes.sizeof(self.keys) + ctypes.sizeof(self.probe_seqs)
+        n += ctypes.sizeof(self.probe_seqs_ind) + ctypes.sizeof(self.probe_pos)
+        # The encoded strings pointed to by keys and probe_seqs
+        n += sum(sys.getsizeof(b) for b in self._keys_bytes)
+        n += sum(sys.getsizeof(b) for b in self._probe_seqs_bytes)
+        return n
+
+
+def shared_kmer_probe_map_nbytes(m):
+    return (m.keys.nbytes + m.probe_ids.nbytes + m.probe_pos.nbytes +
+            m.probe_seqs.nbytes + m.probe_seqs_offsets.nbytes)
+
+
+def time_lookups(m, kmers):
+    start = time.time()
+    for kmer in kmers:
+        m.get(kmer)
+    return (time.time() - start) / len(kmers)
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+
+    genome = ''.join(np.random.choice(bases, size=args.genome_length))
+    probes = []
+    for start in np.random.randint(0, args.genome_length - args.probe_length,
+                                   size=args.num_probes):
+        probes += [probe.Probe.from_str(
+            genome[start:(start + args.probe_length)])]
+
+    np.random.seed(args.seed)
+    start = time.time()
+    kmer_probe_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+        probes, args.mismatches, args.probe_length, min_k=args.k, k=args.k)
+    dict_build = time.time() - start
+    k = len(next(iter(kmer_probe_map.keys())))
+
+    start = time.time()
+    legacy = LegacyKmerProbeMap(kmer_probe_map)
+    legacy_build = time.time() - start
+    start = time.time()
+    current = probe.SharedKmerProbeMap.construct(kmer_probe_map)
+    current_build = time.time() - start
+    np.random.seed(args.seed)
+    start = time.time()
+    probe.SharedKmerProbeMap.construct_from_probes(
+        probes, args.mismatches, args.probe_length, min_k=args.k, k=args.k)
+    vectorized_build = time.time() - start
+
+    present = list(kmer_probe_map.keys())
+    present = [present[i] for i in
+               np.random.randint(0, len(present), size=args.num_lookups)]
+    absent = [''.join(np.random.choice(bases, size=k))
+              for _ in range(args.num_lookups)]
+
+    print("k-mers in map: %d (k=%d)" % (len(kmer_probe_map), k))
+    print("%-22s %14s %14s" % ("", "legacy", "current"))
+    print("%-22s %14.2f %14.2f" % ("build time (s)", legacy_build,
+                                   current_build))
+    print("%-22s %14.1f %14.1f" % ("memory (MB)",
+                                   legacy.nbytes() / 2**20,
+                                   shared_kmer_probe_map_nbytes(current) /
+                                   2**20))
+    print("%-22s %14.2f %14.2f" % ("lookup, hit (us)",
+                                   time_lookups(legacy, present) * 1e6,
+                                   time_lookups(current, present) * 1e6))
+    print("%-22s %14.2f %14.2f" % ("lookup, miss (us)",
+                                   time_lookups(legacy, absent) * 1e6,
+                                   time_lookups(current, absent) * 1e6))
+    print(("build from probes: %.2f s via a dict, %.2f s with "
+           "construct_from_probes()") % (dict_build + current_build,
+                                         vectorized_build))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-probes', type=int, default=20000)
+    parser.add_argument('--probe-length', type=int, default=100)
+    parser.add_argument('--genome-length', type=int, default=1000000)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('-k', type=int, default=20)
+    parser.add_argument('--num-lookups', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
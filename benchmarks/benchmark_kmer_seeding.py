@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark strategies for seeding the k-mer probe map.
+
+The seeds of each probe that are put in the k-mer probe map determine
+how many candidate alignments (hits) are verified while scanning a
+sequence, and which covers are found. This compares:
+  - 'default': pigeonholed k-mers if possible, otherwise random k-mers
+    (as construct_kmer_probe_map_to_find_probe_covers() chooses)
+  - 'minimizer': (w,k)-minimizers of each probe
+  - 'spaced': minimizers of spaced seeds with k care positions
+  - 'exhaustive': every k-mer of each probe
+For each, it reports the number of entries in the map, the number of
+hits verified per base of the genome, the time to scan the genome, and
+the recall: the number of bp covered by the probes relative to what
+exhaustive seeding finds.
+
+The probes are taken from a genome, and a copy of it with random
+substitutions (at --divergence per base) is scanned, so that covers
+must tolerate mismatches. Run, for example, as:
+  python benchmarks/benchmark_kmer_seeding.py --mismatches 5 -k 12
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import probe
+from catch.utils import interval
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def build_map(probes, args, seeding, minimizer_w=None):
+    np.random.seed(args.seed)
+    return probe.SharedKmerProbeMap.construct_from_probes(
+        probes, args.mismatches, args.probe_length, min_k=args.k, k=args.k,
+        seeding=seeding, minimizer_w=minimizer_w)
+
+
+def scan(kmer_probe_map, cover_fn, genome):
+    num_hits = len(kmer_probe_map.find_hits(
+        genome, 0, len(genome) - kmer_probe_map.k + 1)[0])
+    probe.open_probe_finding_pool(kmer_probe_map, cover_fn, num_processes=1)
+    try:
+        bounds = (0, len(genome) - kmer_probe_map.k + 1)
+        start = time.time()
+        covers = probe._find_probe_covers_in_subsequence(bounds, genome)
+        elapsed = time.time() - start
+        # Key the covers on probes, rather than their ids in the map
+        covers = probe._merge_probe_covers([covers])
+    finally:
+        probe.close_probe_finding_pool()
+    bp_covered = sum(len(interval.IntervalSet(ranges))
+                     for ranges in covers.values())
+    return num_hits, elapsed, bp_covered
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+    genome = ''.join(np.random.choice(bases, size=args.genome_length))
+
+    probes = []
+    for start in np.random.randint(0, args.genome_length - args.probe_length,
+                                   size=args.num_probes):
+        probes += [probe.Probe.from_str(
+            genome[start:(start + args.probe_length)])]
+
+    # Substitute random bases of the genome to scan
+    genome = np.array(list(genome))
+    mutated = np.flatnonzero(np.random.random(len(genome)) < args.divergence)
+    genome[mutated] = bases[(np.searchsorted(bases, genome[mutated]) +
+                             np.random.randint(1, 4, size=len(mutated))) % 4]
+    genome = ''.join(genome)
+
+    cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+        args.mismatches, args.probe_length)
+
+    results = []
+    for name, seeding, minimizer_w in [('default', None, None),
+                                       ('minimizer', 'minimizer', None),
+                                       ('spaced', 'spaced', None),
+                                       ('exhaustive', 'minimizer', 1)]:
+        kmer_probe_map = build_map(probes, args, seeding, minimizer_w)
+        num_hits, elapsed, bp_covered = scan(kmer_probe_map, cover_fn,
+                                             genome)
+        results += [(name, len(kmer_probe_map.keys), kmer_probe_map.k,
+                     num_hits, elapsed, bp_covered)]
+    exhaustive_bp_covered = results[-1][-1]
+
+    print("genome length=%d, probes=%d, mismatches=%d" % (
+        len(genome), len(probes), args.mismatches))
+    print("%-11s %10s %4s %14s %10s %8s" % ("seeding", "entries", "k",
+                                            "hits/base", "scan (s)",
+                                            "recall"))
+    for name, num_entries, k, num_hits, elapsed, bp_covered in results:
+        print("%-11s %10d %4d %14.4f %10.2f %8.4f" % (
+            name, num_entries, k, num_hits / len(genome), elapsed,
+            bp_covered / max(1, exhaustive_bp_covered)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-probes', type=int, default=2000)
+    parser.add_argument('--probe-length', type=int, default=100)
+    parser.add_argument('--genome-length', type=int, default=500000)
+    parser.add_argument('--mismatches', type=int, default=5)
+    parser.add_argument('--divergence', type=float, default=0.04)
+    parser.add_argument('-k', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Benchmark the k-mer scan in probe._find_probe_covers_in_subsequence.
+
+There are two ways to scan a sequence for k-mers in the probe map:
+  - 'slicing': slice out the k-mer at every position of the sequence
+    and look it up in the native dict (use_native_dict=True)
+  - 'rolling': compute a rolling packed key across the windows of the
+    sequence and look up all keys at once in the shared arrays
+    (use_native_dict=False)
+This reports the throughput of each, in bases scanned per second on a
+single core. By default, the cover function never reports a cover so
+that the scan itself dominates; pass --lcf to use the longest common
+substring cover function, as design.py does; with it, the 'rolling'
+scan also verifies the hits in vectorized batches.
+
+Run, for example, as:
+  python benchmarks/benchmark_probe_cover_scan.py --genome-length 2000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import probe
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def no_cover(probe_seq, sequence, kmer_start, kmer_end, full_probe_len,
+             full_sequence_len):
+    return None
+
+
+def time_scan(kmer_probe_map, cover_fn, sequence, use_native_dict):
+    probe.open_probe_finding_pool(kmer_probe_map, cover_fn,
+                                  num_processes=1,
+                                  use_native_dict=use_native_dict)
+    try:
+        bounds = (0, len(sequence) - kmer_probe_map.k + 1)
+        start = time.time()
+        covers = probe._find_probe_covers_in_subsequence(bounds, sequence)
+        elapsed = time.time() - start
+        # Key the covers on probes, rather than their ids in the map
+        covers = probe._merge_probe_covers([covers])
+    finally:
+        probe.close_probe_finding_pool()
+    return elapsed, covers
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+
+    genome = ''.join(np.random.choice(bases, size=args.genome_length))
+    # Sprinkle in some runs of N
+    genome = list(genome)
+    for start in np.random.randint(0, args.genome_length - 100,
+                                   size=args.num_n_runs):
+        genome[start:(start + 100)] = ['N'] * 100
+    genome = ''.join(genome)
+
+    probes = []
+    for start in np.random.randint(0, args.genome_length - args.probe_length,
+                                   size=args.num_probes):
+        probes += [probe.Probe.from_str(
+            genome[start:(start + args.probe_length)].replace('N', 'A'))]
+
+    kmer_probe_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+        probes, args.mismatches, args.probe_length, min_k=args.k, k=args.k)
+    kmer_probe_map = probe.SharedKmerProbeMap.construct(kmer_probe_map)
+
+    if args.lcf:
+        cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+            args.mismatches, args.probe_length)
+    else:
+        cover_fn = no_cover
+
+    slicing_time, slicing_covers = time_scan(kmer_probe_map, cover_fn,
+                                             genome, True)
+    rolling_time, rolling_covers = time_scan(kmer_probe_map, cover_fn,
+                                             genome, False)
+    if slicing_covers != rolling_covers:
+        print("WARNING: the two scans found different covers")
+
+    print("k=%d, genome length=%d" % (kmer_probe_map.k, len(genome)))
+    print("%-10s %12s %16s" % ("scan", "time (s)", "bases/sec/core"))
+    for name, t in [('slicing', slicing_time), ('rolling', rolling_time)]:
+        print("%-10s %12.2f %16.0f" % (name, t, len(genome) / t))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-probes', type=int, default=2000)
+    parser.add_argument('--probe-length', type=int, default=100)
+    parser.add_argument('--genome-length', type=int, default=1000000)
+    parser.add_argument('--num-n-runs', type=int, default=20)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('-k', type=int, default=20)
+    parser.add_argument('--lcf', action='store_true')
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Benchmark masking of frequent seeds in the k-mer probe map.
+
+Low-complexity sequence (e.g., poly-A tracts) and repeats (e.g., the
+LTRs of retroviruses) give seeds that are shared by many probes, and
+each occurrence of such a seed in a scanned sequence yields a hit to
+verify for every one of them. This builds a genome with poly-A tracts
+and copies of a repeat element, designs probes tiling it, and scans it
+with k-mer probe maps that mask seeds having more than a given number
+of entries (see SharedKmerProbeMap.construct_from_probes()). For each
+threshold, it reports the number of seeds masked, the number of hits
+verified and skipped, the time to find probe covers, and the recall:
+the number of bp covered, summed over probes, relative to not masking
+(probes in copies of the repeat lose the covers of other copies that
+they only shared masked seeds with).
+
+Run, for example, as:
+  python benchmarks/benchmark_seed_masking.py --thresholds 100 20 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import probe
+from catch.utils import interval
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def make_genome(args):
+    bases = ['A', 'C', 'G', 'T']
+    repeat = ''.join(np.random.choice(bases, size=args.repeat_length))
+    pieces = []
+    for i in range(args.num_repeats):
+        pieces += [''.join(np.random.choice(
+            bases, size=args.genome_length // args.num_repeats))]
+        # Insert a copy of the repeat, with a few substitutions, and a
+        # poly-A tract
+        copy = np.array(list(repeat))
+        mutated = np.random.random(len(copy)) < args.repeat_divergence
+        copy[mutated] = np.random.choice(bases, size=np.sum(mutated))
+        pieces += [''.join(copy), 'A' * args.poly_a_length]
+    return ''.join(pieces)
+
+
+def scan(kmer_probe_map, cover_fn, genome):
+    bounds = (0, len(genome) - kmer_probe_map.k + 1)
+    num_hits = len(kmer_probe_map.find_hits(genome, *bounds)[0])
+    num_skipped = kmer_probe_map.num_masked_hits_skipped
+    probe.open_probe_finding_pool(kmer_probe_map, cover_fn, num_processes=1)
+    try:
+        start = time.time()
+        covers = probe._find_probe_covers_in_subsequence(bounds, genome)
+        elapsed = time.time() - start
+        # Key the covers on probes, rather than their ids in the map
+        covers = probe._merge_probe_covers([covers])
+    finally:
+        probe.close_probe_finding_pool()
+    bp_covered = sum(len(interval.IntervalSet(ranges))
+                     for ranges in covers.values())
+    return num_hits, num_skipped, elapsed, bp_covered
+
+
+def main(args):
+    np.random.seed(args.seed)
+    genome = make_genome(args)
+    probes = [probe.Probe.from_str(genome[i:(i + args.probe_length)])
+              for i in range(0, len(genome) - args.probe_length + 1,
+                             args.probe_stride)]
+    cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+        args.mismatches, args.probe_length)
+
+    results = []
+    for threshold in [None] + args.thresholds:
+        np.random.seed(args.seed)
+        kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, args.mismatches, args.probe_length, min_k=args.k,
+            k=args.k, max_seed_occurrences=threshold)
+        num_masked = (0 if kmer_probe_map.masked_keys is None else
+                      len(kmer_probe_map.masked_keys))
+        results += [(threshold, len(kmer_probe_map.keys), num_masked) +
+                    scan(kmer_probe_map, cover_fn, genome)]
+    unmasked_bp_covered = results[0][-1]
+
+    print("genome length=%d, probes=%d, k=%d" % (len(genome), len(probes),
+                                                kmer_probe_map.k))
+    print("%-10s %9s %8s %10s %10s %9s %8s" % (
+        "threshold", "entries", "masked", "verified", "skipped",
+        "time (s)", "recall"))
+    for (threshold, num_entries, num_masked, num_hits, num_skipped,
+         elapsed, bp_covered) in results:
+        print("%-10s %9d %8d %10d %10d %9.2f %8.4f" % (
+            'none' if threshold is None else threshold, num_entries,
+            num_masked, num_hits, num_skipped, elapsed,
+            bp_covered / max(1, unmasked_bp_covered)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--genome-length', type=int, default=300000)
+    parser.add_argument('--num-repeats', type=int, default=50)
+    parser.add_argument('--repeat-length', type=int, default=600)
+    parser.add_argument('--repeat-divergence', type=float, default=0.01)
+    parser.add_argument('--poly-a-length', type=int, default=40)
+    parser.add_argument('--probe-length', type=int, default=100)
+    parser.add_argument('--probe-stride', type=int, default=25)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('-k', type=int, default=20)
+    parser.add_argument('--thresholds', type=int, nargs='+',
+                        default=[200, 50, 10])
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmark set_cover.approx_multiuniverse on a synthetic instance.
+
+This builds an instance resembling what SetCoverFilter produces: there
+are a number of universes (target genomes), each a stretch of positions,
+and each set (candidate probe) covers one or a few intervals in some of
+the universes. Sets are stored as IntervalSets (or single-interval
+tuples), as in SetCoverFilter, and some sets are given a higher rank.
+
+It reports the runtime of approx_multiuniverse with the full scan and
+with the lazy greedy approach, each with universes stored as IntervalSets
+and as coverage arrays, and checks that all select the same sets.
+
+Run, for example, as:
+  python benchmarks/benchmark_set_cover.py --num-sets 20000
+"""
+
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from catch.utils import interval
+from catch.utils import set_cover
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def make_instance(num_sets, num_universes, universe_len, probe_len,
+                  num_ranks):
+    sets = {}
+    for set_id in range(num_sets):
+        sets[set_id] = {}
+        # Each probe comes from one genome and covers similar positions in
+        # a few other genomes (which is how probes cover related genomes)
+        origin = np.random.randint(0, universe_len - probe_len)
+        num_hit = np.random.randint(1, min(5, num_universes) + 1)
+        for universe_id in np.random.choice(num_universes, size=num_hit,
+                                            replace=False):
+            start = max(0, origin + np.random.randint(-20, 21))
+            end = min(universe_len, start + probe_len)
+            if np.random.random() < 0.2:
+                # Cover two intervals (e.g., a repetitive region)
+                start2 = np.random.randint(0, universe_len - probe_len)
+                sets[set_id][int(universe_id)] = interval.IntervalSet(
+                    [(start, end), (start2, start2 + probe_len)])
+            else:
+                sets[set_id][int(universe_id)] = (start, end)
+    ranks = {set_id: int(np.random.randint(0, num_ranks))
+             for set_id in range(num_sets)}
+    return sets, ranks
+
+
+def main(args):
+    np.random.seed(args.seed)
+    sets, ranks = make_instance(args.num_sets, args.num_universes,
+                                args.universe_len, args.probe_len,
+                                args.num_ranks)
+    universe_p = {universe_id: args.coverage
+                  for universe_id in range(args.num_universes)}
+
+    results = {}
+    for name, lazy, arrays in [('scan', False, False),
+                               ('lazy greedy', True, False),
+                               ('scan+arrays', False, True),
+                               ('lazy+arrays', True, True)]:
+        start = time.time()
+        cover = set_cover.approx_multiuniverse(
+            sets, universe_p=universe_p, ranks=ranks,
+            use_intervalsets=not arrays, use_lazy_greedy=lazy,
+            use_coverage_arrays=arrays)
+        results[name] = (time.time() - start, cover)
+
+    print("%d sets, %d universes" % (args.num_sets, args.num_universes))
+    print("%-14s %12s %10s" % ("", "time (s)", "selected"))
+    for name, (t, cover) in results.items():
+        print("%-14s %12.2f %10d" % (name, t, len(cover)))
+    if any(cover != results['scan'][1] for _, cover in results.values()):
+        print("WARNING: the selected sets differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-sets', type=int, default=5000)
+    parser.add_argument('--num-universes', type=int, default=20)
+    parser.add_argument('--universe-len', type=int, default=20000)
+    parser.add_argument('--probe-len', type=int, default=100)
+    parser.add_argument('--num-ranks', type=int, default=2)
+    parser.add_argument('--coverage', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=1)
+    logging.disable(logging.INFO)
+    main(parser.parse_args())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Benchmark sending target sequences to the probe finding processes.
+
+This compares two ways of giving the processes the sequences to scan in
+probe.find_probe_covers_in_sequences():
+  - 'pickled': each task carries the sequences it scans, so that they
+    are pickled and sent to a process with every task (as was done
+    before the sequences were placed in shared memory)
+  - 'shared': the sequences are placed once in shared memory (see
+    probe.SharedSequenceCollection) and each task only names them, as
+    tuples (sequence id, start, end)
+For each, it reports the number of bytes pickled for the tasks and the
+time to find the probe covers in all of the sequences.
+
+The target genomes are copies of one genome with random substitutions,
+and the probes are taken from it. Run, for example, as:
+  python benchmarks/benchmark_shared_sequences.py --num-genomes 2000
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from catch import probe
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def scan_pickled(pieces):
+    # Scan pieces that carry their sequences, in a process of the probe
+    # finding pool
+    return [(seq_index, probe._find_probe_covers_in_subsequence(
+                bounds, sequence))
+            for seq_index, sequence, bounds in pieces]
+
+
+def pickled_tasks(sequences, k):
+    # Pack consecutive sequences into tasks, as
+    # find_probe_covers_in_sequences() does
+    tasks = []
+    batch, batch_len = [], 0
+    for seq_index, sequence in enumerate(sequences):
+        batch += [(seq_index, sequence, (0, len(sequence) - k + 1))]
+        batch_len += len(sequence)
+        if batch_len >= probe._BATCH_TASK_LEN:
+            tasks += [batch]
+            batch, batch_len = [], 0
+    if batch:
+        tasks += [batch]
+    return tasks
+
+
+def time_pickled(sequences, k):
+    tasks = pickled_tasks(sequences, k)
+    task_bytes = sum(len(pickle.dumps(task)) for task in tasks)
+    start = time.time()
+    for results in probe._pfp_pool.imap_unordered(scan_pickled, tasks):
+        for _, covers in results:
+            probe._merge_probe_covers([covers])
+    return task_bytes, time.time() - start
+
+
+def time_shared(sequences, k):
+    # The tasks are made inside find_probe_covers_in_sequences(); measure
+    # what is pickled for them by wrapping the pool's imap_unordered()
+    task_bytes = [0]
+    imap_unordered = probe._pfp_pool.imap_unordered
+
+    def counting_imap_unordered(fn, tasks):
+        def iter_counted():
+            for task in tasks:
+                task_bytes[0] += len(pickle.dumps(task))
+                yield task
+        return imap_unordered(fn, iter_counted())
+
+    probe._pfp_pool.imap_unordered = counting_imap_unordered
+    try:
+        start = time.time()
+        for _ in probe.find_probe_covers_in_sequences(
+                ((None, seq) for seq in sequences)):
+            pass
+        elapsed = time.time() - start
+    finally:
+        del probe._pfp_pool.imap_unordered
+    return task_bytes[0], elapsed
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+    genome = np.random.choice(bases, size=args.genome_length)
+    probes = [probe.Probe.from_str(''.join(genome[i:(i + 100)]))
+              for i in range(0, args.genome_length - 100, 50)]
+
+    sequences = []
+    for _ in range(args.num_genomes):
+        mutated = genome.copy()
+        j = np.flatnonzero(np.random.random(len(mutated)) < args.divergence)
+        mutated[j] = bases[np.random.randint(0, 4, size=len(j))]
+        sequences += [''.join(mutated)]
+
+    kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+        probes, args.mismatches, 100)
+    cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+        args.mismatches, 100)
+    k = kmer_probe_map.k
+
+    print("genomes=%d, genome length=%d, processes=%d" % (
+        len(sequences), args.genome_length, args.num_processes))
+    print("%-8s %14s %10s" % ("tasks", "pickled (MB)", "time (s)"))
+    probe.open_probe_finding_pool(kmer_probe_map, cover_fn,
+                                  num_processes=args.num_processes)
+    try:
+        for name, time_fn in [('pickled', time_pickled),
+                              ('shared', time_shared)]:
+            task_bytes, elapsed = time_fn(sequences, k)
+            print("%-8s %14.2f %10.2f" % (name, task_bytes / 2**20, elapsed))
+    finally:
+        probe.close_probe_finding_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-genomes', type=int, default=2000)
+    parser.add_argument('--genome-length', type=int, default=10000)
+    parser.add_argument('--divergence', type=float, default=0.02)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('--num-processes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
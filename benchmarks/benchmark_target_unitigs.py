@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark finding probe covers through unitigs of the target genomes.
+
+This times SetCoverFilter._find_covers() when it scans each target
+genome (distinct ones once) and when it scans the unitigs of the L-mers
+of the target genomes and projects the ranges found onto them (with
+use_target_unitigs), and checks that the two give the same covers.
+
+The target genomes are copies of one genome with random substitutions,
+and the candidate probes are taken from it. A substitution in a genome
+gives rise to about 2L bases of new unitig sequence, so the unitigs are
+much shorter than the genomes only when --divergence is small relative
+to 1/L (e.g., many closely related outbreak genomes). Run, for example,
+as:
+  python benchmarks/benchmark_target_unitigs.py --divergence 0.0005
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import genome
+from catch import probe
+from catch.filter import set_cover_filter
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+    seq = np.random.choice(bases, size=args.genome_length)
+    probes = [probe.Probe.from_str(''.join(seq[i:(i + 100)]))
+              for i in range(0, args.genome_length - 100, 25)]
+
+    genomes = []
+    for _ in range(args.num_genomes):
+        mutated = seq.copy()
+        j = np.flatnonzero(np.random.random(len(mutated)) < args.divergence)
+        mutated[j] = bases[np.random.randint(0, 4, size=len(j))]
+        genomes += [genome.Genome.from_one_seq(''.join(mutated))]
+    probe.set_max_num_processes_for_probe_finding_pools(args.num_processes)
+
+    print("genomes=%d, probes=%d" % (len(genomes), len(probes)))
+    print("%-14s %10s %10s" % ("scan", "time (s)", "covers"))
+    found = []
+    for use_target_unitigs in [False, True]:
+        f = set_cover_filter.SetCoverFilter(
+            mismatches=args.mismatches, lcf_thres=100,
+            use_target_unitigs=use_target_unitigs)
+        f.target_genomes = [genomes]
+        start = time.time()
+        covers = f._find_covers(probes)
+        elapsed = time.time() - start
+        print("%-14s %10.2f %10d" % (
+            "unitigs" if use_target_unitigs else "genomes", elapsed,
+            len(covers['cover_set_id'])))
+        found += [covers]
+    for key in found[0]:
+        assert np.array_equal(found[0][key], found[1][key])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-genomes', type=int, default=500)
+    parser.add_argument('--genome-length', type=int, default=10000)
+    parser.add_argument('--divergence', type=float, default=0.0005)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('--num-processes', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Benchmark the cache of verification outcomes in probe finding workers.
+
+This scans target genomes that are copies of one genome with random
+substitutions, as in the genomes of one species, for probes taken from
+it. For each size of cache and eviction policy (see
+probe.set_verify_cache_for_probe_finding_pools()), it reports the time
+to find the probe covers in all of the genomes, and the hit rate of the
+cache of one worker (in this process).
+
+Run, for example, as:
+  python benchmarks/benchmark_verify_cache.py --num-genomes 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from catch import probe
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+def main(args):
+    np.random.seed(args.seed)
+    bases = np.array(['A', 'C', 'G', 'T'])
+    genome = np.random.choice(bases, size=args.genome_length)
+    probes = [probe.Probe.from_str(''.join(genome[i:(i + 100)]))
+              for i in range(0, args.genome_length - 100, 25)]
+
+    sequences = []
+    for _ in range(args.num_genomes):
+        mutated = genome.copy()
+        j = np.flatnonzero(np.random.random(len(mutated)) < args.divergence)
+        mutated[j] = bases[np.random.randint(0, 4, size=len(j))]
+        sequences += [''.join(mutated)]
+
+    kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+        probes, args.mismatches, 100)
+    cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+        args.mismatches, 100)
+
+    print("genomes=%d, genome length=%d, divergence=%.3f" % (
+        len(sequences), args.genome_length, args.divergence))
+    print("%-10s %-6s %10s %10s" % ("cache size", "policy", "time (s)",
+                                    "hit rate"))
+    configs = [(0, 'lru')]
+    for cache_size in args.cache_sizes:
+        configs += [(cache_size, 'lru'), (cache_size, 'fifo')]
+    expected = None
+    for cache_size, eviction in configs:
+        probe.set_verify_cache_for_probe_finding_pools(cache_size, eviction)
+        probe.open_probe_finding_pool(kmer_probe_map, cover_fn,
+                                      num_processes=args.num_processes)
+        start = time.time()
+        found = [covers for _, covers in probe.find_probe_covers_in_sequences(
+            enumerate(sequences))]
+        elapsed = time.time() - start
+
+        # Scan, in this process, with a fresh cache, to read its hit rate
+        hit_rate = float('nan')
+        if cache_size > 0:
+            probe._reset_verify_cache((cache_size, eviction))
+            for sequence in sequences:
+                probe._find_probe_covers_in_subsequence(
+                    (0, len(sequence) - kmer_probe_map.k + 1), sequence)
+            hit_rate = probe._pfp_worker_verify_cache.hit_rate()
+        probe.close_probe_finding_pool()
+
+        if expected is None:
+            expected = found
+        assert found == expected
+        print("%-10d %-6s %10.2f %10.3f" % (cache_size, eviction, elapsed,
+                                            hit_rate))
+    probe.set_verify_cache_for_probe_finding_pools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num-genomes', type=int, default=200)
+    parser.add_argument('--genome-length', type=int, default=10000)
+    parser.add_argument('--divergence', type=float, default=0.005)
+    parser.add_argument('--mismatches', type=int, default=3)
+    parser.add_argument('--cache-sizes', type=int, nargs='+',
+                        default=[10000, 1000000])
+    parser.add_argument('--num-processes', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
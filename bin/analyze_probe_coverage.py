@@ -33,6 +33,12 @@ def main(args):
         probe.set_max_num_processes_for_probe_finding_pools(
             args.max_num_processes)
 
+    # Have each worker that finds probe covers cache the outcomes of
+    # verifying probes against target windows
+    if args.verify_cache_size:
+        probe.set_verify_cache_for_probe_finding_pools(
+            args.verify_cache_size, args.verify_cache_eviction)
+
     # Read the FASTA file of probes
     fasta = seq_io.read_fasta(args.probes_fasta)
     probes = [probe.Probe.from_str(seq) for _, seq in fasta.items()]
@@ -45,7 +51,10 @@ def main(args):
         genomes_grouped,
         genomes_grouped_names,
         island_of_exact_match=args.island_of_exact_match,
-        cover_extension=args.cover_extension)
+        cover_extension=args.cover_extension,
+        kmer_probe_map_seeding=args.kmer_probe_map_seeding,
+        kmer_probe_map_prefilter_bits_per_key=args.kmer_probe_map_prefilter_bits_per_key,
+        kmer_probe_map_max_seed_occurrences=args.kmer_probe_map_max_seed_occurrences)
     analyzer.run()
     if args.write_analysis_to_tsv:
         analyzer.write_data_matrix_as_tsv(
@@ -125,6 +134,35 @@ if __name__ == "__main__":
               "by the probe set within sliding windows of each target "
               "genome"))
 
+    # Options for the k-mer probe map
+    parser.add_argument('--kmer-probe-map-seeding',
+        choices=probe.KMER_PROBE_MAP_SEEDINGS,
+        help=("(Optional) How to choose the k-mers of each probe to index "
+              "when finding probe coverage. 'minimizer' indexes the "
+              "minimizers of each probe, and 'spaced' indexes minimizers "
+              "of spaced seeds (which tolerate mismatches in the target "
+              "at their don't-care positions); both choose enough seeds "
+              "to be certain to find every cover when possible. When not "
+              "set, index pigeonholed k-mers if possible and otherwise "
+              "random k-mers"))
+    parser.add_argument('--kmer-probe-map-prefilter-bits-per-key',
+        type=float,
+        help=("(Optional) When finding probe coverage, first check each "
+              "k-mer of the scanned sequences against a compact filter "
+              "(a Bloom filter, or a bitmap when k is small) with this "
+              "many bits per indexed k-mer, which cheaply rejects most "
+              "k-mers that are not in any probe. This does not change the "
+              "output; around 10 is a reasonable value"))
+    parser.add_argument('--kmer-probe-map-max-seed-occurrences',
+        type=int,
+        help=("(Optional) When finding probe coverage, mask k-mers (seeds) "
+              "that are shared by more than this number of probe "
+              "positions, such as those in poly-A tracts or repeats, so "
+              "that their many hits in the scanned sequences are not "
+              "each verified. A probe all of whose seeds are masked keeps "
+              "its least frequent seed. This can miss some coverage by "
+              "probes that are only found through masked seeds"))
+
     # Number of processes to use
     def check_max_num_processes(val):
         ival = int(val)
@@ -138,6 +176,21 @@ if __name__ == "__main__":
         help=("(Optional) An int >= 1 that gives the maximum number of "
               "processes to use in multiprocessing pools; uses min(number "
               "of CPUs in the system, MAX_NUM_PROCESSES) processes"))
+    parser.add_argument('--verify-cache-size',
+        type=int,
+        help=("(Optional) When finding probe coverage, have each process "
+              "cache up to this many outcomes of verifying a probe "
+              "against a window of a target genome, keyed by the probe, "
+              "its alignment, and the bases of the window. Near-identical "
+              "target genomes (e.g., of one species) repeat most windows, "
+              "which are then not verified again. This does not change "
+              "the output; each outcome takes about 400 bytes"))
+    parser.add_argument('--verify-cache-eviction',
+        choices=['lru', 'fifo'],
+        default='lru',
+        help=("(Optional) When VERIFY_CACHE_SIZE is set and a cache is "
+              "full, evict the least recently used outcome ('lru', the "
+              "default) or the outcome added longest ago ('fifo')"))
 
     # Logging levels and version
     parser.add_argument('--debug',
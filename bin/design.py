@@ -18,6 +18,7 @@ from catch.filter import near_duplicate_filter
 from catch.filter import probe_designer
 from catch.filter import reverse_complement_filter
 from catch.filter import set_cover_filter
+from catch.utils import dataset_cache
 from catch.utils import seq_io, version, log
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -26,6 +27,13 @@ __author__ = 'Hayden Metsky <hayden@mit.edu>'
 def main(args):
     logger = logging.getLogger(__name__)
 
+    def read_dataset_genomes(dataset):
+        if args.dataset_cache_dir:
+            return dataset_cache.read_dataset_genomes(
+                dataset, args.dataset_cache_dir)
+        else:
+            return seq_io.read_dataset_genomes(dataset)
+
     # Read the genomes from FASTA sequences
     genomes_grouped = []
     genomes_grouped_names = []
@@ -40,7 +48,7 @@ def main(args):
                 raise ValueError("Unknown dataset collection %s" %
                                  collection_name)
             for name, dataset in collection.import_all():
-                genomes_grouped += [seq_io.read_dataset_genomes(dataset)]
+                genomes_grouped += [read_dataset_genomes(dataset)]
                 genomes_grouped_names += [name]
         elif os.path.isfile(ds):
             # Process a custom fasta file with sequences
@@ -53,7 +61,7 @@ def main(args):
                             'catch.datasets.' + ds)
             except ImportError:
                 raise ValueError("Unknown file or dataset '%s'" % ds)
-            genomes_grouped += [seq_io.read_dataset_genomes(dataset)]
+            genomes_grouped += [read_dataset_genomes(dataset)]
             genomes_grouped_names += [ds]
 
     if (args.limit_target_genomes and
@@ -110,6 +118,16 @@ def main(args):
         probe.set_max_num_processes_for_probe_finding_pools(
             args.max_num_processes)
 
+    # Have each worker that finds probe covers cache the outcomes of
+    # verifying probes against target windows
+    if args.verify_cache_size:
+        probe.set_verify_cache_for_probe_finding_pools(
+            args.verify_cache_size, args.verify_cache_eviction)
+
+    # Fork the workers that find probe covers once, and reuse them in all
+    # the steps below that find probe covers (it is stopped at exit)
+    probe.start_persistent_probe_finding_pool()
+
     # Raise exceptions or warn based on use of adapter arguments
     if args.add_adapters:
         if not (args.adapter_a or args.adapter_b):
@@ -178,7 +196,17 @@ def main(args):
         coverage=args.coverage,
         cover_extension=args.cover_extension,
         cover_groupings_separately=args.cover_groupings_separately,
-        kmer_probe_map_use_native_dict=args.use_native_dict_when_finding_tolerant_coverage)
+        kmer_probe_map_use_native_dict=args.use_native_dict_when_finding_tolerant_coverage,
+        kmer_probe_map_seeding=args.kmer_probe_map_seeding,
+        kmer_probe_map_prefilter_bits_per_key=args.kmer_probe_map_prefilter_bits_per_key,
+        kmer_probe_map_max_seed_occurrences=args.kmer_probe_map_max_seed_occurrences,
+        use_lazy_greedy=args.use_lazy_greedy_set_cover,
+        use_coverage_arrays=args.use_coverage_arrays_set_cover,
+        # Like the probe finding pools, use min(number of CPUs,
+        # --max-num-processes or its default) processes
+        set_cover_num_processes=None,
+        cover_cache_dir=args.cover_cache_dir,
+        use_target_unitigs=args.use_target_unitigs)
     filters += [scf]
 
     # [Optional]
@@ -242,6 +270,9 @@ def main(args):
             genomes_grouped_names,
             island_of_exact_match=args.island_of_exact_match,
             cover_extension=args.cover_extension,
+            kmer_probe_map_seeding=args.kmer_probe_map_seeding,
+            kmer_probe_map_prefilter_bits_per_key=args.kmer_probe_map_prefilter_bits_per_key,
+            kmer_probe_map_max_seed_occurrences=args.kmer_probe_map_max_seed_occurrences,
             rc_too=args.add_reverse_complements)
         analyzer.run()
         if args.write_analysis_to_tsv:
@@ -270,6 +301,15 @@ if __name__ == "__main__":
               "in this package (e.g., 'zika'). If the label starts with "
               "'collection:' (e.g., 'collection:viruses_with_human_host'), "
               "then this reads from an available collection of datasets."))
+    parser.add_argument('--dataset-cache-dir',
+        help=("(Optional) Path to a directory in which to cache the "
+              "genomes read from datasets included in this package, in "
+              "a format that can be loaded without parsing FASTA files. "
+              "The cache for a dataset is rewritten when its FASTA files "
+              "change. Repeated runs with the same datasets can start "
+              "considerably faster when this is set, since they skip "
+              "parsing; the genomes' sequences are still loaded into "
+              "memory, so this does not reduce memory usage"))
 
     # Parameters on probe length and stride
     parser.add_argument('-pl', '--probe-length',
@@ -548,6 +588,21 @@ if __name__ == "__main__":
         help=("(Optional) An int >= 1 that gives the maximum number of "
               "processes to use in multiprocessing pools; uses min(number "
               "of CPUs in the system, MAX_NUM_PROCESSES) processes"))
+    parser.add_argument('--verify-cache-size',
+        type=int,
+        help=("(Optional) When finding probe coverage, have each process "
+              "cache up to this many outcomes of verifying a probe "
+              "against a window of a target genome, keyed by the probe, "
+              "its alignment, and the bases of the window. Near-identical "
+              "target genomes (e.g., of one species) repeat most windows, "
+              "which are then not verified again. This does not change "
+              "the output; each outcome takes about 400 bytes"))
+    parser.add_argument('--verify-cache-eviction',
+        choices=['lru', 'fifo'],
+        default='lru',
+        help=("(Optional) When VERIFY_CACHE_SIZE is set and a cache is "
+              "full, evict the least recently used outcome ('lru', the "
+              "default) or the outcome added longest ago ('fifo')"))
     parser.add_argument('--use-native-dict-when-finding-tolerant-coverage',
         dest="use_native_dict_when_finding_tolerant_coverage",
         action="store_true",
@@ -560,6 +615,76 @@ if __name__ == "__main__":
               "this may result in substantial memory usage; but it may provide "
               "an improvement in runtime when there are relatively few "
               "candidate probes and a very large blacklisted input"))
+    parser.add_argument('--kmer-probe-map-seeding',
+        choices=probe.KMER_PROBE_MAP_SEEDINGS,
+        help=("(Optional) How to choose the k-mers of each probe to index "
+              "when finding probe coverage. 'minimizer' indexes the "
+              "minimizers of each probe, and 'spaced' indexes minimizers "
+              "of spaced seeds (which tolerate mismatches in the target "
+              "at their don't-care positions); both choose enough seeds "
+              "to be certain to find every cover when possible. When not "
+              "set, index pigeonholed k-mers if possible and otherwise "
+              "random k-mers"))
+    parser.add_argument('--kmer-probe-map-prefilter-bits-per-key',
+        type=float,
+        help=("(Optional) When finding probe coverage, first check each "
+              "k-mer of the scanned sequences against a compact filter "
+              "(a Bloom filter, or a bitmap when k is small) with this "
+              "many bits per indexed k-mer, which cheaply rejects most "
+              "k-mers that are not in any probe. This does not change the "
+              "output; around 10 is a reasonable value"))
+    parser.add_argument('--kmer-probe-map-max-seed-occurrences',
+        type=int,
+        help=("(Optional) When finding probe coverage, mask k-mers (seeds) "
+              "that are shared by more than this number of probe "
+              "positions, such as those in poly-A tracts or repeats, so "
+              "that their many hits in the scanned sequences are not "
+              "each verified. A probe all of whose seeds are masked keeps "
+              "its least frequent seed. This can miss some coverage by "
+              "probes that are only found through masked seeds"))
+    parser.add_argument('--use-lazy-greedy-set-cover',
+        dest="use_lazy_greedy_set_cover",
+        action="store_true",
+        help=("Select probes in the set cover approximation with a lazy "
+              "greedy approach, which keeps a priority queue of the "
+              "ratios of candidate probes and only recomputes the ratio "
+              "of the probe at its top. This selects the same probes but "
+              "may provide a considerable improvement in runtime when "
+              "there are many candidate probes"))
+    parser.add_argument('--use-coverage-arrays-set-cover',
+        dest="use_coverage_arrays_set_cover",
+        action="store_true",
+        help=("In the set cover approximation, store each target genome "
+              "as an array marking which positions are not yet covered, "
+              "rather than as a set of intervals. This avoids allocating "
+              "new objects each time coverage is counted or removed and "
+              "may provide an improvement in runtime, at the cost of "
+              "about one byte of memory per position of the target genomes"))
+    parser.add_argument('--cover-cache-dir',
+        help=("(Optional) Path to a directory in which to cache the "
+              "ranges that candidate probes cover in the target genomes, "
+              "which is typically the most time-consuming step of the "
+              "set cover filter. A later run reads them from the cache "
+              "if it has the same candidate probes and target genomes, "
+              "the same hybridization parameters (-m, -l, "
+              "--island-of-exact-match), and the same k-mer probe map: "
+              "the same --kmer-probe-map-seeding and "
+              "--kmer-probe-map-max-seed-occurrences, as well as the "
+              "k-mer length and the mismatches and lcf_thres the map is "
+              "built for (set by the hybridization parameters when run "
+              "from here). It does so even if other parameters (e.g., "
+              "coverage, cover extension, or blacklisted genomes) differ"))
+    parser.add_argument('--use-target-unitigs',
+        action="store_true",
+        help=("In the set cover filter, find the ranges that candidate "
+              "probes cover by scanning, once, the unitigs of the k-mers "
+              "of the target genomes (with k the length of the longest "
+              "candidate probe) rather than each target genome, and "
+              "projecting the ranges found onto the genomes. This gives "
+              "the same coverage and may provide a considerable "
+              "improvement in runtime when the target genomes share "
+              "long stretches of identical sequence; it helps little "
+              "when they differ every few hundred bp"))
 
     # Log levels and version
     parser.add_argument('--debug',
@@ -81,6 +81,9 @@ class Analyzer:
                  island_of_exact_match=0,
                  cover_extension=0,
                  kmer_probe_map_k=10,
+                 kmer_probe_map_seeding=None,
+                 kmer_probe_map_prefilter_bits_per_key=None,
+                 kmer_probe_map_max_seed_occurrences=None,
                  rc_too=True):
         """
         Args:
@@ -106,6 +109,21 @@ class Analyzer:
                 bp on each side of that portion
             kmer_probe_map_k: in calls to probe.construct_kmer_probe_map...,
                 uses this value as min_k and k
+            kmer_probe_map_seeding: how to choose the k-mers of each probe
+                to put in the k-mer probe map (see
+                probe.SharedKmerProbeMap.construct_from_probes()); None (the
+                default) for pigeonholed or random k-mers, 'minimizer' for
+                minimizers, or 'spaced' for minimizers of spaced seeds
+            kmer_probe_map_prefilter_bits_per_key: if set, build a
+                prefilter (a Bloom filter or bitmap with this many bits per
+                k-mer) in front of lookups in the k-mer probe map, which
+                cheaply rejects most k-mers of the scanned sequences that are
+                not in it; this does not change the output
+            kmer_probe_map_max_seed_occurrences: if set, mask seeds of the
+                k-mer probe map that each have more than this number of entries
+                (e.g., from low-complexity sequence shared by many probes), so
+                that their occurrences in scanned sequences are not verified;
+                a probe whose seeds are all masked keeps its least frequent one
             rc_too: when True, analyze all the target genomes in
                 target_genomes, as well as their reverse complements (when
                 False, do not analyze reverse complements)
@@ -128,6 +146,11 @@ class Analyzer:
                 mismatches, lcf_thres, island_of_exact_match)
         self.cover_extension = cover_extension
         self.kmer_probe_map_k = kmer_probe_map_k
+        self.kmer_probe_map_seeding = kmer_probe_map_seeding
+        self.kmer_probe_map_prefilter_bits_per_key = \
+            kmer_probe_map_prefilter_bits_per_key
+        self.kmer_probe_map_max_seed_occurrences = \
+            kmer_probe_map_max_seed_occurrences
         self.rc_too = rc_too
 
     def _iter_target_genomes(self):
@@ -175,58 +198,80 @@ class Analyzer:
         # be constructed using the random approach (yielding many k-mers
         # and thus a slower runtime in finding probe covers) rather than
         # the pigeonhole approach.
-        kmer_probe_map = probe.SharedKmerProbeMap.construct(
-            probe.construct_kmer_probe_map_to_find_probe_covers(
-                self.probes, self.mismatches, self.lcf_thres,
-                min_k=self.kmer_probe_map_k, k=self.kmer_probe_map_k)
+        # If reverse complements are needed, the map also indexes the
+        # reverse complements of the probes, so that scanning each
+        # sequence once finds covers in it and in its reverse complement
+        kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+            self.probes, self.mismatches, self.lcf_thres,
+            min_k=self.kmer_probe_map_k, k=self.kmer_probe_map_k,
+            include_reverse_complements=self.rc_too,
+            seeding=self.kmer_probe_map_seeding,
+            prefilter_bits_per_key=self.kmer_probe_map_prefilter_bits_per_key,
+            max_seed_occurrences=self.kmer_probe_map_max_seed_occurrences
         )
         probe.open_probe_finding_pool(kmer_probe_map,
                                       self.cover_range_fn)
 
+        def iter_records():
+            # Yield the sequences of all target genomes, keyed by the
+            # genome they come from and their length
+            for i, genomes_from_group in enumerate(self.target_genomes):
+                for j, gnm in enumerate(genomes_from_group):
+                    for sequence in gnm.seqs:
+                        yield (i, j, len(sequence)), sequence
+
         self.target_covers = {}
         for i, j, gnm, rc in self._iter_target_genomes():
-            if not rc:
-                logger.info(("Computing coverage in grouping %d (of %d), "
-                             "with target genome %d (of %d)"), i + 1,
-                            len(self.target_genomes), j + 1,
-                            len(self.target_genomes[i]))
             if i not in self.target_covers:
                 self.target_covers[i] = {}
             if j not in self.target_covers[i]:
                 self.target_covers[i][j] = {False: None, True: None}
-
-            gnm_covers = []
-            length_so_far = 0
-            for sequence in gnm.seqs:
-                if rc:
-                    # Take the reverse complement of sequence
-                    rc_map = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-                    sequence = ''.join([rc_map.get(b, b)
-                                       for b in sequence[::-1]])
-
-                # Find cover ranges of the probes, while allowing the ranges
-                # to overlap (e.g., if one probe covers two regions that
-                # overlap)
-                probe_cover_ranges = probe.find_probe_covers_in_sequence(
-                    sequence,
-                    merge_overlapping=False)
-                for p, cover_ranges in probe_cover_ranges.items():
+            self.target_covers[i][j][rc] = []
+
+        prev_gnm_id = None
+        # Find cover ranges of the probes, while allowing the ranges
+        # to overlap (e.g., if one probe covers two regions that
+        # overlap); the probe finding pool packs many sequences into each
+        # task sent to a process, and outputs the ranges found in each
+        # sequence in the order of iter_records(); a sequence repeated
+        # across target genomes is scanned once, and its ranges are placed
+        # in each genome that contains it
+        for (i, j, sequence_len), probe_cover_ranges in \
+                probe.find_probe_covers_in_sequences(
+                    iter_records(), merge_overlapping=False, dedup=True):
+            if (i, j) != prev_gnm_id:
+                logger.info(("Computing coverage in grouping %d (of %d), "
+                             "with target genome %d (of %d)"), i + 1,
+                            len(self.target_genomes), j + 1,
+                            len(self.target_genomes[i]))
+                prev_gnm_id = (i, j)
+                length_so_far = 0
+
+            if self.rc_too:
+                # probe_cover_ranges gives ranges in the sequence and,
+                # separately, in its reverse complement
+                probe_cover_ranges_by_strand = zip([False, True],
+                                                   probe_cover_ranges)
+            else:
+                probe_cover_ranges_by_strand = [(False, probe_cover_ranges)]
+            for rc, strand_probe_cover_ranges in probe_cover_ranges_by_strand:
+                gnm_covers = self.target_covers[i][j][rc]
+                for p, cover_ranges in strand_probe_cover_ranges.items():
                     for cover_range in cover_ranges:
                         # Extend the range covered by probe p on both sides
                         # by self.cover_extension
                         cover_start = max(0,
                             cover_range[0] - self.cover_extension)
-                        cover_end = min(len(sequence),
+                        cover_end = min(sequence_len,
                             cover_range[1] + self.cover_extension)
                         # The endpoints of the cover give positions in just
-                        # this sequence (chromosome), so adjust them (according
-                        # to length_so_far) to give a unique integer position
-                        # in the genome gnm
+                        # this sequence (chromosome), so adjust them
+                        # (according to length_so_far) to give a unique
+                        # integer position in the genome gnm
                         adjusted_cover = (cover_start + length_so_far,
                                           cover_end + length_so_far)
                         gnm_covers += [adjusted_cover]
-                length_so_far += len(sequence)
-            self.target_covers[i][j][rc] = gnm_covers
+            length_so_far += sequence_len
 
         probe.close_probe_finding_pool()
 
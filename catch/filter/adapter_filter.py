@@ -159,12 +159,12 @@ class AdapterFilter(BaseFilter):
                 island_of_exact_match=island_of_exact_match)
         self.kmer_probe_map_k = kmer_probe_map_k
 
-    def _votes_in_sequence(self, probes, sequence):
+    def _votes_in_sequence(self, probes, probe_cover_ranges):
         """Compute votes for probes based on their overlap.
 
-        Votes are determined by first determining the probes' hybridization
-        (alignment) to sequence (e.g., one target genome) and then
-        by considering their overlap.
+        Votes are determined from the probes' hybridization (alignment)
+        to a sequence (e.g., one target genome), by considering their
+        overlap.
 
         We use the greedy interval scheduling algorithm and assign 'A'
         votes to all probes selected by this algorithm. All other probes
@@ -173,15 +173,16 @@ class AdapterFilter(BaseFilter):
 
         Args:
             probes: a list of candidate probes for which to determine votes
-            sequence: a string of a sequence (e.g., from a target genome)
-                to use when determining overlap among probes
+            probe_cover_ranges: dict mapping probes to the ranges they
+                cover in a sequence (e.g., from a target genome), as output
+                by probe.find_probe_covers_in_sequence(); used when
+                determining overlap among probes
 
         Returns:
             A list L, in which L[i] corresponds to the probe probes[i].
             L[i] is either (1,0) [vote for 'A'], (0,1) [vote for 'B'], or
             (0,0) [the probe does not hybridize in 'sequence'].
         """
-        probe_cover_ranges = probe.find_probe_covers_in_sequence(sequence)
         aligned_probes = set(probe_cover_ranges.keys())
         # Make a list of all the intervals covered by all the probes,
         # along with a reference to the probe with the interval
@@ -280,13 +281,12 @@ class AdapterFilter(BaseFilter):
             the number of 'B' adapter votes.
         """
         logger.info("Building map from k-mers to probes")
-        kmer_probe_map = probe.SharedKmerProbeMap.construct(
-            probe.construct_kmer_probe_map_to_find_probe_covers(
-                probes,
-                self.mismatches,
-                self.lcf_thres,
-                min_k=self.kmer_probe_map_k,
-                k=self.kmer_probe_map_k)
+        kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes,
+            self.mismatches,
+            self.lcf_thres,
+            min_k=self.kmer_probe_map_k,
+            k=self.kmer_probe_map_k
         )
         probe.open_probe_finding_pool(kmer_probe_map,
                                       self.cover_range_fn)
@@ -295,20 +295,26 @@ class AdapterFilter(BaseFilter):
             for genomes_from_group in self.target_genomes:
                 for g in genomes_from_group:
                     for seq in g.seqs:
-                        yield seq
+                        yield None, seq
 
         # Store adapter votes for each probe in a list where the element
         # at index i is a tuple (A,B) that corresponds to the probe
         # probes[i] where A gives the 'A' votes for the probe and B gives
         # the 'B' votes
         cumulative_votes = [(0, 0) for _ in range(len(probes))]
-        for sequence in iter_all_seqs():
-            # Compute votes for the adapters for each probe in 'sequence',
+        # The probe finding pool packs many sequences into each task sent
+        # to a process, and outputs the ranges found in each sequence in
+        # the order of iter_all_seqs(), which the votes depend on
+        # A sequence repeated across target genomes is scanned once, and
+        # its ranges are reused for each of its occurrences
+        for _, probe_cover_ranges in probe.find_probe_covers_in_sequences(
+                iter_all_seqs(), dedup=True):
+            # Compute votes for the adapters for each probe in the sequence,
             # and also exchange all 'A' votes with 'B' votes and vice-versa.
             # Determine whether or not the exchange matches better with
             # cumulative_votes so far, and update cumulative_votes
             # accordingly.
-            votes = self._votes_in_sequence(probes, sequence)
+            votes = self._votes_in_sequence(probes, probe_cover_ranges)
             votes_flipped = self._flip_AB_votes(votes)
             cumulative_votes_with_nonflipped = self._sum_votes_per_probe(
                 cumulative_votes, votes)
@@ -1,6 +1,8 @@
 """Wrappers around a filter, meant to abstract away common tasks.
 """
 
+from catch import probe
+
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
 
 
@@ -20,19 +22,32 @@ class BaseFilter:
     list of probes after processing from the given input list. This
     saves the input probes in self.input_probes and the output probes in
     self.output_probes.
+
+    The input may also be a probe.ProbeSet. A subclass that can process
+    a ProbeSet directly, without making a probe.Probe for each probe,
+    implements a _filter_probe_set(..) method that returns a ProbeSet (or
+    a list of probes). For subclasses that do not, the ProbeSet is
+    converted to a list of probe.Probe objects and passed to _filter(..).
     """
 
     def filter(self, input):
         """Perform the filtering.
 
         Args:
-            input: list of candidate probes
+            input: list of candidate probes, or a probe.ProbeSet
 
         Returns:
-            list of probes after applying a filter to the input
+            list of probes, or a probe.ProbeSet, after applying a filter
+            to the input
         """
         self.input_probes = input
-        filtered = self._filter(input)
+        if isinstance(input, probe.ProbeSet):
+            if hasattr(self, '_filter_probe_set'):
+                filtered = self._filter_probe_set(input)
+            else:
+                filtered = self._filter(input.to_probes())
+        else:
+            filtered = self._filter(input)
         self.output_probes = filtered
         return filtered
 
@@ -165,3 +165,46 @@ def make_candidate_probes_from_sequences(
             allow_small_seqs=allow_small_seqs)
 
     return probes
+
+
+def make_candidate_probe_set_from_sequences(
+        seqs,
+        probe_length,
+        probe_stride,
+        min_n_string_length=2,
+        allow_small_seqs=None):
+    """Generate a probe.ProbeSet of candidate probes from a list of sequences.
+
+    This is the same as make_candidate_probes_from_sequences(), except
+    that it returns the candidate probes in a probe.ProbeSet. The
+    probe.Probe objects made for one sequence are released before moving
+    on to the next, so there are never Probe objects for all of the
+    candidate probes at once.
+
+    Args:
+        seqs: list of sequences, each as a string
+        probe_length/probe_stride/min_n_string_length/allow_small_seqs:
+            see make_candidate_probes_from_sequences()
+
+    Returns:
+        probe.ProbeSet holding the candidate probes
+    """
+    if not isinstance(seqs, list):
+        raise ValueError("seqs must be a list of sequences")
+    if len(seqs) == 0:
+        raise ValueError("seqs must have at least one sequence")
+    for seq in seqs:
+        if not isinstance(seq, str):
+            raise ValueError("seqs must be a list of Python strings")
+
+    probe_sets = []
+    for seq in seqs:
+        probes = make_candidate_probes_from_sequence(
+            seq,
+            probe_length=probe_length,
+            probe_stride=probe_stride,
+            min_n_string_length=min_n_string_length,
+            allow_small_seqs=allow_small_seqs)
+        probe_sets += [probe.ProbeSet.from_probes(probes)]
+
+    return probe.ProbeSet.concatenate(probe_sets)
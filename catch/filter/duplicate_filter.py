@@ -24,3 +24,8 @@ class DuplicateFilter(BaseFilter):
         # non-duplicate probes, but would not preserve the input
         # order. Instead, preserve the order with an OrderedDict.
         return list(OrderedDict.fromkeys(input))
+
+    def _filter_probe_set(self, input):
+        """Return a subset of the input probes, given as a probe.ProbeSet.
+        """
+        return input.unique()
@@ -35,7 +35,8 @@ class FastaFilter(BaseFilter):
     def _filter(self, input):
         """Return a subset of the input probes.
         """
-        # Read the FASTA file
+        # Read the FASTA file; if a header is repeated, only its last
+        # sequence is kept
         fasta = seq_io.read_fasta(self.fasta_path)
 
         # Construct a set of the sequences from the file
@@ -3,6 +3,7 @@
 
 import logging
 
+from catch import probe
 from catch.filter import candidate_probes
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -43,23 +44,31 @@ class ProbeDesigner:
         """Design probes using the provided filters.
 
         Generates the set of candidate probes and runs these through the
-        filters. Stores the candidate probes in self.candidate_probes and
-        the probes processed by the filters in self.final_probes.
+        filters. Stores the candidate probes, as a probe.ProbeSet, in
+        self.candidate_probes and the probes processed by the filters, as
+        a list of probe.Probe, in self.final_probes.
+
+        The probes are passed between filters as a probe.ProbeSet for as
+        long as the filters accept and return one (see BaseFilter).
         """
 
         logger.info("Building candidate probes from target sequences")
-        self.candidate_probes = []
+        candidate_probe_sets = []
         for genomes_from_group in self.genomes:
             for g in genomes_from_group:
-                self.candidate_probes += candidate_probes.\
-                    make_candidate_probes_from_sequences(
+                candidate_probe_sets += [
+                    candidate_probes.make_candidate_probe_set_from_sequences(
                         g.seqs, probe_length=self.probe_length,
                         probe_stride=self.probe_stride,
-                        allow_small_seqs=self.allow_small_seqs)
+                        allow_small_seqs=self.allow_small_seqs)]
+        self.candidate_probes = probe.ProbeSet.concatenate(
+            candidate_probe_sets)
 
         probes = self.candidate_probes
         for f in self.filters:
             logger.info("Starting filter %s", f.__class__.__name__)
             f.target_genomes = self.genomes
             probes = f.filter(probes)
+        if isinstance(probes, probe.ProbeSet):
+            probes = probes.to_probes()
         self.final_probes = probes
@@ -10,6 +10,9 @@ the original input probes --- i.e., if the input probes are
 Pnr is the reverse complement of Pn.
 """
 
+import numpy as np
+
+from catch import probe
 from catch.filter.base_filter import BaseFilter
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -32,3 +35,20 @@ class ReverseComplementFilter(BaseFilter):
                 (p_rc.identifier(), p.identifier())
             output += [p_rc]
         return output
+
+    def _filter_probe_set(self, input):
+        """Return input probes and their reverse complements, given as a
+        probe.ProbeSet.
+        """
+        rc = input.reverse_complement()
+        ids = input.identifiers()
+        rc_ids = rc.identifiers()
+        input.headers = ["probe_%s | from target sequence" % i for i in ids]
+        rc.headers = ["probe_%s | reverse complement of probe_%s" %
+                      (rc_id, i) for i, rc_id in zip(ids, rc_ids)]
+        # Intersperse the reverse complements with the input probes
+        n = len(input)
+        order = np.empty(2 * n, dtype=np.int64)
+        order[0::2] = np.arange(n)
+        order[1::2] = np.arange(n, 2 * n)
+        return probe.ProbeSet.concatenate([input, rc])[order]
@@ -45,12 +45,18 @@ mismatches between a sequence and a probe.
 from collections import defaultdict
 import gc
 import logging
+import multiprocessing
 import re
 
+import numpy as np
+
 from catch.filter.base_filter import BaseFilter
 from catch import probe
+from catch import target_unitigs
 from catch.utils import interval
+from catch.utils import probe_cover_cache
 from catch.utils import seq_io
+from catch.utils import sequence_dedup
 from catch.utils import set_cover
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -75,7 +81,15 @@ class SetCoverFilter(BaseFilter):
                  cover_extension=0,
                  cover_groupings_separately=False,
                  kmer_probe_map_k=20,
-                 kmer_probe_map_use_native_dict=False):
+                 kmer_probe_map_use_native_dict=False,
+                 kmer_probe_map_seeding=None,
+                 kmer_probe_map_prefilter_bits_per_key=None,
+                 kmer_probe_map_max_seed_occurrences=None,
+                 use_lazy_greedy=False,
+                 use_coverage_arrays=False,
+                 set_cover_num_processes=1,
+                 cover_cache_dir=None,
+                 use_target_unitigs=False):
         """
         Args:
             mismatches/lcf_thres: consider a probe to hybridize to a sequence
@@ -142,10 +156,67 @@ class SetCoverFilter(BaseFilter):
                 Python dict of SharedKmerProbeMap rather than its primitive
                 types that are more suited for sharing across processes;
                 depending on the input this can result in considerably
-                more memory use but may give an improvement in runtime
+                more memory use but may give an improvement in runtime;
+                this cannot be used with 'spaced' seeding
+            kmer_probe_map_seeding: how to choose the k-mers of each probe
+                to put in the k-mer probe map (see
+                probe.SharedKmerProbeMap.construct_from_probes()); None (the
+                default) for pigeonholed or random k-mers, 'minimizer' for
+                minimizers, or 'spaced' for minimizers of spaced seeds
+            kmer_probe_map_prefilter_bits_per_key: if set, build a
+                prefilter (a Bloom filter or bitmap with this many bits per
+                k-mer) in front of lookups in the k-mer probe map, which
+                cheaply rejects most k-mers of the scanned sequences that are
+                not in it; this does not change the output
+            kmer_probe_map_max_seed_occurrences: if set, mask seeds of the
+                k-mer probe map that each have more than this number of entries
+                (e.g., from low-complexity sequence shared by many probes), so
+                that their occurrences in scanned sequences are not verified;
+                a probe whose seeds are all masked keeps its least frequent one
+            use_lazy_greedy: when True, have set_cover.approx_multiuniverse
+                select probes with its lazy greedy approach, which selects
+                the same probes but can be considerably faster when there
+                are many candidate probes
+            use_coverage_arrays: when True, have
+                set_cover.approx_multiuniverse store each target genome
+                as a boolean coverage array rather than as an IntervalSet;
+                this avoids allocating new IntervalSets when counting and
+                removing coverage, at the cost of one byte per position
+                of each target genome
+            set_cover_num_processes: when cover_groupings_separately is
+                True, the number of processes to use for solving the
+                instances of set cover (one per grouping) concurrently;
+                if None, uses min(the number of CPUs in the system, the
+                maximum number of processes set for probe finding pools
+                (see
+                probe.set_max_num_processes_for_probe_finding_pools())). The
+                number of processes used is never more than the number
+                of groupings, and with 1 the instances are solved one
+                after another in this process. The output does not
+                depend on this value
+            cover_cache_dir: if set, path to a directory in which to cache
+                the ranges that candidate probes cover in the target
+                genomes (see utils.probe_cover_cache); a later run with the
+                same candidate probes, target genomes, and 'mismatches',
+                'lcf_thres', 'island_of_exact_match', 'kmer_probe_map_k',
+                'kmer_probe_map_seeding', and
+                'kmer_probe_map_max_seed_occurrences', whose k-mer probe
+                map is built for the same mismatches and lcf_thres (see
+                _find_covers_for_each_setting()), reads them from the
+                cache rather than computing them, even if other parameters
+                (e.g., 'coverage', 'cover_extension', or
+                'blacklisted_genomes') differ
+            use_target_unitigs: when True, find the ranges that candidate
+                probes cover in the target genomes by scanning the unitigs
+                of their L-mers, where L is the length of the longest
+                candidate probe, and projecting the ranges found onto the
+                genomes (see target_unitigs.TargetUnitigs); this gives the
+                same ranges and can be considerably faster when the
+                target genomes share long stretches of identical sequence
         """
         self.mismatches = mismatches
         self.lcf_thres = lcf_thres
+        self.island_of_exact_match = island_of_exact_match
         self.cover_range_fn = \
             probe.probe_covers_sequence_by_longest_common_substring(
                 mismatches, lcf_thres, island_of_exact_match)
@@ -179,8 +250,226 @@ class SetCoverFilter(BaseFilter):
         self.cover_groupings_separately = cover_groupings_separately
         self.kmer_probe_map_k = kmer_probe_map_k
         self.kmer_probe_map_use_native_dict = kmer_probe_map_use_native_dict
+        self.kmer_probe_map_seeding = kmer_probe_map_seeding
+        self.kmer_probe_map_prefilter_bits_per_key = \
+            kmer_probe_map_prefilter_bits_per_key
+        self.kmer_probe_map_max_seed_occurrences = \
+            kmer_probe_map_max_seed_occurrences
+        self.use_lazy_greedy = use_lazy_greedy
+        self.use_coverage_arrays = use_coverage_arrays
+        self.set_cover_num_processes = set_cover_num_processes
+        self.cover_cache_dir = cover_cache_dir
+        self.use_target_unitigs = use_target_unitigs
+
+    def _find_covers(self, candidate_probes):
+        """Find the ranges that candidate probes cover in target genomes.
+
+        The output depends only on the candidate probes, the target
+        genomes, and the parameters that determine hybridization (not,
+        e.g., on self.coverage or self.cover_extension). When
+        self.cover_cache_dir is set, it is read from the cache there if
+        present and otherwise written to it.
+
+        Args:
+            candidate_probes: list of candidate probes
+
+        Returns:
+            dict of np.arrays giving the raw cover ranges of the candidate
+            probes, in the format described in utils.probe_cover_cache
+        """
+        return self._find_covers_for_each_setting(
+            candidate_probes,
+            [(self.mismatches, self.lcf_thres, self.island_of_exact_match)])[0]
+
+    def _find_covers_for_each_setting(self, candidate_probes, settings):
+        """Find the ranges that candidate probes cover, for many settings.
+
+        This scans the target genomes once, finding the ranges covered
+        under every setting of the hybridization parameters (see
+        probe.probe_covers_sequence_by_longest_common_substring_for_each_setting()).
+        The k-mer probe map is constructed with the largest value of
+        mismatches and smallest value of lcf_thres across the settings.
+        When self.cover_cache_dir is set, the output for each setting is
+        read from the cache there if present; the others are found and
+        written to it.
+
+        Args:
+            candidate_probes: list of candidate probes
+            settings: list of tuples (mismatches, lcf_thres,
+                island_of_exact_match)
+
+        Returns:
+            list x in which x[i] is a dict of np.arrays giving the raw
+            cover ranges of the candidate probes under settings[i], in the
+            format described in utils.probe_cover_cache
+        """
+        map_mismatches = max(mismatches for mismatches, _, _ in settings)
+        map_lcf_thres = min(lcf_thres for _, lcf_thres, _ in settings)
+
+        covers_by_setting = [None for _ in settings]
+        keys = [None for _ in settings]
+        if self.cover_cache_dir:
+            for i, (mismatches, lcf_thres, island_of_exact_match) in \
+                    enumerate(settings):
+                keys[i] = probe_cover_cache.cache_key(
+                    candidate_probes, self.target_genomes,
+                    {'mismatches': mismatches,
+                     'lcf_thres': lcf_thres,
+                     'island_of_exact_match': island_of_exact_match,
+                     'kmer_probe_map_k': self.kmer_probe_map_k,
+                     'kmer_probe_map_seeding': self.kmer_probe_map_seeding,
+                     'kmer_probe_map_max_seed_occurrences':
+                         self.kmer_probe_map_max_seed_occurrences,
+                     'kmer_probe_map_mismatches': map_mismatches,
+                     'kmer_probe_map_lcf_thres': map_lcf_thres})
+                covers_by_setting[i] = probe_cover_cache.load(
+                    self.cover_cache_dir, keys[i])
+            if all(covers is not None for covers in covers_by_setting):
+                logger.info(("Read coverage of the candidate probes in the "
+                             "target genomes from the cache"))
+                return covers_by_setting
+        settings_to_find = [i for i, covers in enumerate(covers_by_setting)
+                            if covers is None]
+
+        logger.info("Building map from k-mers to probes")
+        kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+            candidate_probes,
+            map_mismatches,
+            map_lcf_thres,
+            min_k=self.kmer_probe_map_k,
+            k=self.kmer_probe_map_k,
+            seeding=self.kmer_probe_map_seeding,
+            prefilter_bits_per_key=self.kmer_probe_map_prefilter_bits_per_key,
+            max_seed_occurrences=self.kmer_probe_map_max_seed_occurrences
+        )
+        if len(settings) == 1:
+            # Use the setting's parameters, which need not be this
+            # filter's own (e.g., from filter_for_each_setting())
+            cover_range_fn = \
+                probe.probe_covers_sequence_by_longest_common_substring(
+                    *settings[0])
+        else:
+            cover_range_fn = probe.\
+                probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                    [settings[i] for i in settings_to_find])
+        probe.open_probe_finding_pool(kmer_probe_map, cover_range_fn)
+
+        probe_id = {}
+        for id, p in enumerate(candidate_probes):
+            probe_id[p] = id
+        # The covers are found as arrays that give probes by their id in
+        # kmer_probe_map; map these to set ids
+        set_id_of_map_probe = np.array(
+            [probe_id[p] for p in kmer_probe_map.probes], dtype=np.int64)
+
+        def iter_records():
+            # Yield the sequences of all target genomes, keyed by the
+            # universe_id (i,j) of their genome and their length
+            for i, genomes_from_group in enumerate(self.target_genomes):
+                for j, gnm in enumerate(genomes_from_group):
+                    for sequence in gnm.seqs:
+                        yield ((i, j), len(sequence)), sequence
+
+        seq_universe = []
+        seq_offset = []
+        seq_len = []
+        # For each setting to find, lists of arrays giving the set id,
+        # sequence index, and endpoints of each cover range
+        cover_set_id = [[] for _ in settings_to_find]
+        cover_seq = [[] for _ in settings_to_find]
+        cover_start = [[] for _ in settings_to_find]
+        cover_end = [[] for _ in settings_to_find]
+
+        if self.use_target_unitigs:
+            # Scan the unitigs of the target sequences once, and project
+            # the ranges found in them onto the sequences
+            sequences = []
+            prev_universe_id = None
+            for (universe_id, sequence_len), sequence in iter_records():
+                if universe_id != prev_universe_id:
+                    prev_universe_id = universe_id
+                    length_so_far = 0
+                seq_universe += [universe_id]
+                seq_offset += [length_so_far]
+                seq_len += [sequence_len]
+                sequences += [sequence]
+                length_so_far += sequence_len
+            probe_lens = np.diff(kmer_probe_map.probe_seqs_offsets)
+            order = int(probe_lens.max()) if len(probe_lens) > 0 else 1
+            logger.info(("Constructing unitigs of the %d-mers of the target "
+                         "genomes"), order)
+            unitigs = target_unitigs.TargetUnitigs.construct(sequences, order)
+            found = unitigs.find_probe_covers(kmer_probe_map)
+            del unitigs, sequences
+            if len(settings) == 1:
+                # The output is for one setting, not a list
+                found = [found]
+            for s, (seq_idx, map_probe_ids, starts, ends) in \
+                    enumerate(found):
+                cover_set_id[s] += [set_id_of_map_probe[map_probe_ids]]
+                cover_seq[s] += [seq_idx]
+                cover_start[s] += [starts]
+                cover_end[s] += [ends]
+        else:
+            # Stream the sequences through the probe finding pool, which
+            # packs many of them into each task sent to a process; the
+            # ranges found in each sequence are output in the order of
+            # iter_records(). A sequence repeated across genomes (or
+            # groupings) is scanned once, and its ranges are placed in
+            # each genome that contains it
+            prev_universe_id = None
+            for seq_idx, ((universe_id, sequence_len), found) in \
+                    enumerate(probe.find_probe_covers_in_sequences(
+                        iter_records(), as_arrays=True, dedup=True)):
+                if universe_id != prev_universe_id:
+                    i, j = universe_id
+                    logger.info(("Computing coverage in grouping %d (of "
+                                 "%d), with target genome %d (of %d)"),
+                                i + 1, len(self.target_genomes), j + 1,
+                                len(self.target_genomes[i]))
+                    prev_universe_id = universe_id
+                    length_so_far = 0
+                seq_universe += [universe_id]
+                seq_offset += [length_so_far]
+                seq_len += [sequence_len]
+                if len(settings) == 1:
+                    # The output is for one setting, not a list
+                    found = [found]
+                for s, (map_probe_ids, starts, ends) in enumerate(found):
+                    cover_set_id[s] += [set_id_of_map_probe[map_probe_ids]]
+                    cover_seq[s] += [np.full(len(starts), seq_idx,
+                                             dtype=np.int64)]
+                    cover_start[s] += [starts]
+                    cover_end[s] += [ends]
+                length_so_far += sequence_len
+
+        probe.close_probe_finding_pool()
+        del kmer_probe_map
+        gc.collect()
+
+        def concatenate(arrays):
+            return np.concatenate([np.zeros(0, dtype=np.int64)] + arrays)
+
+        seq_universe = np.array(seq_universe, dtype=np.int64).reshape(-1, 2)
+        seq_offset = np.array(seq_offset, dtype=np.int64)
+        seq_len = np.array(seq_len, dtype=np.int64)
+        for s, i in enumerate(settings_to_find):
+            covers_by_setting[i] = {
+                'seq_universe': seq_universe,
+                'seq_offset': seq_offset,
+                'seq_len': seq_len,
+                'cover_set_id': concatenate(cover_set_id[s]),
+                'cover_seq': concatenate(cover_seq[s]),
+                'cover_start': concatenate(cover_start[s]),
+                'cover_end': concatenate(cover_end[s])
+            }
+            if self.cover_cache_dir:
+                probe_cover_cache.write(self.cover_cache_dir, keys[i],
+                                        covers_by_setting[i])
+        return covers_by_setting
 
-    def _make_sets(self, candidate_probes):
+    def _make_sets(self, candidate_probes, covers=None,
+                   cover_extension=None):
         """Return a collection of sets to use in set cover.
 
         In the returned collection of sets, each set corresponds to a
@@ -193,6 +482,12 @@ class SetCoverFilter(BaseFilter):
 
         Args:
             candidate_probes: list of candidate probes
+            covers: raw cover ranges of the candidate probes, as output by
+                self._find_covers(); if None, these are found with
+                self._find_covers()
+            cover_extension: number of bp by which to extend the coverage
+                of a probe on both sides; if None, uses
+                self.cover_extension
 
         Returns:
             a dict mapping set_ids (from 0 through
@@ -214,82 +509,62 @@ class SetCoverFilter(BaseFilter):
             of interval.IntervalSet -- to save space and it should be
             coverted to an interval.IntervalSet when needed.)
         """
-        logger.info("Building map from k-mers to probes")
-        kmer_probe_map = probe.SharedKmerProbeMap.construct(
-            probe.construct_kmer_probe_map_to_find_probe_covers(
-                candidate_probes,
-                self.mismatches,
-                self.lcf_thres,
-                min_k=self.kmer_probe_map_k,
-                k=self.kmer_probe_map_k)
-        )
-        probe.open_probe_finding_pool(kmer_probe_map,
-                                      self.cover_range_fn)
+        if covers is None:
+            covers = self._find_covers(candidate_probes)
+        if cover_extension is None:
+            cover_extension = self.cover_extension
 
-        probe_id = {}
         sets = {}
-        for id, p in enumerate(candidate_probes):
-            probe_id[p] = id
+        for id in range(len(candidate_probes)):
             sets[id] = {}
 
-        for i, genomes_from_group in enumerate(self.target_genomes):
-            for j, gnm in enumerate(genomes_from_group):
-                logger.info(("Computing coverage in grouping %d (of %d), "
-                             "with target genome %d (of %d)"), i + 1,
-                            len(self.target_genomes), j + 1,
-                            len(genomes_from_group))
-                universe_id = (i, j)
-                length_so_far = 0
-                for sequence in gnm.seqs:
-                    probe_cover_ranges = probe.find_probe_covers_in_sequence(
-                        sequence)
-                    # Add the bases of sequence that are covered by all the
-                    # probes into sets with universe_id equal to (i,j)
-                    for p, cover_ranges in probe_cover_ranges.items():
-                        set_id = probe_id[p]
-                        for cover_range in cover_ranges:
-                            # Extend the range covered by probe p on both sides
-                            # by self.cover_extension
-                            cover_start = max(0,
-                                cover_range[0] - self.cover_extension)
-                            cover_end = min(len(sequence),
-                                cover_range[1] + self.cover_extension)
-                            # The endpoints of the cover give positions in
-                            # just this sequence (chromosome), so adding the
-                            # lengths of all the sequences previously iterated
-                            # (length_so_far) onto them gives unique
-                            # integer positions in the genome gnm
-                            adjusted_cover = (cover_start + length_so_far,
-                                              cover_end + length_so_far)
-                            if universe_id not in sets[set_id]:
-                                # Since a list has a lot of overhead and most
-                                # probes align to just one interval, simply
-                                # store that interval alone (not in a list)
-                                sets[set_id][universe_id] = adjusted_cover
-                            else:
-                                prev_cover = sets[set_id][universe_id]
-                                if isinstance(prev_cover, tuple):
-                                    # This probe now aligns to two intervals in
-                                    # this universe/genome, so store them in
-                                    # a list
-                                    sets[set_id][universe_id] = [prev_cover]
-                                sets[set_id][universe_id].append(adjusted_cover)
-                    length_so_far += len(sequence)
-
-        probe.close_probe_finding_pool()
-        del kmer_probe_map
-        gc.collect()
-
-        # Make an IntervalSet out of the intervals of each set. But if
-        # there is just one interval in a set, then save space by leaving
-        # that entry as a tuple.
-        for set_id in sets.keys():
-            for universe_id in sets[set_id].keys():
-                intervals = sets[set_id][universe_id]
-                if not isinstance(intervals, tuple):
-                    sets[set_id][universe_id] = interval.IntervalSet(intervals)
-                # Else, there is just one interval in this set; leave it
-                # stored directly as a tuple
+        # Extend the range covered by each probe on both sides by
+        # cover_extension, without extending past the ends of its
+        # sequence
+        cover_seq = covers['cover_seq']
+        seq_len = covers['seq_len'][cover_seq]
+        cover_start = np.maximum(0,
+            covers['cover_start'] - cover_extension)
+        cover_end = np.minimum(seq_len,
+            covers['cover_end'] + cover_extension)
+        # The endpoints of the cover give positions in just their
+        # sequence (chromosome), so adding the lengths of all the
+        # sequences that come before it in its genome (seq_offset) onto
+        # them gives unique integer positions in the genome
+        seq_offset = covers['seq_offset'][cover_seq]
+        cover_start += seq_offset
+        cover_end += seq_offset
+
+        # Give each universe (genome) an index, and merge the (extended)
+        # ranges that each probe covers in each universe, all at once
+        # rather than in an IntervalSet for each
+        universe_ids, seq_universe_idx = np.unique(
+            covers['seq_universe'], axis=0, return_inverse=True)
+        seq_universe_idx = seq_universe_idx.reshape(-1)
+        num_universes = max(1, len(universe_ids))
+        key, cover_start, cover_end = interval.merge_overlapping_by_key(
+            covers['cover_set_id'] * num_universes +
+            seq_universe_idx[cover_seq], cover_start, cover_end)
+
+        # Add the bases covered by each probe into the set with universe_id
+        # equal to (i,j); the merged ranges are sorted by key, so those of
+        # a (probe, universe) pair are consecutive
+        universe_ids = [tuple(u) for u in universe_ids.tolist()]
+        cover_ranges = list(zip(cover_start.tolist(), cover_end.tolist()))
+        group_start = np.flatnonzero(np.diff(key, prepend=-1))
+        group_end = np.append(group_start[1:], len(key))
+        for i, j, k in zip(group_start.tolist(), group_end.tolist(),
+                           key[group_start].tolist()):
+            set_id, universe_idx = divmod(k, num_universes)
+            universe_id = universe_ids[universe_idx]
+            if j - i == 1:
+                # Since a list has a lot of overhead and most probes
+                # align to just one interval, simply store that
+                # interval alone (not in an IntervalSet)
+                sets[set_id][universe_id] = cover_ranges[i]
+            else:
+                sets[set_id][universe_id] = interval.IntervalSet(
+                    cover_ranges[i:j])
 
         return sets
 
@@ -333,23 +608,34 @@ class SetCoverFilter(BaseFilter):
                                 "finding pool was not created using "
                                 "self.cover_range_tolerant_fn"))
 
-        reverse_complement = [False]
-        if rc_too:
-            reverse_complement += [True]
-        rc_map = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-
         num_bp_covered = defaultdict(int)
 
-        for rc in reverse_complement:
-            if rc:
-                sequence = ''.join([rc_map.get(b, b) for b in sequence[::-1]])
-            probe_cover_ranges = probe.find_probe_covers_in_sequence(sequence)
-
-            all_cover_ranges = []
+        def count(probe_cover_ranges):
             for p, cover_ranges in probe_cover_ranges.items():
                 for cover_range in cover_ranges:
                     num_bp_covered[p] += cover_range[1] - cover_range[0]
 
+        if probe._pfp_kmer_probe_map_both_strands:
+            # The k-mer probe map indexes reverse complements of the
+            # probes, so one scan of sequence finds the ranges covered in
+            # both sequence and its reverse complement
+            fwd_probe_cover_ranges, rc_probe_cover_ranges = \
+                probe.find_probe_covers_in_sequence(sequence)
+            count(fwd_probe_cover_ranges)
+            if rc_too:
+                count(rc_probe_cover_ranges)
+        else:
+            reverse_complement = [False]
+            if rc_too:
+                reverse_complement += [True]
+            rc_map = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
+
+            for rc in reverse_complement:
+                if rc:
+                    sequence = ''.join([rc_map.get(b, b)
+                                        for b in sequence[::-1]])
+                count(probe.find_probe_covers_in_sequence(sequence))
+
         return dict(num_bp_covered)
 
     def _count_num_groupings_hit(self, candidate_probes):
@@ -369,23 +655,38 @@ class SetCoverFilter(BaseFilter):
             genome groupings it hits
         """
         num_groupings_hit = {p: 0 for p in candidate_probes}
+
+        # Scan each distinct sequence once, reusing the probes that hit it
+        # for its repeated occurrences
+        repeated = sequence_dedup.RepeatedSequences(
+            sequence for genomes_from_group in self.target_genomes
+            for gnm in genomes_from_group for sequence in gnm.seqs)
+        repeated.log_savings()
+        seq_idx = 0
         for i, genomes_from_group in enumerate(self.target_genomes):
             logger.info(("Computing coverage in grouping %d (of %d) to "
                          "count number of groupings hit"), i + 1,
                         len(self.target_genomes))
-            num_bp_covered_in_grouping = defaultdict(int)
+            probes_hit_in_grouping = set()
             for j, gnm in enumerate(genomes_from_group):
                 for sequence in gnm.seqs:
-                    # Count hits in both sequence and its reverse complement
-                    num_bp = self._compute_tolerant_bp_covered_within_sequence(
-                        sequence, rc_too=True)
-                    for p in num_bp.keys():
-                        num_bp_covered_in_grouping[p] += num_bp[p]
+                    if repeated.is_first[seq_idx]:
+                        # Count hits in both sequence and its reverse
+                        # complement
+                        num_bp = \
+                            self._compute_tolerant_bp_covered_within_sequence(
+                                sequence, rc_too=True)
+                        probes_hit = set(p for p, bp in num_bp.items()
+                                         if bp >= 1)
+                        repeated.add(sequence, probes_hit)
+                    else:
+                        probes_hit = repeated.take(sequence)
+                    probes_hit_in_grouping.update(probes_hit)
+                    seq_idx += 1
             # If a probe covers at least one bp in this grouping (i),
             # then it hits this grouping
-            for p in num_bp_covered_in_grouping.keys():
-                if num_bp_covered_in_grouping[p] >= 1:
-                    num_groupings_hit[p] += 1
+            for p in probes_hit_in_grouping:
+                num_groupings_hit[p] += 1
 
         # Check that each candidate probe hits at least one grouping
         for p, hit in num_groupings_hit.items():
@@ -492,13 +793,25 @@ class SetCoverFilter(BaseFilter):
                                    len(self.blacklisted_genomes) > 0)
         if need_probe_finding_pool:
             logger.info("Building map from k-mers to probes")
-            kmer_probe_map = probe.SharedKmerProbeMap.construct(
-                probe.construct_kmer_probe_map_to_find_probe_covers(
-                    candidate_probes,
-                    self.mismatches_tolerant,
-                    self.lcf_thres_tolerant,
-                    min_k=self.kmer_probe_map_k,
-                    k=self.kmer_probe_map_k)
+            kmer_probe_map = probe.SharedKmerProbeMap.construct_from_probes(
+                candidate_probes,
+                self.mismatches_tolerant,
+                self.lcf_thres_tolerant,
+                min_k=self.kmer_probe_map_k,
+                k=self.kmer_probe_map_k,
+                # Coverage is counted in both target/blacklisted sequences
+                # and their reverse complements; index the reverse
+                # complements of the probes to find both in one scan (the
+                # native dict cannot hold them, so with it each reverse
+                # complement is scanned separately)
+                include_reverse_complements=(
+                    not self.kmer_probe_map_use_native_dict),
+                include_native_dict=self.kmer_probe_map_use_native_dict,
+                seeding=self.kmer_probe_map_seeding,
+                prefilter_bits_per_key=(
+                    self.kmer_probe_map_prefilter_bits_per_key),
+                max_seed_occurrences=(
+                    self.kmer_probe_map_max_seed_occurrences)
             )
             probe.open_probe_finding_pool(
                 kmer_probe_map,
@@ -610,6 +923,34 @@ class SetCoverFilter(BaseFilter):
                     universe_p[(i, j)] = float(desired_coverage) / gnm.size()
         return universe_p
 
+    def _partition_sets_by_grouping(self, sets, num_groupings):
+        """Split the sets input to set cover into one instance per grouping.
+
+        Each instance only gives coverage for universes corresponding to
+        target genomes from its grouping. This makes one pass over sets,
+        and preserves the order of sets within each instance.
+
+        Args:
+            sets: sets input to set_cover.approx_multiuniverse for a full
+                instance of set cover (i.e., covering target genomes across
+                all groupings)
+            num_groupings: number of groupings of target genomes
+
+        Returns:
+            list x in which x[i] gives the sets input for the instance of
+            set cover corresponding to grouping i
+        """
+        sets_by_grouping = [{} for _ in range(num_groupings)]
+        for set_id, sets_by_universe in sets.items():
+            for universe_id, s in sets_by_universe.items():
+                # For a universe_id, universe_id[0] gives the grouping
+                # of that universe
+                sets_for_instance = sets_by_grouping[universe_id[0]]
+                if set_id not in sets_for_instance:
+                    sets_for_instance[set_id] = {}
+                sets_for_instance[set_id][universe_id] = s
+        return sets_by_grouping
+
     def _compute_set_cover(self, sets, costs, universe_p, ranks):
         """Compute set cover approximation(s) for one or more instances.
 
@@ -620,7 +961,9 @@ class SetCoverFilter(BaseFilter):
         the selected probes (namely, the union of all the selected set ids).
         This may yield more probes than running just one instance in total
         (across all groupings), but should run more quickly because the
-        input size for each instance is smaller.
+        input size for each instance is smaller. The instances are
+        independent, so they are solved concurrently when
+        self.set_cover_num_processes allows it.
 
         When self.cover_groupings_separately is False, this uses the input
         to construct and solve just one instance of set cover (for all target
@@ -646,37 +989,67 @@ class SetCoverFilter(BaseFilter):
             the probes selected to be in the set cover
         """
         if self.cover_groupings_separately:
-            # For each grouping, construct a set cover instance and solve it
+            # Construct a set cover instance for each grouping and solve
+            # them, possibly concurrently
+            num_groupings = len(self.target_genomes)
+            sets_by_grouping = self._partition_sets_by_grouping(
+                sets, num_groupings)
+
+            # The instances are made global in this module so that worker
+            # processes can access them (via fork) without pickling them;
+            # each worker is only given the index of a grouping
+            global _scp_sets_by_grouping
+            global _scp_costs
+            global _scp_universe_p
+            global _scp_ranks
+            global _scp_options
+            _scp_sets_by_grouping = sets_by_grouping
+            _scp_costs = costs
+            _scp_universe_p = universe_p
+            _scp_ranks = ranks
+            _scp_options = {
+                'use_intervalsets': not self.use_coverage_arrays,
+                'use_lazy_greedy': self.use_lazy_greedy,
+                'use_coverage_arrays': self.use_coverage_arrays
+            }
+
+            num_processes = self.set_cover_num_processes
+            if num_processes is None:
+                num_processes = min(multiprocessing.cpu_count(),
+                                    probe._pfp_max_num_processes)
+            num_processes = max(1, min(num_processes, num_groupings))
+            try:
+                if num_processes > 1:
+                    logger.info(("Solving %d instances of set cover with %d "
+                                 "processes"), num_groupings, num_processes)
+                    # Note that the pool must be created after the global
+                    # variables above are set; like the probe finding
+                    # pools, retry if creating it hangs
+                    pool = probe._make_pool(num_processes)
+                    try:
+                        # Use a chunksize of 1 so that instances, which may
+                        # vary considerably in size, are balanced across the
+                        # processes; map() returns the results in grouping
+                        # order regardless of when they finish
+                        results = pool.map(_solve_set_cover_for_grouping,
+                                           range(num_groupings),
+                                           chunksize=1)
+                    finally:
+                        pool.close()
+                        pool.join()
+                else:
+                    results = [_solve_set_cover_for_grouping(i)
+                               for i in range(num_groupings)]
+            finally:
+                del _scp_sets_by_grouping
+                del _scp_costs
+                del _scp_universe_p
+                del _scp_ranks
+                del _scp_options
+
+            # Take the union of the selected set ids across the groupings
             set_ids_in_cover = set()
-            for i in range(len(self.target_genomes)):
-                # The costs, universe_p, and ranks input may have extra
-                # information for this instance, but should still be valid
-                # input to the solver (i.e., they contain all the necessary
-                # information to solve the instance)
-                # We construct the instance by reducing sets -- namely, by
-                # only giving coverage for universes corresponding to target
-                # genomes that come from this grouping.
-                sets_for_instance = {}
-                for set_id in sets.keys():
-                    # For a universe_id, universe_id[0] gives the grouping
-                    # of that universe and should equal i to be included in
-                    # this instance
-                    coverage_for_set_id = {
-                        universe_id: sets[set_id][universe_id]
-                        for universe_id in sets[set_id].keys()
-                        if universe_id[0] == i
-                    }
-                    if len(coverage_for_set_id) > 0:
-                        sets_for_instance[set_id] = coverage_for_set_id
-                logger.info(("Approximating the solution to an instance of "
-                             "set cover, corresponding to grouping %d (of %d)"),
-                            i + 1, len(self.target_genomes))
-                set_ids_for_instance = set_cover.approx_multiuniverse(
-                    sets_for_instance,
-                    costs=costs,
-                    universe_p=universe_p,
-                    ranks=ranks,
-                    use_intervalsets=True)
+            for set_ids_for_instance in results:
                 set_ids_in_cover.update(set_ids_for_instance)
         else:
             logger.info(("Approximating the solution to a single set cover "
@@ -686,7 +1059,9 @@ class SetCoverFilter(BaseFilter):
                 costs=costs,
                 universe_p=universe_p,
                 ranks=ranks,
-                use_intervalsets=True)
+                use_intervalsets=not self.use_coverage_arrays,
+                use_lazy_greedy=self.use_lazy_greedy,
+                use_coverage_arrays=self.use_coverage_arrays)
         return set_ids_in_cover
 
     def _filter(self, input):
@@ -726,3 +1101,101 @@ class SetCoverFilter(BaseFilter):
                            ('' if num_bad_probes == 1 else 's'))
 
         return [input[id] for id in set_ids_in_cover]
+
+    def filter_for_each_setting(self, input, settings):
+        """Select probes for each of multiple settings of parameters.
+
+        This gives, for each setting, the probes that filter() would
+        select with mismatches, lcf_thres, and cover_extension set to the
+        setting's values -- e.g., to count the probes needed over a grid
+        of parameter values. Rather than scanning the target genomes once
+        per setting, this scans them once in total to find the coverage
+        under every distinct (mismatches, lcf_thres), and then solves an
+        instance of set cover for each setting. The k-mer probe map used
+        in the scan is constructed with the largest value of mismatches
+        and smallest value of lcf_thres across the settings, so the
+        coverage found for a setting may include ranges, around
+        additional k-mer hits, that would not be found with that setting
+        alone.
+
+        The ranks (from identification and blacklisting) are computed
+        once, with this filter's tolerant parameters, and are the same
+        for every setting. This does not set self.input_probes or
+        self.output_probes.
+
+        Args:
+            input: list of candidate probes, or a probe.ProbeSet
+            settings: list of tuples (mismatches, lcf_thres,
+                cover_extension)
+
+        Returns:
+            list x in which x[i] is the list of probes selected under
+            settings[i]
+        """
+        if isinstance(input, probe.ProbeSet):
+            input = input.to_probes()
+        else:
+            input = list(input)
+
+        # Find the coverage under each distinct choice of hybridization
+        # parameters in one scan
+        hyb_settings = sorted(set((mismatches, lcf_thres)
+                                  for mismatches, lcf_thres, _ in settings))
+        logger.info(("Finding coverage of the candidate probes for %d "
+                     "hybridization settings"), len(hyb_settings))
+        covers_by_hyb_setting = dict(zip(hyb_settings,
+            self._find_covers_for_each_setting(
+                input,
+                [(mismatches, lcf_thres, self.island_of_exact_match)
+                 for mismatches, lcf_thres in hyb_settings])))
+
+        logger.info("Building set cover ranks input")
+        ranks = self._make_ranks(input)
+        logger.info("Building set cover costs input")
+        costs = self._make_costs(input)
+        logger.info("Building set cover universe_p input")
+        universe_p = self._make_universe_p()
+
+        selected = []
+        for mismatches, lcf_thres, cover_extension in settings:
+            logger.info(("Selecting probes with mismatches=%d, "
+                         "lcf_thres=%d, and cover_extension=%d"),
+                        mismatches, lcf_thres, cover_extension)
+            sets = self._make_sets(
+                input, covers=covers_by_hyb_setting[(mismatches, lcf_thres)],
+                cover_extension=cover_extension)
+            set_ids_in_cover = self._compute_set_cover(sets,
+                                                       costs,
+                                                       universe_p,
+                                                       ranks)
+            selected += [[input[id] for id in set_ids_in_cover]]
+        return selected
+
+
+def _solve_set_cover_for_grouping(i):
+    """Solve the instance of set cover for one grouping.
+
+    This is a top-level function so that it can be called by processes in
+    a pool. It reads the input from global variables (prefixed with
+    '_scp') that are set by SetCoverFilter._compute_set_cover() prior to
+    creating the pool.
+
+    Args:
+        i: index of the grouping
+
+    Returns:
+        set ids selected in the set cover for grouping i
+    """
+    logger.info(("Approximating the solution to an instance of "
+                 "set cover, corresponding to grouping %d (of %d)"),
+                i + 1, len(_scp_sets_by_grouping))
+    # The costs, universe_p, and ranks input may have extra information
+    # for this instance, but should still be valid input to the solver
+    # (i.e., they contain all the necessary information to solve the
+    # instance)
+    return set_cover.approx_multiuniverse(
+        _scp_sets_by_grouping[i],
+        costs=_scp_costs,
+        universe_p=_scp_universe_p,
+        ranks=_scp_ranks,
+        **_scp_options)
@@ -106,6 +106,19 @@ class TestCandidateProbesOnContrivedInput(unittest.TestCase):
         p = [''.join(x.seq) for x in p]
         self.assertCountEqual(p, ['ATCGAT', 'GATCGA', 'CGATCG'] + ['CCGG'])
 
+    def test_probe_set_from_multiple_seqs(self):
+        seqs = ['ATCGATCGATCG', 'CCGG', 'ATCGNNNNNNATCGATCG']
+        args = {'probe_length': 6, 'probe_stride': 3, 'allow_small_seqs': 4,
+                'min_n_string_length': 2}
+        ps = candidate_probes.make_candidate_probe_set_from_sequences(
+            seqs, **args)
+        p = candidate_probes.make_candidate_probes_from_sequences(
+            seqs, **args)
+        self.assertEqual(ps.to_probes(), p)
+        self.assertEqual(list(ps.is_flanking_n_string),
+                         [x.is_flanking_n_string for x in p])
+        self.assertTrue(any(ps.is_flanking_n_string))
+
 
 class TestCandidateProbesOnEbolaZaire(unittest.TestCase):
     """Tests the candidate probes from the Ebola Zaire (w/ 2014) dataset.
@@ -27,3 +27,13 @@ class TestDuplicateFilter(unittest.TestCase):
         # Order should be preserved, so use assertEqual rather than
         # assertCountEqual
         self.assertEqual(f.output_probes, desired_output_probes)
+
+    def test_probe_set(self):
+        input = ['ATCGTCGCGG', 'ATCGTAGCGG', 'ATCGTCACGG', 'ATCGTAGCGG',
+                 'ATTGTCGCGG', 'ATCGTCGCGG', 'ATCGT']
+        desired_output = ['ATCGTCGCGG', 'ATCGTAGCGG', 'ATCGTCACGG',
+                          'ATTGTCGCGG', 'ATCGT']
+        f = duplicate_filter.DuplicateFilter()
+        output = f.filter(probe.ProbeSet.from_seqs(input))
+        self.assertIsInstance(output, probe.ProbeSet)
+        self.assertEqual([p.seq_str for p in output], desired_output)
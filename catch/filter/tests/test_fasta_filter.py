@@ -65,6 +65,29 @@ class TestFastaFilter(unittest.TestCase):
 
         fasta_file.close()
 
+    def test_repeated_header(self):
+        fasta_file = tempfile.NamedTemporaryFile(mode='w')
+        fasta_file.write(">probe1\n")
+        fasta_file.write("ATCGATCG\n")
+        fasta_file.write(">probe2\n")
+        fasta_file.write("GGGGG\n")
+        fasta_file.write(">probe1\n")
+        fasta_file.write("CCCCC\n")
+        fasta_file.seek(0)
+
+        p1 = probe.Probe.from_str('CCCCC')
+        p2 = probe.Probe.from_str('GGGGG')
+        p3 = probe.Probe.from_str('ATCGATCG')
+        input_probes = [p1, p2, p3]
+
+        # Only the last sequence of a repeated header is kept, in the
+        # position of the header's first occurrence
+        fasta_filter = ff.FastaFilter(fasta_file.name)
+        fasta_filter.filter(input_probes)
+        self.assertEqual(fasta_filter.output_probes, [p1, p2])
+
+        fasta_file.close()
+
     def tearDown(self):
         # Re-enable logging 
         logging.disable(logging.NOTSET)
@@ -41,7 +41,8 @@ class TestProbeDesigner(unittest.TestCase):
         pb = probe_designer.ProbeDesigner(seqs, [df], probe_length=100,
             probe_stride=50)
         pb.design()
-        self.assertEqual(pb.candidate_probes, desired_candidate_probes)
+        self.assertEqual(pb.candidate_probes.to_probes(),
+                         desired_candidate_probes)
         self.assertEqual(pb.final_probes, desired_final_probes)
 
     def test_one_filter2(self):
@@ -66,7 +67,8 @@ class TestProbeDesigner(unittest.TestCase):
         pb = probe_designer.ProbeDesigner(seqs, [df], probe_length=75,
             probe_stride=25)
         pb.design()
-        self.assertEqual(pb.candidate_probes, desired_candidate_probes)
+        self.assertEqual(pb.candidate_probes.to_probes(),
+                         desired_candidate_probes)
         self.assertEqual(pb.final_probes, desired_final_probes)
 
     def test_two_groupings(self):
@@ -92,7 +94,8 @@ class TestProbeDesigner(unittest.TestCase):
         pb = probe_designer.ProbeDesigner(seqs, [df], probe_length=100,
             probe_stride=50)
         pb.design()
-        self.assertEqual(pb.candidate_probes, desired_candidate_probes)
+        self.assertEqual(pb.candidate_probes.to_probes(),
+                         desired_candidate_probes)
         self.assertEqual(pb.final_probes, desired_final_probes)
 
     def test_with_small_sequences(self):
@@ -117,7 +120,8 @@ class TestProbeDesigner(unittest.TestCase):
                                           probe_stride=3,
                                           allow_small_seqs=5)
         pb.design()
-        self.assertEqual(pb.candidate_probes, desired_candidate_probes)
+        self.assertEqual(pb.candidate_probes.to_probes(),
+                         desired_candidate_probes)
         self.assertEqual(pb.final_probes, desired_final_probes)
 
     def tearDown(self):
@@ -25,3 +25,15 @@ class TestReverseComplementFilter(unittest.TestCase):
         f.filter(input_probes)
         self.assertCountEqual(f.input_probes, input_probes)
         self.assertCountEqual(f.output_probes, desired_output_probes)
+
+    def test_probe_set(self):
+        input = ['ATCGTCGCGG', 'TGACGACACC', 'AGCTGCTCTT', 'AGCNGCTC']
+        input_probes = [probe.Probe.from_str(s) for s in input]
+        f = reverse_complement_filter.ReverseComplementFilter()
+        output = f.filter(probe.ProbeSet.from_seqs(input))
+        self.assertIsInstance(output, probe.ProbeSet)
+        # The output, including headers, should be the same as when
+        # passing a list of probes
+        desired_output = f.filter(input_probes)
+        self.assertEqual(output.to_probes(), desired_output)
+        self.assertEqual(output.headers, [p.header for p in desired_output])
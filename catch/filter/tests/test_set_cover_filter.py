@@ -3,6 +3,7 @@
 
 from collections import OrderedDict
 import logging
+import os
 import tempfile
 import unittest
 
@@ -29,7 +30,13 @@ class TestSetCoverFilter(unittest.TestCase):
                               cover_extension=0,
                               identify=False,
                               blacklisted_genomes=[],
-                              cover_groupings_separately=False):
+                              cover_groupings_separately=False,
+                              use_coverage_arrays=False,
+                              set_cover_num_processes=1,
+                              cover_cache_dir=None,
+                              use_target_unitigs=False,
+                              kmer_probe_map_seeding=None,
+                              kmer_probe_map_prefilter_bits_per_key=None):
         input_probes = [probe.Probe.from_str(s) for s in input]
         # Remove duplicates
         input_probes = list(OrderedDict.fromkeys(input_probes))
@@ -43,7 +50,14 @@ class TestSetCoverFilter(unittest.TestCase):
             identify=identify,
             blacklisted_genomes=blacklisted_genomes,
             cover_groupings_separately=cover_groupings_separately,
-            kmer_probe_map_k=3)
+            kmer_probe_map_k=3,
+            kmer_probe_map_seeding=kmer_probe_map_seeding,
+            kmer_probe_map_prefilter_bits_per_key=(
+                kmer_probe_map_prefilter_bits_per_key),
+            use_coverage_arrays=use_coverage_arrays,
+            set_cover_num_processes=set_cover_num_processes,
+            cover_cache_dir=cover_cache_dir,
+            use_target_unitigs=use_target_unitigs)
         f.target_genomes = target_genomes
         f.filter(input_probes)
         return (f, f.output_probes)
@@ -194,6 +208,250 @@ class TestSetCoverFilter(unittest.TestCase):
             self.verify_target_genome_coverage(probes, target_genomes,
                                                f, cover_frac)
 
+    def test_same_output_with_coverage_arrays(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        for coverage in [0.5, 1.0, 10]:
+            _, output_intervalsets = self.get_filter_and_output(
+                6, 0, target_genomes, input, coverage)
+            f, output_coverage_arrays = self.get_filter_and_output(
+                6, 0, target_genomes, input, coverage,
+                use_coverage_arrays=True)
+            self.assertEqual(output_intervalsets, output_coverage_arrays)
+            self.verify_target_genome_coverage(output_coverage_arrays,
+                                               target_genomes, f, coverage)
+
+    def test_same_output_with_seeding(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        # Also find tolerant coverage, with identification
+        for lcf_thres, mismatches, identify in [(6, 0, False),
+                                                (6, 0, True),
+                                                (5, 1, False)]:
+            _, expected = self.get_filter_and_output(
+                lcf_thres, mismatches, target_genomes, input, 1.0,
+                mismatches_tolerant=1, lcf_thres_tolerant=5,
+                identify=identify)
+            for seeding in probe.KMER_PROBE_MAP_SEEDINGS:
+                f, output = self.get_filter_and_output(
+                    lcf_thres, mismatches, target_genomes, input, 1.0,
+                    mismatches_tolerant=1, lcf_thres_tolerant=5,
+                    identify=identify, kmer_probe_map_seeding=seeding)
+                self.assertEqual(output, expected)
+                self.verify_target_genome_coverage(output, target_genomes,
+                                                   f, 1.0)
+
+    def test_same_output_with_prefilter(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        for identify in [False, True]:
+            _, expected = self.get_filter_and_output(
+                6, 0, target_genomes, input, 1.0,
+                mismatches_tolerant=1, lcf_thres_tolerant=5,
+                identify=identify, kmer_probe_map_seeding='minimizer')
+            for bits_per_key in [2, 10]:
+                f, output = self.get_filter_and_output(
+                    6, 0, target_genomes, input, 1.0,
+                    mismatches_tolerant=1, lcf_thres_tolerant=5,
+                    identify=identify, kmer_probe_map_seeding='minimizer',
+                    kmer_probe_map_prefilter_bits_per_key=bits_per_key)
+                self.assertEqual(output, expected)
+
+    def test_same_output_with_cover_cache(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        target_genomes[1] += [genome.Genome.from_chrs(
+            OrderedDict([('chr1', 'ABCDEFGHIJKLMN'),
+                         ('chr2', 'OPQRSTUVWXYZ')]))]
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for coverage, cover_extension in [(1.0, 0), (0.5, 0), (1.0, 2),
+                                              (20, 3)]:
+                _, output_uncached = self.get_filter_and_output(
+                    6, 0, target_genomes, input, coverage,
+                    cover_extension=cover_extension)
+                f, output_cached = self.get_filter_and_output(
+                    6, 0, target_genomes, input, coverage,
+                    cover_extension=cover_extension,
+                    cover_cache_dir=cache_dir)
+                self.assertEqual(output_uncached, output_cached)
+                self.verify_target_genome_coverage(
+                    output_cached, target_genomes, f, coverage,
+                    cover_extension=cover_extension)
+                # The covers only depend on the probes, target genomes,
+                # and hybridization parameters, so they are written once
+                # and then read
+                self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # The sets made from the cache should be the same as those
+            # computed directly
+            f.cover_cache_dir = None
+            input_probes = list(OrderedDict.fromkeys(
+                probe.Probe.from_str(s) for s in input))
+            sets_uncached = f._make_sets(input_probes)
+            f.cover_cache_dir = cache_dir
+            sets_cached = f._make_sets(input_probes)
+            self.assertEqual(sets_uncached, sets_cached)
+
+            # Changing the hybridization parameters should write another
+            # cache
+            self.get_filter_and_output(
+                5, 1, target_genomes, input, 1.0,
+                cover_cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_same_output_with_target_unitigs(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEFGHIJKLMNOPQR']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        target_genomes[1] += [genome.Genome.from_chrs(
+            OrderedDict([('chr1', 'ABCDEFGHIJKLMN'),
+                         ('chr2', 'OPQRSTUVWXYZABCDEFGHIJKLMNOPQRS')]))]
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        for coverage, cover_extension in [(1.0, 0), (0.5, 0), (1.0, 2)]:
+            _, expected = self.get_filter_and_output(
+                6, 0, target_genomes, input, coverage,
+                cover_extension=cover_extension)
+            f, output = self.get_filter_and_output(
+                6, 0, target_genomes, input, coverage,
+                cover_extension=cover_extension, use_target_unitigs=True)
+            self.assertEqual(output, expected)
+            self.verify_target_genome_coverage(
+                output, target_genomes, f, coverage,
+                cover_extension=cover_extension)
+
+        # The covers found through the unitigs should be the same as those
+        # found by scanning each genome, for one or many settings
+        input_probes = list(OrderedDict.fromkeys(
+            probe.Probe.from_str(s) for s in input))
+        for settings in [[(0, 6, 0)], [(0, 6, 0), (1, 5, 0)]]:
+            f.use_target_unitigs = False
+            expected = f._find_covers_for_each_setting(input_probes, settings)
+            f.use_target_unitigs = True
+            found = f._find_covers_for_each_setting(input_probes, settings)
+            self.assertEqual(len(found), len(settings))
+            for covers, covers_expected in zip(found, expected):
+                self.assertGreater(len(covers_expected['cover_set_id']), 0)
+                self.assertEqual(covers.keys(), covers_expected.keys())
+                for key in covers:
+                    self.assertEqual(covers[key].tolist(),
+                                     covers_expected[key].tolist())
+
+    def test_filter_for_each_setting(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        input_probes = list(OrderedDict.fromkeys(
+            probe.Probe.from_str(s) for s in input))
+        settings = [(0, 6, 0), (1, 6, 0), (0, 6, 2), (1, 6, 3), (2, 6, 0)]
+        for coverage in [0.5, 1.0]:
+            expected = []
+            for mismatches, lcf_thres, cover_extension in settings:
+                _, output = self.get_filter_and_output(
+                    lcf_thres, mismatches, target_genomes, input, coverage,
+                    cover_extension=cover_extension)
+                expected += [output]
+            # The settings should not all select the same probes
+            self.assertGreater(len(set(frozenset(x) for x in expected)), 1)
+
+            with tempfile.TemporaryDirectory() as cache_dir:
+                f = scf.SetCoverFilter(
+                    mismatches=0,
+                    lcf_thres=6,
+                    coverage=coverage,
+                    kmer_probe_map_k=3,
+                    cover_cache_dir=cache_dir)
+                f.target_genomes = target_genomes
+                for _ in range(2):
+                    # The first pass writes the coverage for each of the 3
+                    # distinct (mismatches, lcf_thres) to the cache, and
+                    # the second reads it
+                    selected = f.filter_for_each_setting(input_probes,
+                                                         settings)
+                    self.assertEqual(len(os.listdir(cache_dir)), 3)
+                    self.assertEqual(len(selected), len(settings))
+                    for output, output_expected in zip(selected, expected):
+                        self.assertCountEqual(output, output_expected)
+
+    def test_filter_for_one_setting_unlike_filter(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
+                           'ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        input_probes = list(OrderedDict.fromkeys(
+            probe.Probe.from_str(s) for s in input))
+        _, expected_own = self.get_filter_and_output(
+            6, 0, target_genomes, input, 1.0)
+        _, expected = self.get_filter_and_output(
+            6, 2, target_genomes, input, 1.0)
+        self.assertNotEqual(set(expected), set(expected_own))
+
+        # A single setting that differs from the filter's own parameters
+        # should be used in the scan, not only for the k-mer probe map and
+        # the cache key
+        for use_target_unitigs in [False, True]:
+            with tempfile.TemporaryDirectory() as cache_dir:
+                f = scf.SetCoverFilter(
+                    mismatches=0,
+                    lcf_thres=6,
+                    coverage=1.0,
+                    kmer_probe_map_k=3,
+                    cover_cache_dir=cache_dir,
+                    use_target_unitigs=use_target_unitigs)
+                f.target_genomes = target_genomes
+                for _ in range(2):
+                    selected = f.filter_for_each_setting(input_probes,
+                                                         [(2, 6, 0)])
+                    self.assertEqual(len(selected), 1)
+                    self.assertCountEqual(selected[0], expected)
+                # The filter's own setting should not read the coverage
+                # cached for the other setting
+                self.assertCountEqual(f.filter(input_probes), expected_own)
+
     def test_explicit_bp_coverage(self):
         target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF',
                            'ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF']]
@@ -534,6 +792,30 @@ class TestSetCoverFilter(unittest.TestCase):
         self.run_full_coverage_check_for_target_genomes(
             target_genomes, cover_groupings_separately=True)
 
+    def test_cover_separately_parallel_same_as_serial(self):
+        target_genomes = [['ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF'],
+                          ['ZYXWVFGHIJWUTSOPQRSTFEDCBAZYXWVF'],
+                          ['ABCDEFGHIJWUTSOPQRSTUVWXYZAZYXWV',
+                           'ZYXWVFGHIJKLMNOPQRSTFEDCBABCDEF']]
+        target_genomes = self.convert_target_genomes(target_genomes)
+        input = []
+        for tg in [g for genomes_from_group in target_genomes
+                   for g in genomes_from_group]:
+            for seq in tg.seqs:
+                input += [seq[i:(i + 6)] for i in range(len(seq) - 6 + 1)]
+        for coverage in [0.5, 1.0]:
+            _, output_serial = self.get_filter_and_output(
+                6, 0, target_genomes, input, coverage,
+                cover_groupings_separately=True)
+            for num_processes in [2, 3, None]:
+                f, output_parallel = self.get_filter_and_output(
+                    6, 0, target_genomes, input, coverage,
+                    cover_groupings_separately=True,
+                    set_cover_num_processes=num_processes)
+                self.assertEqual(output_serial, output_parallel)
+            self.verify_target_genome_coverage(output_parallel,
+                                               target_genomes, f, coverage)
+
     def test_cover_separately_identify_two_groups(self):
         target_genomes = [['ABCDEFXXIJKXMNOPQRXTUXWXYXABCDEF',
                            'ABCDEFGHIJKLMNOPQRSTUVWXYZABCDEF'],
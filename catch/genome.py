@@ -1,6 +1,8 @@
 """Structure(s) for storing and directly working with genomes.
 """
 
+from collections import OrderedDict
+
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
 
 
@@ -12,6 +14,11 @@ class Genome:
        do not have a label for even a single sequence
      - genomes that are divided into multiple chromosomes and must
        support the ability to obtain a sequence from a chromosome label
+
+    The sequences can also be held in a buffer of ASCII-encoded bytes
+    (e.g., a memory-mapped file) rather than as strings; see from_buffer().
+    In that case, they are only decoded into strings when first accessed,
+    and the strings are then kept for the life of the Genome.
     """
 
     def __init__(self, seqs, chrs=None):
@@ -28,16 +35,43 @@ class Genome:
         if len(seqs) > 1 and chrs is None:
             raise ValueError(("When there is more than one sequence, chrs "
                               "should also be specified"))
-        self.seqs = seqs
-        self.chrs = chrs
+        self._seqs = seqs
+        self._chrs = chrs
+
+        # When the sequences are held in a buffer, these are set by
+        # from_buffer() and self._seqs is None until the sequences are
+        # accessed
+        self._buffer = None
+        self._seq_bounds = None
+        self._chr_names = None
 
         self.hash_cached = None
         self.size_cached = None
         self.size_unambig_cached = None
 
+    @property
+    def seqs(self):
+        """List of sequences (chromosomes), as strings.
+        """
+        if self._seqs is None:
+            # Decode the sequences from the buffer
+            self._seqs = [self._buffer[start:end].tobytes().decode()
+                          for start, end in self._seq_bounds]
+        return self._seqs
+
+    @property
+    def chrs(self):
+        """OrderedDict mapping chromosome labels to sequences, or None.
+        """
+        if self._chrs is None and self._chr_names is not None:
+            self._chrs = OrderedDict(zip(self._chr_names, self.seqs))
+        return self._chrs
+
     def divided_into_chrs(self):
         """Return if the genome is broken into more than one chromosome.
         """
+        if self._seqs is None:
+            return len(self._seq_bounds) > 1
         return len(self.seqs) > 1
 
     def size(self, only_unambig=False):
@@ -56,7 +90,12 @@ class Genome:
             return self.size_unambig_cached
         else:
             if self.size_cached is None:
-                self.size_cached = sum(len(seq) for seq in self.seqs)
+                if self._seqs is None:
+                    # Avoid decoding the sequences from the buffer
+                    self.size_cached = sum(end - start
+                                           for start, end in self._seq_bounds)
+                else:
+                    self.size_cached = sum(len(seq) for seq in self.seqs)
             return self.size_cached
 
     def __hash__(self):
@@ -101,3 +140,38 @@ class Genome:
         if not isinstance(seq, str):
             raise TypeError("seq must be a string")
         return Genome([seq])
+
+    @staticmethod
+    def from_buffer(buffer, seq_bounds, chr_names=None):
+        """Construct a Genome whose sequences are held in a buffer.
+
+        The buffer is not copied, and each sequence is only decoded into
+        a string when the sequences are first accessed (e.g., via
+        self.seqs). This allows a Genome to wrap a memory-mapped file
+        without reading it (size() does not decode the sequences).
+        However, the first access to self.seqs or self.chrs decodes every
+        sequence, and the strings are kept; nothing is read from the
+        buffer after that. So a Genome wrapping a memory-mapped file only
+        saves memory until its sequences are used.
+
+        Args:
+            buffer: 1D numpy array of dtype uint8 (e.g., an np.memmap)
+                holding ASCII-encoded sequences
+            seq_bounds: list of tuples (start, end) such that
+                buffer[start:end] gives each sequence (chromosome)
+            chr_names: list of the chromosome labels, in the same order
+                as seq_bounds; None if the genome is not divided into
+                multiple chromosomes
+
+        Returns:
+            instance of Genome whose sequences are in buffer
+        """
+        if len(seq_bounds) > 1 and chr_names is None:
+            raise ValueError(("When there is more than one sequence, "
+                              "chr_names should also be specified"))
+        gnm = Genome([])
+        gnm._seqs = None
+        gnm._buffer = buffer
+        gnm._seq_bounds = list(seq_bounds)
+        gnm._chr_names = chr_names
+        return gnm
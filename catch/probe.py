@@ -5,17 +5,25 @@ import atexit
 import bisect
 import ctypes
 from collections import defaultdict
+from collections import deque
 from functools import partial
 import gc
 import hashlib
 import logging
 import multiprocessing
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
 from multiprocessing import sharedctypes
+import pickle
+import time
 
 import numpy as np
 
+from catch.utils import bounded_cache
 from catch.utils import interval
+from catch.utils import kmer_prefilter
 from catch.utils import longest_common_substring
+from catch.utils import sequence_dedup
 from catch.utils import timeout
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -23,22 +31,74 @@ __author__ = 'Hayden Metsky <hayden@mit.edu>'
 logger = logging.getLogger(__name__)
 
 
+# Translation tables for reverse complementing a probe's bytes, or a
+# string; characters other than 'A', 'T', 'C', and 'G' (e.g., 'N') are
+# left unchanged
+_RC_TRANS_TABLE = bytes.maketrans(b'ATCG', b'TAGC')
+_RC_STR_TRANS_TABLE = str.maketrans('ATCG', 'TAGC')
+
+
 class Probe:
     """Immutable sequence representing a probe/bait.
+
+    There can be tens of millions of Probe objects in memory at once (e.g.,
+    candidate probes), so each is kept compact: the sequence is stored once,
+    as bytes with one byte per base, and the attributes are declared with
+    __slots__ so that an instance has no __dict__. The caches used by
+    shares_some_kmers() are only created when first needed.
     """
 
+    __slots__ = ['seq_bytes', 'is_flanking_n_string', 'header',
+                 '_kmers', '_kmers_rand_choices']
+
     def __init__(self, seq):
         """
         Args:
-            seq: np.array representing the sequence of a probe
+            seq: sequence of the probe, as bytes, a Python string, or an
+                np.array of characters
         """
-        self.seq = seq
-        self.seq_str = ''.join(seq)
+        if isinstance(seq, np.ndarray):
+            seq = ''.join(seq)
+        if isinstance(seq, str):
+            seq = seq.encode()
+        self.seq_bytes = bytes(seq)
         self.is_flanking_n_string = False
         self.header = None
 
-        self.kmers = defaultdict(set)
-        self.kmers_rand_choices = defaultdict(lambda: defaultdict(set))
+        self._kmers = None
+        self._kmers_rand_choices = None
+
+    @property
+    def seq(self):
+        """np.array (of dtype 'U1') representing the sequence of the probe.
+
+        This is constructed on each access, so it should be avoided in
+        code that is performance-critical.
+        """
+        return np.fromiter(self.seq_str, dtype='U1')
+
+    @property
+    def seq_str(self):
+        """Sequence of the probe as a Python string.
+        """
+        return self.seq_bytes.decode()
+
+    @property
+    def kmers(self):
+        """dict mapping k to the set of k-mers in this probe (memoized).
+        """
+        if self._kmers is None:
+            self._kmers = defaultdict(set)
+        return self._kmers
+
+    @property
+    def kmers_rand_choices(self):
+        """dict mapping k and a number of k-mers to a random selection of
+        k-mers from this probe (memoized).
+        """
+        if self._kmers_rand_choices is None:
+            self._kmers_rand_choices = defaultdict(lambda: defaultdict(set))
+        return self._kmers_rand_choices
 
     def mismatches(self, other):
         """Count number of mismatches with other.
@@ -64,16 +124,18 @@ class Probe:
             number of mismatches between self and 'other' after 'other' is
             shifted by 'offset' bp
         """
-        if len(self.seq) != len(other.seq):
+        if len(self.seq_bytes) != len(other.seq_bytes):
             raise ValueError("Sequences must be of same length")
-        if abs(offset) >= len(other.seq):
+        if abs(offset) >= len(other.seq_bytes):
             raise ValueError("Invalid offset value " + str(offset))
+        a = np.frombuffer(self.seq_bytes, dtype=np.uint8)
+        b = np.frombuffer(other.seq_bytes, dtype=np.uint8)
         if offset == 0:
-            return np.sum(self.seq != other.seq)
+            return np.count_nonzero(a != b)
         elif offset < 0:
-            return np.sum(self.seq[:offset] != other.seq[-offset:])
+            return np.count_nonzero(a[:offset] != b[-offset:])
         else:
-            return np.sum(self.seq[offset:] != other.seq[:-offset])
+            return np.count_nonzero(a[offset:] != b[:-offset])
 
     def min_mismatches_within_shift(self, other, max_shift):
         """Compute minimum number of mismatches while shifting.
@@ -103,7 +165,8 @@ class Probe:
             length of the longest common substring with at most k
             mismatches between self and other
         """
-        l, _, _ = longest_common_substring.k_lcf(self.seq, other.seq, k)
+        l, _, _ = longest_common_substring.k_lcf(self.seq_bytes,
+                                                 other.seq_bytes, k)
         return l
 
     def reverse_complement(self):
@@ -112,13 +175,9 @@ class Probe:
         Returns:
             a Probe that is the reverse complement of this probe
         """
-        rc_map = {'A': 'T', 'T': 'A', 'C': 'G', 'G': 'C'}
-        # Using rc_map.get(b, b) ensures that this can process bases
-        # like 'N'. It returns the base itself (e.g., 'N') if it is
-        # not either 'A', 'T', 'C', or 'G'.
-        rc_seq = np.array([rc_map.get(b, b) for b in self.seq[::-1]],
-                          dtype='U1')
-        return Probe(rc_seq)
+        # Characters other than 'A', 'T', 'C', or 'G' (e.g., 'N') are
+        # left as they are
+        return Probe(self.seq_bytes.translate(_RC_TRANS_TABLE)[::-1])
 
     def with_prepended_str(self, s):
         """Create a probe with 's' prepended to this probe.
@@ -129,9 +188,7 @@ class Probe:
         Returns:
             a Probe with 's' prepended to the sequence of this probe
         """
-        s_seq = np.fromiter(s, dtype='U1')
-        new_seq = np.concatenate([s_seq, self.seq])
-        return Probe(new_seq)
+        return Probe(s.encode() + self.seq_bytes)
 
     def with_appended_str(self, s):
         """Create a probe with 's' appended to this probe.
@@ -142,9 +199,7 @@ class Probe:
         Returns:
             a Probe with 's' appended to the sequence of this probe
         """
-        s_seq = np.fromiter(s, dtype='U1')
-        new_seq = np.concatenate([self.seq, s_seq])
-        return Probe(new_seq)
+        return Probe(self.seq_bytes + s.encode())
 
     def construct_kmers(self, k, include_positions=False):
         """Return a list of k-mers in this probe.
@@ -160,9 +215,10 @@ class Probe:
             is ordered according to the positions of the k-mers in the
             probe
         """
+        seq_str = self.seq_str
         kmers = []
-        for i in range(len(self.seq) - k + 1):
-            kmer = self.seq_str[i:(i + k)]
+        for i in range(len(seq_str) - k + 1):
+            kmer = seq_str[i:(i + k)]
             if include_positions:
                 kmers += [(kmer, i)]
             else:
@@ -275,7 +331,7 @@ class Probe:
                 return False
         else:
             rand_kmer_positions = np.random.randint(0,
-                                                    len(self.seq) - k + 1,
+                                                    len(self) - k + 1,
                                                     num_kmers_to_test)
             for n in range(num_kmers_to_test):
                 # Read a random k-mer from self and explicitly test for
@@ -310,23 +366,17 @@ class Probe:
         return hashlib.sha224(self.seq_str.encode()).hexdigest()[-length:]
 
     def __hash__(self):
-        return hash(self.seq_str)
+        return hash(self.seq_bytes)
 
     def __eq__(self, other):
-        return isinstance(other, Probe) and \
-            np.array_equal(self.seq, other.seq)
+        return isinstance(other, Probe) and self.seq_bytes == other.seq_bytes
 
     def __cmp__(self, other):
-        c = np.where(self.seq != other.seq)[0]
-        if len(c) == 0:
-            return 0
-        else:
-            # c[0] holds the first index where a char in self.seq does
-            # not equal the corresponding char in other.seq
-            return cmp(self.seq[c[0]], other.seq[c[0]])
+        return ((self.seq_bytes > other.seq_bytes) -
+                (self.seq_bytes < other.seq_bytes))
 
     def __len__(self):
-        return len(self.seq)
+        return len(self.seq_bytes)
 
     def __getitem__(self, i):
         return self.seq_str[i]
@@ -347,7 +397,210 @@ class Probe:
         Returns:
             instance of Probe, whose sequence is seq_str
         """
-        return Probe(np.fromiter(seq_str, dtype='U1'))
+        return Probe(seq_str.encode())
+
+
+class ProbeSet:
+    """Collection of probes stored in columns.
+
+    A list of Probe objects costs a Python object (and its bytes) per
+    probe. A ProbeSet instead holds the sequences of all its probes in
+    a single contiguous 2D uint8 array, with one row per probe, alongside
+    columns of per-probe metadata. Operations over all the probes (e.g.,
+    removing duplicates and reverse complementing) are done
+    on the array with numpy, without making a Probe for each row.
+
+    Probes may have different lengths; each row is as long as the longest
+    probe, and the bytes past the end of a shorter probe are 0.
+    """
+
+    def __init__(self, seqs, lengths, is_flanking_n_string=None,
+                 headers=None):
+        """
+        Args:
+            seqs: 2D numpy array (uint8) with one row per probe, giving
+                the bytes of the probe's sequence followed by 0s
+            lengths: 1D numpy array giving the length of each probe
+            is_flanking_n_string: 1D numpy array (bool) giving whether
+                each probe flanks a string of N's; if None, all are False
+            headers: list giving the header (or None) of each probe; if
+                None, all are None
+        """
+        self.seqs = np.asarray(seqs, dtype=np.uint8)
+        self.lengths = np.asarray(lengths, dtype=np.int32)
+        if self.seqs.ndim != 2 or len(self.seqs) != len(self.lengths):
+            raise ValueError("seqs must be a 2D array with one row per "
+                             "probe")
+        if is_flanking_n_string is None:
+            is_flanking_n_string = np.zeros(len(self.lengths), dtype=bool)
+        self.is_flanking_n_string = np.asarray(is_flanking_n_string,
+                                               dtype=bool)
+        if headers is None:
+            headers = [None] * len(self.lengths)
+        self.headers = list(headers)
+
+    @staticmethod
+    def from_seqs(seqs):
+        """Construct a ProbeSet from sequences.
+
+        Args:
+            seqs: list of sequences, each as bytes or a Python string
+
+        Returns:
+            instance of ProbeSet with a probe for each sequence in seqs
+        """
+        seqs = [s.encode() if isinstance(s, str) else s for s in seqs]
+        lengths = np.array([len(s) for s in seqs], dtype=np.int32)
+        max_len = int(np.max(lengths)) if len(seqs) > 0 else 0
+        if len(seqs) > 0 and np.all(lengths == max_len):
+            # The common case, where the rows need no padding
+            arr = np.frombuffer(b''.join(seqs), dtype=np.uint8)
+            arr = arr.reshape(len(seqs), max_len).copy()
+        else:
+            arr = np.zeros((len(seqs), max_len), dtype=np.uint8)
+            for i, s in enumerate(seqs):
+                arr[i, :len(s)] = np.frombuffer(s, dtype=np.uint8)
+        return ProbeSet(arr, lengths)
+
+    @staticmethod
+    def from_probes(probes):
+        """Construct a ProbeSet from Probe objects.
+
+        Args:
+            probes: list of instances of Probe
+
+        Returns:
+            instance of ProbeSet with the same probes (and their
+            metadata), in the same order
+        """
+        ps = ProbeSet.from_seqs([p.seq_bytes for p in probes])
+        ps.is_flanking_n_string = np.array(
+            [p.is_flanking_n_string for p in probes], dtype=bool)
+        ps.headers = [p.header for p in probes]
+        return ps
+
+    @staticmethod
+    def concatenate(probe_sets):
+        """Concatenate ProbeSets.
+
+        Args:
+            probe_sets: list of instances of ProbeSet
+
+        Returns:
+            instance of ProbeSet with the probes of each ProbeSet in
+            probe_sets, in order
+        """
+        max_len = max([ps.seqs.shape[1] for ps in probe_sets], default=0)
+        seqs = [np.pad(ps.seqs, ((0, 0), (0, max_len - ps.seqs.shape[1])))
+                for ps in probe_sets]
+        if len(seqs) == 0:
+            return ProbeSet(np.zeros((0, 0), dtype=np.uint8), [])
+        headers = []
+        for ps in probe_sets:
+            headers += ps.headers
+        return ProbeSet(np.concatenate(seqs),
+                        np.concatenate([ps.lengths for ps in probe_sets]),
+                        np.concatenate([ps.is_flanking_n_string
+                                        for ps in probe_sets]),
+                        headers)
+
+    def seq_bytes(self, i):
+        """Return the sequence of a probe as bytes.
+
+        Args:
+            i: index of a probe in this ProbeSet
+
+        Returns:
+            sequence of probe i, as bytes
+        """
+        return self.seqs[i, :self.lengths[i]].tobytes()
+
+    def probe(self, i):
+        """Make a Probe object for a probe in this ProbeSet.
+
+        Args:
+            i: index of a probe in this ProbeSet
+
+        Returns:
+            instance of Probe for probe i, with its metadata
+        """
+        p = Probe(self.seq_bytes(i))
+        p.is_flanking_n_string = bool(self.is_flanking_n_string[i])
+        p.header = self.headers[i]
+        return p
+
+    def to_probes(self):
+        """Make a Probe object for each probe in this ProbeSet.
+
+        Returns:
+            list of instances of Probe, in the order of this ProbeSet
+        """
+        return [self.probe(i) for i in range(len(self))]
+
+    def unique(self):
+        """Remove probes whose sequence duplicates an earlier one.
+
+        Returns:
+            instance of ProbeSet with the first occurrence of each
+            sequence, preserving the order of this ProbeSet
+        """
+        if len(self) == 0:
+            return self[np.arange(0)]
+        # View each row as a single opaque value so that np.unique
+        # compares whole rows; rows of different lengths differ in
+        # their padding
+        rows = np.ascontiguousarray(self.seqs).view(
+            np.dtype((np.void, self.seqs.shape[1])))
+        _, first = np.unique(rows, return_index=True)
+        return self[np.sort(first)]
+
+    def reverse_complement(self):
+        """Reverse complement each probe.
+
+        Returns:
+            instance of ProbeSet whose probe i is the reverse complement
+            of probe i in this ProbeSet (as in Probe.reverse_complement());
+            the metadata are copied, except headers, which are None
+        """
+        rc_table = np.frombuffer(_RC_TRANS_TABLE, dtype=np.uint8)
+        rc = rc_table[self.seqs[:, ::-1]]
+        # Reversing a row moves its padding to the front; shift each row
+        # left so that the sequence starts at column 0
+        cols = np.arange(self.seqs.shape[1])
+        shift = self.seqs.shape[1] - self.lengths
+        idx = np.minimum(cols + shift[:, np.newaxis], self.seqs.shape[1] - 1)
+        rc = np.take_along_axis(rc, idx, axis=1)
+        rc[cols >= self.lengths[:, np.newaxis]] = 0
+        return ProbeSet(rc, self.lengths.copy(),
+                        self.is_flanking_n_string.copy())
+
+    def identifiers(self, length=10):
+        """Return an identifier for each probe, as Probe.identifier() does.
+
+        Args:
+            length: number of hex digits in each identifier
+
+        Returns:
+            list of identifiers (strings), one per probe
+        """
+        return [hashlib.sha224(self.seq_bytes(i)).hexdigest()[-length:]
+                for i in range(len(self))]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.probe(i)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.probe(key)
+        # key is a slice, an array of indices, or a boolean mask
+        idx = np.arange(len(self))[key]
+        return ProbeSet(self.seqs[idx], self.lengths[idx],
+                        self.is_flanking_n_string[idx],
+                        [self.headers[i] for i in idx])
 
 
 def _construct_rand_kmer_probe_map(probes,
@@ -381,7 +634,7 @@ def _construct_rand_kmer_probe_map(probes,
     """
     kmer_probe_map = defaultdict(set)
     for probe in probes:
-        if k > len(probe.seq):
+        if k > len(probe):
             raise ValueError("k is larger than the length of a probe")
         kmers = probe.construct_kmers(k, include_positions)
         if include_positions:
@@ -408,6 +661,44 @@ class PigeonholeRequiresTooSmallKmerSizeError(Exception):
     pass
 
 
+def _pigeonholed_kmer_size(probe_length, mismatches, min_k=20):
+    """Choose the k-mer length for the pigeonhole approach.
+
+    Args:
+        probe_length: length of the probes
+        mismatches/min_k: see _construct_pigeonholed_kmer_probe_map()
+
+    Returns:
+        k-mer length k, which divides probe_length, such that a probe
+        split into non-overlapping k-mers has at least one k-mer without
+        a mismatch
+
+    Raises:
+        PigeonholeRequiresTooSmallKmerSizeError if k would be less than
+        min_k
+    """
+    if mismatches == 0:
+        # Just one k-mer of length probe_length suffices
+        k = probe_length
+    else:
+        # For some k, let us have probe_length/k k-mers. In the worst-case,
+        # we place one mismatch in each k-mer. We want to have at least one
+        # k-mer with no mismatches. So we need probe_length/k > mismatches.
+        # That is, k < probe_length/mismatches.
+        k = int(probe_length / mismatches)
+        if k == float(probe_length) / mismatches:
+            # mismatches divides probe_length, so decrement k
+            k -= 1
+        # We need k to divide probe_length, so keep decrementing k until
+        # this is true
+        while probe_length % k != 0:
+            k -= 1
+
+    if k < min_k:
+        raise PigeonholeRequiresTooSmallKmerSizeError()
+    return k
+
+
 def _construct_pigeonholed_kmer_probe_map(probes,
                                           mismatches,
                                           min_k=20,
@@ -462,36 +753,18 @@ def _construct_pigeonholed_kmer_probe_map(probes,
     # Find the probe length
     if len(probes) == 0:
         return {}
-    probe_length = len(probes[0].seq)
+    probe_length = len(probes[0])
     for p in probes:
-        if len(p.seq) != probe_length:
+        if len(p) != probe_length:
             raise ValueError("All probes must have the same length")
 
-    if mismatches == 0:
-        # Just one k-mer of length probe_length suffices
-        k = probe_length
-    else:
-        # For some k, let us have probe_length/k k-mers. In the worst-case,
-        # we place one mismatch in each k-mer. We want to have at least one
-        # k-mer with no mismatches. So we need probe_length/k > mismatches.
-        # That is, k < probe_length/mismatches.
-        k = int(probe_length / mismatches)
-        if k == float(probe_length) / mismatches:
-            # mismatches divides probe_length, so decrement k
-            k -= 1
-        # We need k to divide probe_length, so keep decrementing k until
-        # this is true
-        while probe_length % k != 0:
-            k -= 1
-
-    if k < min_k:
-        raise PigeonholeRequiresTooSmallKmerSizeError()
+    k = _pigeonholed_kmer_size(probe_length, mismatches, min_k=min_k)
 
     # Construct a map with k-mers from each probe separated by k bp
     kmer_probe_map = defaultdict(set)
     for p in probes:
         kmers = p.construct_kmers(k, include_positions)
-        for i in range(0, len(p.seq), k):
+        for i in range(0, len(p), k):
             if include_positions:
                 kmer, pos = kmers[i]
                 kmer_probe_map[kmer].add((p, pos))
@@ -544,10 +817,10 @@ def construct_kmer_probe_map_to_find_probe_covers(probes,
     # Find the probe length
     if len(probes) == 0:
         return {}
-    probe_length = len(probes[0].seq)
+    probe_length = len(probes[0])
     probe_lengths_differ = False
     for p in probes:
-        if len(p.seq) != probe_length:
+        if len(p) != probe_length:
             probe_lengths_differ = True
             break
 
@@ -568,6 +841,358 @@ def construct_kmer_probe_map_to_find_probe_covers(probes,
             probes, k=k, include_positions=include_positions)
 
 
+def _spaced_seed_offsets(weight):
+    """Make a spaced seed for substitution-only mismatches.
+
+    The seed has a care position at every offset except every third one
+    (as in '1101101...'), so that runs of matching bases are broken up:
+    a substitution at a "don't care" offset does not prevent a hit. The
+    seed is symmetric (the same when reversed) so that it can be used for
+    reverse complements, which reverse the seed.
+
+    Args:
+        weight: number of care positions in the seed
+
+    Returns:
+        tuple (span, offsets) where span is the number of bases the seed
+        spans and offsets is a tuple of the offsets of its care positions
+    """
+    if weight < 1:
+        raise ValueError("A spaced seed must have at least one care position")
+    # Take the first half of the care positions from the repeating
+    # pattern, and mirror it
+    half = [j for j in range(3 * weight) if j % 3 != 2][:(weight + 1) // 2]
+    if weight % 2 == 0:
+        # Mirror the half after a "don't care" offset
+        span = 2 * half[-1] + 3
+    else:
+        # The last position of the half is the center of the seed
+        span = 2 * half[-1] + 1
+    offsets = sorted(set(half + [span - 1 - j for j in half]))
+    return span, tuple(offsets)
+
+
+def _kmer_hashes(probe_seqs, span, offsets):
+    """Hash the seeds at each position of probes.
+
+    Args:
+        probe_seqs: 2D numpy array (uint8) with one row per probe, as in
+            ProbeSet.seqs
+        span: number of bases spanned by a seed
+        offsets: offsets, among the span bases, that are part of a seed
+
+    Returns:
+        2D numpy array (uint64) whose entry [r, i] is a pseudorandom hash
+        of the seed starting at position i of the probe in row r
+    """
+    num_pos = probe_seqs.shape[1] - span + 1
+    h = np.zeros((probe_seqs.shape[0], num_pos), dtype=np.uint64)
+    for j in offsets:
+        h *= np.uint64(1099511628211)
+        h += probe_seqs[:, j:(j + num_pos)]
+    # Mix the bits (the finalizer of splitmix64) so that the order of
+    # hashes does not follow the order of the sequences
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xbf58476d1ce4e5b9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94d049bb133111eb)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+# Number of probes whose seeds are hashed at once when choosing minimizers
+_MINIMIZER_CHUNK_SIZE = 50000
+
+
+def _minimizer_positions(probe_set, span, offsets, w):
+    """Choose the (w, span)-minimizers of each probe.
+
+    In every window of w consecutive seed positions in a probe, the
+    position whose seed has the smallest hash is chosen. So if a sequence
+    shares w+span-1 consecutive bases with a probe, it contains the seed
+    at a chosen position of the probe. A probe with fewer than w seed
+    positions has one (its smallest) chosen.
+
+    Args:
+        probe_set: instance of ProbeSet
+        span/offsets: see _kmer_hashes()
+        w: number of consecutive seed positions in each window
+
+    Returns:
+        tuple (rows, pos) of numpy arrays such that the seed at position
+        pos[i] of the probe in row rows[i] of probe_set is chosen; the
+        same position may be chosen more than once
+    """
+    lengths = probe_set.lengths.astype(np.int64)
+    num_pos = probe_set.seqs.shape[1] - span + 1
+    w = min(w, num_pos)
+    all_rows, all_pos = [], []
+    for chunk_start in range(0, len(lengths), _MINIMIZER_CHUNK_SIZE):
+        chunk = slice(chunk_start, chunk_start + _MINIMIZER_CHUNK_SIZE)
+        h = _kmer_hashes(probe_set.seqs[chunk], span, offsets)
+        # Seeds that run past the end of a probe are never chosen (unless
+        # a whole window is past the end, and then the window is dropped)
+        chunk_num_pos = lengths[chunk] - span + 1
+        pos_in_probe = np.arange(num_pos) < chunk_num_pos[:, np.newaxis]
+        h[~pos_in_probe] = np.iinfo(np.uint64).max
+        window_min = np.argmin(
+            np.lib.stride_tricks.sliding_window_view(h, w, axis=1), axis=2)
+        window_start = np.arange(num_pos - w + 1)
+        keep = ((window_start + w <= chunk_num_pos[:, np.newaxis]) |
+                (window_start == 0))
+        rows, window_idx = np.nonzero(keep)
+        all_rows += [rows + chunk_start]
+        all_pos += [window_min[rows, window_idx] + window_idx]
+    if len(all_rows) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    return np.concatenate(all_rows), np.concatenate(all_pos)
+
+
+# Strategies for choosing the seeds of each probe to put in a k-mer
+# probe map (see _choose_kmer_positions())
+KMER_PROBE_MAP_SEEDINGS = ['minimizer', 'spaced']
+
+
+def _choose_kmer_positions(probe_set, mismatches, lcf_thres, min_k=20, k=20,
+                           num_kmers_per_probe=20, seeding=None,
+                           minimizer_w=None):
+    """Choose the k-mers of each probe to put in a k-mer probe map.
+
+    With seeding=None, this chooses the same k-mers as
+    construct_kmer_probe_map_to_find_probe_covers(), but for all the
+    probes at once. In particular, with the random approach, it draws the
+    same random numbers: np.random.choice(n, size) draws
+    np.random.randint(0, n, size), and drawing the positions for a run of
+    consecutive probes of the same length in one call gives the same
+    numbers as drawing them for each probe in turn.
+
+    The other strategies choose seeds deterministically:
+      - 'minimizer': the (w,k)-minimizers of each probe (see
+        _minimizer_positions()). Unless given, w is the largest value for
+        which a hit is certain: a common substring of lcf_thres bases with
+        at most mismatches mismatches has a run of at least
+        (lcf_thres - mismatches) // (mismatches + 1) matching bases, and a
+        run of w+k-1 bases contains a chosen k-mer. When there is no such
+        w (k is too large), w is 1 and every k-mer is chosen.
+      - 'spaced': spaced seeds with k care positions (see
+        _spaced_seed_offsets()), of which the minimizers are chosen as
+        above. As well as the hits that are certain from runs of matching
+        bases, a spaced seed hits across substitutions that fall on its
+        "don't care" positions.
+
+    Args:
+        probe_set: instance of ProbeSet
+        mismatches/lcf_thres/min_k/k: see
+            construct_kmer_probe_map_to_find_probe_covers()
+        num_kmers_per_probe: see _construct_rand_kmer_probe_map()
+        seeding: None, or one of KMER_PROBE_MAP_SEEDINGS
+        minimizer_w: if set, use this as w rather than choosing it
+
+    Returns:
+        tuple (k, rows, pos, seed_offsets) where k is the chosen k-mer
+        length (for spaced seeds, the span of a seed), rows and pos are
+        numpy arrays such that the k-mer at position pos[i] of the probe
+        in row rows[i] of probe_set is chosen (the same k-mer of a probe
+        may be chosen more than once), and seed_offsets gives the offsets
+        of the care positions of spaced seeds (or is None)
+
+    Raises:
+        ValueError if k is larger than the length of a probe
+    """
+    lengths = probe_set.lengths.astype(np.int64)
+    if len(lengths) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return k, empty, empty, None
+
+    if seeding is not None:
+        if seeding == 'minimizer':
+            span, seed_offsets = k, None
+            offsets = range(k)
+        elif seeding == 'spaced':
+            span, seed_offsets = _spaced_seed_offsets(k)
+            offsets = seed_offsets
+        else:
+            raise ValueError("Unknown seeding strategy '%s'" % seeding)
+        if np.any(lengths < span):
+            raise ValueError("k is larger than the length of a probe")
+        if minimizer_w is None:
+            exact_run_len = (lcf_thres - mismatches) // (mismatches + 1)
+            minimizer_w = exact_run_len - span + 1
+            if minimizer_w < 1:
+                logger.warning(("Seeds spanning %d bases cannot be chosen "
+                                "to be certain to find every cover; "
+                                "choosing every seed"), span)
+                minimizer_w = 1
+        rows, pos = _minimizer_positions(probe_set, span, offsets,
+                                         minimizer_w)
+        return span, rows, pos, seed_offsets
+
+    probe_length = lengths[0]
+    if np.all(lengths == probe_length) and lcf_thres >= probe_length:
+        # Try the pigeonhole approach, with k-mers separated by k bp
+        try:
+            pigeonhole_k = _pigeonholed_kmer_size(int(probe_length),
+                                                  mismatches, min_k=min_k)
+        except PigeonholeRequiresTooSmallKmerSizeError:
+            # Resort to the random approach
+            pigeonhole_k = None
+        if pigeonhole_k is not None:
+            starts = np.arange(0, probe_length, pigeonhole_k)
+            rows = np.repeat(np.arange(len(lengths)), len(starts))
+            pos = np.tile(starts, len(lengths))
+            return pigeonhole_k, rows, pos, None
+
+    if np.any(lengths < k):
+        raise ValueError("k is larger than the length of a probe")
+    run_starts = np.flatnonzero(np.diff(lengths, prepend=-1) != 0)
+    run_ends = np.append(run_starts[1:], len(lengths))
+    pos = np.concatenate([
+        np.random.randint(0, lengths[start] - k + 1,
+                          size=(end - start, num_kmers_per_probe)).ravel()
+        for start, end in zip(run_starts, run_ends)])
+    rows = np.repeat(np.arange(len(lengths)), num_kmers_per_probe)
+    return k, rows, pos, None
+
+
+def _mask_frequent_seeds(keys, probe_ids, num_forward_entries,
+                         max_seed_occurrences):
+    """Choose the entries of a k-mer probe map to drop for frequent seeds.
+
+    A seed (key) that is shared by many entries -- e.g., from a poly-A
+    tract or a repeat found in many probes -- makes every occurrence of
+    it in a scanned sequence expand into that many hits to verify. This
+    masks (drops the entries of) each key with more than
+    max_seed_occurrences entries. A probe all of whose seeds are masked
+    keeps one of them, the one with the fewest entries, as a fallback so
+    that it can still be found.
+
+    When the map indexes reverse complements, entry num_forward_entries+i
+    is the reverse complement of entry i; a pair of entries is masked
+    together, if either of their keys is frequent.
+
+    Args:
+        keys: numpy array of the keys of all entries
+        probe_ids: numpy array of the probe ids of all entries
+        num_forward_entries: number of entries (the first ones) that are
+            not reverse complements; either all entries are, or there is
+            one reverse complement entry for each of them
+        max_seed_occurrences: mask keys with more than this number of
+            entries
+
+    Returns:
+        tuple (keep, masked_keys, masked_key_counts, num_fallback_probes)
+        where keep is a boolean numpy array giving the entries to keep,
+        masked_keys is a sorted numpy array of the keys with dropped
+        entries, masked_key_counts gives the number of entries dropped for
+        each of them, and num_fallback_probes is the number of probes that
+        kept a fallback seed
+    """
+    _, inverse, counts = np.unique(keys, return_inverse=True,
+                                   return_counts=True)
+    entry_counts = counts[inverse.ravel()]
+    pair_counts = entry_counts[:num_forward_entries]
+    if len(keys) > num_forward_entries:
+        pair_counts = np.maximum(pair_counts,
+                                 entry_counts[num_forward_entries:])
+    masked = pair_counts > max_seed_occurrences
+
+    # Keep a fallback seed, with the fewest entries, for each probe whose
+    # seeds are all masked
+    fwd_probe_ids = probe_ids[:num_forward_entries]
+    num_probes = int(fwd_probe_ids.max()) + 1 if len(fwd_probe_ids) else 0
+    num_unmasked = np.bincount(fwd_probe_ids[~masked], minlength=num_probes)
+    needs_fallback = np.flatnonzero(
+        (num_unmasked == 0) &
+        (np.bincount(fwd_probe_ids, minlength=num_probes) > 0))
+    if len(needs_fallback) > 0:
+        candidates = np.flatnonzero(np.isin(fwd_probe_ids, needs_fallback))
+        candidates = candidates[np.lexsort((pair_counts[candidates],
+                                            fwd_probe_ids[candidates]))]
+        first = np.concatenate(([True], np.diff(
+            fwd_probe_ids[candidates]) != 0))
+        masked[candidates[first]] = False
+
+    keep = np.tile(~masked, len(keys) // max(1, num_forward_entries))
+    masked_keys, masked_key_counts = np.unique(keys[~keep],
+                                               return_counts=True)
+    return keep, masked_keys, masked_key_counts, len(needs_fallback)
+
+
+# Code given, in a code table, to characters outside of a k-mer alphabet
+_INVALID_CODE = 255
+
+
+def _make_kmer_encoding(alphabet):
+    """Determine how to pack k-mers over an alphabet into integers.
+
+    When the alphabet consists only of unambiguous nucleotides, each
+    base takes 2 bits (A=0, C=1, G=2, T=3). Otherwise (e.g., if k-mers
+    contain 'N' or, as in some tests, arbitrary letters), each character
+    in the alphabet is given a code in sorted order and takes as many
+    bits as are needed to distinguish all of the characters.
+
+    Args:
+        alphabet: collection of characters (as strings) that appear in
+            the k-mers to encode
+
+    Returns:
+        tuple (code_table, bits_per_base) where code_table is a numpy
+        array of length 256 such that code_table[b] gives the code of the
+        character whose ASCII value is b (or _INVALID_CODE if the character
+        is not in the alphabet), and bits_per_base is the number of bits
+        used to encode each character
+    """
+    alphabet = set(alphabet)
+    code_table = np.full(256, _INVALID_CODE, dtype=np.uint8)
+    if alphabet <= set('ACGT'):
+        chars = 'ACGT'
+        bits_per_base = 2
+    else:
+        chars = sorted(alphabet)
+        if len(chars) > _INVALID_CODE:
+            raise ValueError("Too many distinct characters to encode k-mers")
+        bits_per_base = max(1, int(np.ceil(np.log2(len(chars)))))
+    for code, c in enumerate(chars):
+        code_table[ord(c)] = code
+    return code_table, bits_per_base
+
+
+def _shared_array(arr):
+    """Copy a numpy array into memory that can be shared by processes.
+
+    Args:
+        arr: 1D numpy array
+
+    Returns:
+        numpy array with the same dtype and contents as arr, whose buffer
+        is allocated with multiprocessing.sharedctypes.RawArray
+    """
+    arr = np.ascontiguousarray(arr)
+    raw = multiprocessing.sharedctypes.RawArray(ctypes.c_char,
+                                                max(1, arr.nbytes))
+    shared = np.frombuffer(raw, dtype=arr.dtype, count=len(arr))
+    shared[:] = arr
+    return shared
+
+
+def _sequence_chars(sequence, start, end):
+    """Return the characters of part of a sequence.
+
+    Args:
+        sequence: sequence as a string, or as a numpy array (uint8) of
+            its characters (e.g., from SharedSequenceCollection)
+        start/end: return the characters in [start, end)
+
+    Returns:
+        numpy array (uint8) of the characters of sequence[start:end]; when
+        sequence is an array, this is a view of it
+    """
+    if isinstance(sequence, str):
+        return np.frombuffer(sequence[start:end].encode(), dtype=np.uint8)
+    return sequence[start:end]
+
+
 class SharedKmerProbeMap:
     """A read-only kmer_probe_map that can be shared by processes.
 
@@ -590,58 +1215,255 @@ class SharedKmerProbeMap:
     substantial amount of memory is copied to each process that reads from
     the dict.
 
-    This class avoids that problem by using lower-level structures (from
-    the multiprocessing.sharedctypes module) that can be shared by
-    processes. It implements the same functionality as kmer_probe_map. 
-    While a dict is not an available shared ctype, arrays of primitive types
-    are. Thus, this implementation is based on arrays of shared primitive
-    types. For example, it does not store instances of probe.Probe, but does
-    store just the sequence strings of the probes (as these are all that
-    are needed).
+    This class avoids that problem by storing the map in a handful of
+    flat numpy arrays whose buffers are allocated with
+    multiprocessing.sharedctypes.RawArray, and so can be shared by
+    processes without any per-entry Python objects. It implements the
+    same functionality as kmer_probe_map.
+
+    The k-mers are packed into integers (uint64): with an alphabet of
+    unambiguous nucleotides, each base takes 2 bits so that k-mers with
+    k <= 32 fit entirely in a key. When k is larger than what fits in a
+    key (or the alphabet requires more bits per base), a key holds only
+    a prefix of each k-mer and the remainder of the k-mer is verified
+    against the probe sequence on lookup. Keys are sorted, and lookup is
+    a binary search over them. The probe containing each k-mer, and the
+    k-mer's position in the probe, are stored in parallel int32 arrays.
+    The probe sequences themselves are stored once each, concatenated in
+    a single byte array.
+
+    Rather than contiguous k-mers, the map may hold spaced seeds (see
+    construct_from_probes()): a seed spans k bases but only the bases at
+    some offsets (the "care" positions, seed_offsets) must match, and
+    only those are packed into the key.
+
+    Most k-mers of a scanned sequence are not keys. The map may hold a
+    prefilter (see add_prefilter() and utils.kmer_prefilter), a compact
+    Bloom filter or bitmap of the keys, also in shared memory, that
+    rejects most of them before the binary search over the keys.
+
+    Seeds that are shared by very many probes may be masked (see
+    construct_from_probes()); the map then records the masked keys, so
+    that the hits it skips can be counted.
+
+    The map may also index the reverse complement of each k-mer (see
+    construct()), so that scanning a sequence finds the probes that share
+    k-mers with either strand. The reverse complement of each probe is
+    then stored as an additional probe: the probe with id
+    num_forward_probes + i is the reverse complement of the probe with
+    id i, so the strand of an entry is given by its probe id.
     """
 
-    def __init__(self, keys, probe_seqs_ind, probe_pos, probe_seqs, k,
-            probe_seqs_to_probe, native_dict):
+    def __init__(self, keys, probe_ids, probe_pos, probe_seqs,
+                 probe_seqs_offsets, k, code_table, bits_per_base,
+                 num_forward_probes=None, seed_offsets=None, prefilter=None,
+                 masked_keys=None, masked_key_counts=None, probes=None,
+                 native_dict=None):
         """Accepts arrays containing the information of a kmer_probe_map.
 
-        These arrays are allocated using multiprocessing.sharedctypes.RawArray
-        because the read/write synchronization (as offered by Array) is not
-        needed.
-
         Args:
-            keys: Contains the k-mers (keys) from kmer_probe_map, as strings,
-                in sorted order. This is used for lookup. The same k-mer may
-                appear multiple times if there are multiple probes that contain
-                that k-mer (e.g., ['abc', 'def', 'def', 'ghi'] means that the
-                k-mer 'def' appears at positions in two probes.
-            probe_seqs_ind: For a k-mer keys[i], the value probe_seqs_ind[i]
-                gives an index in the array probe_seqs whose value contains the
-                sequence of a probe that contains the k-mer keys[i]. That is,
-                the sequence probe_seqs[probe_seqs_ind[i]] contains the k-mer
-                keys[i].
-            probe_pos: Contains the position of k-mers in probes. A k-mer
-                keys[i] appears at the position probe_pos[i] in the probe whose
-                sequence is given by probe_seqs[probe_seqs_ind[i]].
-            probe_seqs: The sequences of all the probes that appear in values
-                in the kmer_probe_map. Note that there may be many k-mers/keys
-                that map to the same probe; that probe's sequence appears just
-                once in the probe_seqs array. If we were to make a direct
-                mapping between indices in keys and indices in probe_seqs, we
-                would have to store the same probe sequence many times.
-            k: length of the k-mers (as an int) in keys
-            probe_seqs_to_probe: dict mapping probe sequences (as strings)
-                to the instances of probe.Probe from which these sequences
-                came
-            native_dict: kmer_probe_map as a native Python dict
+            keys: numpy array (uint64) containing the k-mers (keys) from
+                kmer_probe_map, packed into integers, in sorted order. This
+                is used for lookup. The same key may appear multiple times
+                if there are multiple probes (or positions) that contain
+                the k-mer.
+            probe_ids: numpy array (int32) such that, for a key keys[i],
+                probe_ids[i] gives the id of a probe that contains the k-mer
+                keys[i]
+            probe_pos: numpy array (int32) such that the k-mer keys[i]
+                appears at position probe_pos[i] in the probe whose id is
+                probe_ids[i]
+            probe_seqs: numpy array (uint8) holding the sequences of all the
+                probes that appear in kmer_probe_map, concatenated. Each
+                probe sequence is stored just once, even if many k-mers map
+                to the probe.
+            probe_seqs_offsets: numpy array (int64) such that the sequence
+                of the probe with id i is
+                probe_seqs[probe_seqs_offsets[i]:probe_seqs_offsets[i+1]]
+            k: length of the k-mers (as an int)
+            code_table: numpy array (uint8) of length 256 mapping the
+                ASCII value of a character to its code in a packed key
+                (see _make_kmer_encoding)
+            bits_per_base: number of bits used for each character of a
+                k-mer in a packed key
+            num_forward_probes: if the map indexes reverse complements,
+                the number of probes (with ids 0 through
+                num_forward_probes-1) that are not reverse complements;
+                the probe with id num_forward_probes+i is the reverse
+                complement of the probe with id i. None if the map does
+                not index reverse complements
+            seed_offsets: if the keys are spaced seeds, a tuple giving
+                the (sorted) offsets, among the k bases of a seed, that
+                must match and are packed into keys; the first is 0. None
+                if the keys are contiguous k-mers
+            prefilter: instance of kmer_prefilter.KmerPrefilter that
+                accepts every key (or None), to consult before looking up
+                keys
+            masked_keys: sorted numpy array (uint64) of keys whose
+                entries were (all, or all but fallback entries) dropped
+                because they were too frequent, or None
+            masked_key_counts: numpy array giving, for each key in
+                masked_keys, the number of entries dropped
+            probes: list of instances of probe.Probe such that probes[i]
+                is the probe with id i (only for ids of probes that are not
+                reverse complements); this is only needed by the process
+                that constructs the map, and should be None in the copies
+                of this map used by other processes
+            native_dict: kmer_probe_map as a native Python dict (or None)
         """
         self.keys = keys
-        self.probe_seqs_ind = probe_seqs_ind
+        self.probe_ids = probe_ids
         self.probe_pos = probe_pos
         self.probe_seqs = probe_seqs
+        self.probe_seqs_offsets = probe_seqs_offsets
         self.k = k
-        self.probe_seqs_to_probe = probe_seqs_to_probe
+        self.code_table = code_table
+        self.bits_per_base = bits_per_base
+        self.num_forward_probes = num_forward_probes
+        self.seed_offsets = seed_offsets
+        self.prefilter = prefilter
+        self.masked_keys = masked_keys
+        self.masked_key_counts = masked_key_counts
+        self.probes = probes
         self.native_dict = native_dict
 
+        # The number of bases of each k-mer that are held in a key, their
+        # offsets in the k-mer, and the offsets of the rest of the bases
+        # that must match
+        if seed_offsets is None:
+            care_offsets = list(range(k))
+        else:
+            care_offsets = list(seed_offsets)
+        self.key_len = min(len(care_offsets), 64 // bits_per_base)
+        self._key_offsets = care_offsets[:self.key_len]
+        self._verify_offsets = care_offsets[self.key_len:]
+
+        # Indexing into a numpy array creates a numpy scalar, which is slow
+        # for one-at-a-time lookups; memoryviews of the same (shared)
+        # buffers instead yield Python ints and work directly with bisect
+        self._keys_view = memoryview(keys)
+        self._probe_ids_view = memoryview(probe_ids)
+        self._probe_pos_view = memoryview(probe_pos)
+
+        # When each character takes at most 5 bits, a k-mer can be packed
+        # by translating its characters into digits of base 2^bits_per_base
+        # and parsing the result with int(); characters outside the
+        # alphabet are translated into 'z', which is not a valid digit
+        if bits_per_base <= 5:
+            self._digits_table = {
+                b: ('z' if code_table[b] == _INVALID_CODE else
+                    np.base_repr(code_table[b], 2**bits_per_base).lower())
+                for b in range(256)}
+        else:
+            self._digits_table = None
+
+        # Memoize probe sequences that are decoded into strings
+        self._probe_seq_strs = {}
+
+        # Counts, in this process, of the keys looked up ('queried'), of
+        # those that the prefilter passed ('passed'), and of those that
+        # were found in the map ('found')
+        self.prefilter_stats = {'queried': 0, 'passed': 0, 'found': 0}
+
+        # Count, in this process, of the hits that were not found (and so
+        # not verified) because their entries were masked
+        self.num_masked_hits_skipped = 0
+
+    def add_prefilter(self, bits_per_key=None, false_positive_rate=None,
+                      kind=None):
+        """Build a prefilter of the keys, to consult before lookups.
+
+        The prefilter is placed in memory that can be shared by processes,
+        like the other arrays of this map.
+
+        Args:
+            bits_per_key/false_positive_rate/kind: see
+                kmer_prefilter.KmerPrefilter.construct()
+        """
+        self.prefilter = kmer_prefilter.KmerPrefilter.construct(
+            self.keys, self.key_len * self.bits_per_base,
+            bits_per_key=bits_per_key,
+            false_positive_rate=false_positive_rate, kind=kind,
+            allocate=_shared_array)
+        logger.debug(("Built a k-mer prefilter (%s) with 2^%d bits, of "
+                      "which a fraction %f are set"), self.prefilter.kind,
+                     self.prefilter.log2_num_bits,
+                     self.prefilter.fill_fraction())
+
+    def encode(self, kmer):
+        """Pack a k-mer into a key.
+
+        Args:
+            kmer: k-mer (string) to pack
+
+        Returns:
+            int giving the packed key of kmer, or None if kmer contains
+            a character that is not in the alphabet of this map (in which
+            case it cannot be a key)
+        """
+        if self.seed_offsets is None:
+            kmer = kmer[:self.key_len]
+        else:
+            kmer = ''.join(kmer[j] for j in self._key_offsets)
+        if self._digits_table is not None:
+            try:
+                return int(kmer.translate(self._digits_table),
+                           2**self.bits_per_base)
+            except ValueError:
+                return None
+        codes = self.code_table[np.frombuffer(kmer.encode(), dtype=np.uint8)]
+        if np.any(codes == _INVALID_CODE):
+            return None
+        key = 0
+        for c in codes.tolist():
+            key = (key << self.bits_per_base) | c
+        return key
+
+    def lookup(self, key):
+        """Find the range of entries whose key equals a given key.
+
+        Args:
+            key: packed key (int) to lookup
+
+        Returns:
+            tuple (lo, hi) such that entries lo through hi-1 (in
+            self.keys, self.probe_ids, and self.probe_pos) have key
+            equal to the given key; lo == hi if the key is not present
+        """
+        if self.prefilter is not None:
+            self.prefilter_stats['queried'] += 1
+            if not self.prefilter.contains_key(key):
+                return 0, 0
+            self.prefilter_stats['passed'] += 1
+        keys = self._keys_view
+        lo = bisect.bisect_left(keys, key)
+        if lo == len(keys) or keys[lo] != key:
+            return lo, lo
+        if self.prefilter is not None:
+            self.prefilter_stats['found'] += 1
+        hi = lo + 1
+        while hi < len(keys) and keys[hi] == key:
+            hi += 1
+        return lo, hi
+
+    def probe_seq(self, probe_id):
+        """Return the sequence of a probe.
+
+        Args:
+            probe_id: id of a probe in this map
+
+        Returns:
+            the sequence (string) of the probe with id probe_id
+        """
+        try:
+            return self._probe_seq_strs[probe_id]
+        except KeyError:
+            start = self.probe_seqs_offsets[probe_id]
+            end = self.probe_seqs_offsets[probe_id + 1]
+            seq = self.probe_seqs[start:end].tobytes().decode()
+            self._probe_seq_strs[probe_id] = seq
+            return seq
+
     def get(self, kmer):
         """Get the value in kmer_probe_map for the given kmer.
 
@@ -653,31 +1475,261 @@ class SharedKmerProbeMap:
             a probe that contains kmer and pos is the position of kmer in
             the sequence; returns None if kmer is not found as a key
         """
-        # The kmers in self.keys are sorted, so do a binary search to
-        # find kmer
-        kmer_bytes = kmer.encode()
-        i = bisect.bisect_left(self.keys, kmer_bytes)
-        if i == len(self.keys) or self.keys[i] != kmer_bytes:
-            # The key kmer is not present
+        if len(kmer) != self.k:
+            return None
+        key = self.encode(kmer)
+        if key is None:
+            # kmer has a character that is in none of the keys
             return None
+        lo, hi = self.lookup(key)
 
-        # There may be more than one match for the key kmer, so keep
-        # scanning while there is a match
         matches = []
-        while i < len(self.keys) and self.keys[i] == kmer_bytes:
-            seq = self.probe_seqs[self.probe_seqs_ind[i]].decode()
-            pos = self.probe_pos[i]
+        for i in range(lo, hi):
+            seq = self.probe_seq(self._probe_ids_view[i])
+            pos = self._probe_pos_view[i]
+            if any(seq[pos + j] != kmer[j] for j in self._verify_offsets):
+                # Only the part of kmer held in the key matches
+                continue
             matches += [(seq, pos)]
-            i += 1
+        if len(matches) == 0:
+            # The key kmer is not present
+            return None
         return matches
 
+    @property
+    def anchor_len(self):
+        """Number of bases, starting at a hit, that must match exactly.
+
+        At a hit of a contiguous k-mer, the probe and sequence share all
+        k bases; at a hit of a spaced seed, they need only share the
+        care positions, of which the first base is one.
+        """
+        return self.k if self.seed_offsets is None else 1
+
+    def find_hits(self, sequence, start, end):
+        """Find the entries of this map that share k-mers with a sequence.
+
+        Rather than slicing out and encoding each k-mer of sequence, this
+        keeps a rolling hash of the packed key across the windows of
+        sequence: the key of the window at i+1 is the key of the window at
+        i shifted left by one base, with the code of the next base added
+        on. The rolling hash is computed for all windows between start and
+        end at once, using numpy, and all of the keys are then looked up
+        in one pass. Windows that contain a character that is not in any
+        k-mer of this map (e.g., 'N' when the probes are unambiguous) are
+        skipped.
+
+        Args:
+            sequence: sequence to scan, as a string or as a numpy array
+                (uint8) of its characters
+            start/end: scan the k-mers in sequence whose first base is at
+                start through end-1; it must be true that end+k-1 <=
+                len(sequence)
+
+        Returns:
+            tuple (hit_pos, hit_probe_ids, hit_probe_pos) of numpy arrays
+            such that, for each i, the k-mer in sequence starting at
+            hit_pos[i] is found at position hit_probe_pos[i] in the probe
+            with id hit_probe_ids[i]; hits are sorted by hit_pos
+        """
+        n = end - start
+        if n <= 0 or len(self.keys) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.astype(np.int32), empty.astype(np.int32)
+
+        chars = _sequence_chars(sequence, start, end + self.k - 1)
+        codes = self.code_table[chars]
+
+        if self.seed_offsets is None:
+            # Only consider windows whose k bases are all in the alphabet
+            num_invalid = np.zeros(len(codes) + 1, dtype=np.int64)
+            np.cumsum(codes == _INVALID_CODE, out=num_invalid[1:])
+            window_is_valid = (num_invalid[self.k:(self.k + n)] -
+                               num_invalid[:n]) == 0
+        else:
+            # Only the care positions of a spaced seed must be in the
+            # alphabet
+            window_is_valid = np.ones(n, dtype=bool)
+            for j in self.seed_offsets:
+                window_is_valid &= codes[j:(j + n)] != _INVALID_CODE
+
+        # Compute the rolling hash (packed key) of every window
+        codes = codes.astype(np.uint64)
+        bits = np.uint64(self.bits_per_base)
+        window_keys = np.zeros(n, dtype=np.uint64)
+        for j in self._key_offsets:
+            window_keys <<= bits
+            window_keys |= codes[j:(j + n)]
+        window_start = np.flatnonzero(window_is_valid)
+        window_keys = window_keys[window_start]
+
+        if self.masked_keys is not None and len(self.masked_keys) > 0:
+            # Count the entries of masked keys that would have been hit
+            masked_idx = np.minimum(
+                np.searchsorted(self.masked_keys, window_keys),
+                len(self.masked_keys) - 1)
+            is_masked = self.masked_keys[masked_idx] == window_keys
+            self.num_masked_hits_skipped += int(np.sum(
+                self.masked_key_counts[masked_idx[is_masked]]))
+
+        if self.prefilter is not None:
+            # Drop the windows whose keys are certainly not in the map
+            passed = self.prefilter.contains(window_keys)
+            self.prefilter_stats['queried'] += len(window_keys)
+            window_start = window_start[passed]
+            window_keys = window_keys[passed]
+            self.prefilter_stats['passed'] += len(window_keys)
+
+        # Look up all keys, and expand each window into one hit per entry
+        # that has its key; most windows are not found, so only search
+        # for the end of the run of entries for those that are
+        lo = np.searchsorted(self.keys, window_keys, side='left')
+        found = lo < len(self.keys)
+        found[found] = self.keys[lo[found]] == window_keys[found]
+        if self.prefilter is not None:
+            self.prefilter_stats['found'] += int(np.count_nonzero(found))
+        window_start = window_start[found]
+        lo = lo[found]
+        hi = np.searchsorted(self.keys, window_keys[found], side='right')
+        num_entries = hi - lo
+        hit_offsets = np.cumsum(num_entries) - num_entries
+        entries = (np.repeat(lo - hit_offsets, num_entries) +
+                   np.arange(np.sum(num_entries)))
+        hit_pos = np.repeat(window_start, num_entries)
+        hit_probe_ids = self.probe_ids[entries]
+        hit_probe_pos = self.probe_pos[entries]
+
+        if len(self._verify_offsets) > 0 and len(entries) > 0:
+            # Only part of each k-mer was compared in the key; verify the
+            # rest of it against the probe sequence
+            cols = np.array(self._verify_offsets)
+            seq_chars = chars[hit_pos[:, np.newaxis] + cols]
+            probe_chars = self.probe_seqs[
+                (self.probe_seqs_offsets[hit_probe_ids] +
+                 hit_probe_pos)[:, np.newaxis] + cols]
+            matches = np.all(seq_chars == probe_chars, axis=1)
+            hit_pos = hit_pos[matches]
+            hit_probe_ids = hit_probe_ids[matches]
+            hit_probe_pos = hit_probe_pos[matches]
+
+        return hit_pos + start, hit_probe_ids, hit_probe_pos
+
+    def shared_view(self):
+        """Return a copy of this map to be accessed by worker processes.
+
+        The copy refers to the same (shared) arrays, but omits the
+        objects that only the constructing process needs -- namely,
+        the list of Probe objects and the native dict -- so that worker
+        processes cannot accidentally access (and thereby copy) them.
+
+        Returns:
+            instance of SharedKmerProbeMap
+        """
+        return SharedKmerProbeMap(self.keys, self.probe_ids, self.probe_pos,
+                                  self.probe_seqs, self.probe_seqs_offsets,
+                                  self.k, self.code_table, self.bits_per_base,
+                                  num_forward_probes=self.num_forward_probes,
+                                  seed_offsets=self.seed_offsets,
+                                  prefilter=self.prefilter,
+                                  masked_keys=self.masked_keys,
+                                  masked_key_counts=self.masked_key_counts)
+
+    # Arrays copied into a named shared memory block by to_shared_memory()
+    _SHARED_MEMORY_FIELDS = ['keys', 'probe_ids', 'probe_pos', 'probe_seqs',
+                             'probe_seqs_offsets']
+
+    def to_shared_memory(self):
+        """Copy the arrays of this map into a named shared memory block.
+
+        The arrays allocated with RawArray can only be accessed by processes
+        forked after they are allocated. A named block, by contrast, can be
+        attached by any process that is given its name -- e.g., a worker in
+        a pool that was forked before this map was constructed.
+
+        Returns:
+            tuple (shm, handle) where shm is the instance of
+            multiprocessing.shared_memory.SharedMemory holding the arrays
+            (the caller must close() and unlink() it when the map is no
+            longer needed) and handle is a picklable dict from which
+            from_shared_memory() reconstructs the map
+        """
+        arrays = [(field, getattr(self, field))
+                  for field in self._SHARED_MEMORY_FIELDS]
+        if self.prefilter is not None:
+            arrays += [('prefilter_words', self.prefilter.words)]
+        if self.masked_keys is not None:
+            arrays += [('masked_keys', self.masked_keys),
+                       ('masked_key_counts', self.masked_key_counts)]
+        layout = []
+        offset = 0
+        for field, arr in arrays:
+            layout += [(field, arr.dtype.str, offset, len(arr))]
+            # Keep each array aligned to 8 bytes
+            offset += (arr.nbytes + 7) // 8 * 8
+        shm = shared_memory.SharedMemory(create=True, size=max(1, offset))
+        for (field, dtype, field_offset, count), (_, arr) in zip(layout,
+                                                                 arrays):
+            dest = np.ndarray((count,), dtype=dtype, buffer=shm.buf,
+                              offset=field_offset)
+            dest[:] = arr
+        handle = {'name': shm.name, 'layout': layout, 'k': self.k,
+                  'code_table': self.code_table.tobytes(),
+                  'bits_per_base': self.bits_per_base,
+                  'num_forward_probes': self.num_forward_probes,
+                  'seed_offsets': self.seed_offsets,
+                  'prefilter': (None if self.prefilter is None else
+                                self.prefilter.params())}
+        return shm, handle
+
+    @staticmethod
+    def from_shared_memory(handle):
+        """Attach to a map in a named shared memory block.
+
+        Args:
+            handle: dict output by to_shared_memory()
+
+        Returns:
+            tuple (shm, kmer_probe_map) where shm is the attached instance
+            of multiprocessing.shared_memory.SharedMemory and kmer_probe_map
+            is an instance of SharedKmerProbeMap whose arrays refer to it;
+            all references to kmer_probe_map must be dropped before calling
+            shm.close()
+        """
+        shm = shared_memory.SharedMemory(name=handle['name'])
+        arrays = {}
+        for field, dtype, field_offset, count in handle['layout']:
+            arrays[field] = np.ndarray((count,), dtype=dtype, buffer=shm.buf,
+                                       offset=field_offset)
+        code_table = np.frombuffer(handle['code_table'], dtype=np.uint8)
+        if handle['prefilter'] is not None:
+            prefilter = kmer_prefilter.KmerPrefilter(
+                arrays['prefilter_words'], **handle['prefilter'])
+        else:
+            prefilter = None
+        kmer_probe_map = SharedKmerProbeMap(
+            arrays['keys'], arrays['probe_ids'], arrays['probe_pos'],
+            arrays['probe_seqs'], arrays['probe_seqs_offsets'],
+            handle['k'], code_table, handle['bits_per_base'],
+            num_forward_probes=handle['num_forward_probes'],
+            seed_offsets=handle['seed_offsets'], prefilter=prefilter,
+            masked_keys=arrays.get('masked_keys'),
+            masked_key_counts=arrays.get('masked_key_counts'))
+        return shm, kmer_probe_map
+
     @staticmethod
-    def construct(kmer_probe_map):
+    def construct(kmer_probe_map, include_reverse_complements=False):
         """Construct a SharedKmerProbeMap instance from a kmer_probe_map dict.
 
         Args:
             kmer_probe_map: dict as output by the function
                 probe.construct_kmer_probe_map_to_find_probe_covers
+            include_reverse_complements: when True, also index the reverse
+                complement of each k-mer, mapping it to the reverse
+                complement of each probe at the mirrored position; then
+                find_probe_covers_in_sequence() finds the ranges that the
+                probes cover in both a sequence and its reverse complement
+                from one scan of the sequence. The native dict only holds
+                the k-mers of kmer_probe_map
 
         Returns:
             instance of SharedKmerProbeMap that offers the same functionality
@@ -691,6 +1743,7 @@ class SharedKmerProbeMap:
         # of length k, and check that the k-mers in the map come with
         # positions
         k = None
+        alphabet = set()
         for kmer in kmer_probe_map.keys():
             if k is None:
                 k = len(kmer)
@@ -700,45 +1753,78 @@ class SharedKmerProbeMap:
                 if not isinstance(v, tuple):
                     raise ValueError(("Given kmer_probe_map must include kmer "
                                       "positions"))
-
-        # First copy all the (unique) probe sequences to an array probe_seqs
-        # While filling in probe_seqs, save the position of a seq in probe_seqs
-        # as unique_probe_seqs[seq]
-        # Also, save a mapping of all the probe sequences back to the instances
-        # of Probe
-        unique_probe_seqs = {}
-        probe_seqs_to_probe = {}
+            alphabet.update(kmer)
+            if include_reverse_complements:
+                alphabet.update(kmer.translate(_RC_STR_TRANS_TABLE))
+        if k is None:
+            # The map is empty; k is arbitrary
+            k = 1
+
+        code_table, bits_per_base = _make_kmer_encoding(alphabet)
+
+        # Give each (unique) probe an id, and save a mapping of ids back to
+        # the instances of Probe
+        probe_id = {}
+        probes = []
         for kmer, kmer_alignments in kmer_probe_map.items():
             for probe, pos in kmer_alignments:
-                unique_probe_seqs[probe.seq_str] = True
-                probe_seqs_to_probe[probe.seq_str] = probe
-        probe_seqs = multiprocessing.sharedctypes.RawArray(
-            ctypes.c_char_p, len(unique_probe_seqs))
-        for i, (seq, _) in enumerate(unique_probe_seqs.items()):
-            probe_seqs[i] = seq.encode()
-            unique_probe_seqs[seq] = i
-
-        # Find the number of keys that are needed and allocate the keys array
+                if probe not in probe_id:
+                    probe_id[probe] = len(probes)
+                    probes += [probe]
+
+        # Concatenate all the probe sequences (followed by their reverse
+        # complements, if included) into one array, and store the offset
+        # of each
+        probe_seq_bytes = [p.seq_bytes for p in probes]
+        if include_reverse_complements:
+            num_forward_probes = len(probes)
+            probe_seq_bytes += [b.translate(_RC_TRANS_TABLE)[::-1]
+                                for b in probe_seq_bytes]
+        else:
+            num_forward_probes = None
+        probe_seqs = np.frombuffer(b''.join(probe_seq_bytes), dtype=np.uint8)
+        probe_seqs_offsets = np.zeros(len(probe_seq_bytes) + 1,
+                                      dtype=np.int64)
+        probe_seqs_offsets[1:] = np.cumsum([len(b) for b in probe_seq_bytes])
+
+        def pack(kmer):
+            codes = code_table[np.frombuffer(kmer[:key_len].encode(),
+                                             dtype=np.uint8)]
+            key = 0
+            for c in codes.tolist():
+                key = (key << bits_per_base) | c
+            return key
+
+        # Pack each k-mer into a key, and fill in the parallel arrays
         num_keys = sum(len(kmer_alignments)
                        for kmer, kmer_alignments in kmer_probe_map.items())
-        keys = multiprocessing.sharedctypes.RawArray(ctypes.c_char_p, num_keys)
-
-        # Allocate the probe_seqs_ind and probe_pos arrays; their indices map
-        # to indices in key, so their length is also num_keys
-        probe_seqs_ind = multiprocessing.sharedctypes.RawArray(
-            ctypes.c_uint, num_keys)
-        probe_pos = multiprocessing.sharedctypes.RawArray(
-            ctypes.c_uint, num_keys)
-
-        # Fill in keys, probe_seqs_ind, and probe_pos
+        if include_reverse_complements:
+            num_keys *= 2
+        keys = np.zeros(num_keys, dtype=np.uint64)
+        probe_ids = np.zeros(num_keys, dtype=np.int32)
+        probe_pos = np.zeros(num_keys, dtype=np.int32)
+        key_len = min(k, 64 // bits_per_base)
         i = 0
-        for kmer in sorted(kmer_probe_map.keys()):
-            num_alignments = len(kmer_probe_map[kmer])
-            for probe, pos in kmer_probe_map[kmer]:
-                keys[i] = kmer.encode()
-                probe_seqs_ind[i] = unique_probe_seqs[probe.seq_str]
+        for kmer, kmer_alignments in kmer_probe_map.items():
+            key = pack(kmer)
+            for probe, pos in kmer_alignments:
+                keys[i] = key
+                probe_ids[i] = probe_id[probe]
                 probe_pos[i] = pos
                 i += 1
+            if include_reverse_complements:
+                # The reverse complement of kmer appears in the reverse
+                # complement of the probe, at the mirrored position
+                rc_key = pack(kmer.translate(_RC_STR_TRANS_TABLE)[::-1])
+                for probe, pos in kmer_alignments:
+                    keys[i] = rc_key
+                    probe_ids[i] = num_forward_probes + probe_id[probe]
+                    probe_pos[i] = len(probe) - pos - k
+                    i += 1
+
+        # Sort by key (and, within a key, by probe id and position so that
+        # the order is deterministic)
+        order = np.lexsort((probe_pos, probe_ids, keys))
 
         # Fill in native_dict
         native_dict = defaultdict(list)
@@ -747,16 +1833,335 @@ class SharedKmerProbeMap:
                 native_dict[kmer].append((probe.seq_str, pos))
         native_dict = dict(native_dict)
 
-        return SharedKmerProbeMap(keys, probe_seqs_ind, probe_pos, probe_seqs,
-                                  k, probe_seqs_to_probe, native_dict)
+        return SharedKmerProbeMap(_shared_array(keys[order]),
+                                  _shared_array(probe_ids[order]),
+                                  _shared_array(probe_pos[order]),
+                                  _shared_array(probe_seqs),
+                                  _shared_array(probe_seqs_offsets),
+                                  k, code_table, bits_per_base,
+                                  num_forward_probes=num_forward_probes,
+                                  probes=probes, native_dict=native_dict)
 
+    @staticmethod
+    def construct_from_probes(probes, mismatches, lcf_thres, min_k=20, k=20,
+                              include_reverse_complements=False,
+                              include_native_dict=False, seeding=None,
+                              minimizer_w=None, prefilter_bits_per_key=None,
+                              prefilter_false_positive_rate=None,
+                              max_seed_occurrences=None):
+        """Construct a SharedKmerProbeMap instance directly from probes.
+
+        This gives the same map as
+          construct(construct_kmer_probe_map_to_find_probe_covers(
+              probes, mismatches, lcf_thres, min_k=min_k, k=k),
+              include_reverse_complements=include_reverse_complements)
+        (up to the ids given to probes), choosing the same k-mers and
+        drawing the same random numbers. But rather than building a dict
+        of sets of (Probe, position) tuples and then converting it, this
+        holds the probes in a uint8 matrix (a ProbeSet), gathers the chosen
+        k-mers from a strided view of it, packs them into keys column by
+        column, and sorts the keys once -- so it takes no Python work per
+        k-mer, which matters with millions of candidate probes.
 
-def set_max_num_processes_for_probe_finding_pools(max_num_processes=8):
-    """Set the maximum number of processes to use in a probe finding pool.
+        Args:
+            probes: list of instances of probe.Probe, or a ProbeSet
+            mismatches/lcf_thres/min_k/k: see
+                construct_kmer_probe_map_to_find_probe_covers()
+            include_reverse_complements: see construct()
+            include_native_dict: when True, also build the native dict
+                (see open_probe_finding_pool()); this is not vectorized,
+                so it is only built when requested
+            seeding: None to choose k-mers as described above; otherwise,
+                a strategy in KMER_PROBE_MAP_SEEDINGS for choosing seeds
+                (see _choose_kmer_positions()), with which the map is not
+                the same as one output by construct()
+            minimizer_w: with seeding, the number of consecutive seed
+                positions in a probe from which a minimizer is chosen; if
+                None, this is chosen from mismatches and lcf_thres so that
+                every cover is found
+            prefilter_bits_per_key/prefilter_false_positive_rate: if
+                either is set, build a prefilter of the keys with it (see
+                add_prefilter())
+            max_seed_occurrences: if set, mask each seed (key) that is
+                in more than this number of entries -- i.e., that is
+                shared by many probes, or occurs many times in them --
+                except that a probe whose seeds are all masked keeps its
+                least frequent one (see _mask_frequent_seeds()); every
+                occurrence of a frequent seed in a scanned sequence
+                would otherwise yield that many hits to verify
 
-    Args:
-        max_num_processes: an int (>= 1) specifying the maximum number of
-            processes to use in a multiprocessing.Pool when a num_processes
+        Returns:
+            instance of SharedKmerProbeMap
+
+        Raises:
+            ValueError if k is larger than the length of a probe when
+            choosing k-mers randomly or with seeding, or if a native dict
+            is requested for spaced seeds (it only holds contiguous
+            k-mers)
+        """
+        if isinstance(probes, ProbeSet):
+            probe_set = probes
+        else:
+            probe_set = ProbeSet.from_probes(probes)
+        if include_native_dict and seeding == 'spaced':
+            raise ValueError("The native dict cannot hold spaced seeds")
+        k, rows, pos, seed_offsets = _choose_kmer_positions(
+            probe_set, mismatches, lcf_thres, min_k=min_k, k=k,
+            seeding=seeding, minimizer_w=minimizer_w)
+
+        # Give each distinct probe sequence an id, in the order of its
+        # first occurrence (equal probes are one key in a kmer_probe_map)
+        if len(probe_set) > 0:
+            row_vals = np.ascontiguousarray(probe_set.seqs).view(
+                np.dtype((np.void, probe_set.seqs.shape[1]))).ravel()
+            _, first_row, row_unique = np.unique(
+                row_vals, return_index=True, return_inverse=True)
+            id_of_unique = np.empty(len(first_row), dtype=np.int64)
+            id_of_unique[np.argsort(first_row)] = np.arange(len(first_row))
+            row_id = id_of_unique[row_unique.ravel()]
+            id_rows = np.sort(first_row)
+        else:
+            row_id = np.zeros(0, dtype=np.int64)
+            id_rows = np.zeros(0, dtype=np.int64)
+        id_probe_set = probe_set[id_rows]
+        if isinstance(probes, ProbeSet):
+            probes_by_id = id_probe_set.to_probes()
+        else:
+            probes_by_id = [probes[r] for r in id_rows.tolist()]
+
+        # Remove repeated choices of the same k-mer of a probe
+        max_len = max(1, probe_set.seqs.shape[1])
+        entries = np.unique(row_id[rows] * max_len + pos)
+        probe_ids = entries // max_len
+        probe_pos = entries % max_len
+
+        # Gather the chosen k-mers into rows of a matrix
+        if len(entries) > 0:
+            windows = np.lib.stride_tricks.sliding_window_view(
+                id_probe_set.seqs, k, axis=1)[probe_ids, probe_pos]
+        else:
+            windows = np.zeros((0, k), dtype=np.uint8)
+        rc_table = np.frombuffer(_RC_TRANS_TABLE, dtype=np.uint8)
+        alphabet = np.flatnonzero(np.bincount(windows.ravel(), minlength=256))
+        if include_reverse_complements:
+            alphabet = np.union1d(alphabet, rc_table[alphabet])
+        code_table, bits_per_base = _make_kmer_encoding(
+            [chr(c) for c in alphabet.tolist()])
+        # Pack the bases of each k-mer (or, for a spaced seed, its care
+        # positions) that fit in a key
+        if seed_offsets is None:
+            key_offsets = list(range(k))
+        else:
+            key_offsets = list(seed_offsets)
+        key_offsets = key_offsets[:(64 // bits_per_base)]
+
+        def pack(windows):
+            codes = code_table[windows[:, key_offsets]].astype(np.uint64)
+            keys = np.zeros(len(windows), dtype=np.uint64)
+            bits = np.uint64(bits_per_base)
+            for j in range(len(key_offsets)):
+                keys <<= bits
+                keys |= codes[:, j]
+            return keys
+
+        # Concatenate all the probe sequences (followed by their reverse
+        # complements, if included) into one array, and store the offset
+        # of each
+        seqs_by_id = [id_probe_set]
+        keys = [pack(windows)]
+        all_probe_ids = [probe_ids]
+        all_probe_pos = [probe_pos]
+        if include_reverse_complements:
+            # The reverse complement of each k-mer appears in the reverse
+            # complement of its probe, at the mirrored position (spaced
+            # seeds are symmetric, so the care positions of a reversed
+            # seed are the same)
+            num_forward_probes = len(id_probe_set)
+            seqs_by_id += [id_probe_set.reverse_complement()]
+            keys += [pack(rc_table[windows[:, ::-1]])]
+            all_probe_ids += [probe_ids + num_forward_probes]
+            all_probe_pos += [id_probe_set.lengths[probe_ids] - probe_pos - k]
+        else:
+            num_forward_probes = None
+        probe_seqs = np.concatenate(
+            [ps.seqs[np.arange(ps.seqs.shape[1]) <
+                     ps.lengths[:, np.newaxis]] for ps in seqs_by_id])
+        probe_seqs_offsets = np.zeros(
+            sum(len(ps) for ps in seqs_by_id) + 1, dtype=np.int64)
+        probe_seqs_offsets[1:] = np.cumsum(np.concatenate(
+            [ps.lengths for ps in seqs_by_id]))
+        keys = np.concatenate(keys)
+        probe_ids = np.concatenate(all_probe_ids).astype(np.int32)
+        probe_pos = np.concatenate(all_probe_pos).astype(np.int32)
+
+        keep_forward = None
+        masked_keys, masked_key_counts = None, None
+        if max_seed_occurrences is not None:
+            keep, masked_keys, masked_key_counts, num_fallback_probes = \
+                _mask_frequent_seeds(keys, probe_ids, len(windows),
+                                     max_seed_occurrences)
+            logger.info(("Masked %d of %d seeds that each have more than "
+                         "%d entries, removing %d of %d entries; %d probes "
+                         "kept a fallback seed"), len(masked_keys),
+                        len(np.unique(keys)), max_seed_occurrences,
+                        len(keys) - np.count_nonzero(keep), len(keys),
+                        num_fallback_probes)
+            keys = keys[keep]
+            probe_ids = probe_ids[keep]
+            probe_pos = probe_pos[keep]
+            keep_forward = keep[:len(windows)]
+
+        # Sort by key (and, within a key, by probe id and position so that
+        # the order is deterministic)
+        order = np.lexsort((probe_pos, probe_ids, keys))
+
+        if include_native_dict:
+            native_dict = defaultdict(list)
+            for i, (probe_id, kmer_pos) in enumerate(
+                    zip(all_probe_ids[0].tolist(), all_probe_pos[0].tolist())):
+                if keep_forward is not None and not keep_forward[i]:
+                    continue
+                native_dict[windows[i].tobytes().decode()].append(
+                    (probes_by_id[probe_id].seq_str, kmer_pos))
+            native_dict = dict(native_dict)
+        else:
+            native_dict = None
+
+        kmer_probe_map = SharedKmerProbeMap(
+            _shared_array(keys[order]), _shared_array(probe_ids[order]),
+            _shared_array(probe_pos[order]), _shared_array(probe_seqs),
+            _shared_array(probe_seqs_offsets), k, code_table, bits_per_base,
+            num_forward_probes=num_forward_probes, seed_offsets=seed_offsets,
+            masked_keys=(None if masked_keys is None else
+                         _shared_array(masked_keys)),
+            masked_key_counts=(None if masked_key_counts is None else
+                               _shared_array(masked_key_counts)),
+            probes=probes_by_id, native_dict=native_dict)
+        if (prefilter_bits_per_key is not None or
+                prefilter_false_positive_rate is not None):
+            kmer_probe_map.add_prefilter(
+                bits_per_key=prefilter_bits_per_key,
+                false_positive_rate=prefilter_false_positive_rate)
+        return kmer_probe_map
+
+
+class SharedSequenceCollection:
+    """A read-only collection of sequences that can be shared by processes.
+
+    The sequences (e.g., of target genomes) are stored concatenated in a
+    single uint8 array of their characters, alongside an array of offsets
+    in which sequence i spans bases[offsets[i]:offsets[i+1]]. Both are
+    placed in one named shared memory block, so a worker process can
+    attach to the block and read any part of any sequence without it
+    being pickled and sent to the worker; a task then only needs to name
+    a sequence and the range to scan in it.
+
+    This relies on multiprocessing.shared_memory, which requires Python
+    3.8 or later (as does the package, per setup.py). All scans, through
+    find_probe_covers_in_sequence() and find_probe_covers_in_sequences(),
+    read their sequences from here; there is no separate path that
+    pickles the sequences.
+    """
+
+    def __init__(self, bases, offsets):
+        """
+        Args:
+            bases: numpy array (uint8) of the characters of the sequences,
+                concatenated
+            offsets: numpy array (int64) of length one more than the
+                number of sequences, such that sequence i spans
+                bases[offsets[i]:offsets[i+1]]
+        """
+        self.bases = bases
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def sequence_len(self, i):
+        """Return the length of sequence i."""
+        return int(self.offsets[i + 1] - self.offsets[i])
+
+    def sequence_chars(self, i):
+        """Return the characters of sequence i.
+
+        Args:
+            i: index of a sequence
+
+        Returns:
+            numpy array (uint8) of the characters of sequence i, which is
+            a view of (not a copy from) the bases of this collection
+        """
+        return self.bases[self.offsets[i]:self.offsets[i + 1]]
+
+    def sequence(self, i):
+        """Return sequence i as a string."""
+        return self.sequence_chars(i).tobytes().decode()
+
+    @staticmethod
+    def construct(sequences):
+        """Construct a SharedSequenceCollection from sequences.
+
+        Args:
+            sequences: list of sequences (as strings)
+
+        Returns:
+            instance of SharedSequenceCollection
+        """
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum([len(seq) for seq in sequences], out=offsets[1:])
+        bases = np.frombuffer(''.join(sequences).encode(), dtype=np.uint8)
+        return SharedSequenceCollection(bases, offsets)
+
+    def to_shared_memory(self):
+        """Copy this collection into a named shared memory block.
+
+        Returns:
+            tuple (shm, handle) where shm is the instance of
+            multiprocessing.shared_memory.SharedMemory holding the
+            collection (the caller must close() and unlink() it when the
+            collection is no longer needed) and handle is a picklable dict
+            from which from_shared_memory() reconstructs the collection
+        """
+        bases_offset = self.offsets.nbytes
+        shm = shared_memory.SharedMemory(
+            create=True, size=max(1, bases_offset + self.bases.nbytes))
+        np.ndarray(self.offsets.shape, dtype=np.int64, buffer=shm.buf)[:] = \
+            self.offsets
+        np.ndarray(self.bases.shape, dtype=np.uint8, buffer=shm.buf,
+                   offset=bases_offset)[:] = self.bases
+        handle = {'name': shm.name, 'num_sequences': len(self),
+                  'num_bases': len(self.bases)}
+        return shm, handle
+
+    @staticmethod
+    def from_shared_memory(handle):
+        """Attach to a collection in a named shared memory block.
+
+        Args:
+            handle: dict output by to_shared_memory()
+
+        Returns:
+            tuple (shm, sequences) where shm is the attached instance of
+            multiprocessing.shared_memory.SharedMemory and sequences is an
+            instance of SharedSequenceCollection whose arrays refer to it;
+            all references to sequences (and to arrays it returns) must be
+            dropped before calling shm.close()
+        """
+        shm = shared_memory.SharedMemory(name=handle['name'])
+        num_offsets = handle['num_sequences'] + 1
+        offsets = np.ndarray((num_offsets,), dtype=np.int64, buffer=shm.buf)
+        bases = np.ndarray((handle['num_bases'],), dtype=np.uint8,
+                           buffer=shm.buf, offset=offsets.nbytes)
+        return shm, SharedSequenceCollection(bases, offsets)
+
+
+def set_max_num_processes_for_probe_finding_pools(max_num_processes=8):
+    """Set the maximum number of processes to use in a probe finding pool.
+
+    Args:
+        max_num_processes: an int (>= 1) specifying the maximum number of
+            processes to use in a multiprocessing.Pool when a num_processes
             argument is not provided to probe.open_probe_finding_pool; uses
             min(the number of CPUs in the system, max_num_processes) processes
             when num_processes is not provided to
@@ -767,6 +2172,258 @@ def set_max_num_processes_for_probe_finding_pools(max_num_processes=8):
 set_max_num_processes_for_probe_finding_pools()
 
 
+def set_verify_cache_for_probe_finding_pools(max_size=0, eviction='lru'):
+    """Set the cache of verification outcomes kept by each worker.
+
+    Within a species, most target genomes differ at only a few positions,
+    so a probe is often verified (i.e., its longest common substring with
+    the target is computed) against the same window of bases at many
+    hits across genomes. With a cache, each worker of a probe finding pool
+    keeps the outcomes of its recent verifications in a
+    utils.bounded_cache.BoundedCache, keyed by the probe id, the
+    alignment of the probe, and the bases of the target window, and
+    reuses them rather than verifying again. This does not change the
+    output. It applies to the cover functions returned by
+    probe_covers_sequence_by_longest_common_substring() and
+    probe_covers_sequence_by_longest_common_substring_for_each_setting()
+    when the k-mer probe map does not use its native dict.
+
+    This applies to pools opened after it is called.
+
+    Args:
+        max_size: maximum number of outcomes in the cache of each worker
+            (each takes about 400 bytes for 100 nt probes); 0 for no cache
+        eviction: policy for choosing the outcome to evict when a cache
+            is full; one of utils.bounded_cache.EVICTION_POLICIES
+
+    Raises:
+        ValueError if max_size or eviction is invalid
+    """
+    global _pfp_verify_cache_params
+    if max_size < 0:
+        raise ValueError("max_size must be at least 0")
+    if eviction not in bounded_cache.EVICTION_POLICIES:
+        raise ValueError("Unknown eviction policy '%s'" % eviction)
+    _pfp_verify_cache_params = (max_size, eviction)
+set_verify_cache_for_probe_finding_pools()
+
+
+def _make_pool(num_processes):
+    """Create a multiprocessing pool, retrying if creating it times out.
+
+    Args:
+        num_processes: number of processes/workers to have in the pool
+
+    Returns:
+        instance of multiprocessing.Pool
+    """
+    # Sometimes opening a pool (via multiprocessing.Pool) hangs indefinitely,
+    # particularly when many pools are opened/closed repeatedly by a master
+    # process; this likely stems from issues in multiprocessing.Pool. So set
+    # a timeout on opening the pool, and try again if it times out. It
+    # appears, from testing, that opening a pool may timeout a few times in
+    # a row, but eventually succeeds.
+    # Start the resource tracker, which tracks shared memory blocks, before
+    # forking so that the workers share it with this process; otherwise,
+    # each worker would start its own and, when it exits, warn about (and
+    # try to unlink) the blocks that it attached to
+    resource_tracker.ensure_running()
+
+    time_limit = 60
+    while True:
+        try:
+            with timeout.time_limit(time_limit):
+                pool = multiprocessing.Pool(num_processes)
+            break
+        except timeout.TimeoutException:
+            # Try again
+            logger.debug("Pool initialization timed out; trying again")
+            time_limit *= 2
+            continue
+    return pool
+
+
+def _shutdown_pool(pool):
+    """Make a best effort to terminate and join a multiprocessing pool.
+
+    Args:
+        pool: instance of multiprocessing.Pool to which work was submitted
+    """
+    pool.close()
+    # Due to issues that likely stem from bugs in the multiprocessing
+    # module, calls to pool.terminate() and pool.join() sometimes hang
+    # indefinitely (even when work was indeed submitted to the processes).
+    # So make a best effort in calling these functions -- i.e., use a
+    # timeout around calls to these functions
+    try:
+        with timeout.time_limit(60):
+            pool.terminate()
+    except timeout.TimeoutException:
+        # Ignore the timeout
+        # If pool.terminate() or pool.join() fails this will not affect
+        # correctness and will not necessarily prevent additional pools
+        # from being created, so let the program continue to execute
+        # because it will generally be able to keep making progress
+        logger.debug(("Terminating the probe finding pool timed out; "
+                      "ignoring"))
+        pass
+    except:
+        # pool.terminate() occassionally raises another exception
+        # (NoneType) if it tries to terminate a process that has already
+        # been terminated; ignoring that exception should not affect
+        # correctness or prevent additional pools from being created, so
+        # is better to ignore it than to let the exception crash the
+        # program
+        pass
+
+    try:
+        with timeout.time_limit(60):
+            pool.join()
+    except timeout.TimeoutException:
+        # Ignore the timeout
+        # If pool.terminate() or pool.join() fails this will not affect
+        # correctness and will not necessarily prevent additional pools
+        # from being created, so let the program continue to execute
+        # because it will generally be able to keep making progress
+        logger.debug(("Joining the probe finding pool timed out; "
+                      "ignoring"))
+        pass
+    except:
+        # Ignore any additional exception from pool.join() rather than
+        # letting it crash the program
+        pass
+
+
+# Long-lived pool started by start_persistent_probe_finding_pool(), if any
+_pfp_persistent_pool = None
+
+
+def start_persistent_probe_finding_pool(num_processes=None):
+    """Start a pool of worker processes to reuse across probe finding pools.
+
+    Without this, each call to open_probe_finding_pool() forks a new pool
+    of processes, which inherit kmer_probe_map and the cover function as
+    module globals; a run that finds probe covers at several steps pays
+    the cost of starting a pool at each of them. After this is called,
+    open_probe_finding_pool() instead uses the workers of this one pool,
+    which is forked just once. Because these workers are forked before
+    kmer_probe_map exists, open_probe_finding_pool() publishes it to them
+    through a named shared memory block (see
+    SharedKmerProbeMap.to_shared_memory()) and sends the cover function
+    with each task; the workers attach to the block the first time they
+    scan with it.
+
+    open_probe_finding_pool() still forks a pool of its own when the
+    workers of this pool cannot be used -- namely, when use_native_dict
+    is set (the native dict cannot be placed in shared memory) or when the
+    cover function can be neither pickled nor reconstructed from its
+    parameters.
+
+    Before forking, this calls gc.freeze() so that the garbage collector
+    in the workers does not touch (and thereby copy) the objects they
+    inherit from this process.
+
+    The pool is stopped by stop_persistent_probe_finding_pool(), or at
+    exit.
+
+    Args:
+        num_processes: number of processes/workers to have in the pool;
+            if None, uses min(the number of CPUs in the system,
+            _pfp_max_num_processes)
+
+    Raises:
+        RuntimeError if the persistent pool is already started, or if a
+        probe finding pool is open
+    """
+    global _pfp_persistent_pool
+
+    if _pfp_persistent_pool is not None:
+        raise RuntimeError("Persistent probe finding pool is already started")
+    try:
+        if _pfp_is_open:
+            raise RuntimeError("Probe finding pool is open")
+    except NameError:
+        pass
+
+    if num_processes is None:
+        num_processes = min(multiprocessing.cpu_count(),
+                            _pfp_max_num_processes)
+
+    logger.debug("Starting a persistent probe finding pool with %d processes",
+                 num_processes)
+
+    # Objects that exist now are moved to a permanent generation, which
+    # the garbage collector does not scan, so that collections in the
+    # workers do not write to (and thereby copy) the pages holding them;
+    # unfreeze afterward so that they can still be collected here
+    gc.collect()
+    gc.freeze()
+    try:
+        _pfp_persistent_pool = _make_pool(num_processes)
+    finally:
+        gc.unfreeze()
+
+    atexit.register(stop_persistent_probe_finding_pool)
+
+
+def stop_persistent_probe_finding_pool():
+    """Stop the pool started by start_persistent_probe_finding_pool().
+
+    This does nothing if the pool is not started.
+
+    Raises:
+        RuntimeError if a probe finding pool using it is open
+    """
+    global _pfp_persistent_pool
+
+    if _pfp_persistent_pool is None:
+        return
+    try:
+        if _pfp_is_open and _pfp_pool is _pfp_persistent_pool:
+            raise RuntimeError(("Probe finding pool using the persistent "
+                                "pool is open"))
+    except NameError:
+        pass
+
+    logger.debug("Stopping the persistent probe finding pool")
+    _shutdown_pool(_pfp_persistent_pool)
+    _pfp_persistent_pool = None
+    atexit.unregister(stop_persistent_probe_finding_pool)
+
+
+def _cover_fn_for_workers(cover_range_for_probe_in_subsequence_fn):
+    """Determine how to send a cover function to already-forked workers.
+
+    Args:
+        cover_range_for_probe_in_subsequence_fn: function that determines
+            whether a probe covers a part of a subsequence
+
+    Returns:
+        tuple ('lcf', params) if the function was returned by
+        probe_covers_sequence_by_longest_common_substring() with params;
+        tuple ('lcf_settings', settings) if it was returned by
+        probe_covers_sequence_by_longest_common_substring_for_each_setting()
+        with settings;
+        tuple ('fn', fn) if the function can be pickled; or None if the
+        function cannot be sent to workers
+    """
+    lcf_params = getattr(cover_range_for_probe_in_subsequence_fn,
+                         'lcf_params', None)
+    if lcf_params is not None:
+        # The function is a closure, which cannot be pickled, but it can
+        # be reconstructed from its parameters
+        return ('lcf', lcf_params)
+    lcf_settings = getattr(cover_range_for_probe_in_subsequence_fn,
+                           'lcf_settings', None)
+    if lcf_settings is not None:
+        return ('lcf_settings', lcf_settings)
+    try:
+        pickle.dumps(cover_range_for_probe_in_subsequence_fn)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return None
+    return ('fn', cover_range_for_probe_in_subsequence_fn)
+
+
 def open_probe_finding_pool(kmer_probe_map,
                             cover_range_for_probe_in_subsequence_fn,
                             num_processes=None,
@@ -781,6 +2438,11 @@ def open_probe_finding_pool(kmer_probe_map,
     with opening a multiprocessing pool -- also makes global the variables
     that should be shared with the worker processes.
 
+    If start_persistent_probe_finding_pool() was called, this instead uses
+    the workers of that pool when possible, publishing kmer_probe_map to
+    them through shared memory (see that function); num_processes is then
+    ignored.
+
     All the global variables that are part of this probe finding pool are
     prefixed with '_pfp'.
 
@@ -804,20 +2466,24 @@ def open_probe_finding_pool(kmer_probe_map,
     Raises:
         RuntimeError if the pool is already open; only one pool may be
         open at a time
+        ValueError if use_native_dict is True and kmer_probe_map indexes
+        reverse complements or spaced seeds, or was constructed without a
+        native dict
     """
     global _pfp_is_open
     global _pfp_max_num_processes
     global _pfp_pool
     global _pfp_work_was_submitted
     global _pfp_cover_range_for_probe_in_subsequence_fn
-    global _pfp_kmer_probe_map_keys
-    global _pfp_kmer_probe_map_probe_seqs_ind
-    global _pfp_kmer_probe_map_probe_pos
-    global _pfp_kmer_probe_map_probe_seqs
-    global _pfp_kmer_probe_map_probe_seqs_to_probe
+    global _pfp_kmer_probe_map
+    global _pfp_kmer_probe_map_probes
+    global _pfp_kmer_probe_map_native_probe_ids
     global _pfp_kmer_probe_map_k
     global _pfp_kmer_probe_map_native
     global _pfp_kmer_probe_map_use_native
+    global _pfp_kmer_probe_map_both_strands
+    global _pfp_shm
+    global _pfp_worker_handle
 
     try:
         if _pfp_is_open:
@@ -825,57 +2491,78 @@ def open_probe_finding_pool(kmer_probe_map,
     except NameError:
         pass
 
+    both_strands = kmer_probe_map.num_forward_probes is not None
+    if use_native_dict and both_strands:
+        raise ValueError(("The native dict of a kmer_probe_map does not "
+                          "index reverse complements"))
+    if use_native_dict and kmer_probe_map.seed_offsets is not None:
+        raise ValueError(("The native dict of a kmer_probe_map cannot hold "
+                          "spaced seeds"))
+    if use_native_dict and kmer_probe_map.native_dict is None:
+        raise ValueError(("kmer_probe_map was constructed without a "
+                          "native dict"))
+
     if num_processes is None:
         num_processes = min(multiprocessing.cpu_count(),
                             _pfp_max_num_processes)
 
-    logger.debug("Opening a probe finding pool with %d processes",
-                 num_processes)
-
     _pfp_is_open = True
 
     _pfp_cover_range_for_probe_in_subsequence_fn = \
         cover_range_for_probe_in_subsequence_fn
 
-    # Rather than saving kmer_probe_map directly, save pointers to individual
-    # variables and have the function a process executes reconstruct an
-    # instance of SharedKmerProbeMap from these variables
+    # Rather than saving kmer_probe_map directly, save a view of it that
+    # only refers to its shared arrays, along with separate pointers to the
+    # variables that only this process needs
     # This way, we can be careful to only share in memory with other processes
     # variables that do not have to be copied -- i.e., those processes explicitly
     # access certain variables and we can ensure that variables that would
-    # need to be copied (like kmer_probe_map.probe_seqs_to_probe) are not
+    # need to be copied (like _pfp_kmer_probe_map_probes) are not
     # accidentally accessed by a process
-    _pfp_kmer_probe_map_keys = kmer_probe_map.keys
-    _pfp_kmer_probe_map_probe_seqs_ind = kmer_probe_map.probe_seqs_ind
-    _pfp_kmer_probe_map_probe_pos = kmer_probe_map.probe_pos
-    _pfp_kmer_probe_map_probe_seqs = kmer_probe_map.probe_seqs
-    _pfp_kmer_probe_map_probe_seqs_to_probe = \
-        kmer_probe_map.probe_seqs_to_probe
+    _pfp_kmer_probe_map = kmer_probe_map.shared_view()
+    _pfp_kmer_probe_map_probes = kmer_probe_map.probes
+    if use_native_dict:
+        # The native dict gives probe sequences, from which processes
+        # find probe ids
+        _pfp_kmer_probe_map_native_probe_ids = {
+            p.seq_str: probe_id
+            for probe_id, p in enumerate(kmer_probe_map.probes)}
+    else:
+        _pfp_kmer_probe_map_native_probe_ids = None
     _pfp_kmer_probe_map_k = kmer_probe_map.k
     _pfp_kmer_probe_map_native = kmer_probe_map.native_dict
     _pfp_kmer_probe_map_use_native = use_native_dict
+    _pfp_kmer_probe_map_both_strands = both_strands
+
+    # Outcomes cached for another kmer_probe_map do not apply to this one;
+    # workers forked below start without a cache
+    _reset_verify_cache(_pfp_verify_cache_params)
+
+    worker_cover_fn = _cover_fn_for_workers(
+        cover_range_for_probe_in_subsequence_fn)
+    if (_pfp_persistent_pool is not None and not use_native_dict and
+            worker_cover_fn is not None):
+        # Use the workers of the persistent pool; they were forked before
+        # the globals above were set, so publish what they need through
+        # shared memory and a handle sent with each task
+        logger.debug("Opening a probe finding pool on the persistent pool")
+        _pfp_shm, _pfp_worker_handle = kmer_probe_map.to_shared_memory()
+        _pfp_worker_handle['cover_fn'] = worker_cover_fn
+        _pfp_worker_handle['verify_cache'] = _pfp_verify_cache_params
+        _pfp_pool = _pfp_persistent_pool
+        _pfp_work_was_submitted = False
+        return
+
+    _pfp_shm = None
+    _pfp_worker_handle = None
+
+    logger.debug("Opening a probe finding pool with %d processes",
+                 num_processes)
 
     # Note that the pool must be created at the very end of this function
     # because the only global variables shared with processes in this
     # pool are those that are created prior to creating the pool
-
-    # Sometimes opening a pool (via multiprocessing.Pool) hangs indefinitely,
-    # particularly when many pools are opened/closed repeatedly by a master
-    # process; this likely stems from issues in multiprocessing.Pool. So set
-    # a timeout on opening the pool, and try again if it times out. It
-    # appears, from testing, that opening a pool may timeout a few times in
-    # a row, but eventually succeeds.
-    time_limit = 60
-    while True:
-        try:
-            with timeout.time_limit(time_limit):
-                _pfp_pool = multiprocessing.Pool(num_processes)
-            break
-        except timeout.TimeoutException:
-            # Try again
-            logger.debug("Pool initialization timed out; trying again")
-            time_limit *= 2
-            continue
+    _pfp_pool = _make_pool(num_processes)
 
     _pfp_work_was_submitted = False
     logger.debug("Successfully opened a probe finding pool")
@@ -886,7 +2573,9 @@ def close_probe_finding_pool():
 
     This closes the multiprocessing pool and also deletes pointers to the
     variables that were made global in this module in order to be shared
-    with worker processes.
+    with worker processes. If the pool uses the workers of the persistent
+    pool, the workers are left running and the shared memory holding
+    kmer_probe_map is released.
 
     Raises:
         RuntimeError if the pool is not open
@@ -895,14 +2584,15 @@ def close_probe_finding_pool():
     global _pfp_pool
     global _pfp_work_was_submitted
     global _pfp_cover_range_for_probe_in_subsequence_fn
-    global _pfp_kmer_probe_map_keys
-    global _pfp_kmer_probe_map_probe_seqs_ind
-    global _pfp_kmer_probe_map_probe_pos
-    global _pfp_kmer_probe_map_probe_seqs
-    global _pfp_kmer_probe_map_probe_seqs_to_probe
+    global _pfp_kmer_probe_map
+    global _pfp_kmer_probe_map_probes
+    global _pfp_kmer_probe_map_native_probe_ids
     global _pfp_kmer_probe_map_k
     global _pfp_kmer_probe_map_native
     global _pfp_kmer_probe_map_use_native
+    global _pfp_kmer_probe_map_both_strands
+    global _pfp_shm
+    global _pfp_worker_handle
 
     pfp_is_open = False
     try:
@@ -917,85 +2607,421 @@ def close_probe_finding_pool():
 
     del _pfp_cover_range_for_probe_in_subsequence_fn
 
-    del _pfp_kmer_probe_map_keys
-    del _pfp_kmer_probe_map_probe_seqs_ind
-    del _pfp_kmer_probe_map_probe_pos
-    del _pfp_kmer_probe_map_probe_seqs
-    del _pfp_kmer_probe_map_probe_seqs_to_probe
+    del _pfp_kmer_probe_map
+    del _pfp_kmer_probe_map_probes
+    del _pfp_kmer_probe_map_native_probe_ids
     del _pfp_kmer_probe_map_k
     del _pfp_kmer_probe_map_native
     del _pfp_kmer_probe_map_use_native
+    del _pfp_kmer_probe_map_both_strands
+    _reset_verify_cache(_pfp_verify_cache_params)
+
+    if _pfp_shm is not None:
+        # The pool is the persistent pool, which is left running; the
+        # workers hold on to their mapping of the block until they attach
+        # to another one, but its name is removed now
+        _pfp_shm.close()
+        _pfp_shm.unlink()
+    elif _pfp_work_was_submitted:
+        # In Python versions earlier than 2.7.3 there is a bug (see
+        # http://bugs.python.org/issue12157) that occurs if a pool p is
+        # created and p.join() is called, but p.map() is never called (i.e.,
+        # no work is submitted to the processes in the pool); the bug
+        # causes p.join() to sometimes hang indefinitely.
+        # That could happen here if a probe finding pool is opened/closed
+        # but find_probe_covers_in_sequence() is never called; the variable
+        # _pfp_work_was_submitted ensures that join() is only called on
+        # the pool if work was indeed submitted.
+        # Similarly, when no work is submitted, a call to p.close() may yield
+        # a RuntimeError that is printed but ignored; so only call close()
+        # when work was indeed submitted.
+        _shutdown_pool(_pfp_pool)
+
+    del _pfp_shm
+    del _pfp_worker_handle
+    del _pfp_pool
+    _pfp_is_open = False
+    del _pfp_work_was_submitted
+
+    gc.collect()
+    logger.debug("Successfully closed the probe finding pool")
+
+
+# In a worker of the persistent pool, the shared memory block holding the
+# kmer_probe_map that the worker is attached to (if any)
+_pfp_worker_shm = None
+
+# In a worker, the cache of verification outcomes (see
+# set_verify_cache_for_probe_finding_pools()), which is made when first
+# needed, and the parameters (max_size, eviction) with which to make it
+_pfp_worker_verify_cache = None
+_pfp_worker_verify_cache_params = (0, 'lru')
+
+
+def _reset_verify_cache(params):
+    """Drop the cache of verification outcomes in this process.
+
+    Args:
+        params: tuple (max_size, eviction) with which to make the next
+            cache
+    """
+    global _pfp_worker_verify_cache
+    global _pfp_worker_verify_cache_params
+    _pfp_worker_verify_cache = None
+    _pfp_worker_verify_cache_params = params
+
+
+def _worker_verify_cache():
+    """Return the cache of verification outcomes in this process.
+
+    Returns:
+        instance of utils.bounded_cache.BoundedCache, or None if there
+        is to be no cache
+    """
+    global _pfp_worker_verify_cache
+    max_size, eviction = _pfp_worker_verify_cache_params
+    if max_size == 0:
+        return None
+    if _pfp_worker_verify_cache is None:
+        _pfp_worker_verify_cache = bounded_cache.BoundedCache(
+            max_size, eviction=eviction)
+    return _pfp_worker_verify_cache
 
-    # In Python versions earlier than 2.7.3 there is a bug (see
-    # http://bugs.python.org/issue12157) that occurs if a pool p is
-    # created and p.join() is called, but p.map() is never called (i.e.,
-    # no work is submitted to the processes in the pool); the bug
-    # causes p.join() to sometimes hang indefinitely.
-    # That could happen here if a probe finding pool is opened/closed
-    # but find_probe_covers_in_sequence() is never called; the variable
-    # _pfp_work_was_submitted ensures that join() is only called on
-    # the pool if work was indeed submitted.
-    # Similarly, when no work is submitted, a call to p.close() may yield
-    # a RuntimeError that is printed but ignored; so only call close()
-    # when work was indeed submitted.
-    if _pfp_work_was_submitted:
-        _pfp_pool.close()
-        # Due to issues that likely stem from bugs in the multiprocessing
-        # module, calls to _pfp_pool.terminate() and _pfp_pool.join()
-        # sometimes hang indefinitely (even when work was indeed submitted
-        # to the processes). So make a best effort in calling these functions
-        # -- i.e., use a timeout around calls to these functions
+
+def _attach_worker_to_kmer_probe_map(handle):
+    """Set, in a worker of the persistent pool, the globals for scanning.
+
+    This sets the globals that _find_probe_covers_in_subsequence() reads
+    -- attaching to the shared memory block holding kmer_probe_map if the
+    worker is not already attached to it.
+
+    Args:
+        handle: dict giving kmer_probe_map, as output by
+            SharedKmerProbeMap.to_shared_memory(), along with the cover
+            function (key 'cover_fn'), as output by _cover_fn_for_workers()
+    """
+    global _pfp_worker_shm
+    global _pfp_cover_range_for_probe_in_subsequence_fn
+    global _pfp_kmer_probe_map
+    global _pfp_kmer_probe_map_k
+    global _pfp_kmer_probe_map_use_native
+
+    if _pfp_worker_shm is not None and _pfp_worker_shm.name == handle['name']:
+        return
+
+    if _pfp_worker_shm is not None:
+        # Detach from the previous block; the map referring to it must
+        # be dropped first
+        _pfp_kmer_probe_map = None
         try:
-            with timeout.time_limit(60):
-                _pfp_pool.terminate()
-        except timeout.TimeoutException:
-            # Ignore the timeout
-            # If _pfp_pool.terminate() or _pfp_pool.join() fails this will
-            # not affect correctness and will not necessarily prevent
-            # additional pools from being created, so let the program continue
-            # to execute because it will generally be able to keep making
-            # progress
-            logger.debug(("Terminating the probe finding pool timed out; "
-                          "ignoring"))
-            pass
-        except:
-            # _pfp_pool.terminate() occassionally raises another exception
-            # (NoneType) if it tries to terminate a process that has already
-            # been terminated; ignoring that exception should not affect
-            # correctness or prevent additional pools from being created, so
-            # is better to ignore it than to let the exception crash the
-            # program
+            _pfp_worker_shm.close()
+        except BufferError:
+            # Something still refers to the block; it will be unmapped
+            # when that is collected
             pass
+    _pfp_worker_shm, _pfp_kmer_probe_map = \
+        SharedKmerProbeMap.from_shared_memory(handle)
+    _pfp_kmer_probe_map_k = _pfp_kmer_probe_map.k
+    _pfp_kmer_probe_map_use_native = False
+    _reset_verify_cache(handle['verify_cache'])
+
+    kind, value = handle['cover_fn']
+    if kind == 'lcf':
+        _pfp_cover_range_for_probe_in_subsequence_fn = \
+            probe_covers_sequence_by_longest_common_substring(*value)
+    elif kind == 'lcf_settings':
+        _pfp_cover_range_for_probe_in_subsequence_fn = \
+            probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                value)
+    else:
+        _pfp_cover_range_for_probe_in_subsequence_fn = value
+
+
+# In a worker, the shared memory block holding the SharedSequenceCollection
+# that the worker is attached to (if any), and that collection
+_pfp_worker_sequences_shm = None
+_pfp_worker_sequences = None
 
+
+def _attach_worker_to_sequences(sequences_handle):
+    """Attach, in a worker, to a collection of sequences to scan.
+
+    Args:
+        sequences_handle: dict output by
+            SharedSequenceCollection.to_shared_memory()
+
+    Returns:
+        instance of SharedSequenceCollection in shared memory
+    """
+    global _pfp_worker_sequences_shm
+    global _pfp_worker_sequences
+
+    if (_pfp_worker_sequences_shm is not None and
+            _pfp_worker_sequences_shm.name == sequences_handle['name']):
+        return _pfp_worker_sequences
+
+    if _pfp_worker_sequences_shm is not None:
+        # Detach from the previous block; the collection referring to it
+        # must be dropped first
+        _pfp_worker_sequences = None
         try:
-            with timeout.time_limit(60):
-                _pfp_pool.join()
-        except timeout.TimeoutException:
-            # Ignore the timeout
-            # If _pfp_pool.terminate() or _pfp_pool.join() fails this will
-            # not affect correctness and will not necessarily prevent
-            # additional pools from being created, so let the program continue
-            # to execute because it will generally be able to keep making
-            # progress
-            logger.debug(("Joining the probe finding pool timed out; "
-                          "ignoring"))
-            pass
-        except:
-            # Ignore any additional exception from _pfp_pool.join() rather
-            # than letting it crash the program
+            _pfp_worker_sequences_shm.close()
+        except BufferError:
             pass
+    _pfp_worker_sequences_shm, _pfp_worker_sequences = \
+        SharedSequenceCollection.from_shared_memory(sequences_handle)
+    return _pfp_worker_sequences
 
-    del _pfp_pool
-    _pfp_is_open = False
-    del _pfp_work_was_submitted
 
-    gc.collect()
-    logger.debug("Successfully closed the probe finding pool")
+def _find_probe_covers_in_pieces(task, handle=None, merge_overlapping=True,
+                                 per_hit=False):
+    """Helper function for find_probe_covers_in_sequence(s)().
+
+    This is run by the workers. The sequences to scan are not sent with
+    the task; they are read, without being copied, from a
+    SharedSequenceCollection in shared memory.
+
+    Args:
+        task: tuple (sequences_handle, pieces) where sequences_handle is
+            the dict output by SharedSequenceCollection.to_shared_memory(),
+            along with the id of its first sequence (key 'first_id'), and
+            pieces is a list of tuples (seq_id, start, end), each giving
+            a sequence and the k-mers in it to scan (see the argument
+            bounds of _find_probe_covers_in_subsequence()); or None,
+            which is a NO-OP
+        handle: when the workers are those of the persistent pool, a dict
+            giving kmer_probe_map and the cover function (see
+            _attach_worker_to_kmer_probe_map()); otherwise, None
+        merge_overlapping/per_hit: see _find_probe_covers_in_subsequence()
+
+    Returns:
+        list of tuples (seq_id, output of
+        _find_probe_covers_in_subsequence()), one for each piece
+    """
+    if task is None:
+        return []
+    sequences_handle, pieces = task
+    if handle is not None:
+        _attach_worker_to_kmer_probe_map(handle)
+    sequences = _attach_worker_to_sequences(sequences_handle)
+
+    results = []
+    for seq_id, start, end in pieces:
+        sequence = sequences.sequence_chars(
+            seq_id - sequences_handle['first_id'])
+        results += [(seq_id, _find_probe_covers_in_subsequence(
+            (start, end), sequence, merge_overlapping=merge_overlapping,
+            per_hit=per_hit))]
+    return results
+
+
+# Number of k-mers to scan at once when computing rolling keys in
+# _find_probe_covers_in_subsequence()
+_SCAN_BLOCK_SIZE = 1000000
+
+# Number of k-mer hits to verify at once in _lcf_cover_ranges_of_hits()
+_VERIFY_BATCH_SIZE = 10000
+
+
+def _lcf_cover_ranges_of_hits(kmer_probe_map, sequence_chars,
+                              sequence_chars_start, sequence_len,
+                              hit_pos, hit_probe_ids, hit_probe_pos,
+                              mismatches, lcf_thres, island_of_exact_match):
+    """Determine, in one batch, the ranges that probes cover around hits.
+
+    This gives the same result as calling, for each hit, the function
+    returned by probe_covers_sequence_by_longest_common_substring() with
+    the probe aligned to the sequence at the hit (as done in
+    _find_probe_covers_in_subsequence()). But rather than building the
+    probe and subsequence as arrays and computing the longest common
+    substring one hit at a time, it gathers the aligned probe and
+    subsequence of all the hits into 2D uint8 arrays and computes the
+    longest common substrings with vectorized operations.
+
+    Args:
+        kmer_probe_map: instance of SharedKmerProbeMap
+        sequence_chars: numpy array (uint8) of the characters of the
+            sequence, or of a part of it that includes every base that
+            a probe aligned at a hit may overlap
+        sequence_chars_start: position in the sequence of
+            sequence_chars[0]
+        sequence_len: length of the full sequence
+        hit_pos/hit_probe_ids/hit_probe_pos: numpy arrays, as output by
+            SharedKmerProbeMap.find_hits(), giving the k-mer hits
+        mismatches/lcf_thres/island_of_exact_match: parameters to
+            probe_covers_sequence_by_longest_common_substring()
+
+    Returns:
+        tuple (probe_ids, cover_start, cover_end) of numpy arrays such
+        that, for each i, the probe with id probe_ids[i] covers the range
+        [cover_start[i], cover_end[i]) of the sequence; hits at which the
+        probe does not cover the sequence are omitted
+    """
+    return _lcf_cover_ranges_of_hits_for_each_setting(
+        kmer_probe_map, sequence_chars, sequence_chars_start, sequence_len,
+        hit_pos, hit_probe_ids, hit_probe_pos,
+        [(mismatches, lcf_thres, island_of_exact_match)])[0]
+
+
+def _lcf_cover_ranges_of_hits_for_each_setting(kmer_probe_map,
+                                               sequence_chars,
+                                               sequence_chars_start,
+                                               sequence_len,
+                                               hit_pos, hit_probe_ids,
+                                               hit_probe_pos, settings,
+                                               verify_cache=None,
+                                               with_hits=False):
+    """Determine, in one batch, the ranges that probes cover for settings.
+
+    This gives the same output as calling _lcf_cover_ranges_of_hits()
+    with each setting, but aligns the probes at the hits, and finds the
+    mismatches around each hit, only once.
+
+    The longest common substrings at a hit depend only on the probe, its
+    alignment (the position of the hit in the probe, and how much of the
+    probe is clipped by the start of the sequence), and the bases of the
+    sequence that the probe overlaps (the target window). When
+    verify_cache is given, they are looked up in it by these, and only
+    computed for the hits not found; those are then added to it.
+
+    Args:
+        kmer_probe_map/sequence_chars/sequence_chars_start/sequence_len/
+            hit_pos/hit_probe_ids/hit_probe_pos: see
+            _lcf_cover_ranges_of_hits()
+        settings: list of tuples (mismatches, lcf_thres,
+            island_of_exact_match), each giving parameters to
+            probe_covers_sequence_by_longest_common_substring()
+        verify_cache: if set, instance of utils.bounded_cache.BoundedCache
+            holding, for earlier hits, the longest common substrings
+            computed for them; settings must be the same for every call
+            given the same cache
+        with_hits: if True, each output also gives the hits at which the
+            probes cover the sequence
+
+    Returns:
+        list x in which x[i] is the output of _lcf_cover_ranges_of_hits()
+        with the parameters in settings[i]; if with_hits is True, x[i]
+        has a fourth array, giving the index (in hit_pos) of the hit at
+        which each range is covered
+    """
+    k = kmer_probe_map.k
+    probe_start = kmer_probe_map.probe_seqs_offsets[hit_probe_ids]
+    probe_len = (kmer_probe_map.probe_seqs_offsets[hit_probe_ids + 1] -
+                 probe_start)
+
+    # Align each probe to the sequence at its hit, and clip it to the
+    # ends of the sequence
+    align_pos = hit_pos - hit_probe_pos
+    subseq_left = np.maximum(0, align_pos)
+    subseq_right = np.minimum(sequence_len, align_pos + probe_len)
+    subseq_len = subseq_right - subseq_left
+    anchor_start = hit_pos - subseq_left
+    anchor_end = anchor_start + kmer_probe_map.anchor_len
+
+    # Gather the aligned probe and subsequence of each hit into rows;
+    # columns past the end of a row are filled with the row's first
+    # character, and are ignored in computing the longest common substring
+    cols = np.arange(np.max(subseq_len))
+    in_row = cols < subseq_len[:, np.newaxis]
+    seq_idx = np.where(in_row, subseq_left[:, np.newaxis] + cols,
+                       subseq_left[:, np.newaxis]) - sequence_chars_start
+    b = sequence_chars[seq_idx]
+    # Number of bases of each probe clipped by the start of the sequence
+    probe_clip = subseq_left - align_pos
+
+    # The longest common substrings are needed for each number of
+    # mismatches that the settings need (0 is needed for an island of
+    # exact match)
+    ks = sorted(set([mismatches for mismatches, _, _ in settings] +
+                    [0 for _, _, island_of_exact_match in settings
+                     if island_of_exact_match > 0]))
+
+    def compute_lcf(rows):
+        # Compute, for the hits selected by rows, the output of
+        # k_lcf_around_anchors_for_each_k()
+        probe_idx = np.where(in_row[rows], cols, 0) + (
+            probe_start[rows] + probe_clip[rows])[:, np.newaxis]
+        a = kmer_probe_map.probe_seqs[probe_idx]
+        return longest_common_substring.k_lcf_around_anchors_for_each_k(
+            a, b[rows], subseq_len[rows], anchor_start[rows],
+            anchor_end[rows], ks)
+
+    if verify_cache is None:
+        lcf_by_k = dict(zip(ks, compute_lcf(slice(None))))
+    else:
+        # Key each hit by its probe, alignment, and target window
+        row_bytes = b.tobytes()
+        num_cols = b.shape[1]
+        keys = [(probe_id, probe_pos, clip,
+                 row_bytes[(row * num_cols):(row * num_cols + length)])
+                for row, (probe_id, probe_pos, clip, length) in enumerate(
+                    zip(hit_probe_ids.tolist(), hit_probe_pos.tolist(),
+                        probe_clip.tolist(), subseq_len.tolist()))]
+        cached = verify_cache.get_many(keys)
+        is_miss = np.array([c is None for c in cached], dtype=bool)
+
+        # Columns of lcf give, for each k in ks, the length and start of
+        # the longest common substring
+        lcf = np.empty((len(keys), 2 * len(ks)), dtype=np.int64)
+        if not np.all(is_miss):
+            lcf[~is_miss] = [c for c in cached if c is not None]
+        if np.any(is_miss):
+            computed = np.column_stack([x for l_and_start in
+                                        compute_lcf(is_miss)
+                                        for x in l_and_start])
+            lcf[is_miss] = computed
+            verify_cache.put_many(
+                [key for key, c in zip(keys, cached) if c is None],
+                [tuple(row) for row in computed.tolist()])
+        lcf_by_k = {k: (lcf[:, 2 * i], lcf[:, 2 * i + 1])
+                    for i, k in enumerate(ks)}
+
+    results = []
+    for mismatches, lcf_thres, island_of_exact_match in settings:
+        l, cover_start = lcf_by_k[mismatches]
+        covers = l >= np.minimum(np.minimum(lcf_thres, probe_len),
+                                 sequence_len)
+        if island_of_exact_match > 0:
+            exact_match_l, _ = lcf_by_k[0]
+            covers &= exact_match_l >= island_of_exact_match
+
+        cover_start = cover_start[covers] + subseq_left[covers]
+        result = (hit_probe_ids[covers], cover_start,
+                  cover_start + l[covers])
+        if with_hits:
+            result += (np.flatnonzero(covers),)
+        results += [result]
+    return results
+
+
+def _pack_covers(*rows):
+    """Pack cover ranges into one compact array.
+
+    The output of a worker is pickled and sent back to the main process;
+    one int32 array is far smaller, and faster to pickle, than a dict of
+    lists of tuples, or three int64 arrays.
+
+    Args:
+        rows: numpy arrays of the same length giving the cover ranges,
+            e.g., probe_ids, starts, and ends such that, for each i, the
+            probe with id probe_ids[i] covers [starts[i], ends[i])
+
+    Returns:
+        numpy array of shape (len(rows), len(rows[0])) whose rows are
+        those given; its dtype is int32 unless a value does not fit, in
+        which case it is int64
+    """
+    covers = np.vstack(rows)
+    if covers.size == 0 or (covers.min() >= -2**31 and
+                            covers.max() < 2**31):
+        return covers.astype(np.int32)
+    return covers.astype(np.int64)
 
 
 def _find_probe_covers_in_subsequence(bounds,
                                       sequence,
-                                      merge_overlapping=True):
+                                      merge_overlapping=True,
+                                      per_hit=False):
     """Helper function for find_probe_covers_in_sequence().
 
     Scans through a subsequence of sequence, as specified by bounds, and
@@ -1006,26 +3032,52 @@ def _find_probe_covers_in_subsequence(bounds,
             in sequence beginning with the k-mer whose first base is
             at start and ending with the k-mer whose first base is at
             end-1
-        sequence: sequence (as a string) in which to find ranges that
-            probes cover
+        sequence: sequence in which to find ranges that probes cover, as
+            a string or as a numpy array (uint8) of its characters (e.g.,
+            a view of a SharedSequenceCollection in shared memory)
         merge_overlapping: when True, merges overlapping ranges into
             a single range and returns the ranges in sorted order; when
             False, intervals returned may be overlapping (e.g., if a
             probe covers two regions that overlap)
+        per_hit: when True, rather than merging the ranges of each probe,
+            output each range along with the alignment of the probe at
+            the hit where it is covered (see below); this requires the
+            cover function to be one returned by
+            probe_covers_sequence_by_longest_common_substring() or
+            probe_covers_sequence_by_longest_common_substring_for_each_setting(),
+            and the k-mer probe map to not use its native dict or index
+            reverse complements
 
     Returns:
-        dict mapping probe sequences (as strings) to the set of ranges
-        (each range is a tuple of the form (start, end)) that each probe
-        "covers" in the scanned subsequence
+        numpy array c, of shape (3, number of ranges), giving the ranges
+        that probes "cover" in the scanned subsequence: for each i, the
+        probe with id c[0, i] in the k-mer probe map covers
+        [c[1, i], c[2, i]) (see _pack_covers()). The ranges are sorted by
+        probe id and then by range and, if merge_overlapping is True, the
+        overlapping ranges of each probe are merged. If the k-mer probe map
+        indexes reverse complements, this is instead a tuple (f, r) where
+        f is such an array and r is such an array giving ranges that probes
+        cover in the reverse complement of sequence (with positions in the
+        reverse complement). If the cover function was returned by
+        probe_covers_sequence_by_longest_common_substring_for_each_setting(),
+        this is a list with such an output for each setting. (When bounds
+        is None, this is {} regardless.) If per_hit is True, c instead has
+        shape (4, number of ranges) and, for each i, the probe with id
+        c[0, i], with its first base aligned to position c[1, i] of
+        sequence (which may be negative, if the probe extends past the
+        start of sequence), covers [c[2, i], c[3, i]); there is one such
+        column for each distinct tuple of these among the hits, sorted
+        by the rows in order.
+
+    Raises:
+        ValueError if per_hit is True and the cover function or k-mer
+        probe map does not allow it
     """
     if bounds is None:
         return {}
 
     global _pfp_cover_range_for_probe_in_subsequence_fn
-    global _pfp_kmer_probe_map_keys
-    global _pfp_kmer_probe_map_probe_seqs_ind
-    global _pfp_kmer_probe_map_probe_pos
-    global _pfp_kmer_probe_map_probe_seqs
+    global _pfp_kmer_probe_map
     global _pfp_kmer_probe_map_k
     global _pfp_kmer_probe_map_use_native
 
@@ -1033,36 +3085,223 @@ def _find_probe_covers_in_subsequence(bounds,
         global _pfp_kmer_probe_map_native
         shared_kmer_probe_map = _pfp_kmer_probe_map_native
     else:
-        shared_kmer_probe_map = SharedKmerProbeMap(
-            _pfp_kmer_probe_map_keys,
-            _pfp_kmer_probe_map_probe_seqs_ind,
-            _pfp_kmer_probe_map_probe_pos,
-            _pfp_kmer_probe_map_probe_seqs,
-            _pfp_kmer_probe_map_k,
-            None,
-            None)
+        # Make a fresh view so that probe sequences memoized while scanning
+        # this subsequence do not accumulate in the worker process
+        shared_kmer_probe_map = _pfp_kmer_probe_map.shared_view()
     k = _pfp_kmer_probe_map_k
-    # Each time a probe is found to cover a range of sequence,
-    # add that range, as a tuple, to the probe's entry in
-    # subseq_probe_cover_ranges
     start, end = bounds
-    subseq_probe_cover_ranges = defaultdict(list)
-    for i in range(start, end):
-        kmer = sequence[i:(i + k)]
-        # Find the probes with this kmer (with the potential to miss
-        # some probes due to false negatives)
-        probes_to_align = shared_kmer_probe_map.get(kmer)
-        if probes_to_align is None:
-            # No probes (from kmer_probe_map) share this kmer
-            continue
-        for probe_seq_str, pos in probes_to_align:
+
+    # The bases at a hit that match exactly, around which a probe's cover
+    # is found (only the first base for a spaced seed)
+    if _pfp_kmer_probe_map_use_native:
+        anchor_len = k
+    else:
+        anchor_len = shared_kmer_probe_map.anchor_len
+
+    # When the map indexes reverse complements, hits to the reverse
+    # complement of a probe p are found while scanning sequence; each is
+    # equivalent to a hit of p to the reverse complement of sequence, and
+    # is verified as such so that the output is the same as scanning the
+    # reverse complement of sequence
+    if _pfp_kmer_probe_map_use_native:
+        num_forward_probes = None
+    else:
+        num_forward_probes = shared_kmer_probe_map.num_forward_probes
+    num_strands = 1 if num_forward_probes is None else 2
+    rc_sequence = None
+
+    def iter_hits():
+        # Yield tuples (i, probe_id, probe_seq_str, pos, rc) such that the
+        # k-mer starting at position i of sequence (if rc is False) or of
+        # its reverse complement (if rc is True) appears at position pos
+        # of the probe whose id is probe_id and whose sequence is
+        # probe_seq_str
+        if _pfp_kmer_probe_map_use_native:
+            global _pfp_kmer_probe_map_native_probe_ids
+            for i in range(start, end):
+                kmer = sequence[i:(i + k)]
+                # Find the probes with this kmer (with the potential to
+                # miss some probes due to false negatives)
+                probes_to_align = shared_kmer_probe_map.get(kmer)
+                if probes_to_align is None:
+                    # No probes (from kmer_probe_map) share this kmer
+                    continue
+                for probe_seq_str, pos in probes_to_align:
+                    yield (i, _pfp_kmer_probe_map_native_probe_ids[
+                               probe_seq_str], probe_seq_str, pos, False)
+        else:
+            # Scan in blocks so that the arrays holding the rolling keys
+            # stay small for long subsequences
+            for block_start in range(start, end, _SCAN_BLOCK_SIZE):
+                block_end = min(end, block_start + _SCAN_BLOCK_SIZE)
+                hit_pos, hit_probe_ids, hit_probe_pos = \
+                    shared_kmer_probe_map.find_hits(sequence, block_start,
+                                                    block_end)
+                for i, probe_id, pos in zip(hit_pos.tolist(),
+                                            hit_probe_ids.tolist(),
+                                            hit_probe_pos.tolist()):
+                    if (num_forward_probes is not None and
+                            probe_id >= num_forward_probes):
+                        # Mirror the hit onto the reverse complement
+                        probe_id -= num_forward_probes
+                        probe_seq_str = shared_kmer_probe_map.probe_seq(
+                            probe_id)
+                        yield (len(sequence) - i - k, probe_id, probe_seq_str,
+                               len(probe_seq_str) - pos - k, True)
+                    else:
+                        yield (i, probe_id,
+                               shared_kmer_probe_map.probe_seq(probe_id),
+                               pos, False)
+
+    scan_start_time = time.time()
+
+    # The cover function returned by
+    # probe_covers_sequence_by_longest_common_substring_for_each_setting()
+    # determines coverage for multiple settings at once, and gives a
+    # cover range (or None) for each
+    lcf_settings = getattr(_pfp_cover_range_for_probe_in_subsequence_fn,
+                           'lcf_settings', None)
+    num_settings = len(lcf_settings) if lcf_settings is not None else 1
+
+    # Each time a probe is found to cover a range of sequence (or its
+    # reverse complement), add that range, keyed by the probe's id, to an
+    # accumulator for each setting and strand; the accumulator extends
+    # the probe's last range when the new one overlaps it, and otherwise
+    # merges ranges lazily (once per block of the scan)
+    accumulators_by_setting = [
+        [interval.IntervalAccumulator(merge_overlapping=merge_overlapping)
+         for _ in range(num_strands)]
+        for _ in range(num_settings)]
+
+    # The cover functions returned by
+    # probe_covers_sequence_by_longest_common_substring() and
+    # probe_covers_sequence_by_longest_common_substring_for_each_setting()
+    # carry their parameters; with these, the hits can be verified in
+    # vectorized batches rather than one at a time
+    lcf_params = getattr(_pfp_cover_range_for_probe_in_subsequence_fn,
+                         'lcf_params', None)
+    if lcf_params is not None:
+        lcf_settings_to_verify = [lcf_params]
+    else:
+        lcf_settings_to_verify = lcf_settings
+    if per_hit and (lcf_settings_to_verify is None or
+                    _pfp_kmer_probe_map_use_native or num_strands == 2):
+        raise ValueError(("Cover ranges can only be output per hit when "
+                          "verifying hits in batches on one strand"))
+
+    # When per_hit is True, for each setting, a list of arrays giving the
+    # probe id, alignment, and cover range of each hit at which a probe
+    # covers sequence
+    hits_by_setting = [[] for _ in range(num_settings)]
+
+    if (lcf_settings_to_verify is not None and
+            not _pfp_kmer_probe_map_use_native):
+        # Encode the part of sequence that a probe aligned at a hit
+        # may overlap
+        probe_seqs_offsets = shared_kmer_probe_map.probe_seqs_offsets
+        if len(probe_seqs_offsets) > 1:
+            max_probe_len = int(np.max(np.diff(probe_seqs_offsets)))
+        else:
+            max_probe_len = 0
+        chars_start = max(0, start - max_probe_len)
+        chars_end = min(len(sequence), end + k - 1 + max_probe_len)
+        sequence_chars = _sequence_chars(sequence, chars_start, chars_end)
+        if num_strands == 2:
+            # The same part of the reverse complement of sequence
+            rc_table = np.frombuffer(_RC_TRANS_TABLE, dtype=np.uint8)
+            rc_sequence_chars = rc_table[sequence_chars[::-1]]
+            rc_chars_start = len(sequence) - chars_end
+
+        # Outcomes of verifying hits, kept across calls in this process
+        verify_cache = _worker_verify_cache()
+
+        def add_covers(covers_by_setting, rc):
+            for accumulators, (probe_ids, cover_starts, cover_ends) in zip(
+                    accumulators_by_setting, covers_by_setting):
+                accumulators[rc].add_arrays(probe_ids, cover_starts,
+                                            cover_ends)
+
+        for block_start in range(start, end, _SCAN_BLOCK_SIZE):
+            block_end = min(end, block_start + _SCAN_BLOCK_SIZE)
+            hit_pos, hit_probe_ids, hit_probe_pos = \
+                shared_kmer_probe_map.find_hits(sequence, block_start,
+                                                block_end)
+            for batch_start in range(0, len(hit_pos), _VERIFY_BATCH_SIZE):
+                batch = slice(batch_start, batch_start + _VERIFY_BATCH_SIZE)
+                batch_pos = hit_pos[batch]
+                batch_probe_ids = hit_probe_ids[batch]
+                batch_probe_pos = hit_probe_pos[batch]
+                if num_strands == 2:
+                    is_rc = batch_probe_ids >= num_forward_probes
+                    if np.any(is_rc):
+                        # Mirror the hits to reverse complements of probes
+                        # onto the reverse complement of sequence
+                        rc_probe_ids = (batch_probe_ids[is_rc] -
+                                        num_forward_probes)
+                        rc_probe_len = (
+                            probe_seqs_offsets[rc_probe_ids + 1] -
+                            probe_seqs_offsets[rc_probe_ids])
+                        add_covers(_lcf_cover_ranges_of_hits_for_each_setting(
+                                       shared_kmer_probe_map,
+                                       rc_sequence_chars, rc_chars_start,
+                                       len(sequence),
+                                       len(sequence) - batch_pos[is_rc] - k,
+                                       rc_probe_ids,
+                                       (rc_probe_len -
+                                        batch_probe_pos[is_rc] - k),
+                                       lcf_settings_to_verify,
+                                       verify_cache=verify_cache),
+                                   1)
+                    batch_pos = batch_pos[~is_rc]
+                    batch_probe_ids = batch_probe_ids[~is_rc]
+                    batch_probe_pos = batch_probe_pos[~is_rc]
+                if len(batch_pos) > 0:
+                    covers_by_setting = \
+                        _lcf_cover_ranges_of_hits_for_each_setting(
+                            shared_kmer_probe_map, sequence_chars,
+                            chars_start, len(sequence), batch_pos,
+                            batch_probe_ids, batch_probe_pos,
+                            lcf_settings_to_verify,
+                            verify_cache=verify_cache, with_hits=per_hit)
+                    if per_hit:
+                        batch_align = batch_pos - batch_probe_pos
+                        for hits, (probe_ids, cover_starts, cover_ends,
+                                   hit_idx) in zip(hits_by_setting,
+                                                   covers_by_setting):
+                            hits += [np.vstack((probe_ids,
+                                                batch_align[hit_idx],
+                                                cover_starts, cover_ends))]
+                    else:
+                        add_covers(covers_by_setting, 0)
+            # Merge the cover ranges found in this block, to save memory
+            # (they are merged across processes at the end of
+            # find_probe_covers_in_sequence() regardless)
+            for accumulators in accumulators_by_setting:
+                for accumulator in accumulators:
+                    accumulator.merge()
+    else:
+        if not isinstance(sequence, str):
+            # The hits are verified one at a time, slicing sequence as a
+            # string
+            sequence = sequence.tobytes().decode()
+        for i, probe_id, probe_seq_str, pos, rc in iter_hits():
+            if rc:
+                # The hit is to the reverse complement of sequence, which
+                # is only built if needed
+                if rc_sequence is None:
+                    rc_sequence = sequence.translate(
+                        _RC_STR_TRANS_TABLE)[::-1]
+                target_sequence = rc_sequence
+            else:
+                target_sequence = sequence
             # kmer appears in probe at position pos. So align probe
             # to sequence at i-pos and see how much of the subsequence
             # starting here the probe covers.
             probe_seq_full = np.fromiter(probe_seq_str, dtype='U1')
             subseq_left = max(0, i - pos)
-            subseq_right = min(len(sequence), i - pos + len(probe_seq_full))
-            subsequence = sequence[subseq_left:subseq_right]
+            subseq_right = min(len(target_sequence),
+                               i - pos + len(probe_seq_full))
+            subsequence = target_sequence[subseq_left:subseq_right]
             if i - pos < 0:
                 # An edge case where probe is cutoff on left end because it
                 # extends further left than where sequence begins
@@ -1071,44 +3310,86 @@ def _find_probe_covers_in_subsequence(bounds,
                 # position in probe_seq (equivalently its position in
                 # subsequence, which is i)
                 kmer_start = pos + (i - pos)
-            elif i - pos + len(probe_seq_full) > len(sequence):
+            elif i - pos + len(probe_seq_full) > len(target_sequence):
                 # An edge case where probe is cutoff on right end because it
                 # extends further right than where sequence ends
                 probe_seq = probe_seq_full[:-(i - pos + len(probe_seq_full) -
-                                            len(sequence))]
+                                            len(target_sequence))]
                 kmer_start = pos
             else:
                 probe_seq = probe_seq_full
                 kmer_start = pos
             cover_range = \
                 _pfp_cover_range_for_probe_in_subsequence_fn(
-                    probe_seq, subsequence, kmer_start, kmer_start + k,
-                    len(probe_seq_full), len(sequence))
-            if cover_range is None:
-                # probe does not meet the threshold for covering this
-                # subsequence
-                continue
-            cover_start, cover_end = cover_range
-            # cover_start and cover_end are relative to subsequence, so
-            # adjust these to be relative to sequence
-            cover_start += subseq_left
-            cover_end += subseq_left
-            subseq_probe_cover_ranges[probe_seq_str].append(
-                (cover_start, cover_end))
-            if merge_overlapping:
-                # Save some memory in each process by merging cover ranges,
-                # since many found by this method will overlap
-                # (This is not necessary because all the cover ranges for
-                # each probe will be merged across processes at the end of
-                # find_probe_covers_in_sequence(), but it can save
-                # considerable memory before that final merge.)
-                subseq_probe_cover_ranges[probe_seq_str] = interval.\
-                    merge_overlapping(subseq_probe_cover_ranges[probe_seq_str])
-    return dict(subseq_probe_cover_ranges)
+                    probe_seq, subsequence, kmer_start,
+                    kmer_start + anchor_len,
+                    len(probe_seq_full), len(target_sequence))
+            if lcf_settings is not None:
+                cover_range_by_setting = cover_range
+            else:
+                cover_range_by_setting = [cover_range]
+            for accumulators, cover_range in zip(accumulators_by_setting,
+                                                 cover_range_by_setting):
+                if cover_range is None:
+                    # probe does not meet the threshold for covering this
+                    # subsequence
+                    continue
+                cover_start, cover_end = cover_range
+                # cover_start and cover_end are relative to subsequence, so
+                # adjust these to be relative to the sequence (or its
+                # reverse complement)
+                cover_start += subseq_left
+                cover_end += subseq_left
+                # Many of the ranges found by this method overlap the
+                # probe's previous one, which the accumulator extends
+                accumulators[int(rc)].add(probe_id, cover_start, cover_end)
+
+    scan_time = time.time() - scan_start_time
+    if scan_time > 0:
+        logger.debug("Scanned %d bp in %.3f sec (%.0f bp/sec)",
+                     end - start, scan_time, (end - start) / scan_time)
+    if (not _pfp_kmer_probe_map_use_native and
+            shared_kmer_probe_map.prefilter is not None):
+        stats = shared_kmer_probe_map.prefilter_stats
+        logger.debug(("Prefilter passed %d of %d k-mers, of which %d are "
+                      "in the k-mer probe map"), stats['passed'],
+                     stats['queried'], stats['found'])
+    if (not _pfp_kmer_probe_map_use_native and
+            shared_kmer_probe_map.masked_keys is not None):
+        logger.debug("Skipped verifying %d hits of masked seeds",
+                     shared_kmer_probe_map.num_masked_hits_skipped)
+    if _pfp_worker_verify_cache is not None:
+        logger.debug(("Verification cache has had %d hits and %d misses "
+                      "(hit rate %.3f), and %d evictions"),
+                     _pfp_worker_verify_cache.hits,
+                     _pfp_worker_verify_cache.misses,
+                     _pfp_worker_verify_cache.hit_rate(),
+                     _pfp_worker_verify_cache.evictions)
+
+    if per_hit:
+        def output_hits(hits):
+            hits = np.concatenate([np.zeros((4, 0), dtype=np.int64)] + hits,
+                                  axis=1)
+            return _pack_covers(*np.unique(hits, axis=1))
+        if lcf_settings is not None:
+            return [output_hits(hits) for hits in hits_by_setting]
+        return output_hits(hits_by_setting[0])
+
+    def output(accumulators):
+        if num_strands == 2:
+            return tuple(_pack_covers(*accumulator.to_arrays())
+                         for accumulator in accumulators)
+        return _pack_covers(*accumulators[0].to_arrays())
+
+    if lcf_settings is not None:
+        return [output(accumulators)
+                for accumulators in accumulators_by_setting]
+    return output(accumulators_by_setting[0])
 
 
 def find_probe_covers_in_sequence(sequence,
-                                  merge_overlapping=True):
+                                  merge_overlapping=True,
+                                  as_arrays=False):
     """Find ranges in sequence that a collection of probes cover.
 
     This uses multiple processes to scan through sequence in parallel.
@@ -1117,7 +3398,10 @@ def find_probe_covers_in_sequence(sequence,
     arguments (like kmer_probe_map and cover_range_for_probe_in_sequence_fn)
     that the worker processes use in finding ranges that the probes cover.
     Those variables are made global in this module so that the worker
-    processes can access them without having to copy the memory.
+    processes can access them without having to copy the memory. Likewise,
+    sequence is placed in shared memory (see SharedSequenceCollection),
+    from which the processes read it, rather than being pickled and sent
+    to each of them.
 
     Probes are from the values of kmer_probe_map. A probe is said
     to "cover" (i.e., hybridize to) a region as determined by the
@@ -1162,10 +3446,27 @@ def find_probe_covers_in_sequence(sequence,
             a single range and returns the ranges in sorted order; when
             False, intervals returned may be overlapping (e.g., if a
             probe covers two regions that overlap)
+        as_arrays: when True, give the ranges as flat arrays rather than
+            as a dict keyed on probes, which avoids building a tuple for
+            every range
 
     Returns:
         dict mapping probes to the set of ranges (each range is a tuple
-        of the form (start, end)) that each probe "covers"
+        of the form (start, end)) that each probe "covers". If as_arrays
+        is True, this is instead a tuple (probe_ids, starts, ends) of
+        numpy arrays (int64) such that, for each i, the probe
+        kmer_probe_map.probes[probe_ids[i]] covers [starts[i], ends[i]),
+        where kmer_probe_map is the one given to open_probe_finding_pool();
+        the ranges are sorted by probe id and then by range. If the pool
+        was opened with a kmer_probe_map that indexes reverse complements
+        (see SharedKmerProbeMap.construct()), this is instead a tuple
+        (f, r) where f is such an output and r is such an output for the
+        reverse complement of sequence (i.e., r is what scanning the
+        reverse complement of sequence would give, with ranges relative
+        to it). If the pool was opened with a cover function returned by
+        probe_covers_sequence_by_longest_common_substring_for_each_setting(),
+        this is a list x in which x[i] is such an output for the i'th
+        setting
 
     Raises:
         RuntimeError if a pool for finding probes is not open; a pool
@@ -1175,8 +3476,8 @@ def find_probe_covers_in_sequence(sequence,
     global _pfp_is_open
     global _pfp_pool
     global _pfp_work_was_submitted
-    global _pfp_kmer_probe_map_probe_seqs_to_probe
     global _pfp_kmer_probe_map_k
+    global _pfp_worker_handle
 
     pfp_is_open = False
     try:
@@ -1190,12 +3491,20 @@ def find_probe_covers_in_sequence(sequence,
     k = _pfp_kmer_probe_map_k
 
     # Setup a function that the processes can execute; do this using
-    # functools.partial so that the created function (scan_subsequence)
-    # takes just the argument 'bounds' and all the other arguments to
-    # _find_probe_covers_in_subsequence are filled in
-    scan_subsequence = partial(_find_probe_covers_in_subsequence,
-                               sequence=sequence,
-                               merge_overlapping=merge_overlapping)
+    # functools.partial so that the created function (scan_pieces)
+    # takes just the argument 'task' and all the other arguments to
+    # _find_probe_covers_in_pieces are filled in (when the workers are
+    # those of the persistent pool, they also need the handle to
+    # kmer_probe_map)
+    scan_pieces = partial(_find_probe_covers_in_pieces,
+                          handle=_pfp_worker_handle,
+                          merge_overlapping=merge_overlapping)
+
+    # Place sequence in shared memory, from which the processes read it;
+    # each task only names the range of it to scan
+    shm, sequences_handle = SharedSequenceCollection.construct(
+        [sequence]).to_shared_memory()
+    sequences_handle['first_id'] = 0
 
     # Create bounds for each process
     # The first num_processes-1 processes should be given bounds
@@ -1203,50 +3512,450 @@ def find_probe_covers_in_sequence(sequence,
     # range to scan
     # (Rather than having processes that are never sent any work -- which
     # seems to sometimes cause trouble for a multiprocessing Pool -- send
-    # 'None' as the bounds for this process; the helper function
-    # _find_probe_covers_in_subsequence treats bounds='None' as a NO-OP)
+    # 'None' as the task for this process; the helper function
+    # _find_probe_covers_in_pieces treats task='None' as a NO-OP)
     num_processes = _pfp_pool._processes
     bounds_size = int((len(sequence) - k + 1) / num_processes + 1)
-    bounds_by_process = []
+    tasks = []
     for start in range(0, len(sequence) - k + 1, bounds_size):
         end = min(len(sequence) - k + 1, start + bounds_size)
-        bounds_by_process += [(start, end)]
-    while len(bounds_by_process) < num_processes:
-        bounds_by_process += [None]
+        tasks += [(sequences_handle, [(0, start, end)])]
+    while len(tasks) < num_processes:
+        tasks += [None]
 
     # Run the processes
     try:
         _pfp_work_was_submitted = True
-        all_subseq_probe_cover_ranges = _pfp_pool.map(scan_subsequence,
-                                                      bounds_by_process)
+        all_subseq_probe_cover_ranges = [
+            subseq_probe_cover_ranges
+            for results in _pfp_pool.map(scan_pieces, tasks)
+            for _, subseq_probe_cover_ranges in results]
     except KeyboardInterrupt:
         _pfp_pool.terminate()
         _pfp_pool.join()
+    finally:
+        # The processes hold on to their mapping of the block until they
+        # attach to another one, but its name is removed now
+        shm.close()
+        shm.unlink()
 
-    # Merge the outputs from the different processes. Namely:
-    # all_subseq_probe_cover_ranges is a list of dicts, where each
-    # dict is keyed on probe sequences and has values that are lists.
-    # Merge these to create one dict, keyed on probes, by concatenating
-    # all the lists (across the dicts) for each probe.
-    probe_cover_ranges = defaultdict(list)
-    for subseq_probe_cover_ranges in all_subseq_probe_cover_ranges:
-        for probe_seq, cover_ranges in subseq_probe_cover_ranges.items():
-            probe = _pfp_kmer_probe_map_probe_seqs_to_probe[probe_seq]
-            probe_cover_ranges[probe].extend(cover_ranges)
-
-    # It's possible that the list of cover ranges for a probe has
-    # overlapping ranges. Clean the list of cover ranges by "merging"
-    # overlapping ones, if desired. Also, convert the defaultdict to
-    # a regular dict.
-    probe_cover_ranges_cleaned = {}
-    for probe, cover_ranges in probe_cover_ranges.items():
-        if merge_overlapping:
-            probe_cover_ranges_cleaned[probe] = interval.\
-                merge_overlapping(cover_ranges)
-        else:
-            # Remove duplicate cover ranges
-            probe_cover_ranges_cleaned[probe] = sorted(list(set(cover_ranges)))
-    return probe_cover_ranges_cleaned
+    return _merge_probe_covers(all_subseq_probe_cover_ranges,
+                               merge_overlapping=merge_overlapping,
+                               as_arrays=as_arrays)
+
+
+def _merge_probe_covers(all_subseq_probe_cover_ranges,
+                        merge_overlapping=True,
+                        as_arrays=False):
+    """Merge the outputs of scanning subsequences of a sequence.
+
+    Args:
+        all_subseq_probe_cover_ranges: list of outputs of
+            _find_probe_covers_in_subsequence(), for subsequences of one
+            sequence
+        merge_overlapping/as_arrays: see find_probe_covers_in_sequence()
+
+    Returns:
+        dict mapping probes to the set of ranges that each probe "covers"
+        in the sequence (or, if as_arrays is True, a tuple of arrays
+        giving the ranges), or a tuple of such outputs (one per strand),
+        or a list of either (one per setting), as output by
+        find_probe_covers_in_sequence()
+    """
+    global _pfp_cover_range_for_probe_in_subsequence_fn
+    global _pfp_kmer_probe_map_both_strands
+
+    def merge(outputs):
+        # Merge outputs for one setting; if the k-mer probe map indexes
+        # reverse complements, each is a tuple with one dict per strand
+        if _pfp_kmer_probe_map_both_strands:
+            return tuple(_merge_probe_covers_for_setting(
+                             [output[strand] for output in outputs],
+                             merge_overlapping=merge_overlapping,
+                             as_arrays=as_arrays)
+                         for strand in range(2))
+        return _merge_probe_covers_for_setting(
+            outputs, merge_overlapping=merge_overlapping,
+            as_arrays=as_arrays)
+
+    lcf_settings = getattr(_pfp_cover_range_for_probe_in_subsequence_fn,
+                           'lcf_settings', None)
+    if lcf_settings is not None:
+        # Merge the outputs separately for each setting
+        return [merge([subseq_probe_cover_ranges[i]
+                       for subseq_probe_cover_ranges in
+                       all_subseq_probe_cover_ranges])
+                for i in range(len(lcf_settings))]
+    return merge(all_subseq_probe_cover_ranges)
+
+
+def _merge_probe_covers_for_setting(all_subseq_probe_cover_ranges,
+                                    merge_overlapping=True,
+                                    as_arrays=False):
+    """Merge the outputs, for one setting, of scanning subsequences.
+
+    Args:
+        all_subseq_probe_cover_ranges: list of arrays, each output by
+            _find_probe_covers_in_subsequence() (for one setting and
+            strand), for subsequences of one sequence
+        merge_overlapping/as_arrays: see find_probe_covers_in_sequence()
+
+    Returns:
+        dict mapping probes to the set of ranges that each probe "covers"
+        in the sequence or, if as_arrays is True, a tuple of arrays giving
+        the ranges (see find_probe_covers_in_sequence())
+    """
+    global _pfp_kmer_probe_map_probes
+
+    # Merge the outputs from the different processes: concatenate their
+    # ranges and, since it's possible that the ranges of a probe from
+    # different processes overlap, merge overlapping ones, if desired
+    # (otherwise, only remove duplicates)
+    if len(all_subseq_probe_cover_ranges) > 0:
+        probe_ids, starts, ends = np.concatenate(
+            all_subseq_probe_cover_ranges, axis=1).astype(np.int64)
+    else:
+        probe_ids, starts, ends = np.zeros((3, 0), dtype=np.int64)
+    if merge_overlapping:
+        probe_ids, starts, ends = interval.merge_overlapping_by_key(
+            probe_ids, starts, ends)
+    else:
+        probe_ids, starts, ends = interval.unique_by_key(
+            probe_ids, starts, ends)
+    if as_arrays:
+        return probe_ids, starts, ends
+
+    # Split the ranges, which are sorted by probe id, into a dict keyed
+    # on probes
+    probe_cover_ranges = {}
+    first = np.flatnonzero(np.diff(probe_ids)) + 1
+    cover_ranges = list(zip(starts.tolist(), ends.tolist()))
+    for i, j in zip(np.concatenate(([0], first)).tolist(),
+                    np.append(first, len(probe_ids)).tolist()):
+        if i < j:
+            probe = _pfp_kmer_probe_map_probes[int(probe_ids[i])]
+            probe_cover_ranges[probe] = cover_ranges[i:j]
+    return probe_cover_ranges
+
+
+def _concatenate_hits(all_subseq_hits, lcf_settings):
+    """Concatenate the outputs, per hit, of scanning subsequences.
+
+    Args:
+        all_subseq_hits: list of outputs of
+            _find_probe_covers_in_subsequence(), with per_hit, for
+            subsequences of one sequence
+        lcf_settings: if the cover function gives many settings, the list
+            of them; otherwise, None
+
+    Returns:
+        output of _find_probe_covers_in_subsequence(), with per_hit, for
+        the whole sequence (in int64), except that a hit found in two
+        subsequences (near where they meet) may appear twice and the
+        columns are sorted only within each subsequence
+    """
+    def concatenate(arrays):
+        return np.concatenate([np.zeros((4, 0), dtype=np.int64)] + arrays,
+                              axis=1).astype(np.int64)
+
+    if lcf_settings is None:
+        return concatenate(all_subseq_hits)
+    return [concatenate([hits[i] for hits in all_subseq_hits])
+            for i in range(len(lcf_settings))]
+
+
+# Total length (in bp) of the sequences that find_probe_covers_in_sequences()
+# packs into one task; a sequence longer than this is instead split across
+# the processes, as in find_probe_covers_in_sequence()
+_BATCH_TASK_LEN = 100000
+
+# Number of tasks, per process, that find_probe_covers_in_sequences() has
+# submitted to the pool but not yet received results for
+_BATCH_TASKS_IN_FLIGHT_PER_PROCESS = 4
+
+# Total length (in bp) of the consecutive sequences that
+# find_probe_covers_in_sequences() places in one shared memory block
+_SHARED_SEQUENCES_LEN = 2**26
+
+
+def find_probe_covers_in_sequences(records,
+                                   merge_overlapping=True,
+                                   as_arrays=False,
+                                   dedup=False,
+                                   per_hit=False):
+    """Find ranges that a collection of probes cover in many sequences.
+
+    This gives the same output as calling find_probe_covers_in_sequence()
+    on each sequence, but keeps the processes busy when there are many
+    short sequences (e.g., viral genomes). find_probe_covers_in_sequence()
+    splits one sequence across the processes and waits for all of them;
+    for a short sequence, the time to set up the scan is comparable to
+    the time to perform it, and processes are idle while the slowest one
+    finishes. Here, consecutive sequences are packed into tasks of about
+    _BATCH_TASK_LEN bp in total, which are submitted with apply_async()
+    and kept queued ahead of the processes so that a process starts on a
+    new task as soon as it finishes one.
+    A sequence longer than _BATCH_TASK_LEN is split across the processes,
+    as in find_probe_covers_in_sequence().
+
+    The sequences are not sent with the tasks. Rather, consecutive
+    sequences totaling about _SHARED_SEQUENCES_LEN bp (e.g., all of the
+    target genomes, for most designs) are placed together, once, in a
+    shared memory block of bases with a table of offsets (see
+    SharedSequenceCollection). A task only names the block and gives, for
+    each piece to scan, a tuple (sequence id, start, end); the processes
+    read the bases from the block without copying them.
+
+    records is read lazily, and only a bounded number of blocks and tasks
+    exist at once, so the sequences need not all be held in memory at
+    the same time. Tasks are submitted from the thread that reads the
+    output, only as results are read, so no thread of the pool ever
+    waits on this function; the output may be read partly, or alongside
+    other scans with the same pool, without blocking them.
+
+    When dedup is True, each distinct sequence is scanned only once: the
+    output for the first record with a sequence is also output for every
+    later record with the same sequence (see
+    utils.sequence_dedup.RepeatedSequences). This reads all of records
+    before scanning (holding references to, but not copies of, their
+    sequences). The same output object may be yielded for many records,
+    so it should not be modified.
+
+    As with find_probe_covers_in_sequence(), a pool of processes must
+    have been created by calling open_probe_finding_pool().
+
+    Args:
+        records: iterable of tuples (key, sequence), where sequence is a
+            sequence (as a string) in which to find ranges that probes
+            cover and key is any object, which is output along with the
+            ranges found in sequence
+        merge_overlapping/as_arrays: see find_probe_covers_in_sequence()
+        dedup: if True, scan only the first record with each distinct
+            sequence and reuse its output for the others
+        per_hit: if True, output, for each record, the cover ranges along
+            with the alignments of the probes at the hits where they are
+            covered, rather than the ranges merged for each probe (see
+            _find_probe_covers_in_subsequence(), which gives the
+            requirements for this); the output for a record is then an
+            array (or, for a cover function that gives many settings, a
+            list of arrays) of shape (4, number of ranges) in the format
+            that function gives, and merge_overlapping and as_arrays are
+            ignored
+
+    Yields:
+        tuple (key, probe_cover_ranges) for each record, in the order of
+        records, where probe_cover_ranges is the output of
+        find_probe_covers_in_sequence() for the record's sequence
+
+    Raises:
+        RuntimeError if a pool for finding probes is not open; a pool
+        must be opened prior to calling this function by calling
+        open_probe_finding_pool()
+    """
+    global _pfp_is_open
+    global _pfp_pool
+    global _pfp_work_was_submitted
+    global _pfp_kmer_probe_map_k
+    global _pfp_worker_handle
+
+    pfp_is_open = False
+    try:
+        if _pfp_is_open:
+            pfp_is_open = True
+    except NameError:
+        pass
+    if not pfp_is_open:
+        raise RuntimeError("Probe finding pool is not open")
+
+    if dedup:
+        yield from _find_probe_covers_in_distinct_sequences(
+            records, merge_overlapping=merge_overlapping,
+            as_arrays=as_arrays, per_hit=per_hit)
+        return
+
+    k = _pfp_kmer_probe_map_k
+    num_processes = _pfp_pool._processes
+    pool = _pfp_pool
+    scan_pieces = partial(_find_probe_covers_in_pieces,
+                          handle=_pfp_worker_handle,
+                          merge_overlapping=merge_overlapping,
+                          per_hit=per_hit)
+    if per_hit:
+        lcf_settings = getattr(_pfp_cover_range_for_probe_in_subsequence_fn,
+                               'lcf_settings', None)
+
+    # For each sequence index (which is also its id in the shared memory
+    # blocks), the key of its record, the number of its pieces whose
+    # results have not yet been received, the results of its pieces
+    # received so far, and the name of the block holding it
+    keys = {}
+    num_pieces_left = {}
+    results_by_seq = defaultdict(list)
+    block_of_seq = {}
+
+    # For the name of each shared memory block, a list [shm, number of its
+    # sequences not yet output]
+    blocks = {}
+
+    def iter_chunks():
+        # Yield lists of tuples (seq_index, sequence) of consecutive
+        # records, each totaling about _SHARED_SEQUENCES_LEN bp
+        chunk = []
+        chunk_len = 0
+        for seq_index, (key, sequence) in enumerate(records):
+            keys[seq_index] = key
+            chunk += [(seq_index, sequence)]
+            chunk_len += len(sequence)
+            if chunk_len >= _SHARED_SEQUENCES_LEN:
+                yield chunk
+                chunk, chunk_len = [], 0
+        if chunk:
+            yield chunk
+
+    def load_chunk(chunk):
+        # Place the sequences of chunk in a shared memory block, and
+        # return its handle
+        shm, sequences_handle = SharedSequenceCollection.construct(
+            [sequence for _, sequence in chunk]).to_shared_memory()
+        sequences_handle['first_id'] = chunk[0][0]
+        blocks[shm.name] = [shm, len(chunk)]
+        for seq_index, _ in chunk:
+            block_of_seq[seq_index] = shm.name
+        return sequences_handle
+
+    def iter_tasks():
+        for chunk in iter_chunks():
+            sequences_handle = load_chunk(chunk)
+            batch = []
+            batch_len = 0
+            for seq_index, sequence in chunk:
+                num_kmers = len(sequence) - k + 1
+                if num_kmers > _BATCH_TASK_LEN:
+                    # Split the sequence across the processes, each piece
+                    # in its own task; first send the current batch so
+                    # that tasks are submitted in the order of the
+                    # sequences
+                    if batch:
+                        yield sequences_handle, batch
+                        batch, batch_len = [], 0
+                    bounds_size = int(num_kmers / num_processes + 1)
+                    all_bounds = [
+                        (start, min(num_kmers, start + bounds_size))
+                        for start in range(0, num_kmers, bounds_size)]
+                    num_pieces_left[seq_index] = len(all_bounds)
+                    for start, end in all_bounds:
+                        yield sequences_handle, [(seq_index, start, end)]
+                else:
+                    # If sequence is shorter than k, its piece scans no
+                    # k-mers and gives an empty output
+                    num_pieces_left[seq_index] = 1
+                    batch += [(seq_index, 0, max(0, num_kmers))]
+                    batch_len += len(sequence)
+                    if batch_len >= _BATCH_TASK_LEN:
+                        yield sequences_handle, batch
+                        batch, batch_len = [], 0
+            if batch:
+                yield sequences_handle, batch
+
+    def release_block(seq_index):
+        # Release the block holding a sequence once all of its sequences
+        # have been output
+        name = block_of_seq.pop(seq_index)
+        blocks[name][1] -= 1
+        if blocks[name][1] == 0:
+            shm, _ = blocks.pop(name)
+            shm.close()
+            shm.unlink()
+
+    # Keep up to this many tasks submitted to the pool whose results have
+    # not been read, submitting more as results are read
+    max_tasks_in_flight = num_processes * _BATCH_TASKS_IN_FLIGHT_PER_PROCESS
+    tasks = iter_tasks()
+    tasks_in_flight = deque()
+
+    def submit_tasks():
+        while len(tasks_in_flight) < max_tasks_in_flight:
+            task = next(tasks, None)
+            if task is None:
+                return
+            tasks_in_flight.append(pool.apply_async(scan_pieces, (task,)))
+
+    _pfp_work_was_submitted = True
+    next_seq_index = 0
+    try:
+        submit_tasks()
+        while tasks_in_flight:
+            # Wait on the earliest task submitted; the sequences are
+            # output in order, so results of later tasks could not be
+            # output before it anyway
+            results = tasks_in_flight.popleft().get()
+            submit_tasks()
+            for seq_index, subseq_probe_cover_ranges in results:
+                results_by_seq[seq_index] += [subseq_probe_cover_ranges]
+                num_pieces_left[seq_index] -= 1
+
+            # Output, in order, the sequences whose pieces have all
+            # been received
+            while num_pieces_left.get(next_seq_index) == 0:
+                if per_hit:
+                    probe_cover_ranges = _concatenate_hits(
+                        results_by_seq.pop(next_seq_index), lcf_settings)
+                else:
+                    probe_cover_ranges = _merge_probe_covers(
+                        results_by_seq.pop(next_seq_index),
+                        merge_overlapping=merge_overlapping,
+                        as_arrays=as_arrays)
+                del num_pieces_left[next_seq_index]
+                release_block(next_seq_index)
+                yield keys.pop(next_seq_index), probe_cover_ranges
+                next_seq_index += 1
+    finally:
+        # Release the blocks that remain (if the output of this function
+        # was not read to the end); tasks already submitted that name
+        # them may then fail, but their results are never read
+        for shm, _ in blocks.values():
+            shm.close()
+            shm.unlink()
+        blocks.clear()
+
+
+def _find_probe_covers_in_distinct_sequences(records,
+                                             merge_overlapping=True,
+                                             as_arrays=False,
+                                             per_hit=False):
+    """Helper function for find_probe_covers_in_sequences(), with dedup.
+
+    Args:
+        records/merge_overlapping/as_arrays/per_hit: see
+            find_probe_covers_in_sequences()
+
+    Yields:
+        same as find_probe_covers_in_sequences()
+    """
+    records = list(records)
+    repeated = sequence_dedup.RepeatedSequences(
+        sequence for _, sequence in records)
+    repeated.log_savings()
+
+    # Scan the first record with each distinct sequence; the output of
+    # the scan is in the order of these records
+    distinct_outputs = find_probe_covers_in_sequences(
+        ((None, sequence) for (_, sequence), is_first in
+            zip(records, repeated.is_first) if is_first),
+        merge_overlapping=merge_overlapping, as_arrays=as_arrays,
+        per_hit=per_hit)
+    try:
+        for (key, sequence), is_first in zip(records, repeated.is_first):
+            if is_first:
+                _, probe_cover_ranges = next(distinct_outputs)
+                repeated.add(sequence, probe_cover_ranges)
+            else:
+                probe_cover_ranges = repeated.take(sequence)
+            yield key, probe_cover_ranges
+    finally:
+        # Release the shared memory of the scan, if its output was not
+        # read to the end
+        distinct_outputs.close()
 
 
 def probe_covers_sequence_by_longest_common_substring(mismatches,
@@ -1321,4 +4030,63 @@ def probe_covers_sequence_by_longest_common_substring(mismatches,
 
         return (start, start + l)
 
+    # Expose the parameters so that callers can compute coverage by lcf
+    # in batches (see _lcf_cover_ranges_of_hits())
+    lcf.lcf_params = (mismatches, lcf_thres, island_of_exact_match)
+
     return lcf
+
+
+def probe_covers_sequence_by_longest_common_substring_for_each_setting(
+        settings):
+    """Return a function that determines coverage for multiple settings.
+
+    This is like probe_covers_sequence_by_longest_common_substring(), but
+    determines coverage for each of multiple settings of its parameters
+    at once. When a probe finding pool is opened with the returned
+    function, find_probe_covers_in_sequence() (and
+    find_probe_covers_in_sequences()) output the ranges covered for each
+    setting, from one scan of each sequence; around each k-mer hit,
+    the mismatches between the probe and sequence are found once and
+    used for every setting (see
+    longest_common_substring.k_lcf_around_anchors_for_each_k()). This is
+    useful for finding coverage over a grid of parameter values.
+
+    The k-mer probe map given to open_probe_finding_pool() must find the
+    hits needed by every setting; e.g., it can be constructed with the
+    largest value of mismatches and the smallest of lcf_thres across the
+    settings. With the same k-mer probe map, the output for each setting
+    is the same as the output when the pool is opened with that setting
+    alone.
+
+    Args:
+        settings: list of tuples (mismatches, lcf_thres) or (mismatches,
+            lcf_thres, island_of_exact_match), each giving arguments to
+            probe_covers_sequence_by_longest_common_substring()
+
+    Returns:
+        function that, given a probe and sequence anchored at a shared
+        k-mer (as with the function returned by
+        probe_covers_sequence_by_longest_common_substring()), returns a
+        list x in which x[i] is None if the probe does not cover part of
+        the sequence under the i'th setting and, if it does, the part
+        that it covers
+    """
+    if len(settings) == 0:
+        raise ValueError("At least one setting must be given")
+    lcf_fns = [probe_covers_sequence_by_longest_common_substring(*setting)
+               for setting in settings]
+
+    def lcf_for_each_setting(probe_seq, sequence, kmer_start, kmer_end,
+                             full_probe_len, full_sequence_len):
+        return [lcf(probe_seq, sequence, kmer_start, kmer_end,
+                    full_probe_len, full_sequence_len)
+                for lcf in lcf_fns]
+
+    # Expose the settings, as tuples of 3 parameters, so that callers can
+    # compute coverage by lcf in batches (see
+    # _lcf_cover_ranges_of_hits_for_each_setting())
+    lcf_for_each_setting.lcf_settings = tuple(lcf.lcf_params
+                                              for lcf in lcf_fns)
+
+    return lcf_for_each_setting
@@ -0,0 +1,681 @@
+"""Compacted representation of target genomes, for scanning them once.
+
+Large, highly redundant datasets (e.g., thousands of genomes of one
+virus) repeat nearly all of their sequence across genomes, so scanning
+each genome for probe covers repeats nearly the same work. This builds a
+compacted graph of the distinct L-mers of the target sequences: its
+nodes are the L-mers, with an edge between two L-mers that are adjacent
+in some sequence, and its unitigs are the maximal paths on which every
+edge is the only one out of its source and into its target. Each
+distinct L-mer appears once across the unitigs, so scanning the unitigs
+seeds and verifies each distinct context of L bases once. Each sequence
+is recorded as the runs of consecutive L-mers that it shares with a
+unitig (the 'colors' of the graph), through which the covers found in
+the unitigs are projected back to the sequences.
+
+With L at least the length of every probe, this gives the same covers
+as scanning each sequence. Whether a probe covers a sequence at a hit
+depends only on the probe, its alignment, and the bases of the sequence
+that it overlaps (its window). A window that lies within a sequence is
+within one of its L-mers, and so within a run; the hits whose windows
+lie within a run's part of a unitig are exactly the hits in that part
+of the sequence. The windows that are clipped by an end of a sequence
+are not in any unitig as such, so the first and last 2L bases of each
+sequence (or, for a sequence shorter than 4L, all of it) are scanned
+directly.
+
+Distinct L-mers are found by two 64-bit polynomial hashes; two distinct
+L-mers collide with a probability of about 2^-120, and are otherwise
+never merged.
+
+This helps most when the target genomes share long stretches of
+identical sequence: a substitution in one genome makes L new L-mers, so
+when genomes differ every few hundred bases the unitigs are short and
+barely shorter, in total, than the genomes.
+"""
+
+import logging
+
+import numpy as np
+
+from catch import probe
+from catch.utils import interval
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+logger = logging.getLogger(__name__)
+
+
+# Odd multipliers of the two polynomial hashes of L-mers, and their
+# inverses mod 2^64
+_HASH_BASES = (0x9e3779b97f4a7c15, 0xc2b2ae3d27d4eb4f)
+_HASH_BASE_INVERSES = (0xf1de83e19937733d, 0x0ba79078168d4baf)
+
+# Number of bases of whole sequences to read at a time when constructing
+# unitigs
+_CONSTRUCT_BATCH_LEN = 10**6
+
+
+def _lmer_hashes(chars, order):
+    """Compute two polynomial hashes of every L-mer of a sequence.
+
+    The hashes of an L-mer do not depend on its position, so L-mers of a
+    concatenation of sequences can be compared across the sequences.
+
+    Args:
+        chars: numpy array (uint8) of the characters of a sequence
+        order: L
+
+    Returns:
+        numpy array with a structured dtype of two uint64 fields, giving
+        the hashes of the L-mer starting at each position of chars
+    """
+    num_lmers = max(0, len(chars) - order + 1)
+    hashes = np.zeros(num_lmers, dtype=[('h1', np.uint64),
+                                        ('h2', np.uint64)])
+    if num_lmers == 0:
+        return hashes
+    values = chars.astype(np.uint64)
+    for field, base, base_inverse in zip(['h1', 'h2'], _HASH_BASES,
+                                         _HASH_BASE_INVERSES):
+        # powers[t] = base^t and inv_powers[t] = base^(-t), mod 2^64
+        powers = np.full(len(chars), base, dtype=np.uint64)
+        powers[0] = 1
+        np.cumprod(powers, out=powers)
+        inv_powers = np.full(num_lmers, base_inverse, dtype=np.uint64)
+        inv_powers[0] = 1
+        np.cumprod(inv_powers, out=inv_powers)
+        # The L-mer at t hashes to sum_u chars[t+u] base^u, which is the
+        # difference of prefix sums divided by base^t
+        prefix = np.zeros(len(chars) + 1, dtype=np.uint64)
+        np.cumsum(values * powers, out=prefix[1:])
+        hashes[field] = (prefix[order:] - prefix[:num_lmers]) * inv_powers
+    return hashes
+
+
+def _distinct_ids(h1, h2):
+    """Number the distinct pairs of hashes.
+
+    Args:
+        h1/h2: numpy arrays (uint64) of the same length giving pairs of
+            hashes
+
+    Returns:
+        tuple (ids, first) such that ids[i] is the id of the pair
+        (h1[i], h2[i]), numbered from 0 in order of the pairs' values, and
+        first[d] is the smallest i such that ids[i] is d
+    """
+    # Sorting by h1 alone is considerably faster than sorting by both;
+    # pairs with the same h1 almost always have the same h2, and if they
+    # do not, sort by both
+    sort_order = np.argsort(h1)
+    h1_sorted, h2_sorted = h1[sort_order], h2[sort_order]
+    is_new = np.ones(len(h1), dtype=bool)
+    is_new[1:] = h1_sorted[1:] != h1_sorted[:-1]
+    group_ids = np.cumsum(is_new) - 1
+    if not np.array_equal(h2_sorted, h2_sorted[is_new][group_ids]):
+        sort_order = np.lexsort((h2, h1))
+        h1_sorted, h2_sorted = h1[sort_order], h2[sort_order]
+        is_new[1:] = ((h1_sorted[1:] != h1_sorted[:-1]) |
+                      (h2_sorted[1:] != h2_sorted[:-1]))
+        group_ids = np.cumsum(is_new) - 1
+    ids = np.empty(len(h1), dtype=np.int64)
+    ids[sort_order] = group_ids
+    if len(h1) == 0:
+        return ids, np.zeros(0, dtype=np.int64)
+    first = np.minimum.reduceat(sort_order, np.flatnonzero(is_new))
+    return ids, first.astype(np.int64)
+
+
+
+def _batch_lmers(sequences, seq_idxs, order):
+    """Find the L-mers of a batch of sequences and their hashes.
+
+    Args:
+        sequences: list of sequences (as strings)
+        seq_idxs: indices in sequences of the sequences in the batch, each
+            of length at least L
+        order: L
+
+    Returns:
+        tuple (lmer_seq, lmer_seq_pos, h1, h2) of numpy arrays giving, for
+        each L-mer of the batch's sequences in order, the index in
+        seq_idxs of its sequence, its position in that sequence, and its
+        two hashes
+    """
+    seq_lens = np.array([len(sequences[i]) for i in seq_idxs],
+                        dtype=np.int64)
+    chars = np.frombuffer(
+        ''.join(sequences[i] for i in seq_idxs).encode(), dtype=np.uint8)
+    seq_offsets = np.zeros(len(seq_idxs) + 1, dtype=np.int64)
+    np.cumsum(seq_lens, out=seq_offsets[1:])
+
+    # Only keep the L-mers in chars that do not span two sequences
+    num_lmers = seq_lens - order + 1
+    lmer_seq = np.repeat(np.arange(len(seq_idxs)), num_lmers)
+    lmer_first = np.zeros(len(seq_idxs) + 1, dtype=np.int64)
+    np.cumsum(num_lmers, out=lmer_first[1:])
+    lmer_seq_pos = (np.arange(lmer_first[-1]) -
+                    np.repeat(lmer_first[:-1], num_lmers))
+    hashes = _lmer_hashes(chars, order)[seq_offsets[lmer_seq] + lmer_seq_pos]
+    return lmer_seq, lmer_seq_pos, hashes['h1'], hashes['h2']
+
+
+def _lookup(table_h1, table_h2, table_ids, h1, h2):
+    """Look up pairs of hashes in a table of them.
+
+    Args:
+        table_h1/table_h2/table_ids: numpy arrays giving the pairs of
+            hashes in the table, sorted by h1, and the id of each
+        h1/h2: numpy arrays (uint64) giving pairs of hashes to look up
+
+    Returns:
+        numpy array (int64) giving the id of each pair (h1[i], h2[i]), or
+        -1 if it is not in the table
+    """
+    lo = np.searchsorted(table_h1, h1, side='left')
+    hi = np.searchsorted(table_h1, h1, side='right')
+    ids = np.full(len(h1), -1, dtype=np.int64)
+    one = np.flatnonzero(hi - lo == 1)
+    one = one[table_h2[lo[one]] == h2[one]]
+    ids[one] = table_ids[lo[one]]
+    # Pairs that share h1 with others in the table are rare, so look
+    # them up one at a time
+    for i in np.flatnonzero(hi - lo > 1):
+        match = np.flatnonzero(table_h2[lo[i]:hi[i]] == h2[i])
+        if len(match) > 0:
+            ids[i] = table_ids[lo[i] + match[0]]
+    return ids
+
+
+def _add_edges(src, dst, num_edges, edge_dst):
+    """Count the distinct edges out of nodes, up to 2.
+
+    Args:
+        src/dst: numpy arrays (int64) giving the source and target of
+            edges, possibly with duplicates
+        num_edges: numpy array such that num_edges[x] is the number of
+            distinct edges found so far out of node x, capped at 2; this
+            is modified
+        edge_dst: numpy array (int64) such that edge_dst[x] is the target
+            of an edge found so far out of node x, or -1 if there are
+            none; this is modified
+    """
+    if len(src) == 0:
+        return
+    sort_order = np.lexsort((dst, src))
+    src, dst = src[sort_order], dst[sort_order]
+    distinct = np.ones(len(src), dtype=bool)
+    distinct[1:] = (src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+    src, dst = src[distinct], dst[distinct]
+    group_first = np.flatnonzero(np.diff(src, prepend=-1) != 0)
+    group_src = src[group_first]
+    group_size = np.diff(np.append(group_first, len(src)))
+    # The edge already found out of a node may be among the new ones
+    already_found = np.logical_or.reduceat(dst == edge_dst[src],
+                                           group_first)
+    count = num_edges[group_src].astype(np.int64)
+    edge_dst[group_src[count == 0]] = dst[group_first[count == 0]]
+    num_edges[group_src] = np.minimum(2, count + group_size - already_found)
+
+
+def _rank_paths(prev):
+    """Find the first node and position of each node on disjoint paths.
+
+    Args:
+        prev: numpy array (int64) such that prev[x] is the node before x
+            on its path, or -1 if x is the first node; every node is
+            before at most one other, and no node is on a cycle
+
+    Returns:
+        tuple (head, rank) of numpy arrays (int64) giving the first node
+        of the path of each node and the position of the node on it
+    """
+    nodes = np.arange(len(prev), dtype=np.int64)
+    head = np.where(prev < 0, nodes, prev)
+    rank = (prev >= 0).astype(np.int64)
+    # Jump along the paths, doubling the distance jumped each time
+    while True:
+        next_head = head[head]
+        if np.array_equal(next_head, head):
+            return head, rank
+        rank += rank[head]
+        head = next_head
+
+
+def _break_cycles(prev, next):
+    """Break cycles among paths of nodes.
+
+    Each cycle is broken before its smallest node, which becomes the
+    first node of a path.
+
+    Args:
+        prev/next: numpy arrays (int64) such that prev[x] and next[x] are
+            the nodes before and after x, or -1 if there are none; these
+            are modified
+    """
+    num_nodes = len(prev)
+    # Jump, from each node, back along the paths; a node that is not on
+    # a cycle reaches the first node of its path (whose prev is -1),
+    # while one on a cycle keeps jumping, collecting the smallest node of
+    # its cycle
+    nodes = np.arange(num_nodes, dtype=np.int64)
+    jump = np.where(prev < 0, nodes, prev)
+    smallest = nodes.copy()
+    for _ in range(max(1, int(np.ceil(np.log2(max(2, num_nodes)))) + 1)):
+        smallest = np.minimum(smallest, smallest[jump])
+        jump = jump[jump]
+    on_cycle = prev[jump] >= 0
+    heads = np.flatnonzero(on_cycle & (smallest == nodes))
+    next[prev[heads]] = -1
+    prev[heads] = -1
+
+
+class TargetUnitigs:
+    """Unitigs of the L-mers of target sequences, with the runs of each
+    sequence along them.
+    """
+
+    def __init__(self, sequences, order, unitigs, run_seq, run_seq_start,
+                 run_unitig, run_unitig_start, run_len):
+        """
+        Args:
+            sequences: list of the target sequences (as strings)
+            order: L
+            unitigs: list of the unitigs (as strings)
+            run_seq/run_seq_start/run_unitig/run_unitig_start/run_len:
+                numpy arrays (int64) giving the runs: for each i, bases
+                [run_seq_start[i], run_seq_start[i] + run_len[i]) of
+                sequence run_seq[i] are the same as bases
+                [run_unitig_start[i], run_unitig_start[i] + run_len[i])
+                of unitig run_unitig[i]
+        """
+        self.sequences = sequences
+        self.order = order
+        self.unitigs = unitigs
+        self.run_seq = run_seq
+        self.run_seq_start = run_seq_start
+        self.run_unitig = run_unitig
+        self.run_unitig_start = run_unitig_start
+        self.run_len = run_len
+
+    def in_graph(self, seq_idx):
+        """Determine whether a sequence is represented by runs.
+
+        A sequence shorter than 4L is instead scanned directly.
+
+        Args:
+            seq_idx: index of a sequence
+
+        Returns:
+            True iff sequences[seq_idx] is represented by runs
+        """
+        return len(self.sequences[seq_idx]) >= 4 * self.order
+
+    @staticmethod
+    def construct(sequences, order):
+        """Construct the unitigs of target sequences.
+
+        This reads the sequences in batches of whole sequences, about
+        _CONSTRUCT_BATCH_LEN bases at a time, twice: first to find the
+        distinct L-mers and the edges between them, and then to find the
+        runs of each sequence. Aside from the sequences themselves,
+        memory grows with the number of distinct L-mers (about 110 bytes
+        each at its peak) and of runs (40 bytes each), plus about 80 bytes
+        per base of one batch, rather than with the total length of the
+        sequences. Runs are few when the sequences share long stretches,
+        but each difference between sequences breaks them.
+
+        Args:
+            sequences: list of the target sequences (as strings)
+            order: L; it should be at least the length of every probe
+                whose covers are to be found
+
+        Returns:
+            instance of TargetUnitigs
+        """
+        seq_lens = np.array([len(seq) for seq in sequences], dtype=np.int64)
+        graph_seqs = np.flatnonzero(seq_lens >= 4 * order)
+        batch_first = [0]
+        batch_len = 0
+        for i, seq_len in enumerate(seq_lens[graph_seqs].tolist()):
+            if batch_len >= _CONSTRUCT_BATCH_LEN:
+                batch_first += [i]
+                batch_len = 0
+            batch_len += seq_len
+        batches = [graph_seqs[i:j] for i, j in
+                   zip(batch_first, batch_first[1:] + [len(graph_seqs)])]
+
+        # Give each distinct L-mer an id, in order of first occurrence,
+        # and keep the sequence and position of its first occurrence. The
+        # distinct L-mers are kept sorted by h1, for looking them up.
+        table_h1 = np.zeros(0, dtype=np.uint64)
+        table_h2 = np.zeros(0, dtype=np.uint64)
+        table_node = np.zeros(0, dtype=np.int64)
+        node_seq, node_pos = [], []
+        num_nodes = 0
+        # Count the distinct edges out of and into each L-mer, up to 2,
+        # and keep one of each
+        num_out = np.zeros(0, dtype=np.int8)
+        out_dst = np.zeros(0, dtype=np.int64)
+        num_in = np.zeros(0, dtype=np.int8)
+        in_src = np.zeros(0, dtype=np.int64)
+        for batch in batches:
+            lmer_seq, lmer_seq_pos, h1, h2 = _batch_lmers(sequences, batch,
+                                                          order)
+            ids, first = _distinct_ids(h1, h2)
+            distinct_node = _lookup(table_h1, table_h2, table_node,
+                                    h1[first], h2[first])
+            new = np.flatnonzero(distinct_node < 0)
+            new = new[np.argsort(first[new], kind='stable')]
+            distinct_node[new] = num_nodes + np.arange(len(new))
+            num_nodes += len(new)
+            # Distinct ids are in order of h1, so sorting them keeps the
+            # table sorted
+            insert = np.sort(new)
+            insert_at = np.searchsorted(table_h1, h1[first[insert]])
+            table_h1 = np.insert(table_h1, insert_at, h1[first[insert]])
+            table_h2 = np.insert(table_h2, insert_at, h2[first[insert]])
+            table_node = np.insert(table_node, insert_at,
+                                   distinct_node[insert])
+            node_seq += [batch[lmer_seq[first[new]]]]
+            node_pos += [lmer_seq_pos[first[new]]]
+            del h1, h2, first
+
+            num_out = np.append(num_out, np.zeros(len(new), dtype=np.int8))
+            out_dst = np.append(out_dst, np.full(len(new), -1,
+                                                 dtype=np.int64))
+            num_in = np.append(num_in, np.zeros(len(new), dtype=np.int8))
+            in_src = np.append(in_src, np.full(len(new), -1,
+                                               dtype=np.int64))
+            # Most edges repeat within a batch, so find the distinct ones
+            # (by the ids within the batch) before counting them
+            adjacent = lmer_seq[1:] == lmer_seq[:-1]
+            edges = np.unique(ids[:-1][adjacent] * len(distinct_node) +
+                              ids[1:][adjacent])
+            src = distinct_node[edges // len(distinct_node)]
+            dst = distinct_node[edges % len(distinct_node)]
+            _add_edges(src, dst, num_out, out_dst)
+            _add_edges(dst, src, num_in, in_src)
+            del ids, edges, src, dst
+        node_seq = np.concatenate([np.zeros(0, dtype=np.int64)] + node_seq)
+        node_pos = np.concatenate([np.zeros(0, dtype=np.int64)] + node_pos)
+
+        # An edge can be compacted if it is the only one out of its source
+        # and into its target
+        compact = np.flatnonzero(num_out == 1)
+        compact = compact[(num_in[out_dst[compact]] == 1) &
+                          (out_dst[compact] != compact)]
+        del num_out, num_in, in_src
+        prev = np.full(num_nodes, -1, dtype=np.int64)
+        next = np.full(num_nodes, -1, dtype=np.int64)
+        prev[out_dst[compact]] = compact
+        next[compact] = out_dst[compact]
+        del out_dst, compact
+        _break_cycles(prev, next)
+        head, rank = _rank_paths(prev)
+        del next
+
+        # Number the unitigs in the order of the first occurrences of
+        # their first L-mers (i.e., in the order of the L-mers' ids)
+        heads = np.flatnonzero(prev < 0)
+        del prev
+        unitig_of_head = np.zeros(num_nodes, dtype=np.int64)
+        unitig_of_head[heads] = np.arange(len(heads))
+        node_unitig = unitig_of_head[head]
+        del head, unitig_of_head
+
+        # A unitig is the first L-mer on its path followed by the last
+        # base of each other L-mer; read these from each sequence in
+        # which L-mers first occur
+        order_on_unitigs = np.lexsort((rank, node_unitig))
+        first_on_unitig = rank[order_on_unitigs] == 0
+        num_chars = np.where(first_on_unitig, order, 1)
+        chars_start = (node_pos[order_on_unitigs] +
+                       np.where(first_on_unitig, 0, order - 1))
+        chars_first = np.cumsum(num_chars) - num_chars
+        chars_seq = node_seq[order_on_unitigs]
+        del order_on_unitigs, first_on_unitig, node_seq, node_pos
+        unitig_chars = np.zeros(int(num_chars.sum()), dtype=np.uint8)
+        by_seq = np.argsort(chars_seq, kind='stable')
+        seq_first = np.flatnonzero(np.diff(chars_seq[by_seq],
+                                           prepend=-1) != 0)
+        for i, j in zip(seq_first.tolist(),
+                        seq_first[1:].tolist() + [len(by_seq)]):
+            chars = np.frombuffer(
+                sequences[chars_seq[by_seq[i]]].encode(), dtype=np.uint8)
+            k = by_seq[i:j]
+            arange = np.arange(int(num_chars[k].sum()))
+            num_before = np.cumsum(num_chars[k]) - num_chars[k]
+            unitig_chars[np.repeat(chars_first[k] - num_before,
+                                   num_chars[k]) + arange] = \
+                chars[np.repeat(chars_start[k] - num_before,
+                                num_chars[k]) + arange]
+        del num_chars, chars_start, chars_first, chars_seq, by_seq
+        unitig_lens = np.bincount(node_unitig, minlength=len(heads)) + \
+            order - 1
+        unitig_offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+        np.cumsum(unitig_lens, out=unitig_offsets[1:])
+        unitig_bytes = unitig_chars.tobytes()
+        del unitig_chars
+        unitigs = [unitig_bytes[i:j].decode() for i, j in
+                   zip(unitig_offsets[:-1].tolist(),
+                       unitig_offsets[1:].tolist())]
+        del unitig_bytes
+
+        # Split the L-mers of each sequence into runs of consecutive
+        # L-mers of one unitig
+        runs = [[] for _ in range(5)]
+        for batch in batches:
+            lmer_seq, lmer_seq_pos, h1, h2 = _batch_lmers(sequences, batch,
+                                                          order)
+            ids, first = _distinct_ids(h1, h2)
+            node = _lookup(table_h1, table_h2, table_node,
+                           h1[first], h2[first])[ids]
+            del h1, h2, ids, first
+            lmer_unitig = node_unitig[node]
+            lmer_rank = rank[node]
+            new_run = np.ones(len(node), dtype=bool)
+            new_run[1:] = ((lmer_seq[1:] != lmer_seq[:-1]) |
+                           (lmer_unitig[1:] != lmer_unitig[:-1]) |
+                           (lmer_rank[1:] != lmer_rank[:-1] + 1))
+            run_first = np.flatnonzero(new_run)
+            run_num_lmers = np.diff(np.append(run_first, len(node)))
+            for field, values in zip(runs, [batch[lmer_seq[run_first]],
+                                            lmer_seq_pos[run_first],
+                                            lmer_unitig[run_first],
+                                            lmer_rank[run_first],
+                                            run_num_lmers + order - 1]):
+                field += [values.astype(np.int64)]
+        # Concatenate one field at a time, so that the runs are only held
+        # about once
+        for f in range(len(runs)):
+            runs[f] = np.concatenate([np.zeros(0, dtype=np.int64)] + runs[f])
+        return TargetUnitigs(sequences, order, unitigs, *runs)
+
+    def num_bases(self):
+        """Count the bases in the target sequences and to scan.
+
+        Returns:
+            tuple (number of bases in the sequences, number of bases in
+            the unitigs and in the parts of sequences scanned directly)
+        """
+        num_seq_bases = sum(len(seq) for seq in self.sequences)
+        num_scan_bases = sum(len(unitig) for unitig in self.unitigs)
+        for seq_idx, seq in enumerate(self.sequences):
+            if self.in_graph(seq_idx):
+                num_scan_bases += 4 * self.order
+            else:
+                num_scan_bases += len(seq)
+        return num_seq_bases, num_scan_bases
+
+    def _unitig_offsets(self):
+        """Find where each unitig starts in their concatenation.
+
+        Returns:
+            numpy array (int64) x such that, for each i, the i'th unitig
+            starts at position x[i] of the unitigs concatenated with one
+            'N' between each (see _iter_records())
+        """
+        unitig_lens = np.array([len(u) for u in self.unitigs],
+                               dtype=np.int64)
+        return np.cumsum(unitig_lens + 1) - (unitig_lens + 1)
+
+    def _iter_records(self):
+        """Yield the sequences to scan.
+
+        The unitigs are scanned as one sequence, so that the many short
+        ones do not each carry the cost of being set up for a scan and
+        the pool can split them across its processes. They are separated
+        by 'N' so that no k-mer spans two unitigs; a probe aligned across
+        two unitigs may still be found to cover one of them, but such a
+        hit does not lie within a run and is not projected onto a
+        sequence.
+
+        Yields:
+            tuples (key, sequence) where key is ('unitigs', None) for the
+            concatenated unitigs, ('start', s) or ('end', s) for the
+            first or last 2L bases of a sequence s in the graph, or
+            ('all', s) for a sequence s that is not in the graph
+        """
+        yield ('unitigs', None), 'N'.join(self.unitigs)
+        for seq_idx, seq in enumerate(self.sequences):
+            if self.in_graph(seq_idx):
+                yield ('start', seq_idx), seq[:(2 * self.order)]
+                yield ('end', seq_idx), seq[-(2 * self.order):]
+            else:
+                yield ('all', seq_idx), seq
+
+    def find_probe_covers(self, kmer_probe_map):
+        """Find ranges that probes cover in the target sequences.
+
+        This gives, for each sequence, the same ranges as
+        probe.find_probe_covers_in_sequences() with as_arrays=True, but
+        scans the unitigs rather than the sequences. A pool of processes
+        must have been opened, with kmer_probe_map and a cover function
+        that allows finding covers per hit, by calling
+        probe.open_probe_finding_pool().
+
+        Args:
+            kmer_probe_map: the instance of probe.SharedKmerProbeMap given
+                to probe.open_probe_finding_pool(); its probes must be no
+                longer than L
+
+        Returns:
+            tuple (seq_idx, probe_ids, starts, ends) of numpy arrays
+            (int64) such that, for each i, the probe with id probe_ids[i]
+            in kmer_probe_map covers [starts[i], ends[i]) of sequence
+            seq_idx[i]; for each sequence and probe, overlapping ranges are
+            merged, and the ranges are sorted by sequence, probe id, and
+            start. If the cover function gives many settings, this is a
+            list with such an output for each setting.
+
+        Raises:
+            ValueError if a probe is longer than L
+        """
+        probe_lens = np.diff(kmer_probe_map.probe_seqs_offsets)
+        if len(probe_lens) > 0 and probe_lens.max() > self.order:
+            raise ValueError(("A probe is longer than the L-mers of the "
+                              "unitigs"))
+        num_probes = len(probe_lens)
+        lcf_settings = getattr(
+            probe._pfp_cover_range_for_probe_in_subsequence_fn,
+            'lcf_settings', None)
+        num_settings = 1 if lcf_settings is None else len(lcf_settings)
+
+        num_seq_bases, num_scan_bases = self.num_bases()
+        logger.info(("Scanning %d unitigs, and the ends of target "
+                     "sequences, totaling %d bp rather than the %d bp of "
+                     "the %d target sequences"), len(self.unitigs),
+                    num_scan_bases, num_seq_bases, len(self.sequences))
+
+        # For each setting, the hits found in the unitigs and lists of
+        # arrays giving the ranges found in the sequences directly
+        unitig_hits = [None for _ in range(num_settings)]
+        direct_covers = [[] for _ in range(num_settings)]
+        window = 2 * self.order
+        # Many sequences have identical ends, which are scanned once
+        for (kind, i), hits_by_setting in \
+                probe.find_probe_covers_in_sequences(
+                    self._iter_records(), dedup=True, per_hit=True):
+            if lcf_settings is None:
+                hits_by_setting = [hits_by_setting]
+            for s, hits in enumerate(hits_by_setting):
+                if kind == 'unitigs':
+                    unitig_hits[s] = hits
+                    continue
+                probe_ids, align, starts, ends = hits
+                if kind == 'start':
+                    # Only keep hits at which the probe is clipped by the
+                    # start of the sequence
+                    keep = align < 0
+                    shift = 0
+                elif kind == 'end':
+                    # Only keep hits at which the probe is clipped by the
+                    # end of the sequence
+                    keep = align + probe_lens[probe_ids] > window
+                    shift = len(self.sequences[i]) - window
+                else:
+                    keep = np.ones(len(probe_ids), dtype=bool)
+                    shift = 0
+                direct_covers[s] += [np.vstack((
+                    np.full(np.count_nonzero(keep), i), probe_ids[keep],
+                    starts[keep] + shift, ends[keep] + shift))]
+
+        results = []
+        for s in range(num_settings):
+            covers = [self._project_hits(unitig_hits[s], probe_lens)]
+            covers += direct_covers[s]
+            seq_idx, probe_ids, starts, ends = np.concatenate(
+                [np.zeros((4, 0), dtype=np.int64)] + covers,
+                axis=1).astype(np.int64)
+            keys, starts, ends = interval.merge_overlapping_by_key(
+                seq_idx * num_probes + probe_ids, starts, ends)
+            results += [(keys // max(1, num_probes),
+                         keys % max(1, num_probes), starts, ends)]
+        if lcf_settings is None:
+            return results[0]
+        return results
+
+    def _project_hits(self, unitig_hits, probe_lens):
+        """Project the ranges covered at hits in unitigs onto sequences.
+
+        Args:
+            unitig_hits: array of shape (4, number of hits) giving the
+                probe id, alignment, and range covered of each hit in the
+                concatenated unitigs (see _iter_records())
+            probe_lens: numpy array giving the length of each probe
+
+        Returns:
+            array of shape (4, number of ranges) giving, for each range
+            that a probe covers in a sequence through a run, the sequence,
+            probe id, and endpoints (possibly with duplicates)
+        """
+        probe_ids, align, starts, ends = unitig_hits.astype(np.int64)
+        if len(probe_ids) == 0 or len(self.run_seq) == 0:
+            return np.zeros((4, 0), dtype=np.int64)
+
+        # Sort the hits by alignment
+        order = np.argsort(align, kind='stable')
+        probe_ids, align = probe_ids[order], align[order]
+        starts, ends = starts[order], ends[order]
+
+        # For each run, find the hits whose probes may lie within its
+        # part of the concatenated unitigs, and then keep those that do
+        run_start = (self._unitig_offsets()[self.run_unitig] +
+                     self.run_unitig_start)
+        run_end = run_start + self.run_len
+        lo = np.searchsorted(align, run_start, side='left')
+        hi = np.searchsorted(align, run_end - probe_lens.min(), side='right')
+        num_hits = np.maximum(0, hi - lo)
+        hit_run = np.repeat(np.arange(len(lo)), num_hits)
+        hit_first = np.cumsum(num_hits) - num_hits
+        hit_idx = (np.repeat(lo - hit_first, num_hits) +
+                   np.arange(int(num_hits.sum())))
+        within = (align[hit_idx] + probe_lens[probe_ids[hit_idx]] <=
+                  run_end[hit_run])
+        hit_run, hit_idx = hit_run[within], hit_idx[within]
+
+        shift = self.run_seq_start[hit_run] - run_start[hit_run]
+        return np.vstack((self.run_seq[hit_run], probe_ids[hit_idx],
+                          starts[hit_idx] + shift, ends[hit_idx] + shift))
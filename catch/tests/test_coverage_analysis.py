@@ -57,6 +57,25 @@ class TestAnalyzerWithTwoTargetGenomes(unittest.TestCase):
         self.assertCountEqual(self.analyzer.target_covers[1][0][True],
                               [])   # no coverage in reverse complement
 
+    def test_probe_cover_ranges_with_seeding(self):
+        """Test that seeding the k-mer probe map with minimizers or spaced
+        seeds finds the same probe cover ranges.
+        """
+        for seeding in probe.KMER_PROBE_MAP_SEEDINGS:
+            analyzer = ca.Analyzer(self.analyzer.probes,
+                                   mismatches=0,
+                                   lcf_thres=6,
+                                   target_genomes=self.analyzer.target_genomes,
+                                   target_genomes_names=["g_a", "g_b"],
+                                   kmer_probe_map_k=3,
+                                   kmer_probe_map_seeding=seeding)
+            analyzer.run(window_length=6, window_stride=3)
+            for i in range(2):
+                for rc in [False, True]:
+                    self.assertCountEqual(
+                        analyzer.target_covers[i][0][rc],
+                        self.analyzer.target_covers[i][0][rc])
+
     def test_bp_covered(self):
         """Test the calculation of the number of bp covered.
 
@@ -4,6 +4,8 @@
 from collections import OrderedDict
 import unittest
 
+import numpy as np
+
 from catch import genome
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -77,3 +79,32 @@ class TestGenome(unittest.TestCase):
         self.assertNotEqual(genome_one_seq2, genome_two_chrs2)
         self.assertEqual(genome_two_chrs1, genome_two_chrs1)
         self.assertNotEqual(genome_two_chrs1, genome_two_chrs2)
+
+class TestGenomeFromBuffer(unittest.TestCase):
+    """Tests constructing a Genome that wraps a buffer.
+    """
+
+    def test_one_seq(self):
+        buffer = np.frombuffer(b'XXATCGNYY', dtype=np.uint8)
+        gnm = genome.Genome.from_buffer(buffer, [(2, 7)])
+        self.assertFalse(gnm.divided_into_chrs())
+        self.assertEqual(gnm.size(), 5)
+        self.assertEqual(gnm.size(only_unambig=True), 4)
+        self.assertEqual(gnm, genome.Genome.from_one_seq('ATCGN'))
+        self.assertEqual(hash(gnm), hash(genome.Genome.from_one_seq('ATCGN')))
+
+    def test_chrs(self):
+        buffer = np.frombuffer(b'ATCGGG', dtype=np.uint8)
+        gnm = genome.Genome.from_buffer(buffer, [(0, 2), (2, 6)],
+                                        chr_names=['chr1', 'chr2'])
+        self.assertTrue(gnm.divided_into_chrs())
+        self.assertEqual(gnm.size(), 6)
+        expected = genome.Genome.from_chrs(
+            OrderedDict([('chr1', 'AT'), ('chr2', 'CGGG')]))
+        self.assertEqual(gnm, expected)
+        self.assertEqual(gnm.chrs, expected.chrs)
+
+    def test_multiple_seqs_without_chrs(self):
+        buffer = np.frombuffer(b'ATCG', dtype=np.uint8)
+        with self.assertRaises(ValueError):
+            genome.Genome.from_buffer(buffer, [(0, 2), (2, 4)])
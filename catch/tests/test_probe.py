@@ -10,6 +10,7 @@ import unittest
 import numpy as np
 
 from catch import probe
+from catch.utils import interval
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
 
@@ -43,6 +44,31 @@ class TestProbe(unittest.TestCase):
                                                 'G', 'C', 'G', 'G', 'A', 'T',
                                                 'C', 'G']))
 
+    def test_construct_from_other_types(self):
+        """Test that probes constructed from bytes, strings, and arrays
+        are equal.
+        """
+        a_from_bytes = probe.Probe(b'ATCGTCGCGGATCG')
+        a_from_str = probe.Probe('ATCGTCGCGGATCG')
+        a_from_array = probe.Probe(np.array(list('ATCGTCGCGGATCG')))
+        for p in [a_from_bytes, a_from_str, a_from_array]:
+            self.assertEqual(p, self.a)
+            self.assertEqual(hash(p), hash(self.a))
+            self.assertEqual(p.seq_str, 'ATCGTCGCGGATCG')
+        self.assertNotEqual(self.a, self.b)
+        self.assertNotEqual(self.a, 'ATCGTCGCGGATCG')
+
+    def test_compact(self):
+        """Test that a probe has no __dict__ and only makes its k-mer
+        caches when they are used.
+        """
+        self.assertFalse(hasattr(self.a, '__dict__'))
+        self.assertIsNone(self.a._kmers)
+        self.assertIsNone(self.a._kmers_rand_choices)
+        self.a.shares_some_kmers(self.d, k=5)
+        self.assertIn(5, self.a.kmers)
+        self.assertIn(5, self.d.kmers)
+
     def test_mismatches(self):
         """Test mismatches method.
         """
@@ -339,6 +365,61 @@ class TestConstructPigeonholedKmerProbeMap(unittest.TestCase):
         logging.disable(logging.NOTSET)
 
 
+class TestProbeSet(unittest.TestCase):
+    """Tests the ProbeSet class.
+    """
+
+    def setUp(self):
+        self.seqs = ['ATCGTCGCGG', 'TGACGNCACC', 'ATCG', 'ATCGTCGCGG',
+                     'AGCTGCTCTTAA', 'ATCG']
+        self.probes = [probe.Probe.from_str(s) for s in self.seqs]
+        self.ps = probe.ProbeSet.from_seqs(self.seqs)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.ps), 6)
+        self.assertEqual(self.ps.seqs.shape, (6, 12))
+        self.assertEqual(self.ps.to_probes(), self.probes)
+        self.assertEqual(list(self.ps), self.probes)
+        self.assertEqual(self.ps[1], self.probes[1])
+
+    def test_from_probes_keeps_metadata(self):
+        self.probes[2].is_flanking_n_string = True
+        self.probes[3].header = 'h'
+        ps = probe.ProbeSet.from_probes(self.probes)
+        self.assertTrue(ps[2].is_flanking_n_string)
+        self.assertFalse(ps[3].is_flanking_n_string)
+        self.assertEqual(ps[3].header, 'h')
+        self.assertIsNone(ps[2].header)
+
+    def test_indexing(self):
+        self.assertEqual(self.ps[1:3].to_probes(), self.probes[1:3])
+        self.assertEqual(self.ps[np.array([4, 0])].to_probes(),
+                         [self.probes[4], self.probes[0]])
+        mask = np.array([True, False, True, False, False, True])
+        self.assertEqual(self.ps[mask].to_probes(),
+                         [self.probes[0], self.probes[2], self.probes[5]])
+
+    def test_unique(self):
+        self.assertEqual(self.ps.unique().to_probes(),
+                         [self.probes[i] for i in [0, 1, 2, 4]])
+
+    def test_reverse_complement(self):
+        rc = self.ps.reverse_complement()
+        self.assertEqual(rc.to_probes(),
+                         [p.reverse_complement() for p in self.probes])
+        np.testing.assert_array_equal(rc.lengths, self.ps.lengths)
+
+    def test_identifiers(self):
+        self.assertEqual(self.ps.identifiers(),
+                         [p.identifier() for p in self.probes])
+
+    def test_concatenate(self):
+        ps = probe.ProbeSet.concatenate([self.ps[:2], self.ps[2:3],
+                                         self.ps[3:]])
+        self.assertEqual(ps.to_probes(), self.probes)
+        self.assertEqual(len(probe.ProbeSet.concatenate([])), 0)
+
+
 class TestSharedKmerProbeMap(unittest.TestCase):
     """Tests SharedKmerProbeMap class.
     """
@@ -402,11 +483,551 @@ class TestSharedKmerProbeMap(unittest.TestCase):
         self.assertIsNone(shared_kmer_map.get('MN'))
         self.assertEqual(shared_kmer_map.k, 2)
 
+    def test_nucleotide_keys_packed_in_2_bits(self):
+        np.random.seed(1)
+        a = probe.Probe.from_str('ACGTACGTAC')
+        b = probe.Probe.from_str('TTGCAACGTA')
+        kmer_map = probe._construct_rand_kmer_probe_map([a, b],
+                                                        k=4,
+                                                        num_kmers_per_probe=50,
+                                                        include_positions=True)
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        self.assertEqual(shared_kmer_map.bits_per_base, 2)
+        self.assertEqual(shared_kmer_map.key_len, 4)
+        self.assertEqual(shared_kmer_map.keys.dtype, np.uint64)
+        self.assertTrue(np.all(np.diff(shared_kmer_map.keys.astype(float))
+                               >= 0))
+        self.assertCountEqual(shared_kmer_map.get('ACGT'),
+                              [(a.seq_str, 0), (a.seq_str, 4),
+                               (b.seq_str, 5)])
+        self.assertCountEqual(shared_kmer_map.get('TTGC'),
+                              [(b.seq_str, 0)])
+        # 'N' is not in the alphabet of any k-mer
+        self.assertIsNone(shared_kmer_map.get('ACGN'))
+        self.assertIsNone(shared_kmer_map.get('AAAA'))
+
+    def test_kmers_longer_than_key(self):
+        # With k=40, only the first 32 bases of a k-mer fit in a key; the
+        # rest must be verified against the probe sequence
+        prefix = 'ACGT' * 8
+        a = probe.Probe.from_str(prefix + 'AAAAAAAA')
+        b = probe.Probe.from_str(prefix + 'CCCCCCCC')
+        kmer_map = probe._construct_pigeonholed_kmer_probe_map(
+            [a, b], 0, min_k=40, include_positions=True)
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        self.assertEqual(shared_kmer_map.k, 40)
+        self.assertEqual(shared_kmer_map.key_len, 32)
+        self.assertEqual(shared_kmer_map.get(a.seq_str), [(a.seq_str, 0)])
+        self.assertEqual(shared_kmer_map.get(b.seq_str), [(b.seq_str, 0)])
+        self.assertIsNone(shared_kmer_map.get(prefix + 'GGGGGGGG'))
+
+    def test_find_hits_matches_get(self):
+        np.random.seed(1)
+        kmer_map = {}
+        probes = [probe.Probe.from_str(''.join(np.random.choice(
+            ['A', 'C', 'G', 'T'], size=20))) for _ in range(10)]
+        for p in probes:
+            for kmer, pos in p.construct_kmers(6, include_positions=True):
+                kmer_map.setdefault(kmer, set()).add((p, pos))
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+
+        # Build a sequence from pieces of the probes, with some N's
+        sequence = ''.join(p.seq_str[3:15] + 'N' for p in probes)
+        end = len(sequence) - 6 + 1
+        expected = []
+        for i in range(end):
+            found = shared_kmer_map.get(sequence[i:(i + 6)])
+            if found is not None:
+                expected += [(i, seq, pos) for seq, pos in sorted(found)]
+        hit_pos, hit_probe_ids, hit_probe_pos = shared_kmer_map.find_hits(
+            sequence, 0, end)
+        hits = sorted((i, shared_kmer_map.probe_seq(probe_id), pos)
+                      for i, probe_id, pos in zip(hit_pos, hit_probe_ids,
+                                                  hit_probe_pos))
+        self.assertEqual(hits, sorted(expected))
+        self.assertGreater(len(hits), 0)
+        # No window containing an N should be hit
+        for i in hit_pos:
+            self.assertNotIn('N', sequence[i:(i + 6)])
+
+    def test_find_hits_in_part_of_sequence(self):
+        a = probe.Probe.from_str('ACGTTGCA')
+        kmer_map = {'CGTT': {(a, 1)}, 'TGCA': {(a, 4)}}
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        sequence = 'ACGTTGCAACGTTGCA'
+        hit_pos, hit_probe_ids, hit_probe_pos = shared_kmer_map.find_hits(
+            sequence, 2, 12)
+        self.assertEqual(list(hit_pos), [4, 9])
+        self.assertEqual(list(hit_probe_pos), [4, 1])
+        hit_pos, _, _ = shared_kmer_map.find_hits(sequence, 5, 5)
+        self.assertEqual(len(hit_pos), 0)
+
+        # The sequence may be given as an array of its characters
+        chars = np.frombuffer(sequence.encode(), dtype=np.uint8)
+        for x, y in zip(shared_kmer_map.find_hits(chars, 2, 12),
+                        shared_kmer_map.find_hits(sequence, 2, 12)):
+            np.testing.assert_array_equal(x, y)
+
+    def test_shared_memory(self):
+        a = probe.Probe.from_str('ABCDEFGABC')
+        b = probe.Probe.from_str('XYZDEFHGHI')
+        kmer_map = probe._construct_rand_kmer_probe_map([a, b], k=3,
+                                                        num_kmers_per_probe=50,
+                                                        include_positions=True)
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        shm, handle = shared_kmer_map.to_shared_memory()
+        try:
+            attached_shm, attached_map = \
+                probe.SharedKmerProbeMap.from_shared_memory(handle)
+            for kmer in ['DEF', 'ABC', 'EFH', 'MNO']:
+                self.assertEqual(attached_map.get(kmer),
+                                 shared_kmer_map.get(kmer))
+            sequence = 'QQABCDEFGABCXYZDEF'
+            for x, y in zip(attached_map.find_hits(sequence, 0, 16),
+                            shared_kmer_map.find_hits(sequence, 0, 16)):
+                np.testing.assert_array_equal(x, y)
+            del attached_map
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_construct_from_probes(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in np.random.randint(0, 2900, size=50)]
+        # Include a repeated probe and probes of other lengths
+        probes += [probes[0]]
+        probes += [probe.Probe.from_str(genome[i:(i + 60)])
+                   for i in np.random.randint(0, 2900, size=10)]
+        probes += [probe.Probe.from_str('ACGTN' * 16)]
+
+        def entries(kmer_map):
+            return sorted(zip(kmer_map.keys.tolist(),
+                              [kmer_map.probe_seq(i)
+                               for i in kmer_map.probe_ids.tolist()],
+                              kmer_map.probe_pos.tolist()))
+
+        # Use the pigeonhole approach (when all probes have the same
+        # length), the random approach because lcf_thres is less than the
+        # probe length, and the random approach because the probes have
+        # different lengths
+        for probes_to_map, lcf_thres in [(probes[:50], 80),
+                                         (probes[:50], 70),
+                                         (probes, 80)]:
+            for rc in [False, True]:
+                np.random.seed(2)
+                expected = probe.SharedKmerProbeMap.construct(
+                    probe.construct_kmer_probe_map_to_find_probe_covers(
+                        probes_to_map, 3, lcf_thres, min_k=10, k=10),
+                    include_reverse_complements=rc)
+                for probes_input in [probes_to_map,
+                                     probe.ProbeSet.from_probes(
+                                         probes_to_map)]:
+                    np.random.seed(2)
+                    kmer_map = \
+                        probe.SharedKmerProbeMap.construct_from_probes(
+                            probes_input, 3, lcf_thres, min_k=10, k=10,
+                            include_reverse_complements=rc,
+                            include_native_dict=not rc)
+                    self.assertEqual(kmer_map.k, expected.k)
+                    self.assertEqual(kmer_map.num_forward_probes,
+                                     expected.num_forward_probes)
+                    self.assertEqual(entries(kmer_map), entries(expected))
+                    self.assertCountEqual(kmer_map.probes, expected.probes)
+                    if not rc:
+                        self.assertEqual(
+                            {kmer: sorted(v) for kmer, v in
+                             kmer_map.native_dict.items()},
+                            {kmer: sorted(v) for kmer, v in
+                             expected.native_dict.items()})
+
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes[:50], 3, 80, min_k=10, k=10)
+        self.assertIsNone(kmer_map.native_dict)
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 80)
+        with self.assertRaises(ValueError):
+            probe.open_probe_finding_pool(kmer_map, f, use_native_dict=True)
+        with self.assertRaises(ValueError):
+            probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=70)
+
+    def test_spaced_seed_offsets(self):
+        self.assertEqual(probe._spaced_seed_offsets(1), (1, (0,)))
+        self.assertEqual(probe._spaced_seed_offsets(4), (5, (0, 1, 3, 4)))
+        for weight in range(1, 30):
+            span, offsets = probe._spaced_seed_offsets(weight)
+            self.assertEqual(len(offsets), weight)
+            self.assertEqual(offsets[0], 0)
+            self.assertEqual(offsets[-1], span - 1)
+            # The seed is symmetric
+            self.assertEqual(offsets,
+                             tuple(span - 1 - j for j in reversed(offsets)))
+        with self.assertRaises(ValueError):
+            probe._spaced_seed_offsets(0)
+
+    def test_minimizer_positions(self):
+        np.random.seed(1)
+        probes = [probe.Probe.from_str(''.join(
+                    np.random.choice(['A', 'C', 'G', 'T'], size=n)))
+                  for n in [80] * 20 + [60, 25, 12]]
+        probe_set = probe.ProbeSet.from_probes(probes)
+        for span, offsets in [(10, range(10)),
+                              probe._spaced_seed_offsets(8)]:
+            for w in [1, 5, 20]:
+                rows, pos = probe._minimizer_positions(probe_set, span,
+                                                       offsets, w)
+                for r, p in enumerate(probes):
+                    num_pos = len(p.seq) - span + 1
+                    chosen = set(pos[rows == r].tolist())
+                    self.assertTrue(len(chosen) > 0)
+                    self.assertTrue(all(0 <= i < num_pos for i in chosen))
+                    # Every window of w consecutive positions has a
+                    # chosen position
+                    for start in range(num_pos - w + 1):
+                        self.assertTrue(
+                            chosen & set(range(start, start + w)))
+                    if w == 1:
+                        self.assertEqual(chosen, set(range(num_pos)))
+
+    def test_construct_from_probes_with_seeding(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in np.random.randint(0, 2900, size=50)]
+
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 80, k=10, seeding='minimizer')
+        self.assertEqual(kmer_map.k, 10)
+        self.assertEqual(kmer_map.anchor_len, 10)
+        # Every (indexed) k-mer is at its position in its probe
+        for key, i, pos in zip(kmer_map.keys.tolist(),
+                               kmer_map.probe_ids.tolist(),
+                               kmer_map.probe_pos.tolist()):
+            kmer = kmer_map.probe_seq(i)[pos:(pos + 10)]
+            self.assertIn((kmer_map.probe_seq(i), pos), kmer_map.get(kmer))
+
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 80, k=10, seeding='spaced',
+            include_reverse_complements=True)
+        span, offsets = probe._spaced_seed_offsets(10)
+        self.assertEqual(kmer_map.k, span)
+        self.assertEqual(kmer_map.anchor_len, 1)
+        # The bases at "don't care" positions do not matter
+        p = probes[0].seq_str
+        pos = kmer_map.probe_pos[kmer_map.probe_ids == 0][0]
+        seed = list(p[pos:(pos + span)])
+        for j in set(range(span)) - set(offsets):
+            seed[j] = 'A' if seed[j] != 'A' else 'C'
+        self.assertIn((p, pos), kmer_map.get(''.join(seed)))
+
+        shm, handle = kmer_map.to_shared_memory()
+        try:
+            attached_shm, attached_map = \
+                probe.SharedKmerProbeMap.from_shared_memory(handle)
+            self.assertEqual(attached_map.seed_offsets, offsets)
+            self.assertIn((p, pos), attached_map.get(''.join(seed)))
+            del attached_map
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        with self.assertRaises(ValueError):
+            probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=10, seeding='unknown')
+        with self.assertRaises(ValueError):
+            probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=10, seeding='spaced',
+                include_native_dict=True)
+
+    def test_prefilter(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in np.random.randint(0, 2900, size=50)]
+        other = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        sequence = genome + 'NN' + other
+
+        for kwargs in [{'k': 10},
+                       {'k': 10, 'include_reverse_complements': True},
+                       {'k': 6, 'seeding': 'minimizer'},
+                       {'k': 10, 'seeding': 'spaced'}]:
+            np.random.seed(2)
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 70, **kwargs)
+            hits = kmer_map.find_hits(sequence, 0,
+                                      len(sequence) - kmer_map.k + 1)
+            kmers = [sequence[i:(i + kmer_map.k)] for i in range(0, 6000, 7)]
+            values = [kmer_map.get(kmer) for kmer in kmers]
+            for prefilter_kwargs in [{'bits_per_key': 10},
+                                     {'false_positive_rate': 0.2},
+                                     {'kind': 'bitmap'},
+                                     {'kind': 'bloom'}]:
+                kmer_map.add_prefilter(**prefilter_kwargs)
+                kmer_map.prefilter_stats = {'queried': 0, 'passed': 0,
+                                            'found': 0}
+                hits_with_prefilter = kmer_map.find_hits(
+                    sequence, 0, len(sequence) - kmer_map.k + 1)
+                for x, y in zip(hits_with_prefilter, hits):
+                    np.testing.assert_array_equal(x, y)
+                stats = kmer_map.prefilter_stats
+                self.assertLessEqual(stats['found'], stats['passed'])
+                self.assertLess(stats['passed'], stats['queried'])
+                self.assertEqual(stats['found'], len(np.unique(hits[0])))
+                self.assertEqual([kmer_map.get(kmer) for kmer in kmers],
+                                 values)
+
+            shm, handle = kmer_map.to_shared_memory()
+            try:
+                attached_shm, attached_map = \
+                    probe.SharedKmerProbeMap.from_shared_memory(handle)
+                self.assertEqual(attached_map.prefilter.params(),
+                                 kmer_map.prefilter.params())
+                for x, y in zip(attached_map.find_hits(
+                                    sequence, 0,
+                                    len(sequence) - kmer_map.k + 1),
+                                hits):
+                    np.testing.assert_array_equal(x, y)
+                del attached_map
+                attached_shm.close()
+            finally:
+                shm.close()
+                shm.unlink()
+
+    def test_verify_cache(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, 2900, 60)]
+        # Make near-identical copies of the genome, so that most windows
+        # are verified more than once
+        sequences = []
+        for _ in range(4):
+            mutated = list(genome)
+            for j in np.random.choice(len(genome), size=10, replace=False):
+                mutated[j] = 'A' if mutated[j] != 'A' else 'C'
+            sequences += [''.join(mutated)]
+        sequences += [genome[:50], genome[:5]]
+        settings = [(3, 70, 0), (0, 80, 20)]
+        fns = [probe.probe_covers_sequence_by_longest_common_substring(3, 80),
+               probe.
+               probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                   settings)]
+
+        def find(fn, cache_size, eviction='lru', rc=False, persistent=False):
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 70, k=10, include_reverse_complements=rc)
+            probe.set_verify_cache_for_probe_finding_pools(cache_size,
+                                                           eviction)
+            if persistent:
+                probe.start_persistent_probe_finding_pool(3)
+            try:
+                probe.open_probe_finding_pool(kmer_map, fn, 3)
+                found = [found_for_seq for _, found_for_seq in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences))]
+                probe.close_probe_finding_pool()
+            finally:
+                if persistent:
+                    probe.stop_persistent_probe_finding_pool()
+                probe.set_verify_cache_for_probe_finding_pools()
+            return found
+
+        for fn in fns:
+            for rc in [False, True]:
+                expected = find(fn, 0, rc=rc)
+                self.assertEqual(find(fn, 10000, rc=rc), expected)
+                # A cache too small to hold the windows of one genome
+                # should evict outcomes but give the same output
+                for eviction in ['lru', 'fifo']:
+                    self.assertEqual(find(fn, 20, eviction, rc=rc),
+                                     expected)
+        self.assertEqual(find(fns[1], 10000, rc=True, persistent=True),
+                         expected)
+
+        # Scanning, in this process, a sequence repeated should find the
+        # outcomes of all of its hits in the cache
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 70, k=10)
+        probe.set_verify_cache_for_probe_finding_pools(10000)
+        try:
+            probe.open_probe_finding_pool(kmer_map, fns[0], 1)
+            bounds = (0, len(sequences[0]) - 10 + 1)
+            expected = probe._find_probe_covers_in_subsequence(
+                bounds, sequences[0])
+            cache = probe._pfp_worker_verify_cache
+            num_verified = cache.misses
+            self.assertGreater(num_verified, 0)
+            self.assertEqual(cache.hits, 0)
+            np.testing.assert_array_equal(
+                probe._find_probe_covers_in_subsequence(bounds, sequences[0]),
+                expected)
+            self.assertEqual(cache.hits, num_verified)
+            self.assertEqual(cache.misses, num_verified)
+            self.assertEqual(cache.hit_rate(), 0.5)
+            probe.close_probe_finding_pool()
+            self.assertIsNone(probe._pfp_worker_verify_cache)
+        finally:
+            probe.set_verify_cache_for_probe_finding_pools()
+
+        with self.assertRaises(ValueError):
+            probe.set_verify_cache_for_probe_finding_pools(10, 'random')
+
+    def test_mask_frequent_seeds(self):
+        np.random.seed(1)
+        # Make probes that share a poly-A tract, and probes made only of
+        # repeats (which must keep a fallback seed)
+        probes = []
+        for i in range(30):
+            seq = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=60))
+            probes += [probe.Probe.from_str(seq[:30] + 'A' * 20 + seq[30:])]
+        probes += [probe.Probe.from_str('A' * 80),
+                   probe.Probe.from_str('AT' * 40)]
+
+        for rc in [False, True]:
+            unmasked_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=10, seeding='minimizer', minimizer_w=1,
+                include_reverse_complements=rc)
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=10, seeding='minimizer', minimizer_w=1,
+                include_reverse_complements=rc, max_seed_occurrences=5)
+            self.assertIn(kmer_map.encode('A' * 10),
+                          kmer_map.masked_keys.tolist())
+            self.assertEqual(
+                len(kmer_map.keys) + int(np.sum(kmer_map.masked_key_counts)),
+                len(unmasked_map.keys))
+
+            # Every probe (and reverse complement) keeps a seed
+            num_ids = len(probes) * (2 if rc else 1)
+            self.assertEqual(len(np.unique(kmer_map.probe_ids)), num_ids)
+            # Only fallback seeds have more than 5 entries, and the probes
+            # made of repeats have only their fallback seed
+            _, counts = np.unique(kmer_map.keys, return_counts=True)
+            self.assertLessEqual(np.sum(counts > 5), 2 if rc else 1)
+            for p in probes[-2:]:
+                p_id = kmer_map.probes.index(p)
+                self.assertEqual(np.sum(kmer_map.probe_ids == p_id), 1)
+
+            # Scanning a poly-A tract skips the masked hits
+            hits = kmer_map.find_hits('A' * 50, 0, 41)
+            unmasked_hits = unmasked_map.find_hits('A' * 50, 0, 41)
+            self.assertEqual(
+                len(hits[0]) + kmer_map.num_masked_hits_skipped,
+                len(unmasked_hits[0]))
+            self.assertGreater(kmer_map.num_masked_hits_skipped, 0)
+
+            shm, handle = kmer_map.to_shared_memory()
+            try:
+                attached_shm, attached_map = \
+                    probe.SharedKmerProbeMap.from_shared_memory(handle)
+                np.testing.assert_array_equal(attached_map.masked_keys,
+                                              kmer_map.masked_keys)
+                attached_map.find_hits('A' * 50, 0, 41)
+                self.assertEqual(attached_map.num_masked_hits_skipped,
+                                 kmer_map.num_masked_hits_skipped)
+                del attached_map
+                attached_shm.close()
+            finally:
+                shm.close()
+                shm.unlink()
+
+        # The native dict is masked too
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 80, k=10, seeding='minimizer', minimizer_w=1,
+            include_native_dict=True, max_seed_occurrences=5)
+        self.assertEqual(sum(len(v) for v in kmer_map.native_dict.values()),
+                         len(kmer_map.keys))
+
+    def test_reverse_complements(self):
+        a = probe.Probe.from_str('AACGTTGCAT')
+        b = probe.Probe.from_str('GGGATCCATT')
+        kmer_map = probe._construct_rand_kmer_probe_map([a, b], k=4,
+                                                        num_kmers_per_probe=50,
+                                                        include_positions=True)
+        shared_kmer_map = probe.SharedKmerProbeMap.construct(
+            kmer_map, include_reverse_complements=True)
+        self.assertEqual(shared_kmer_map.num_forward_probes, 2)
+        a_rc = a.reverse_complement().seq_str
+        b_rc = b.reverse_complement().seq_str
+        # a's reverse complement is 'ATGCAACGTT', so 'AACG' is at
+        # position 0 of a and position 4 of it, and its reverse
+        # complement 'CGTT' is at position 2 of a and position 6 of it
+        self.assertCountEqual(shared_kmer_map.get('AACG'),
+                              [(a.seq_str, 0), (a_rc, 4)])
+        self.assertCountEqual(shared_kmer_map.get('CGTT'),
+                              [(a.seq_str, 2), (a_rc, 6)])
+        # 'ATGC' and 'AATG' only occur in reverse complements
+        self.assertCountEqual(shared_kmer_map.get('ATGC'),
+                              [(a_rc, 0)])
+        self.assertCountEqual(shared_kmer_map.get('AATG'),
+                              [(b_rc, 0)])
+        self.assertIsNone(probe.SharedKmerProbeMap.construct(
+            kmer_map).num_forward_probes)
+
+        shm, handle = shared_kmer_map.to_shared_memory()
+        try:
+            attached_shm, attached_map = \
+                probe.SharedKmerProbeMap.from_shared_memory(handle)
+            self.assertEqual(attached_map.num_forward_probes, 2)
+            self.assertCountEqual(attached_map.get('AATG'), [(b_rc, 0)])
+            del attached_map
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
     def tearDown(self):
         # Re-enable logging
         logging.disable(logging.NOTSET)
 
 
+class TestSharedSequenceCollection(unittest.TestCase):
+    """Tests the SharedSequenceCollection class.
+    """
+
+    def setUp(self):
+        self.sequences = ['ACGTACGT', '', 'NNACG', 'T' * 20]
+
+    def test_construct(self):
+        sequences = probe.SharedSequenceCollection.construct(self.sequences)
+        self.assertEqual(len(sequences), 4)
+        for i, seq in enumerate(self.sequences):
+            self.assertEqual(sequences.sequence_len(i), len(seq))
+            self.assertEqual(sequences.sequence(i), seq)
+            self.assertEqual(sequences.sequence_chars(i).tobytes(),
+                             seq.encode())
+
+    def test_shared_memory(self):
+        sequences = probe.SharedSequenceCollection.construct(self.sequences)
+        shm, handle = sequences.to_shared_memory()
+        try:
+            attached_shm, attached = \
+                probe.SharedSequenceCollection.from_shared_memory(handle)
+            self.assertEqual([attached.sequence(i)
+                              for i in range(len(attached))],
+                             self.sequences)
+            del attached
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        # An empty collection
+        shm, handle = probe.SharedSequenceCollection.construct(
+            []).to_shared_memory()
+        try:
+            attached_shm, attached = \
+                probe.SharedSequenceCollection.from_shared_memory(handle)
+            self.assertEqual(len(attached), 0)
+            del attached
+            attached_shm.close()
+        finally:
+            shm.close()
+            shm.unlink()
+
+
 class TestProbeCoversSequenceByLongestCommonSubstring(unittest.TestCase):
     """Tests probe_covers_sequence_by_longest_common_substring function.
     """
@@ -742,6 +1363,558 @@ class TestFindProbeCoversInSequence(unittest.TestCase):
             probe.close_probe_finding_pool()
             time.sleep(1)
 
+    def test_batched_lcf_same_as_per_hit(self):
+        """Tests that verifying hits in batches (which is done when the
+        cover function comes from
+        probe_covers_sequence_by_longest_common_substring()) gives the
+        same covers as calling the cover function for each hit.
+        """
+        np.random.seed(1)
+        sequence = ''.join(np.random.choice(['A', 'C', 'G', 'T'],
+                                            size=5000))
+        probes = []
+        for start in np.random.randint(-50, 5000, size=100):
+            probe_str = sequence[max(0, start):(start + 100)]
+            probe_str = list(probe_str.rjust(100, 'A'))
+            for pos in np.random.randint(0, 100, size=3):
+                probe_str[pos] = 'T'
+            probes += [probe.Probe.from_str(''.join(probe_str))]
+        kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+            probes, 3, 80)
+        kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        for island in [0, 30]:
+            f = probe.probe_covers_sequence_by_longest_common_substring(
+                3, 80, island_of_exact_match=island)
+            # Wrapping f hides its parameters, so that it is called
+            # for each hit
+            def f_per_hit(*args):
+                return f(*args)
+            found = []
+            for fn in [f, f_per_hit]:
+                probe.open_probe_finding_pool(kmer_map, fn, 2)
+                found += [probe.find_probe_covers_in_sequence(sequence)]
+                probe.close_probe_finding_pool()
+            self.assertGreater(len(found[0]), 0)
+            self.assertEqual(found[0], found[1])
+
+    def test_persistent_pool(self):
+        np.random.seed(1)
+        sequence = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=5000))
+        probes_by_map = []
+        for start in [(100, 900, 2500), (400, 1700, 4200)]:
+            probes_by_map += [[probe.Probe.from_str(sequence[i:(i + 80)])
+                               for i in start]]
+        kmer_maps = []
+        for probes in probes_by_map:
+            kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+                probes, 3, 80)
+            kmer_maps += [probe.SharedKmerProbeMap.construct(kmer_map)]
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 80)
+        def f_per_hit(*args):
+            # Cannot be pickled, so the persistent pool cannot be used
+            return f(*args)
+
+        def find(kmer_map, fn, use_native_dict=False):
+            probe.open_probe_finding_pool(kmer_map, fn, 3,
+                                          use_native_dict=use_native_dict)
+            found = probe.find_probe_covers_in_sequence(sequence)
+            probe.close_probe_finding_pool()
+            return found
+
+        expected = [find(kmer_map, f) for kmer_map in kmer_maps]
+        self.assertGreater(len(expected[0]), 0)
+
+        probe.start_persistent_probe_finding_pool(3)
+        try:
+            with self.assertRaises(RuntimeError):
+                probe.start_persistent_probe_finding_pool(3)
+            # Alternate between the maps so that the workers switch
+            # between shared memory blocks
+            for i in [0, 1, 0]:
+                self.assertEqual(find(kmer_maps[i], f), expected[i])
+            self.assertEqual(find(kmer_maps[1], f_per_hit), expected[1])
+            self.assertEqual(find(kmer_maps[0], f, use_native_dict=True),
+                             expected[0])
+        finally:
+            probe.stop_persistent_probe_finding_pool()
+        # Stopping again does nothing
+        probe.stop_persistent_probe_finding_pool()
+
+    def test_many_sequences(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=5000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, 4900, 350)]
+        kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+            probes, 3, 80)
+        kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 80)
+        # Take sequences of varied lengths from the genome, including some
+        # shorter than k and some long enough to be split across processes
+        # (with the task size lowered below)
+        sequences = []
+        for length in [0, 5, 100, 300, 250, 2000, 90, 4000, 150, 200]:
+            start = np.random.randint(0, 5000 - length + 1)
+            sequences += [genome[start:(start + length)]]
+        sequences *= 3
+        records = [(('seq', i), seq) for i, seq in enumerate(sequences)]
+
+        def find_each(merge_overlapping):
+            probe.open_probe_finding_pool(kmer_map, f, 3)
+            found = [(key, probe.find_probe_covers_in_sequence(
+                        seq, merge_overlapping=merge_overlapping))
+                     for key, seq in records]
+            probe.close_probe_finding_pool()
+            return found
+
+        def find_batched(merge_overlapping, dedup=False):
+            probe.open_probe_finding_pool(kmer_map, f, 3)
+            found = list(probe.find_probe_covers_in_sequences(
+                iter(records), merge_overlapping=merge_overlapping,
+                dedup=dedup))
+            probe.close_probe_finding_pool()
+            return found
+
+        # Lower the task size, and the size of the shared memory blocks
+        # holding the sequences so that several are used
+        batch_task_len = probe._BATCH_TASK_LEN
+        shared_sequences_len = probe._SHARED_SEQUENCES_LEN
+        probe._BATCH_TASK_LEN = 500
+        probe._SHARED_SEQUENCES_LEN = 3000
+        try:
+            for merge_overlapping in [False, True]:
+                expected = find_each(merge_overlapping)
+                self.assertGreater(sum(len(found)
+                                       for _, found in expected), 0)
+                self.assertEqual(find_batched(merge_overlapping), expected)
+                # The sequences are repeated, so scanning only distinct
+                # ones should give the same output
+                self.assertEqual(find_batched(merge_overlapping, dedup=True),
+                                 expected)
+
+                probe.start_persistent_probe_finding_pool(3)
+                try:
+                    self.assertEqual(find_batched(merge_overlapping),
+                                     expected)
+                finally:
+                    probe.stop_persistent_probe_finding_pool()
+
+            # Stopping early, before all tasks are submitted, should
+            # leave the pool usable
+            probe.open_probe_finding_pool(kmer_map, f, 3)
+            found = probe.find_probe_covers_in_sequences(iter(records * 20))
+            self.assertEqual(next(found), expected[0])
+            found.close()
+            found = probe.find_probe_covers_in_sequences(iter(records * 20),
+                                                         dedup=True)
+            self.assertEqual(next(found), expected[0])
+            found.close()
+            self.assertEqual(
+                list(probe.find_probe_covers_in_sequences(iter(records))),
+                expected)
+
+            # A scan whose output is partly read should not block other
+            # scans with the same pool, and scans can be read alongside
+            # each other
+            partly_read = probe.find_probe_covers_in_sequences(
+                iter(records * 20))
+            for i in range(3):
+                self.assertEqual(next(partly_read), expected[i])
+            self.assertEqual(
+                probe.find_probe_covers_in_sequence(records[7][1]),
+                expected[7][1])
+            found = [[], []]
+            for x, y in zip(
+                    probe.find_probe_covers_in_sequences(iter(records)),
+                    probe.find_probe_covers_in_sequences(iter(records),
+                                                         dedup=True)):
+                found[0] += [x]
+                found[1] += [y]
+            self.assertEqual(found, [expected, expected])
+            self.assertEqual(next(partly_read), expected[3])
+            partly_read.close()
+            probe.close_probe_finding_pool()
+        finally:
+            probe._BATCH_TASK_LEN = batch_task_len
+            probe._SHARED_SEQUENCES_LEN = shared_sequences_len
+
+    def test_for_each_setting(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        # Make probes from the genome, with some mutations so that the
+        # settings differ in the coverage they find
+        probes = []
+        for i in range(0, 2900, 130):
+            probe_seq = list(genome[i:(i + 80)])
+            for j in np.random.choice(80, size=i % 5, replace=False):
+                probe_seq[j] = 'A' if probe_seq[j] != 'A' else 'C'
+            probes += [probe.Probe.from_str(''.join(probe_seq))]
+        sequences = [genome, genome[1000:1500], genome[:50]]
+        settings = [(0, 80, 0), (2, 70, 0), (4, 60, 20), (3, 80)]
+
+        # Use the same k-mer probe map for each setting
+        kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+            probes, 4, 60, min_k=10, k=10)
+        kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+
+        for merge_overlapping in [True, False]:
+            expected = []
+            for setting in settings:
+                f = probe.probe_covers_sequence_by_longest_common_substring(
+                    *setting)
+                probe.open_probe_finding_pool(kmer_map, f, 3)
+                expected += [[probe.find_probe_covers_in_sequence(
+                                seq, merge_overlapping=merge_overlapping)
+                              for seq in sequences]]
+                probe.close_probe_finding_pool()
+            # The settings should find different coverage
+            self.assertNotEqual(expected[0], expected[1])
+
+            f = probe.\
+                probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                    settings)
+            for persistent in [False, True]:
+                if persistent:
+                    probe.start_persistent_probe_finding_pool(3)
+                probe.open_probe_finding_pool(kmer_map, f, 3)
+                found = [probe.find_probe_covers_in_sequence(
+                            seq, merge_overlapping=merge_overlapping)
+                         for seq in sequences]
+                found_batched = [found_for_seq for _, found_for_seq in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences),
+                        merge_overlapping=merge_overlapping)]
+                probe.close_probe_finding_pool()
+                if persistent:
+                    probe.stop_persistent_probe_finding_pool()
+                for i in range(len(settings)):
+                    self.assertEqual([x[i] for x in found], expected[i])
+                    self.assertEqual([x[i] for x in found_batched],
+                                     expected[i])
+
+    def test_both_strands(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        genome = genome[:1200] + 'NNNN' + genome[1204:]
+        genome_rc = probe.Probe.from_str(genome).reverse_complement().seq_str
+        # Make probes from both strands of the genome, with some mutations
+        probes = []
+        for i in range(0, 2900, 110):
+            probe_seq = list((genome, genome_rc)[(i // 110) % 2][i:(i + 80)])
+            for j in np.random.choice(80, size=i % 4, replace=False):
+                probe_seq[j] = 'A' if probe_seq[j] != 'A' else 'C'
+            probes += [probe.Probe.from_str(''.join(probe_seq))]
+        sequences = [genome, genome[1000:1500], genome[:50], genome[:5]]
+        settings = [(3, 70, 0), (0, 80, 20)]
+
+        kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+            probes, 3, 70, min_k=10, k=10)
+        fwd_kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+        kmer_map = probe.SharedKmerProbeMap.construct(
+            kmer_map, include_reverse_complements=True)
+
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 70)
+        def f_per_hit(*args):
+            return f(*args)
+        f_for_each_setting = probe.\
+            probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                settings)
+
+        def find(kmer_map, fn, seqs):
+            probe.open_probe_finding_pool(kmer_map, fn, 3)
+            found = [found_for_seq for _, found_for_seq in
+                probe.find_probe_covers_in_sequences(enumerate(seqs))]
+            probe.close_probe_finding_pool()
+            return found
+
+        # Scanning each strand separately should give the same output
+        sequences_rc = [probe.Probe.from_str(seq).reverse_complement().seq_str
+                        if seq else seq for seq in sequences]
+        expected = list(zip(find(fwd_kmer_map, f, sequences),
+                            find(fwd_kmer_map, f, sequences_rc)))
+        self.assertGreater(len(expected[0][0]), 0)
+        self.assertGreater(len(expected[0][1]), 0)
+        self.assertEqual(expected[3], ({}, {}))
+        self.assertEqual(find(kmer_map, f, sequences), expected)
+        self.assertEqual(find(kmer_map, f_per_hit, sequences), expected)
+        probe.open_probe_finding_pool(kmer_map, f, 3)
+        self.assertEqual(probe.find_probe_covers_in_sequence(sequences[1]),
+                         expected[1])
+        probe.close_probe_finding_pool()
+
+        expected_for_each_setting = list(zip(
+            find(fwd_kmer_map, f_for_each_setting, sequences),
+            find(fwd_kmer_map, f_for_each_setting, sequences_rc)))
+        found = find(kmer_map, f_for_each_setting, sequences)
+        for x, (y_fwd, y_rc) in zip(found, expected_for_each_setting):
+            self.assertEqual(x, list(zip(y_fwd, y_rc)))
+
+        probe.start_persistent_probe_finding_pool(3)
+        try:
+            self.assertEqual(find(kmer_map, f, sequences), expected)
+        finally:
+            probe.stop_persistent_probe_finding_pool()
+
+        # The native dict does not hold the reverse complements
+        with self.assertRaises(ValueError):
+            probe.open_probe_finding_pool(kmer_map, f, 3,
+                                          use_native_dict=True)
+
+    def test_as_arrays(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, 2900, 70)]
+        sequences = [genome, genome[500:1500], genome[:5]]
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 80, include_reverse_complements=True)
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 80)
+
+        def to_dict(found):
+            probe_ids, starts, ends = found
+            d = {}
+            for probe_id, start, end in zip(probe_ids.tolist(),
+                                            starts.tolist(), ends.tolist()):
+                d.setdefault(kmer_map.probes[probe_id], []).append(
+                    (start, end))
+            return d
+
+        probe.open_probe_finding_pool(kmer_map, f, 3)
+        try:
+            for merge_overlapping in [True, False]:
+                expected = [
+                    found for _, found in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences),
+                        merge_overlapping=merge_overlapping)]
+                self.assertGreater(len(expected[0][0]), 0)
+                found = [
+                    found for _, found in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences),
+                        merge_overlapping=merge_overlapping,
+                        as_arrays=True)]
+                self.assertEqual([tuple(to_dict(x) for x in by_strand)
+                                  for by_strand in found], expected)
+                # A sequence shorter than k gives empty arrays, with the
+                # same structure as the others
+                self.assertEqual([[y.tolist() for y in x] for x in found[2]],
+                                 [[[], [], []], [[], [], []]])
+                found = probe.find_probe_covers_in_sequence(
+                    sequences[1], merge_overlapping=merge_overlapping,
+                    as_arrays=True)
+                self.assertEqual(tuple(to_dict(x) for x in found),
+                                 expected[1])
+        finally:
+            probe.close_probe_finding_pool()
+
+    def test_pack_covers(self):
+        covers = probe._pack_covers(np.array([0, 2]), np.array([5, 10]),
+                                    np.array([20, 30]))
+        self.assertEqual(covers.dtype, np.int32)
+        self.assertEqual(covers.tolist(), [[0, 2], [5, 10], [20, 30]])
+        covers = probe._pack_covers(np.array([0]), np.array([2**31]),
+                                    np.array([2**31 + 5]))
+        self.assertEqual(covers.dtype, np.int64)
+        self.assertEqual(covers.tolist(), [[0], [2**31], [2**31 + 5]])
+        covers = probe._pack_covers(np.array([1]), np.array([-3]))
+        self.assertEqual(covers.dtype, np.int32)
+        self.assertEqual(covers.tolist(), [[1], [-3]])
+
+    def test_per_hit(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=3000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, 2900, 70)]
+        # Include sequences that clip probes at their ends
+        sequences = [genome, genome[500:1500], genome[:5], genome[20:90]]
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 60, k=10)
+        settings = [(3, 60, 0), (0, 80, 0)]
+        cover_fns = [
+            probe.probe_covers_sequence_by_longest_common_substring(3, 60),
+            probe.\
+                probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                    settings)]
+        for cover_fn in cover_fns:
+            probe.open_probe_finding_pool(kmer_map, cover_fn, 3)
+            try:
+                expected = [
+                    found for _, found in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences), as_arrays=True)]
+                found = [
+                    found for _, found in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences), per_hit=True)]
+            finally:
+                probe.close_probe_finding_pool()
+            if isinstance(expected[0], tuple):
+                expected = [[x] for x in expected]
+                found = [[x] for x in found]
+            for seq, expected_for_seq, found_for_seq in \
+                    zip(sequences, expected, found):
+                for x, hits in zip(expected_for_seq, found_for_seq):
+                    self.assertEqual(hits.shape[0], 4)
+                    probe_ids, align, starts, ends = hits
+                    # Each probe should be aligned where it was taken
+                    # from the genome, and cover part of that alignment
+                    for probe_id, a, start, end in hits.T.tolist():
+                        p = kmer_map.probes[probe_id].seq_str
+                        self.assertEqual(
+                            seq[max(0, a):(a + len(p))],
+                            p[max(0, -a):(len(seq) - a)])
+                        self.assertLessEqual(max(0, a), start)
+                        self.assertLessEqual(end, min(len(seq), a + len(p)))
+                    # Merging the ranges of each probe should give the
+                    # output without per_hit
+                    merged = interval.merge_overlapping_by_key(
+                        probe_ids, starts, ends)
+                    self.assertEqual([y.tolist() for y in merged],
+                                     [y.tolist() for y in x])
+            self.assertGreater(found[1][0].shape[1], 0)
+            self.assertEqual(found[2][0].shape, (4, 0))
+            self.assertTrue(np.any(found[1][0][1] < 0))
+
+        # Output per hit requires verifying hits in batches, on one strand
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 3, 60, k=10, include_reverse_complements=True)
+        probe.open_probe_finding_pool(kmer_map, cover_fns[0], 3)
+        try:
+            with self.assertRaises(ValueError):
+                list(probe.find_probe_covers_in_sequences(
+                    enumerate(sequences), per_hit=True))
+        finally:
+            probe.close_probe_finding_pool()
+
+    def test_prefilter(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=5000))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, 4900, 60)]
+        mutated = list(genome)
+        for j in np.random.choice(len(genome), size=100, replace=False):
+            mutated[j] = 'A' if mutated[j] != 'A' else 'C'
+        sequences = [''.join(mutated), ''.join(mutated[1000:1500]),
+                     genome[:5]]
+        f = probe.probe_covers_sequence_by_longest_common_substring(3, 80)
+
+        def find(prefilter_bits_per_key, rc=False, persistent=False):
+            np.random.seed(2)
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 3, 80, k=10, include_reverse_complements=rc,
+                prefilter_bits_per_key=prefilter_bits_per_key)
+            if persistent:
+                probe.start_persistent_probe_finding_pool(3)
+            try:
+                probe.open_probe_finding_pool(kmer_map, f, 3)
+                found = [found_for_seq for _, found_for_seq in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences))]
+                probe.close_probe_finding_pool()
+            finally:
+                if persistent:
+                    probe.stop_persistent_probe_finding_pool()
+            return found
+
+        for rc in [False, True]:
+            expected = find(None, rc=rc)
+            self.assertGreater(len(expected[0]), 0)
+            self.assertEqual(find(10, rc=rc), expected)
+            self.assertEqual(find(2, rc=rc), expected)
+        self.assertEqual(find(10, rc=True, persistent=True), expected)
+
+    def test_mask_frequent_seeds(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=5000))
+        # Put poly-A tracts throughout the genome
+        genome = ''.join(genome[i:(i + 100)] + 'A' * 25
+                         for i in range(0, 5000, 100))
+        probes = [probe.Probe.from_str(genome[i:(i + 80)])
+                  for i in range(0, len(genome) - 80, 40)]
+        probes += [probe.Probe.from_str('A' * 80)]
+        sequences = [genome, genome[1000:1500], 'C' + 'A' * 100 + 'C']
+        f = probe.probe_covers_sequence_by_longest_common_substring(0, 80)
+
+        def find(max_seed_occurrences, rc=False, persistent=False):
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 0, 80, k=10, seeding='minimizer',
+                include_reverse_complements=rc,
+                max_seed_occurrences=max_seed_occurrences)
+            if persistent:
+                probe.start_persistent_probe_finding_pool(3)
+            try:
+                probe.open_probe_finding_pool(kmer_map, f, 3)
+                found = [found_for_seq for _, found_for_seq in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences))]
+                probe.close_probe_finding_pool()
+            finally:
+                if persistent:
+                    probe.stop_persistent_probe_finding_pool()
+            return found
+
+        # Each probe has a seed outside of the poly-A tracts, or keeps a
+        # fallback seed, so masking does not lose covers here
+        for rc in [False, True]:
+            expected = find(None, rc=rc)
+            self.assertGreater(len(expected[0]), 0)
+            self.assertEqual(find(3, rc=rc), expected)
+        self.assertEqual(find(3, rc=True, persistent=True), expected)
+        # The poly-A probe is found through its fallback seed
+        self.assertIn(probe.Probe.from_str('A' * 80), expected[2][0])
+
+    def test_seeding(self):
+        np.random.seed(1)
+        genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'], size=5000))
+        genome_rc = probe.Probe.from_str(genome).reverse_complement().seq_str
+        # Make probes from both strands of the genome, and scan a copy of
+        # it with mutations, so that there are covers with mismatches
+        probes = []
+        for i in range(0, 4900, 50):
+            probes += [probe.Probe.from_str(
+                (genome, genome_rc)[(i // 50) % 2][i:(i + 80)])]
+        mutated = list(genome)
+        for j in np.random.choice(len(genome), size=150, replace=False):
+            mutated[j] = 'A' if mutated[j] != 'A' else 'C'
+        sequences = [''.join(mutated), ''.join(mutated[1000:1500])]
+
+        f = probe.probe_covers_sequence_by_longest_common_substring(4, 80)
+
+        def find(seeding, minimizer_w=None, rc=False, persistent=False):
+            kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+                probes, 4, 80, k=8, seeding=seeding,
+                minimizer_w=minimizer_w, include_reverse_complements=rc)
+            if persistent:
+                probe.start_persistent_probe_finding_pool(3)
+            try:
+                probe.open_probe_finding_pool(kmer_map, f, 3)
+                found = [found_for_seq for _, found_for_seq in
+                    probe.find_probe_covers_in_sequences(
+                        enumerate(sequences))]
+                probe.close_probe_finding_pool()
+            finally:
+                if persistent:
+                    probe.stop_persistent_probe_finding_pool()
+            return found
+
+        # Choosing every k-mer finds every cover; minimizers (with w
+        # chosen to be certain to find every cover) and spaced seeds
+        # should find the same covers
+        for rc in [False, True]:
+            expected = find('minimizer', minimizer_w=1, rc=rc)
+            self.assertGreater(len(expected[0]), 0)
+            self.assertEqual(find('minimizer', rc=rc), expected)
+            self.assertEqual(find('spaced', rc=rc), expected)
+        self.assertEqual(find('spaced', rc=True, persistent=True), expected)
+
+        # The native dict does not hold spaced seeds
+        kmer_map = probe.SharedKmerProbeMap.construct_from_probes(
+            probes, 4, 80, k=8, seeding='spaced')
+        with self.assertRaises(ValueError):
+            probe.open_probe_finding_pool(kmer_map, f, 3,
+                                          use_native_dict=True)
+
     def test_random_small_genome1(self):
         self.run_random(100, 15000, 25000, 300, seed=1)
 
@@ -0,0 +1,209 @@
+"""Tests for target_unitigs module.
+"""
+
+import logging
+import unittest
+
+import numpy as np
+
+from catch import probe
+from catch import target_unitigs
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestTargetUnitigs(unittest.TestCase):
+    """Tests constructing unitigs and finding probe covers through them.
+    """
+
+    def setUp(self):
+        # Disable logging
+        logging.disable(logging.WARNING)
+
+        np.random.seed(1)
+        self.genome = ''.join(np.random.choice(['A', 'C', 'G', 'T'],
+                                               size=2000))
+        # Make variants of the genome, with a few substitutions, and
+        # trimmed by different amounts at their ends
+        self.sequences = []
+        for i in range(12):
+            seq = list(self.genome)
+            for j in np.random.choice(len(seq), size=i % 4, replace=False):
+                seq[j] = 'A' if seq[j] != 'A' else 'C'
+            seq = ''.join(seq)
+            self.sequences += [seq[(7 * i):(len(seq) - 11 * i)]]
+        self.sequences += [
+            self.sequences[0],
+            self.genome[:150],
+            self.genome[300:700],
+            'N' * 60 + self.genome[:700],
+            ('ACGT' * 200)[:750],
+            'A' * 500,
+            self.genome[:500] * 3,
+            '']
+
+        # Make probes from the genome, of varying length and with some
+        # mutations, plus one from a repeat
+        self.probes = []
+        for i in range(0, 1900, 37):
+            probe_seq = list(self.genome[i:(i + (60, 80, 100)[i % 3])])
+            for j in np.random.choice(len(probe_seq), size=i % 3,
+                                      replace=False):
+                probe_seq[j] = 'A' if probe_seq[j] != 'A' else 'C'
+            self.probes += [probe.Probe.from_str(''.join(probe_seq))]
+        self.probes += [probe.Probe.from_str(('ACGT' * 30)[:100])]
+
+        kmer_map = probe.construct_kmer_probe_map_to_find_probe_covers(
+            self.probes, 5, 80, min_k=15, k=15)
+        self.kmer_map = probe.SharedKmerProbeMap.construct(kmer_map)
+
+    def test_hash_base_inverses(self):
+        for base, base_inverse in zip(target_unitigs._HASH_BASES,
+                                      target_unitigs._HASH_BASE_INVERSES):
+            self.assertEqual(base * base_inverse % 2**64, 1)
+
+    def test_lmer_hashes(self):
+        chars = np.frombuffer(self.genome[:300].encode(), dtype=np.uint8)
+        hashes = target_unitigs._lmer_hashes(chars, 20)
+        self.assertEqual(len(hashes), 281)
+        # Hashes depend only on the L-mer, not on its position
+        for i in range(0, 281, 7):
+            j = self.genome.find(self.genome[i:(i + 20)])
+            self.assertEqual(hashes[i], hashes[j])
+        repeat = np.frombuffer((self.genome[100:150] * 2).encode(),
+                               dtype=np.uint8)
+        repeat_hashes = target_unitigs._lmer_hashes(repeat, 20)
+        self.assertEqual(repeat_hashes[0], repeat_hashes[50])
+        self.assertEqual(repeat_hashes[0], hashes[100])
+        self.assertNotEqual(repeat_hashes[0], repeat_hashes[1])
+
+    def test_construct(self):
+        for order in [1, 5, 100]:
+            unitigs = target_unitigs.TargetUnitigs.construct(self.sequences,
+                                                             order)
+            # Each distinct L-mer of the sequences in the graph should be
+            # in exactly one unitig, once
+            lmers_in_sequences = set()
+            for i, seq in enumerate(self.sequences):
+                if unitigs.in_graph(i):
+                    lmers_in_sequences.update(
+                        seq[j:(j + order)]
+                        for j in range(len(seq) - order + 1))
+            lmers_in_unitigs = [u[j:(j + order)] for u in unitigs.unitigs
+                                for j in range(len(u) - order + 1)]
+            self.assertEqual(len(lmers_in_unitigs), len(lmers_in_sequences))
+            self.assertEqual(set(lmers_in_unitigs), lmers_in_sequences)
+
+            # The runs of each sequence should spell it out
+            runs = sorted(zip(unitigs.run_seq.tolist(),
+                              unitigs.run_seq_start.tolist(),
+                              unitigs.run_unitig.tolist(),
+                              unitigs.run_unitig_start.tolist(),
+                              unitigs.run_len.tolist()))
+            spelled = {}
+            for seq_idx, seq_start, unitig, unitig_start, length in runs:
+                run = unitigs.unitigs[unitig][
+                    unitig_start:(unitig_start + length)]
+                self.assertEqual(len(run), length)
+                self.assertEqual(
+                    self.sequences[seq_idx][seq_start:(seq_start + length)],
+                    run)
+                # Consecutive runs overlap by L-1 bases
+                prev_end = spelled.get(seq_idx, order - 1)
+                self.assertEqual(seq_start, prev_end - (order - 1))
+                spelled[seq_idx] = seq_start + length
+            for i, seq in enumerate(self.sequences):
+                if unitigs.in_graph(i):
+                    self.assertEqual(spelled[i], len(seq))
+                else:
+                    self.assertNotIn(i, spelled)
+
+        # With many copies of similar genomes, the unitigs should be much
+        # shorter than the sequences
+        unitigs = target_unitigs.TargetUnitigs.construct(
+            self.sequences[:12] * 10, 100)
+        num_seq_bases, num_scan_bases = unitigs.num_bases()
+        num_unitig_bases = sum(len(u) for u in unitigs.unitigs)
+        self.assertEqual(num_seq_bases,
+                         sum(len(seq) for seq in self.sequences[:12]) * 10)
+        self.assertEqual(num_scan_bases,
+                         num_unitig_bases + 120 * 4 * 100)
+        self.assertLess(num_unitig_bases, num_seq_bases / 20)
+
+    def test_construct_in_batches(self):
+        def construct():
+            unitigs = target_unitigs.TargetUnitigs.construct(
+                self.sequences * 3, 100)
+            return (unitigs.unitigs, unitigs.run_seq.tolist(),
+                    unitigs.run_seq_start.tolist(),
+                    unitigs.run_unitig.tolist(),
+                    unitigs.run_unitig_start.tolist(),
+                    unitigs.run_len.tolist())
+
+        expected = construct()
+        # Lower the number of bases read at a time so that the sequences
+        # are read in several batches, or one at a time; these should
+        # give the same unitigs and runs
+        construct_batch_len = target_unitigs._CONSTRUCT_BATCH_LEN
+        try:
+            for batch_len in [5000, 1]:
+                target_unitigs._CONSTRUCT_BATCH_LEN = batch_len
+                self.assertEqual(construct(), expected)
+        finally:
+            target_unitigs._CONSTRUCT_BATCH_LEN = construct_batch_len
+
+    def find_covers_directly(self, sequences):
+        # Give the output of find_probe_covers() for each setting, from
+        # scanning each sequence
+        found = probe.find_probe_covers_in_sequences(enumerate(sequences),
+                                                     as_arrays=True)
+        covers = []
+        for seq_idx, found_for_seq in found:
+            if isinstance(found_for_seq, tuple):
+                found_for_seq = [found_for_seq]
+            for s, (probe_ids, starts, ends) in enumerate(found_for_seq):
+                if s == len(covers):
+                    covers += [[]]
+                covers[s] += [np.vstack((np.full(len(starts), seq_idx),
+                                         probe_ids, starts, ends))]
+        return [np.concatenate(c, axis=1).tolist() for c in covers]
+
+    def test_find_probe_covers(self):
+        settings = [(0, 80, 0), (3, 90, 0), (5, 100, 20)]
+        cover_fns = [
+            probe.probe_covers_sequence_by_longest_common_substring(3, 90),
+            probe.\
+                probe_covers_sequence_by_longest_common_substring_for_each_setting(
+                    settings)]
+        for cover_fn in cover_fns:
+            for order in [100, 120]:
+                probe.open_probe_finding_pool(self.kmer_map, cover_fn, 3)
+                expected = self.find_covers_directly(self.sequences)
+                self.assertGreater(len(expected[0][0]), 0)
+                unitigs = target_unitigs.TargetUnitigs.construct(
+                    self.sequences, order)
+                found = unitigs.find_probe_covers(self.kmer_map)
+                probe.close_probe_finding_pool()
+                if isinstance(found, tuple):
+                    found = [found]
+                self.assertEqual(len(found), len(expected))
+                for found_for_setting, expected_for_setting in \
+                        zip(found, expected):
+                    self.assertEqual(np.vstack(found_for_setting).tolist(),
+                                     expected_for_setting)
+
+    def test_probe_longer_than_order(self):
+        cover_fn = probe.probe_covers_sequence_by_longest_common_substring(
+            3, 90)
+        probe.open_probe_finding_pool(self.kmer_map, cover_fn, 3)
+        try:
+            unitigs = target_unitigs.TargetUnitigs.construct(
+                self.sequences, 80)
+            with self.assertRaises(ValueError):
+                unitigs.find_probe_covers(self.kmer_map)
+        finally:
+            probe.close_probe_finding_pool()
+
+    def tearDown(self):
+        # Re-enable logging
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,140 @@
+"""Cache holding a bounded number of entries.
+
+Finding probe covers verifies, at each k-mer hit, whether a probe covers
+the part of the target aligned to it. Within a species, most target
+genomes differ at only a few positions, so the same probe is verified
+against the same aligned window of bases many times across genomes.
+A BoundedCache lets a worker remember the outcomes of recent
+verifications without its memory growing with the number of genomes
+scanned.
+
+When the cache is full, adding an entry evicts one according to a
+policy:
+  - 'lru': the least recently used entry (the one added or read longest
+    ago), which suits a scan that keeps returning to the same windows
+  - 'fifo': the entry added longest ago, regardless of reads; reads are
+    then slightly cheaper
+"""
+
+from collections import OrderedDict
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+# Policies for choosing an entry to evict
+EVICTION_POLICIES = ['lru', 'fifo']
+
+
+class BoundedCache:
+    """Mapping from keys to values that holds at most max_size entries.
+
+    This counts the lookups that find a key (hits) and that do not
+    (misses), as well as evictions, so that its use can be reported.
+    """
+
+    def __init__(self, max_size, eviction='lru'):
+        """
+        Args:
+            max_size: maximum number of entries to hold (>= 1)
+            eviction: policy for choosing the entry to evict when full;
+                one of EVICTION_POLICIES
+
+        Raises:
+            ValueError if max_size or eviction is invalid
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError("Unknown eviction policy '%s'" % eviction)
+        self.max_size = max_size
+        self.eviction = eviction
+        self._entries = OrderedDict()
+        self.reset_stats()
+
+    def reset_stats(self):
+        """Reset the counts of hits, misses, and evictions to 0.
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, keys):
+        """Look up many keys.
+
+        Args:
+            keys: list of hashable keys
+
+        Returns:
+            list x in which x[i] is the value of keys[i], or None if
+            keys[i] is not in the cache
+        """
+        entries = self._entries
+        values = [entries.get(key) for key in keys]
+        num_misses = values.count(None)
+        self.misses += num_misses
+        self.hits += len(keys) - num_misses
+        if self.eviction == 'lru' and num_misses < len(keys):
+            # Mark the entries read as the most recently used
+            move_to_end = entries.move_to_end
+            for key, value in zip(keys, values):
+                if value is not None:
+                    move_to_end(key)
+        return values
+
+    def get(self, key):
+        """Look up one key.
+
+        Args:
+            key: hashable key
+
+        Returns:
+            value of key, or None if key is not in the cache
+        """
+        return self.get_many([key])[0]
+
+    def put_many(self, keys, values):
+        """Add entries, evicting others if the cache is full.
+
+        Args:
+            keys: list of hashable keys
+            values: list of values (not None) such that values[i] is
+                the value of keys[i]
+        """
+        entries = self._entries
+        for key, value in zip(keys, values):
+            entries[key] = value
+            if self.eviction == 'lru':
+                entries.move_to_end(key)
+        num_to_evict = len(entries) - self.max_size
+        if num_to_evict > 0:
+            for _ in range(num_to_evict):
+                entries.popitem(last=False)
+            self.evictions += num_to_evict
+
+    def put(self, key, value):
+        """Add one entry, evicting another if the cache is full.
+
+        Args:
+            key: hashable key
+            value: value (not None) of key
+        """
+        self.put_many([key], [value])
+
+    def hit_rate(self):
+        """Compute the fraction of lookups that found their key.
+
+        Returns:
+            float in [0, 1] (0 if there have been no lookups)
+        """
+        num_lookups = self.hits + self.misses
+        if num_lookups == 0:
+            return 0.0
+        return float(self.hits) / num_lookups
+
+    def clear(self):
+        """Remove all entries (but not the counts of their use).
+        """
+        self._entries.clear()
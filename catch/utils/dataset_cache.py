@@ -0,0 +1,206 @@
+"""Cache of parsed dataset genomes on disk, in a memory-mappable format.
+
+Reading the genomes of a dataset (seq_io.read_dataset_genomes) parses
+and normalizes its FASTA files, which can take a considerable amount of
+time for large datasets. This stores the result so that later reads of
+the same dataset can skip the parsing.
+
+This saves time, not memory. The first access to a genome's sequences
+(genome.Genome.seqs) decodes all of them from the mapped buffer into
+strings, which the genome keeps; probe design and coverage analysis
+read every genome's sequences right away, so each is held in memory as
+strings just as if it were read from the FASTA files.
+
+The cache for a dataset consists of three files in a cache directory:
+  - [stem].seqs: the sequences of all genomes, ASCII-encoded (one byte
+    per base) and concatenated; this is loaded with np.memmap, so loading
+    does not read the sequences and the genomes wrap the mapped buffer
+    (see genome.Genome.from_buffer)
+  - [stem].offsets.npy: int64 array giving the offset in [stem].seqs at
+    which each sequence starts, followed by the total length
+  - [stem].json: for each genome, the number of sequences it has and,
+    when it is divided into chromosomes, the chromosome labels
+The json file is written last, so a cache is only used if it was fully
+written.
+
+[stem] includes a key computed from the dataset name and the path, mtime,
+and size of each of its FASTA files, so that a cache is not used after
+the dataset changes.
+"""
+
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+
+import numpy as np
+
+from catch import genome
+from catch.utils import seq_io
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+logger = logging.getLogger(__name__)
+
+# Increment when the format of the cache changes, so that caches written
+# in an old format are not read
+_CACHE_FORMAT_VERSION = 1
+
+_CACHE_EXTENSIONS = ['.seqs', '.offsets.npy', '.json']
+
+
+def _cache_key(dataset):
+    """Compute a key identifying a dataset and the state of its files.
+
+    Args:
+        dataset: instance of datasets.GenomesDataset
+
+    Returns:
+        hex string
+    """
+    h = hashlib.sha1()
+    h.update(('v%d\0%s' % (_CACHE_FORMAT_VERSION,
+                           dataset.__name__)).encode())
+    for fn in dataset.fasta_paths:
+        st = os.stat(fn)
+        h.update(('\0%s\0%d\0%d' % (os.path.abspath(fn), st.st_mtime_ns,
+                                    st.st_size)).encode())
+    return h.hexdigest()[:16]
+
+
+def _cache_stem(cache_dir, dataset, key):
+    """Give the path, without extension, of the cache files for a dataset.
+
+    Args:
+        cache_dir: path to cache directory
+        dataset: instance of datasets.GenomesDataset
+        key: output of _cache_key(dataset)
+
+    Returns:
+        path
+    """
+    return os.path.join(cache_dir, '%s.%s' % (dataset.__name__, key))
+
+
+def _write(stem, genomes):
+    """Write genomes to cache files.
+
+    Args:
+        stem: path, without extension, of the cache files
+        genomes: list of genome.Genome
+    """
+    offsets = [0]
+    genomes_meta = []
+    # Write to temporary files and then rename them, so that a partially
+    # written cache is never read
+    tmp_suffix = '.tmp%d' % os.getpid()
+    with open(stem + '.seqs' + tmp_suffix, 'wb') as f:
+        for gnm in genomes:
+            for seq in gnm.seqs:
+                b = seq.encode()
+                f.write(b)
+                offsets += [offsets[-1] + len(b)]
+            if gnm.chrs is not None:
+                chr_names = list(gnm.chrs.keys())
+            else:
+                chr_names = None
+            genomes_meta += [{'num_seqs': len(gnm.seqs),
+                              'chr_names': chr_names}]
+    with open(stem + '.offsets.npy' + tmp_suffix, 'wb') as f:
+        np.save(f, np.array(offsets, dtype=np.int64))
+    with open(stem + '.json' + tmp_suffix, 'w') as f:
+        json.dump({'genomes': genomes_meta}, f)
+
+    os.replace(stem + '.seqs' + tmp_suffix, stem + '.seqs')
+    os.replace(stem + '.offsets.npy' + tmp_suffix, stem + '.offsets.npy')
+    os.replace(stem + '.json' + tmp_suffix, stem + '.json')
+
+
+def _load(stem):
+    """Load genomes from cache files.
+
+    Args:
+        stem: path, without extension, of the cache files
+
+    Returns:
+        list of genome.Genome, each wrapping a memory-mapped buffer
+
+    Raises:
+        FileNotFoundError if the cache files do not exist
+    """
+    with open(stem + '.json') as f:
+        genomes_meta = json.load(f)['genomes']
+    offsets = np.load(stem + '.offsets.npy')
+    if offsets[-1] > 0:
+        buffer = np.memmap(stem + '.seqs', dtype=np.uint8, mode='r')
+    else:
+        # np.memmap cannot map an empty file
+        buffer = np.zeros(0, dtype=np.uint8)
+
+    genomes = []
+    seq_idx = 0
+    for meta in genomes_meta:
+        num_seqs = meta['num_seqs']
+        seq_bounds = [(int(offsets[i]), int(offsets[i + 1]))
+                      for i in range(seq_idx, seq_idx + num_seqs)]
+        seq_idx += num_seqs
+        genomes += [genome.Genome.from_buffer(buffer, seq_bounds,
+                                              chr_names=meta['chr_names'])]
+    return genomes
+
+
+def _remove_stale(cache_dir, dataset, key):
+    """Remove cache files for a dataset that were written with other keys.
+
+    Args:
+        cache_dir: path to cache directory
+        dataset: instance of datasets.GenomesDataset
+        key: output of _cache_key(dataset) for the current cache
+    """
+    prefix = os.path.join(cache_dir, dataset.__name__ + '.')
+    for ext in _CACHE_EXTENSIONS:
+        for fn in glob.glob(glob.escape(prefix) + '*' + ext):
+            # Only remove files whose name is exactly the prefix, a key,
+            # and the extension (not, e.g., files for another dataset
+            # whose name begins with this one's)
+            fn_key = fn[len(prefix):-len(ext)]
+            if fn_key != key and re.fullmatch('[0-9a-f]{16}', fn_key):
+                os.remove(fn)
+
+
+def read_dataset_genomes(dataset, cache_dir):
+    """Read genomes of the given dataset, using a cache on disk.
+
+    If the cache holds the genomes of the dataset, as its FASTA files
+    currently are, this loads them from the cache. Otherwise, this reads
+    them with seq_io.read_dataset_genomes() and writes them to the cache.
+
+    Args:
+        dataset: instance of datasets.GenomesDataset
+        cache_dir: path to directory holding the cache; created if it
+            does not exist
+
+    Returns:
+        list of genome.Genome, in the same order as given by
+        seq_io.read_dataset_genomes()
+    """
+    key = _cache_key(dataset)
+    stem = _cache_stem(cache_dir, dataset, key)
+
+    try:
+        genomes = _load(stem)
+    except FileNotFoundError:
+        pass
+    else:
+        logger.debug("Loaded dataset %s from cache %s", dataset.__name__,
+                     stem)
+        return genomes
+
+    genomes = seq_io.read_dataset_genomes(dataset)
+    logger.debug("Writing dataset %s to cache %s", dataset.__name__, stem)
+    os.makedirs(cache_dir, exist_ok=True)
+    _write(stem, genomes)
+    _remove_stale(cache_dir, dataset, key)
+    return genomes
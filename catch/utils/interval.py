@@ -3,6 +3,8 @@
 
 import bisect
 
+import numpy as np
+
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
 
 
@@ -316,6 +318,168 @@ def merge_overlapping(intervals):
     return intervals_merged
 
 
+def merge_overlapping_by_key(keys, starts, ends):
+    """Merge possibly overlapping intervals, separately for each key.
+
+    This gives the same intervals as calling merge_overlapping() on the
+    intervals of each key, but operates on flat arrays with vectorized
+    operations.
+
+    Args:
+        keys: numpy array of integer keys
+        starts/ends: numpy arrays of integers such that, for each i,
+            (starts[i], ends[i]) is an interval of key keys[i]; starts
+            are inclusive and ends are exclusive
+
+    Returns:
+        tuple (keys, starts, ends) of numpy arrays (int64) giving the
+        merged intervals, sorted by key and then by start; as with
+        merge_overlapping(), intervals that are touching are merged
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    n = len(keys)
+    if n == 0:
+        return keys, starts, ends
+
+    order = np.lexsort((starts, keys))
+    keys, starts, ends = keys[order], starts[order], ends[order]
+    new_key = np.ones(n, dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+
+    # Shift the intervals of each key past those of the previous key, so
+    # that one running maximum of the ends covers all of the keys
+    lo = int(starts.min())
+    span = int(ends.max()) - lo + 1
+    shift = (np.cumsum(new_key) - 1) * span - lo
+    run_end = np.maximum.accumulate(ends + shift)
+
+    # A merged interval begins at the first interval of a key, or at an
+    # interval that starts after all the ones before it end
+    begins = new_key
+    begins[1:] |= starts[1:] + shift[1:] > run_end[:-1]
+    first = np.flatnonzero(begins)
+    last = np.append(first[1:], n) - 1
+    return keys[first], starts[first], run_end[last] - shift[first]
+
+
+def unique_by_key(keys, starts, ends):
+    """Remove duplicate intervals, separately for each key.
+
+    Args:
+        keys/starts/ends: see merge_overlapping_by_key()
+
+    Returns:
+        tuple (keys, starts, ends) of numpy arrays (int64) giving the
+        distinct intervals, sorted by key and then by interval
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if len(keys) == 0:
+        return keys, starts, ends
+
+    order = np.lexsort((ends, starts, keys))
+    keys, starts, ends = keys[order], starts[order], ends[order]
+    distinct = np.ones(len(keys), dtype=bool)
+    distinct[1:] = ((keys[1:] != keys[:-1]) | (starts[1:] != starts[:-1]) |
+                    (ends[1:] != ends[:-1]))
+    return keys[distinct], starts[distinct], ends[distinct]
+
+
+class IntervalAccumulator(object):
+    """Collects intervals, each with an integer key, as they are found.
+
+    When scanning a sequence from left to right, the intervals found for
+    a key (e.g., the ranges that a probe covers) mostly arrive in order
+    of their start and overlap the previous one for that key. add() then
+    extends the last interval of the key in place, in O(1) time, rather
+    than storing another. Intervals are only fully merged, with
+    merge_overlapping_by_key(), when merge() or to_arrays() is called.
+    """
+
+    def __init__(self, merge_overlapping=True):
+        """
+        Args:
+            merge_overlapping: when True, overlapping (or touching)
+                intervals of a key are merged; when False, they are kept
+                separate and only duplicates are removed
+        """
+        self.merge_overlapping = merge_overlapping
+        self._keys = []
+        self._starts = []
+        self._ends = []
+        # Index, in the lists above, of the last interval of each key
+        self._last = {}
+        # Intervals added as arrays, or already merged, as a list of
+        # tuples (keys, starts, ends)
+        self._arrays = []
+
+    def add(self, key, start, end):
+        """Add one interval.
+
+        Args:
+            key: integer key of the interval
+            start/end: start (inclusive) and end (exclusive) of the
+                interval
+        """
+        if self.merge_overlapping:
+            i = self._last.get(key)
+            if i is not None and self._starts[i] <= start <= self._ends[i]:
+                # The interval overlaps the last one of key, which it
+                # does not start before; extend that one
+                if end > self._ends[i]:
+                    self._ends[i] = end
+                return
+            self._last[key] = len(self._keys)
+        self._keys.append(key)
+        self._starts.append(start)
+        self._ends.append(end)
+
+    def add_arrays(self, keys, starts, ends):
+        """Add many intervals at once.
+
+        Args:
+            keys/starts/ends: see merge_overlapping_by_key()
+        """
+        if len(keys) > 0:
+            self._arrays += [(keys, starts, ends)]
+
+    def merge(self):
+        """Merge (or deduplicate) the intervals collected so far.
+
+        This is not necessary for the output of to_arrays(), but calling
+        it periodically (e.g., after each chunk of a sequence) bounds the
+        memory used to hold intervals.
+        """
+        merged = self.to_arrays()
+        self._keys, self._starts, self._ends = [], [], []
+        self._last = {}
+        self._arrays = [merged] if len(merged[0]) > 0 else []
+
+    def to_arrays(self):
+        """Return the intervals collected.
+
+        Returns:
+            tuple (keys, starts, ends) of numpy arrays (int64), output by
+            merge_overlapping_by_key() (if merge_overlapping is True) or
+            by unique_by_key() (if it is False) on the intervals collected
+        """
+        parts = list(self._arrays)
+        if len(self._keys) > 0:
+            parts += [(self._keys, self._starts, self._ends)]
+        if len(parts) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty.copy(), empty.copy()
+        keys, starts, ends = (np.concatenate([np.asarray(part[j], np.int64)
+                                              for part in parts])
+                              for j in range(3))
+        if self.merge_overlapping:
+            return merge_overlapping_by_key(keys, starts, ends)
+        return unique_by_key(keys, starts, ends)
+
+
 def schedule(intervals):
     """Schedule the maximum number of compatible intervals.
 
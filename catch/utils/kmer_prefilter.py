@@ -0,0 +1,265 @@
+"""Compact membership prefilter over the packed keys of a k-mer map.
+
+Most k-mers of a target genome are not keys of the k-mer probe map (see
+probe.SharedKmerProbeMap), yet looking each one up costs a binary search
+over all of the keys, which mostly misses the CPU caches. A prefilter
+answers, far more cheaply, whether a k-mer might be a key: it never
+rejects a key, but may accept a k-mer that is not one (a false
+positive), which the full lookup then rejects.
+
+There are two kinds:
+  - 'bitmap': a direct bitmap indexed by the first bits of a packed key
+    (i.e., by a prefix of the k-mer). When a whole key fits in the
+    bitmap (e.g., k <= 12 for nucleotides with a budget of 2^24 bits),
+    it is exact.
+  - 'bloom': a blocked Bloom filter, in which all of the bits for a key
+    are in one 64-bit word, so that a query reads one word.
+Both store their bits in a single flat uint64 array, which can be placed
+in shared memory and used by many processes.
+"""
+
+import math
+
+import numpy as np
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+# Kinds of prefilter
+KINDS = ['bitmap', 'bloom']
+
+# Default number of bits per key
+DEFAULT_BITS_PER_KEY = 10
+
+# Largest bitmap, in log2 of its number of bits (2^32 bits is 512 MB)
+_MAX_LOG2_BITMAP_BITS = 32
+
+# Largest number of bits set per key in a Bloom filter; each takes 6
+# bits of a 64-bit hash
+_MAX_NUM_HASHES = 10
+
+_U64_MASK = 2**64 - 1
+
+
+def _mix(h):
+    """Mix the bits of 64-bit integers (the finalizer of splitmix64).
+
+    Args:
+        h: numpy array (uint64), which is modified
+
+    Returns:
+        h
+    """
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xbf58476d1ce4e5b9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94d049bb133111eb)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+def _mix_int(h):
+    """Same as _mix(), for one Python int."""
+    h ^= h >> 30
+    h = (h * 0xbf58476d1ce4e5b9) & _U64_MASK
+    h ^= h >> 27
+    h = (h * 0x94d049bb133111eb) & _U64_MASK
+    h ^= h >> 31
+    return h
+
+
+# Multiplier to derive, from the hash giving a key's word in a Bloom
+# filter, the hash giving its bits in the word
+_BIT_HASH_MULTIPLIER = 0x9e3779b97f4a7c15
+
+
+class KmerPrefilter:
+    """Membership prefilter over packed (uint64) keys.
+    """
+
+    def __init__(self, words, kind, log2_num_bits, num_hashes=1, shift=0):
+        """
+        Args:
+            words: numpy array (uint64) holding the bits of the filter
+            kind: 'bitmap' or 'bloom'
+            log2_num_bits: log2 of the number of bits in the filter
+            num_hashes: for a Bloom filter, the number of bits set per key
+            shift: for a bitmap, the number of low bits of a key to drop
+                to obtain its index in the bitmap
+        """
+        if kind not in KINDS:
+            raise ValueError("Unknown kind of prefilter '%s'" % kind)
+        self.words = words
+        self.kind = kind
+        self.log2_num_bits = log2_num_bits
+        self.num_hashes = num_hashes
+        self.shift = shift
+
+        self._words_view = memoryview(words)
+        # For a Bloom filter, mask giving the word of a key
+        self._word_mask = 2**max(0, log2_num_bits - 6) - 1
+
+    def params(self):
+        """Return the parameters, other than the bits, of this filter.
+
+        Returns:
+            dict such that KmerPrefilter(words, **params()) is this filter
+        """
+        return {'kind': self.kind, 'log2_num_bits': self.log2_num_bits,
+                'num_hashes': self.num_hashes, 'shift': self.shift}
+
+    @staticmethod
+    def construct(keys, key_bits, bits_per_key=None, false_positive_rate=None,
+                  kind=None, allocate=None):
+        """Construct a prefilter that accepts a given collection of keys.
+
+        The number of bits in the filter is a power of 2, at least
+        bits_per_key times the number of distinct keys (and less than
+        twice that), except that a bitmap is never larger than needed to
+        hold whole keys. The false positive rate of a Bloom filter with
+        b bits per key is about 0.6185^b; that of a bitmap depends on how
+        many keys share their prefixes.
+
+        Args:
+            keys: numpy array (uint64) of packed keys
+            key_bits: number of low bits of a key that are used
+            bits_per_key: number of bits in the filter per distinct key;
+                if None (and false_positive_rate is None), uses
+                DEFAULT_BITS_PER_KEY
+            false_positive_rate: if set, choose bits_per_key so that a
+                Bloom filter has about this false positive rate
+            kind: 'bitmap' or 'bloom'; if None, use a bitmap if it can
+                hold whole keys (and so has no false positives) within
+                the budget of bits, and otherwise a Bloom filter
+            allocate: function that accepts a numpy array and returns it
+                (or a copy of it, e.g., in shared memory) to hold the bits
+                of the filter; if None, the array is used directly
+
+        Returns:
+            instance of KmerPrefilter
+
+        Raises:
+            ValueError if both bits_per_key and false_positive_rate are
+            set, or either is out of range
+        """
+        if bits_per_key is not None and false_positive_rate is not None:
+            raise ValueError(("Only one of bits_per_key and "
+                              "false_positive_rate can be set"))
+        if false_positive_rate is not None:
+            if not 0 < false_positive_rate < 1:
+                raise ValueError("false_positive_rate must be in (0, 1)")
+            bits_per_key = -math.log(false_positive_rate) / math.log(2)**2
+        elif bits_per_key is None:
+            bits_per_key = DEFAULT_BITS_PER_KEY
+        if bits_per_key <= 0:
+            raise ValueError("bits_per_key must be positive")
+
+        # Find the distinct keys (they are often already sorted, as in a
+        # k-mer probe map, which makes sorting them fast)
+        keys = np.sort(np.asarray(keys, dtype=np.uint64))
+        if len(keys) > 0:
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        log2_num_bits = max(6, int(math.ceil(
+            math.log2(max(1, bits_per_key * len(keys))))))
+        if kind is None:
+            kind = ('bitmap' if key_bits <= min(log2_num_bits,
+                                                _MAX_LOG2_BITMAP_BITS)
+                    else 'bloom')
+
+        if kind == 'bitmap':
+            log2_num_bits = max(6, min(log2_num_bits, key_bits,
+                                       _MAX_LOG2_BITMAP_BITS))
+            shift = max(0, key_bits - log2_num_bits)
+            prefilter = KmerPrefilter(
+                np.zeros(2**(log2_num_bits - 6), dtype=np.uint64), kind,
+                log2_num_bits, shift=shift)
+            idx = keys >> np.uint64(shift)
+            word_idx = (idx >> np.uint64(6)).astype(np.int64)
+            word_bits = np.uint64(1) << (idx & np.uint64(63))
+        elif kind == 'bloom':
+            num_hashes = min(_MAX_NUM_HASHES,
+                             max(1, int(round(bits_per_key * math.log(2)))))
+            prefilter = KmerPrefilter(
+                np.zeros(2**(log2_num_bits - 6), dtype=np.uint64), kind,
+                log2_num_bits, num_hashes=num_hashes)
+            word_idx, word_bits = prefilter._bloom_words_and_bits(keys)
+        else:
+            raise ValueError("Unknown kind of prefilter '%s'" % kind)
+
+        np.bitwise_or.at(prefilter.words, word_idx, word_bits)
+        if allocate is not None:
+            prefilter = KmerPrefilter(allocate(prefilter.words),
+                                      **prefilter.params())
+        return prefilter
+
+    def _bloom_words_and_bits(self, keys):
+        """Compute, for a Bloom filter, the word and bits of keys.
+
+        Args:
+            keys: numpy array (uint64) of keys
+
+        Returns:
+            tuple (word_idx, word_bits) of numpy arrays where word_idx[i]
+            is the index of the word for keys[i] and word_bits[i] has
+            the bits, in that word, that are set for keys[i]
+        """
+        h = _mix(keys.astype(np.uint64, copy=True))
+        word_idx = (h & np.uint64(self._word_mask)).astype(np.int64)
+        h *= np.uint64(_BIT_HASH_MULTIPLIER)
+        word_bits = np.zeros(len(keys), dtype=np.uint64)
+        for i in range(self.num_hashes):
+            word_bits |= np.uint64(1) << (
+                (h >> np.uint64(58 - 6 * i)) & np.uint64(63))
+        return word_idx, word_bits
+
+    def contains(self, keys):
+        """Determine which keys might be in this filter.
+
+        Args:
+            keys: numpy array (uint64) of keys
+
+        Returns:
+            numpy array (bool) that is False for keys[i] only if keys[i]
+            is certainly not one of the keys of this filter
+        """
+        if self.kind == 'bitmap':
+            idx = keys >> np.uint64(self.shift)
+            words = self.words[(idx >> np.uint64(6)).astype(np.int64)]
+            return ((words >> (idx & np.uint64(63))) &
+                    np.uint64(1)).astype(bool)
+        word_idx, word_bits = self._bloom_words_and_bits(keys)
+        return (self.words[word_idx] & word_bits) == word_bits
+
+    def contains_key(self, key):
+        """Determine whether one key might be in this filter.
+
+        This is the same as contains(), but is faster for one key.
+
+        Args:
+            key: key (Python int)
+
+        Returns:
+            False only if key is certainly not one of the keys of this
+            filter
+        """
+        if self.kind == 'bitmap':
+            idx = key >> self.shift
+            return bool((self._words_view[idx >> 6] >> (idx & 63)) & 1)
+        h = _mix_int(key)
+        word = self._words_view[h & self._word_mask]
+        h = (h * _BIT_HASH_MULTIPLIER) & _U64_MASK
+        for i in range(self.num_hashes):
+            if not (word >> ((h >> (58 - 6 * i)) & 63)) & 1:
+                return False
+        return True
+
+    def fill_fraction(self):
+        """Compute the fraction of bits in this filter that are set.
+
+        Returns:
+            float in [0, 1]
+        """
+        if len(self.words) == 0:
+            return 0.0
+        set_bits = np.unpackbits(self.words.view(np.uint8)).sum()
+        return float(set_bits) / (64 * len(self.words))
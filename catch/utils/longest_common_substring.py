@@ -157,3 +157,108 @@ def k_lcf_around_anchor(a, b, anchor_start, anchor_end, k):
             max_common_substring_start = anchor_start - before_len
 
     return max_common_substring_len, max_common_substring_start
+
+
+def k_lcf_around_anchors(a, b, lengths, anchor_start, anchor_end, k):
+    """Compute longest common substrings around many anchors at once.
+
+    This is a vectorized form of k_lcf_around_anchor(), for computing it
+    on many pairs of sequences in a single pass. Row r of the output
+    is what k_lcf_around_anchor() would return for
+      (a[r, :lengths[r]], b[r, :lengths[r]], anchor_start[r],
+       anchor_end[r], k).
+    Rather than expanding out from each anchor one at a time, this sorts
+    the positions of the mismatches in each row to find the k+1
+    mismatches closest to the anchor on each side; the ends of a row act
+    as a mismatch that is never passed.
+
+    Args:
+        a: 2D numpy array in which each row is a sequence (e.g., of
+            uint8 codes)
+        b: 2D numpy array with the same shape and dtype as a
+        lengths: 1D numpy array giving the number of positions in each
+            row of a and b to consider; positions beyond this are ignored
+        anchor_start/anchor_end: 1D numpy arrays giving, for each row,
+            the anchor (shared substring of a and b) around which to
+            find the longest common substring; as in
+            k_lcf_around_anchor(), a and b must be the same between
+            anchor_start and anchor_end (exclusive); this is not checked
+        k: find the longest common substrings with this number of
+            mismatches
+
+    Returns:
+        a tuple (l, s) of 1D numpy arrays where l[r] is the length of the
+        longest common substring found in row r and s[r] is its starting
+        index
+    """
+    return k_lcf_around_anchors_for_each_k(a, b, lengths, anchor_start,
+                                           anchor_end, [k])[0]
+
+
+def k_lcf_around_anchors_for_each_k(a, b, lengths, anchor_start, anchor_end,
+                                    ks):
+    """Compute longest common substrings around anchors for many k at once.
+
+    This gives the same output as calling k_lcf_around_anchors() with each
+    value of k in ks, but finds the mismatches around each anchor only
+    once: the k+1 mismatches closest to the anchor on each side, for the
+    largest k, include those for every smaller k.
+
+    Args:
+        a/b/lengths/anchor_start/anchor_end: see k_lcf_around_anchors()
+        ks: list of numbers of mismatches
+
+    Returns:
+        list x in which x[i] is the output of k_lcf_around_anchors() with
+        k equal to ks[i]
+    """
+    num_rows, num_cols = a.shape
+    lengths = np.asarray(lengths, dtype=np.int64)
+    anchor_start = np.asarray(anchor_start, dtype=np.int64)
+    anchor_end = np.asarray(anchor_end, dtype=np.int64)
+    if num_rows == 0:
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+                for _ in ks]
+    max_k = max(ks)
+
+    cols = np.arange(num_cols)
+    mismatches = (a != b) & (cols < lengths[:, np.newaxis])
+
+    # For each row, the positions of mismatches before the anchor,
+    # ordered from the anchor toward the beginning; positions that are
+    # not mismatches are -1, which acts as a mismatch just past the
+    # beginning of the row
+    before = np.where(mismatches & (cols < anchor_start[:, np.newaxis]),
+                      cols, -1)
+    before = -np.sort(-before, axis=1)[:, :(max_k + 1)]
+    # Likewise for mismatches after the anchor, ordered from the anchor
+    # toward the end, with lengths acting as a mismatch just past the
+    # end of the row
+    after = np.where(mismatches & (cols >= anchor_end[:, np.newaxis]),
+                     cols, lengths[:, np.newaxis])
+    after = np.sort(after, axis=1)[:, :(max_k + 1)]
+    if before.shape[1] < max_k + 1:
+        # There are fewer columns than max_k+1; pad with the boundaries
+        pad = max_k + 1 - before.shape[1]
+        before = np.hstack((before, np.full((num_rows, pad), -1)))
+        after = np.hstack((after, np.repeat(lengths[:, np.newaxis], pad,
+                                            axis=1)))
+
+    anchor_len = anchor_end - anchor_start
+    rows = np.arange(num_rows)
+    results = []
+    for k in ks:
+        # Number of bases from before and after the anchor that are part
+        # of a common substring with i mismatches before the anchor and
+        # k-i after it (as in k_lcf_around_anchor())
+        before_len = anchor_start[:, np.newaxis] - 1 - before[:, :(k + 1)]
+        after_len = after[:, k::-1] - anchor_end[:, np.newaxis]
+        substring_len = before_len + anchor_len[:, np.newaxis] + after_len
+
+        # argmax picks the first i achieving the maximum, as the loop in
+        # k_lcf_around_anchor() does
+        best = np.argmax(substring_len, axis=1)
+        l = substring_len[rows, best]
+        s = anchor_start - before_len[rows, best]
+        results += [(l, s)]
+    return results
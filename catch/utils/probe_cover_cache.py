@@ -0,0 +1,136 @@
+"""Cache on disk of the ranges that probes cover in target genomes.
+
+Finding the ranges that candidate probes cover in the target genomes
+(e.g., in SetCoverFilter._make_sets) is typically the most expensive
+part of a design. Its output depends only on the probes, the target
+genomes, and the parameters determining hybridization -- not on, e.g.,
+the desired coverage or a blacklist -- so this stores it to be reused
+by later runs that only change such other parameters.
+
+The cache holds the raw cover ranges, as output by
+probe.find_probe_covers_in_sequence(), without any adjustment (e.g.,
+cover extension) applied to them. They are stored as integer arrays:
+  - seq_universe: (n_seqs, 2) array whose row s gives (i,j) for the s'th
+    sequence, which is a sequence of the j'th target genome in the i'th
+    grouping
+  - seq_offset: the sum of the lengths of the sequences that come before
+    sequence s in its genome
+  - seq_len: the length of sequence s
+  - cover_set_id: the index of the probe (among the probes used to
+    compute the key) that covers each range
+  - cover_seq: the index s of the sequence in which each range occurs
+  - cover_start/cover_end: the endpoints of each range, relative to the
+    start of its sequence
+These are written in one npz file, [cache_dir]/probe_covers.[key].npz,
+where the key is a hash of the probes, the target genomes, and the
+hybridization parameters.
+"""
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+logger = logging.getLogger(__name__)
+
+# Increment when the format of the cache changes, so that caches written
+# in an old format are not read
+_CACHE_FORMAT_VERSION = 1
+
+_ARRAY_NAMES = ['seq_universe', 'seq_offset', 'seq_len',
+                'cover_set_id', 'cover_seq', 'cover_start', 'cover_end']
+
+
+def cache_key(probes, target_genomes, params):
+    """Compute a key identifying the input to finding probe covers.
+
+    Args:
+        probes: list of probe.Probe, in the order that determines their
+            set ids
+        target_genomes: list of groupings, each a list of genome.Genome
+        params: dict mapping names of parameters that affect the ranges
+            found (e.g., mismatches) to their values; values must have a
+            repr() that identifies them
+
+    Returns:
+        hex string
+    """
+    h = hashlib.sha1()
+    h.update(('v%d' % _CACHE_FORMAT_VERSION).encode())
+    for name in sorted(params.keys()):
+        h.update(('\0%s=%r' % (name, params[name])).encode())
+
+    # Separate each probe and sequence with a character that cannot occur
+    # in it, and mark the boundaries of genomes and groupings, so that
+    # different input cannot produce the same stream of bytes
+    h.update(b'\0probes')
+    for p in probes:
+        h.update(b'\0')
+        h.update(p.seq_bytes)
+    h.update(b'\0genomes')
+    for genomes_from_group in target_genomes:
+        h.update(b'\0g')
+        for gnm in genomes_from_group:
+            h.update(b'\0n')
+            for seq in gnm.seqs:
+                h.update(b'\0')
+                h.update(seq.encode())
+    return h.hexdigest()[:16]
+
+
+def _cache_path(cache_dir, key):
+    """Give the path of the cache file for a key.
+
+    Args:
+        cache_dir: path to cache directory
+        key: output of cache_key()
+
+    Returns:
+        path
+    """
+    return os.path.join(cache_dir, 'probe_covers.%s.npz' % key)
+
+
+def load(cache_dir, key):
+    """Load probe covers from the cache.
+
+    Args:
+        cache_dir: path to cache directory
+        key: output of cache_key()
+
+    Returns:
+        dict mapping each name in _ARRAY_NAMES to an np.array (see the
+        module docstring), or None if the cache does not hold covers for
+        key
+    """
+    path = _cache_path(cache_dir, key)
+    try:
+        with np.load(path) as npz:
+            covers = {name: npz[name] for name in _ARRAY_NAMES}
+    except FileNotFoundError:
+        return None
+    logger.debug("Loaded probe covers from cache %s", path)
+    return covers
+
+
+def write(cache_dir, key, covers):
+    """Write probe covers to the cache.
+
+    Args:
+        cache_dir: path to cache directory; created if it does not exist
+        key: output of cache_key()
+        covers: dict mapping each name in _ARRAY_NAMES to an np.array
+            (see the module docstring)
+    """
+    path = _cache_path(cache_dir, key)
+    logger.debug("Writing probe covers to cache %s", path)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a temporary file and then rename it, so that a partially
+    # written cache is never read
+    tmp_path = path + '.tmp%d' % os.getpid()
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **{name: covers[name] for name in _ARRAY_NAMES})
+    os.replace(tmp_path, path)
@@ -5,7 +5,6 @@ from collections import defaultdict
 from collections import OrderedDict
 import gzip
 import logging
-import re
 
 import numpy as np
 
@@ -68,9 +67,7 @@ def read_dataset_genomes(dataset):
         logger.debug("Reading dataset %s with one chromosome per genome",
                      dataset.__name__)
         for fn in dataset.fasta_paths:
-            seqs = list(read_fasta(fn).values())
-            for seq in seqs:
-                genomes += [genome.Genome.from_one_seq(seq)]
+            genomes += read_genomes_from_fasta(fn)
 
     return genomes
 
@@ -87,13 +84,124 @@ def read_genomes_from_fasta(fn):
     """
     logger.debug("Reading fasta %s; assuming one sequence per genome", fn)
 
+    # Stream the records rather than storing them all (with read_fasta())
+    # before making genomes. As with read_fasta(), a sequence whose header
+    # repeats an earlier one replaces the earlier sequence
     genomes = []
-    seqs = list(read_fasta(fn).values())
-    for seq in seqs:
-        genomes += [genome.Genome.from_one_seq(seq)]
+    genome_idx_by_header = {}
+    for header, seq in iterate_fasta_records(fn):
+        gnm = genome.Genome.from_one_seq(seq)
+        if header in genome_idx_by_header:
+            genomes[genome_idx_by_header[header]] = gnm
+        else:
+            genome_idx_by_header[header] = len(genomes)
+            genomes += [gnm]
     return genomes
 
 
+# Bytes that are degenerate bases; these are replaced with 'N'
+_DEGENERATE_BASES = b'YRWSMKBDHV'
+
+# Whitespace within sequence lines is ignored
+_SEQ_WHITESPACE = b' \t\n\r\x0b\x0c'
+
+
+def _make_seq_translation(replace_degenerate, skip_gaps, make_uppercase):
+    """Construct arguments to bytes.translate() for reading sequence lines.
+
+    Performing all the changes to a sequence with one call to
+    bytes.translate() on the full sequence is considerably faster than
+    changing each line as it is read (e.g., with str.upper() and a regex).
+
+    Args:
+        replace_degenerate: when True, replace degenerate bases with 'N'
+        skip_gaps: when True, delete dashes ('-')
+        make_uppercase: when True, change all bases to be uppercase
+
+    Returns:
+        tuple (table, delete) to give to bytes.translate()
+    """
+    table = bytearray(range(256))
+    if make_uppercase:
+        for b in range(ord('a'), ord('z') + 1):
+            table[b] = b - ord('a') + ord('A')
+    if replace_degenerate:
+        # Replace after making uppercase so that, if make_uppercase is
+        # set, lowercase degenerate bases are also replaced
+        for b in range(256):
+            if table[b] in _DEGENERATE_BASES:
+                table[b] = ord('N')
+    delete = _SEQ_WHITESPACE
+    if skip_gaps:
+        delete += b'-'
+    return bytes(table), delete
+
+
+def iterate_fasta_records(fn, replace_degenerate=True, skip_gaps=True,
+                          make_uppercase=True, allow_missing_header=False):
+    """Scan through a FASTA file and yield each record.
+
+    This is a generator that only stores the record being read, so its
+    memory usage is bounded by the length of the longest sequence rather
+    than the size of the file. The lines of a sequence are accumulated
+    in a list and joined once, rather than concatenated one by one.
+
+    Empty lines and whitespace within sequence lines are ignored.
+
+    Args:
+        fn: path to FASTA file to read (may be gzip'd, with a name
+            ending in '.gz')
+        replace_degenerate: when True, replace the degenerate
+            bases ('Y','R','W','S','M','K','B','D','H','V')
+            with 'N'
+        skip_gaps: when True, do not read dashes ('-'), which
+            represent gaps
+        make_uppercase: when True, change all bases to be
+            uppercase
+        allow_missing_header: when True, read sequence lines that occur
+            before any header as a first record whose header is None
+
+    Yields:
+        tuple (header, seq) for each sequence, in the order in which
+        they appear in the FASTA file; header excludes the leading '>'
+
+    Raises:
+        ValueError if a sequence line occurs before any header and
+        allow_missing_header is False
+    """
+    table, delete = _make_seq_translation(replace_degenerate, skip_gaps,
+                                          make_uppercase)
+
+    def process(f):
+        header = None
+        lines = []
+        for line in f:
+            if line.startswith(b'>'):
+                if header is not None or len(lines) > 0:
+                    seq = b''.join(lines).translate(table, delete)
+                    yield (header, seq.decode())
+                header = line[1:].rstrip().decode()
+                lines = []
+            elif header is None and len(line.strip()) == 0:
+                # Skip empty lines before the first record
+                continue
+            elif header is None and not allow_missing_header:
+                raise ValueError(("Sequence in FASTA file %s occurs "
+                                  "before a header") % fn)
+            else:
+                lines.append(line)
+        if header is not None or len(lines) > 0:
+            seq = b''.join(lines).translate(table, delete)
+            yield (header, seq.decode())
+
+    if fn.endswith('.gz'):
+        with gzip.open(fn, 'rb') as f:
+            yield from process(f)
+    else:
+        with open(fn, 'rb') as f:
+            yield from process(f)
+
+
 def read_fasta(fn, data_type='str', replace_degenerate=True,
                skip_gaps=True, make_uppercase=True):
     """Read a FASTA file.
@@ -120,52 +228,17 @@ def read_fasta(fn, data_type='str', replace_degenerate=True,
     """
     logger.info("Reading fasta file %s", fn)
 
-    degenerate_pattern = re.compile('[YRWSMKBDHV]')
-
-    def process(f):
-        m = OrderedDict()
-        curr_seq_name = ""
-        for line in f:
-            line = line.rstrip()
-            if len(line) == 0:
-                # Reset the sequence being read on an empty line
-                curr_seq_name = ""
-                continue
-            if curr_seq_name == "":
-                # Must encounter a new sequence
-                assert line.startswith('>')
-            if line.startswith('>'):
-                curr_seq_name = line[1:]
-                m[curr_seq_name] = ''
-            else:
-                # Append the sequence
-                if make_uppercase:
-                    line = line.upper()
-                if replace_degenerate:
-                    line = degenerate_pattern.sub('N', line)
-                if skip_gaps:
-                    line = line.replace('-', '')
-                m[curr_seq_name] += line
-        return m
-
-    if fn.endswith('.gz'):
-        with gzip.open(fn, 'rt') as f:
-            m = process(f)
-    else:
-        with open(fn, 'r') as f:
-            m = process(f)
-
-    if data_type == 'str':
-        # Already stored sequence as string
-        m_converted = m
-    elif data_type == 'np':
-        m_converted = OrderedDict()
-        for seq_name, seq in m.items():
-            m_converted[seq_name] = np.fromiter(seq, dtype='U1')
-    else:
+    if data_type not in ('str', 'np'):
         raise ValueError("Unknown data_type " + data_type)
 
-    return m_converted
+    m = OrderedDict()
+    for header, seq in iterate_fasta_records(
+            fn, replace_degenerate=replace_degenerate, skip_gaps=skip_gaps,
+            make_uppercase=make_uppercase):
+        if data_type == 'np':
+            seq = np.fromiter(seq, dtype='U1')
+        m[header] = seq
+    return m
 
 
 def iterate_fasta(fn, data_type='str', replace_degenerate=True):
@@ -173,6 +246,10 @@ def iterate_fasta(fn, data_type='str', replace_degenerate=True):
 
     This is a generator that scans through a given FASTA file and,
     upon completing the read of a sequence, yields that sequence.
+    Unlike read_fasta(), this does not change the case of bases or
+    skip gaps, and it skips sequences that are empty. Sequence lines that
+    occur before any header are read as a first sequence, rather than
+    raising an error.
 
     Args:
         fn: path to FASTA file to read
@@ -186,8 +263,6 @@ def iterate_fasta(fn, data_type='str', replace_degenerate=True):
     Yields:
         each sequence in the FASTA file
     """
-    degenerate_pattern = re.compile('[YRWSMKBDHV]')
-
     def format_seq(seq):
         if data_type == 'str':
             # Already stored as str
@@ -195,35 +270,14 @@ def iterate_fasta(fn, data_type='str', replace_degenerate=True):
         elif data_type == 'np':
             return np.fromiter(seq, dtype='U1')
         else:
-            raise ValueError("Unknown data_type " + data_tyoe)
+            raise ValueError("Unknown data_type " + data_type)
 
-    def process(f):
-        curr_seq = ''
-        for line in f:
-            line = line.rstrip()
-            if len(line) == 0:
-                # Skip the blank line
-                continue
-            if line.startswith('>'):
-                # Yield the current sequence (if there is one) and reset the
-                # sequence being read
-                if len(curr_seq) > 0:
-                    yield format_seq(curr_seq)
-                curr_seq = ''
-            else:
-                # Append the sequence
-                if replace_degenerate:
-                    line = degenerate_pattern.sub('N', line)
-                curr_seq += line
-        if len(curr_seq) > 0:
-            yield format_seq(curr_seq)
+    for header, seq in iterate_fasta_records(
+            fn, replace_degenerate=replace_degenerate, skip_gaps=False,
+            make_uppercase=False, allow_missing_header=True):
+        if len(seq) > 0:
+            yield format_seq(seq)
 
-    if fn.endswith('.gz'):
-        with gzip.open(fn, 'rt') as f:
-            yield from process(f)
-    else:
-        with open(fn, 'r') as f:
-            yield from process(f)
 
 def write_probe_fasta(probes, out_fn):
     """Write probe sequences to a FASTA file.
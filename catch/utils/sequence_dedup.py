@@ -0,0 +1,115 @@
+"""Reuse of outputs across repeated sequences.
+
+Collections of target genomes often contain exact copies of a genome or
+of one of its sequences (e.g., identical influenza segments across many
+isolates). Finding the ranges that probes cover in a sequence depends
+only on its bases, so a copy need not be scanned again: the output for
+its first occurrence can be given to every later occurrence, which is
+then placed at its own (grouping, genome, offset) by the caller.
+
+RepeatedSequences finds, given all of the sequences in the order they
+will be processed, the first occurrence of each distinct sequence, and
+holds the output for a sequence from its first occurrence until its last
+one, so that no more than the outputs of the sequences still to be
+repeated are held at once. Sequences are compared by their content: they
+are keyed in a dict by their hash and checked for equality on a match,
+so distinct sequences are never treated as copies.
+"""
+
+import logging
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+logger = logging.getLogger(__name__)
+
+
+class RepeatedSequences:
+    """Finds repeated sequences and holds outputs to reuse for them.
+    """
+
+    def __init__(self, sequences):
+        """
+        Args:
+            sequences: iterable of sequences (as strings), in the order
+                in which they will be processed
+        """
+        # self.is_first[i] is True iff the i'th sequence is the first
+        # occurrence of its content
+        self.is_first = []
+        # For each distinct sequence, the number of its occurrences whose
+        # output has not yet been taken
+        self._num_left = {}
+        # For each sequence that is still to be repeated, the output of
+        # its first occurrence
+        self._outputs = {}
+
+        self.num_sequences = 0
+        self.num_bases = 0
+        self.num_distinct_sequences = 0
+        self.num_distinct_bases = 0
+        for sequence in sequences:
+            num_left = self._num_left.get(sequence, 0)
+            self.is_first += [num_left == 0]
+            self._num_left[sequence] = num_left + 1
+            self.num_sequences += 1
+            self.num_bases += len(sequence)
+            if num_left == 0:
+                self.num_distinct_sequences += 1
+                self.num_distinct_bases += len(sequence)
+
+    def add(self, sequence, output):
+        """Record the output for the first occurrence of a sequence.
+
+        The output is held only if the sequence occurs again.
+
+        Args:
+            sequence: sequence whose first occurrence was processed
+            output: output for sequence, to give to its later occurrences
+        """
+        num_left = self._num_left[sequence] - 1
+        if num_left > 0:
+            self._num_left[sequence] = num_left
+            self._outputs[sequence] = output
+        else:
+            del self._num_left[sequence]
+
+    def take(self, sequence):
+        """Return the output for a repeated occurrence of a sequence.
+
+        The output is released after its last occurrence takes it.
+
+        Args:
+            sequence: sequence that is not the first occurrence of its
+                content
+
+        Returns:
+            the output given to add() for the first occurrence of
+            sequence
+
+        Raises:
+            KeyError if the output for sequence was not added, or it was
+            already taken by all of its occurrences
+        """
+        output = self._outputs[sequence]
+        num_left = self._num_left[sequence] - 1
+        if num_left > 0:
+            self._num_left[sequence] = num_left
+        else:
+            del self._num_left[sequence]
+            del self._outputs[sequence]
+        return output
+
+    def log_savings(self):
+        """Log the number of sequences and bases that need not be scanned.
+        """
+        if self.num_distinct_sequences == self.num_sequences:
+            logger.info("All %d target sequences are distinct",
+                        self.num_sequences)
+            return
+        logger.info(("Scanning %d distinct sequences (%d bp) of %d target "
+                     "sequences (%d bp); reusing covers for %d repeated "
+                     "sequences (%d bp)"),
+                    self.num_distinct_sequences, self.num_distinct_bases,
+                    self.num_sequences, self.num_bases,
+                    self.num_sequences - self.num_distinct_sequences,
+                    self.num_bases - self.num_distinct_bases)
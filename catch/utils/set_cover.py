@@ -2,8 +2,11 @@
 """
 
 from collections import defaultdict
+import heapq
 import logging
 
+import numpy as np
+
 from catch.utils import interval
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -144,12 +147,95 @@ def approx(sets, costs=None, p=1.0):
     return set_ids_in_cover
 
 
+class _CoverageArrayUniverse:
+    """Universe of integer elements stored as a boolean coverage array.
+
+    This is an alternative to storing a universe as an IntervalSet. The
+    universe spans a range of positions [start, end) and mask[i] is True
+    iff position start+i is in the universe (i.e., has not yet been
+    covered). Counting the elements of a set that are in the universe
+    and removing a set from the universe operate on slices of the array
+    and, unlike IntervalSet.intersection() and IntervalSet.difference(),
+    do not allocate new objects.
+    """
+
+    __slots__ = ['start', 'mask', 'size']
+
+    def __init__(self, start, end):
+        """
+        Args:
+            start: smallest element that can be in the universe
+            end: one more than the largest element that can be in the
+                universe
+
+        The universe is initially empty.
+        """
+        self.start = start
+        self.mask = np.zeros(max(0, end - start), dtype=bool)
+        self.size = 0
+
+    @staticmethod
+    def _intervals(s):
+        """Give the intervals in s.
+
+        Args:
+            s: IntervalSet or tuple (start, end) giving a single interval
+
+        Returns:
+            iterable of (start, end) intervals
+        """
+        if isinstance(s, tuple):
+            return (s,)
+        return s.intervals
+
+    def add(self, s):
+        """Add the elements of s to the universe.
+
+        Args:
+            s: IntervalSet or tuple (start, end) giving a single interval
+        """
+        for a, b in self._intervals(s):
+            region = self.mask[(a - self.start):(b - self.start)]
+            self.size += len(region) - int(np.count_nonzero(region))
+            region[:] = True
+
+    def count(self, s):
+        """Count the elements of s that are in the universe.
+
+        Args:
+            s: IntervalSet or tuple (start, end) giving a single interval
+
+        Returns:
+            |s intersect universe|
+        """
+        n = 0
+        for a, b in self._intervals(s):
+            n += np.count_nonzero(self.mask[(a - self.start):(b - self.start)])
+        return int(n)
+
+    def remove(self, s):
+        """Remove the elements of s from the universe, in place.
+
+        Args:
+            s: IntervalSet or tuple (start, end) giving a single interval
+        """
+        for a, b in self._intervals(s):
+            region = self.mask[(a - self.start):(b - self.start)]
+            self.size -= int(np.count_nonzero(region))
+            region[:] = False
+
+    def __len__(self):
+        return self.size
+
+
 def approx_multiuniverse(sets,
                          costs=None,
                          universe_p=None,
                          ranks=None,
                          use_arrays=False,
-                         use_intervalsets=False):
+                         use_intervalsets=False,
+                         use_lazy_greedy=False,
+                         use_coverage_arrays=False):
     """Approximates the solution to a "multiuniverse" set problem.
 
     We define the "multiuniverse" set problem to be a version of the
@@ -218,6 +304,25 @@ def approx_multiuniverse(sets,
             has just one interval (i.e., the one specified by the tuple),
             which is useful for saving space, and the interval is converted
             into an instance of IntervalSet as needed.
+        use_lazy_greedy: when True, find the set to put into the set
+            cover on each iteration with a priority queue of (possibly
+            stale) ratios rather than by recomputing the ratios of all
+            sets when the last_min_ratio heuristic fails [see
+            implementation note below]. This selects exactly the same sets
+            as when it is False, but can be much faster when there are
+            many sets.
+        use_coverage_arrays: when True, the values inside the input 'sets'
+            are expected to be stored as they are when 'use_intervalsets'
+            is True (an IntervalSet, or a tuple giving a single interval),
+            but each universe is stored as a boolean array with one entry
+            per position spanned by the universe. Counting the elements a
+            set covers and removing a set from a universe then operate on
+            slices of the array in place, rather than allocating new
+            IntervalSets. This uses memory proportional to the extent of
+            each universe (one byte per position), so it is best suited
+            to universes that are dense stretches of positions, such as
+            target genomes. This cannot be true when 'use_arrays' or
+            'use_intervalsets' is also True.
 
     Returns:
         a set consisting of the identifiers of the sets chosen to be
@@ -280,9 +385,29 @@ def approx_multiuniverse(sets,
         the usual approach that would not use this heuristic -- i.e.,
         compute the ratios for all sets not yet in the set cover and find
         the set with the minimum ratio.
+      - As elements are covered, the ratio of every set can only increase
+        (or stay the same). When use_lazy_greedy is True, this exploits
+        that fact in the manner of the "lazy greedy" (or CELF) algorithm.
+        A heap holds, for each set not in the set cover, a ratio computed
+        on some earlier iteration; since ratios only increase, it is a
+        lower bound on the set's current ratio. On each iteration, we
+        recompute the ratio of just the set at the top of the heap: if it
+        is unchanged, that set has the minimum ratio and goes into the set
+        cover; otherwise, the set is pushed back with its new ratio and we
+        look at the new top. Heap entries are keyed by (rank, ratio, order)
+        where order is the position of the set in the (fixed) order in which
+        the full scan above iterates over sets; ties are thereby broken the
+        same way as the full scan breaks them, so that the chosen sets are
+        identical. Sets whose ratio is infinite can never again cover
+        anything needed, so they are dropped from the heap; this has the
+        effect of moving on to the next rank once no set of the current rank
+        covers anything needed.
     """
     if use_arrays and use_intervalsets:
         raise ValueError("Cannot use both arrays and IntervalSets")
+    if use_coverage_arrays and (use_arrays or use_intervalsets):
+        raise ValueError(("Cannot use coverage arrays together with arrays "
+                          "or IntervalSets"))
 
     if costs is None:
         # Give each set a default cost of 1
@@ -297,7 +422,28 @@ def approx_multiuniverse(sets,
                                  set_id)
 
     # Create the universes from given sets
-    if use_intervalsets:
+    if use_coverage_arrays:
+        # Determine the extent of each universe so that its coverage
+        # array can be allocated once
+        universe_extents = {}
+        for sets_by_universe in sets.values():
+            for universe_id, s in sets_by_universe.items():
+                if isinstance(s, tuple):
+                    s_start, s_end = s
+                else:
+                    if len(s.intervals) == 0:
+                        continue
+                    s_start, s_end = s.first_start, s.last_end
+                if universe_id in universe_extents:
+                    u_start, u_end = universe_extents[universe_id]
+                    universe_extents[universe_id] = (min(u_start, s_start),
+                                                     max(u_end, s_end))
+                else:
+                    universe_extents[universe_id] = (s_start, s_end)
+        universes = defaultdict(lambda: _CoverageArrayUniverse(0, 0))
+        for universe_id, (u_start, u_end) in universe_extents.items():
+            universes[universe_id] = _CoverageArrayUniverse(u_start, u_end)
+    elif use_intervalsets:
         # Store the elements of each universe in an IntervalSet
         universes = defaultdict(lambda: interval.IntervalSet([]))
     else:
@@ -305,7 +451,9 @@ def approx_multiuniverse(sets,
         universes = defaultdict(set)
     for sets_by_universe in sets.values():
         for universe_id, s in sets_by_universe.items():
-            if use_intervalsets:
+            if use_coverage_arrays:
+                universes[universe_id].add(s)
+            elif use_intervalsets:
                 if isinstance(s, tuple):
                     # s is a single interval
                     s = interval.IntervalSet([s])
@@ -400,10 +548,15 @@ def approx_multiuniverse(sets,
                 if use_intervalsets and isinstance(s, tuple):
                     # s is a single interval
                     s = interval.IntervalSet([s])
-                # If use_intervalsets, then s and universe should already
-                # be IntervalSets, and the intersection method is defined
-                # for these
-                num_covered = len(s.intersection(universe))
+                if use_coverage_arrays:
+                    # Count directly from the coverage array, without
+                    # building the intersection
+                    num_covered = universe.count(s)
+                else:
+                    # If use_intervalsets, then s and universe should
+                    # already be IntervalSets, and the intersection method
+                    # is defined for these
+                    num_covered = len(s.intersection(universe))
                 # Memoize num_covered
                 memoized_intersect_counts[universe_id][set_id] = num_covered
             # There is no need to cover more than num_left_to_cover
@@ -430,6 +583,17 @@ def approx_multiuniverse(sets,
 
     set_ids_not_in_cover = set(sets.keys())
     set_ids_in_cover = set()
+
+    if use_lazy_greedy:
+        # Make a heap of (rank, ratio, order, set_id) for all sets (see the
+        # implementation note above); iterating over set_ids_not_in_cover
+        # gives the order in which the full scan considers sets
+        ratio_heap = []
+        for order, set_id in enumerate(set_ids_not_in_cover):
+            ratio = compute_ratio_for_set(set_id)
+            if ratio != float('inf'):
+                ratio_heap += [(ranks[set_id], ratio, order, set_id)]
+        heapq.heapify(ratio_heap)
     # Keep iterating until desired partial cover of each universe
     # is obtained (note that [] evaluates to False)
     while [True for universe_id in universes.keys()
@@ -444,6 +608,30 @@ def approx_multiuniverse(sets,
         # it covers
         id_min_ratio = None
 
+        if use_lazy_greedy:
+            while ratio_heap:
+                rank, stale_ratio, order, set_id = ratio_heap[0]
+                ratio = compute_ratio_for_set(set_id)
+                if ratio == float('inf'):
+                    # set_id will never again cover anything that needs to
+                    # be covered
+                    heapq.heappop(ratio_heap)
+                elif ratio == stale_ratio:
+                    # The ratio is current, and no other set can have a
+                    # smaller one
+                    heapq.heappop(ratio_heap)
+                    id_min_ratio = set_id
+                    break
+                else:
+                    heapq.heapreplace(ratio_heap,
+                                      (rank, ratio, order, set_id))
+            if id_min_ratio is None:
+                # No set covers anything that needs to be covered
+                break
+            # On the lazy path, set_ids_with_same_ratio_as_last_min stays
+            # empty and id_min_ratio is set, so the full scan below is
+            # skipped
+
         # First, look among all sets whose ratio equals the last minimum
         # ratio. Because the minimum ratio is nondecreasing across iterations,
         # if one set's ratio equals the last minimum ratio, this one must also
@@ -521,7 +709,14 @@ def approx_multiuniverse(sets,
             s = sets[id_min_ratio][universe_id]
             prev_universe_size = len(universe)
             # Remove s from universe
-            if use_intervalsets:
+            if use_coverage_arrays:
+                # Clear the positions of s in place
+                universe.remove(s)
+                if isinstance(s, tuple):
+                    # s is a single interval; the memo invalidation below
+                    # expects an IntervalSet
+                    s = interval.IntervalSet([s])
+            elif use_intervalsets:
                 if isinstance(s, tuple):
                     # s is a single interval
                     s = interval.IntervalSet([s])
@@ -536,7 +731,7 @@ def approx_multiuniverse(sets,
                 0, len(universe) - num_that_can_be_uncovered[universe_id])
             # Discard memoized values
             if len(universe) != prev_universe_size:
-                if use_intervalsets:
+                if use_intervalsets or use_coverage_arrays:
                     # The universe was modified and since we are using interval
                     # sets we can optimize what values we choose to discard
                     # (i.e., invalidate). In particular, only invalidate
@@ -0,0 +1,58 @@
+"""Tests for bounded_cache module.
+"""
+
+import unittest
+
+from catch.utils import bounded_cache
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestBoundedCache(unittest.TestCase):
+    """Tests the BoundedCache class.
+    """
+
+    def test_get_and_put(self):
+        cache = bounded_cache.BoundedCache(10)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        cache.put_many(['b', 'c'], [2, 3])
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get_many(['c', 'd', 'b']), [3, None, 2])
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.hits, 3)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hit_rate(), 0.6)
+
+        cache.reset_stats()
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.hit_rate(), 0.0)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = bounded_cache.BoundedCache(3, eviction='lru')
+        cache.put_many(['a', 'b', 'c'], [1, 2, 3])
+        # Reading 'a' makes 'b' the least recently used
+        cache.get('a')
+        cache.put('d', 4)
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd']),
+                         [1, None, 3, 4])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_fifo_eviction(self):
+        cache = bounded_cache.BoundedCache(3, eviction='fifo')
+        cache.put_many(['a', 'b', 'c'], [1, 2, 3])
+        # Reading 'a' does not keep it from being evicted first
+        cache.get('a')
+        cache.put_many(['d', 'e'], [4, 5])
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd', 'e']),
+                         [None, None, 3, 4, 5])
+        self.assertEqual(cache.evictions, 2)
+        self.assertEqual(len(cache), 3)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            bounded_cache.BoundedCache(0)
+        with self.assertRaises(ValueError):
+            bounded_cache.BoundedCache(10, eviction='random')
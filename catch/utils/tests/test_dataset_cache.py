@@ -0,0 +1,116 @@
+"""Tests for dataset_cache module.
+"""
+
+import logging
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from catch.datasets import GenomesDatasetMultiChrom
+from catch.datasets import GenomesDatasetSingleChrom
+from catch import genome
+from catch.utils import dataset_cache
+from catch.utils import seq_io
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestDatasetCache(unittest.TestCase):
+    """Tests reading datasets through the cache.
+    """
+
+    def setUp(self):
+        # Disable logging
+        logging.disable(logging.INFO)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+        # Write a dataset with one chromosome per genome
+        self.single_fasta = os.path.join(self.tmp_dir.name, 'single.fasta')
+        with open(self.single_fasta, 'w') as f:
+            f.write(">genome_1\nATCGry\nAA-T\n>genome_2\nGGGG\n>genome_3\n\n")
+        self.single_ds = GenomesDatasetSingleChrom(
+            'test_single', self.single_fasta, None)
+        self.single_ds.add_fasta_path(self.single_fasta)
+
+        # Write a dataset with multiple chromosomes per genome
+        self.multi_fasta = os.path.join(self.tmp_dir.name, 'multi.fasta')
+        with open(self.multi_fasta, 'w') as f:
+            f.write(">[genome A] [segment S]\nATCG\n"
+                    ">[genome A] [segment L]\nCCCCAT\n"
+                    ">[genome B] [segment L]\nTTTT\n"
+                    ">[genome B] [segment S]\nGG\n")
+
+        def seq_header_to_chr(header):
+            return 'segment_' + header.split('[segment ')[1][0]
+
+        def seq_header_to_genome(header):
+            return header.split('[genome ')[1][0]
+
+        self.multi_ds = GenomesDatasetMultiChrom(
+            'test_multi', self.multi_fasta, None,
+            ['segment_L', 'segment_S'], seq_header_to_chr,
+            seq_header_to_genome=seq_header_to_genome)
+        self.multi_ds.add_fasta_path(self.multi_fasta)
+
+    def cache_files(self):
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_same_as_uncached(self):
+        for ds in [self.single_ds, self.multi_ds]:
+            expected = seq_io.read_dataset_genomes(ds)
+            # The first read writes the cache, and the second loads it
+            written = dataset_cache.read_dataset_genomes(ds, self.cache_dir)
+            loaded = dataset_cache.read_dataset_genomes(ds, self.cache_dir)
+            self.assertEqual(written, expected)
+            self.assertEqual(loaded, expected)
+            self.assertEqual([g.size() for g in loaded],
+                             [g.size() for g in expected])
+            self.assertEqual([g.divided_into_chrs() for g in loaded],
+                             [g.divided_into_chrs() for g in expected])
+
+    def test_loaded_genomes_wrap_memmap(self):
+        dataset_cache.read_dataset_genomes(self.single_ds, self.cache_dir)
+        loaded = dataset_cache.read_dataset_genomes(self.single_ds,
+                                                    self.cache_dir)
+        for gnm in loaded:
+            self.assertIsInstance(gnm._buffer, np.memmap)
+            # The sequences should not be decoded until accessed
+            self.assertIsNone(gnm._seqs)
+        self.assertEqual(loaded[0].size(), 9)
+        self.assertIsNone(loaded[0]._seqs)
+        self.assertEqual(loaded[0].seqs, ['ATCGNNAAT'])
+
+    def test_cache_rewritten_when_fasta_changes(self):
+        dataset_cache.read_dataset_genomes(self.single_ds, self.cache_dir)
+        files_before = self.cache_files()
+        self.assertEqual(len(files_before), 3)
+
+        with open(self.single_fasta, 'a') as f:
+            f.write(">genome_4\nCCCC\n")
+        genomes = dataset_cache.read_dataset_genomes(self.single_ds,
+                                                     self.cache_dir)
+        self.assertEqual(genomes[-1], genome.Genome.from_one_seq('CCCC'))
+        loaded = dataset_cache.read_dataset_genomes(self.single_ds,
+                                                    self.cache_dir)
+        self.assertEqual(loaded, genomes)
+
+        # The stale cache should have been removed
+        files_after = self.cache_files()
+        self.assertEqual(len(files_after), 3)
+        self.assertEqual(set(files_before) & set(files_after), set())
+
+    def test_other_datasets_kept(self):
+        dataset_cache.read_dataset_genomes(self.single_ds, self.cache_dir)
+        dataset_cache.read_dataset_genomes(self.multi_ds, self.cache_dir)
+        self.assertEqual(len(self.cache_files()), 6)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging
+        logging.disable(logging.NOTSET)
+
@@ -3,6 +3,8 @@
 
 import unittest
 
+import numpy as np
+
 from catch.utils import interval
 from catch.utils.interval import IntervalSet
 
@@ -174,6 +176,115 @@ class TestMergeOverlapping(unittest.TestCase):
                      [(1, 8), (10, 12), (15, 20)])
 
 
+def random_keyed_intervals(n, num_keys=5, max_start=200, max_len=20):
+    keys = np.random.randint(0, num_keys, size=n)
+    starts = np.random.randint(0, max_start, size=n)
+    ends = starts + np.random.randint(1, max_len, size=n)
+    return keys, starts, ends
+
+
+def intervals_by_key(keys, starts, ends):
+    by_key = {}
+    for key, start, end in zip(keys.tolist(), starts.tolist(),
+                               ends.tolist()):
+        by_key.setdefault(key, []).append((start, end))
+    return by_key
+
+
+class TestMergeOverlappingByKey(unittest.TestCase):
+    """Tests the merge_overlapping_by_key function.
+    """
+
+    def test_same_as_merge_overlapping(self):
+        np.random.seed(1)
+        for n in [0, 1, 2, 10, 100, 1000]:
+            keys, starts, ends = random_keyed_intervals(n)
+            merged = interval.merge_overlapping_by_key(keys, starts, ends)
+            expected = {key: interval.merge_overlapping(intervals)
+                        for key, intervals in
+                        intervals_by_key(keys, starts, ends).items()}
+            self.assertEqual(intervals_by_key(*merged), expected)
+            # The output is sorted by key and then start
+            self.assertEqual(list(zip(*(x.tolist() for x in merged))),
+                             sorted(zip(*(x.tolist() for x in merged))))
+
+    def test_touching(self):
+        keys, starts, ends = interval.merge_overlapping_by_key(
+            [3, 3, 1, 3], [1, 3, 3, 10], [3, 5, 5, 12])
+        self.assertEqual(keys.tolist(), [1, 3, 3])
+        self.assertEqual(starts.tolist(), [3, 1, 10])
+        self.assertEqual(ends.tolist(), [5, 5, 12])
+
+
+class TestUniqueByKey(unittest.TestCase):
+    """Tests the unique_by_key function.
+    """
+
+    def test_same_as_set(self):
+        np.random.seed(1)
+        keys, starts, ends = random_keyed_intervals(1000, max_len=3)
+        unique = interval.unique_by_key(keys, starts, ends)
+        self.assertEqual(list(zip(*(x.tolist() for x in unique))),
+                         sorted(set(zip(keys.tolist(), starts.tolist(),
+                                        ends.tolist()))))
+
+
+class TestIntervalAccumulator(unittest.TestCase):
+    """Tests the IntervalAccumulator class.
+    """
+
+    def test_add(self):
+        np.random.seed(1)
+        keys, starts, ends = random_keyed_intervals(1000)
+        # Mostly in order of start, as when scanning a sequence
+        order = np.argsort(starts + np.random.randint(0, 5, size=1000))
+        keys, starts, ends = keys[order], starts[order], ends[order]
+        for merge_overlapping in [True, False]:
+            if merge_overlapping:
+                expected = interval.merge_overlapping_by_key(keys, starts,
+                                                             ends)
+            else:
+                expected = interval.unique_by_key(keys, starts, ends)
+            accumulator = interval.IntervalAccumulator(
+                merge_overlapping=merge_overlapping)
+            for i, (key, start, end) in enumerate(zip(
+                    keys.tolist(), starts.tolist(), ends.tolist())):
+                accumulator.add(key, start, end)
+                if i % 300 == 0:
+                    accumulator.merge()
+            for x, y in zip(accumulator.to_arrays(), expected):
+                self.assertEqual(x.tolist(), y.tolist())
+
+    def test_add_extends_last_interval(self):
+        accumulator = interval.IntervalAccumulator()
+        for i in range(100):
+            accumulator.add(7, i, i + 10)
+        self.assertEqual(len(accumulator._keys), 1)
+        self.assertEqual([x.tolist() for x in accumulator.to_arrays()],
+                         [[7], [0], [109]])
+
+    def test_add_arrays(self):
+        np.random.seed(1)
+        keys, starts, ends = random_keyed_intervals(500)
+        accumulator = interval.IntervalAccumulator()
+        accumulator.add_arrays(keys[:200], starts[:200], ends[:200])
+        accumulator.merge()
+        for key, start, end in zip(keys[200:300].tolist(),
+                                   starts[200:300].tolist(),
+                                   ends[200:300].tolist()):
+            accumulator.add(key, start, end)
+        accumulator.add_arrays(keys[300:], starts[300:], ends[300:])
+        expected = interval.merge_overlapping_by_key(keys, starts, ends)
+        for x, y in zip(accumulator.to_arrays(), expected):
+            self.assertEqual(x.tolist(), y.tolist())
+
+    def test_empty(self):
+        accumulator = interval.IntervalAccumulator()
+        accumulator.merge()
+        for x in accumulator.to_arrays():
+            self.assertEqual(len(x), 0)
+
+
 class TestSchedule(unittest.TestCase):
     """Tests the schedule function.
     """
@@ -0,0 +1,95 @@
+"""Tests for kmer_prefilter module.
+"""
+
+import unittest
+
+import numpy as np
+
+from catch.utils import kmer_prefilter
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestKmerPrefilter(unittest.TestCase):
+    """Tests constructing and querying a KmerPrefilter.
+    """
+
+    def setUp(self):
+        np.random.seed(1)
+        self.keys = np.random.randint(0, 2**40, size=5000, dtype=np.uint64)
+        self.other_keys = np.setdiff1d(
+            np.random.randint(0, 2**40, size=100000, dtype=np.uint64),
+            self.keys)
+
+    def check_accepts_keys(self, prefilter, keys, others):
+        self.assertTrue(np.all(prefilter.contains(keys)))
+        for key in keys[:500].tolist():
+            self.assertTrue(prefilter.contains_key(key))
+        # contains_key() should give the same answers as contains()
+        others = others[:2000]
+        self.assertEqual([prefilter.contains_key(key)
+                          for key in others.tolist()],
+                         prefilter.contains(others).tolist())
+
+    def test_bloom(self):
+        for bits_per_key in [2, 10, 16]:
+            prefilter = kmer_prefilter.KmerPrefilter.construct(
+                self.keys, 40, bits_per_key=bits_per_key)
+            self.assertEqual(prefilter.kind, 'bloom')
+            self.assertGreaterEqual(2**prefilter.log2_num_bits,
+                                    bits_per_key * len(self.keys))
+            self.check_accepts_keys(prefilter, self.keys, self.other_keys)
+            fpr = np.mean(prefilter.contains(self.other_keys))
+            # A blocked Bloom filter has a somewhat higher rate than the
+            # standard one
+            self.assertLess(fpr, 3 * 0.6185**bits_per_key + 0.001)
+
+        # The false positive rate decreases with more bits per key
+        fprs = [np.mean(kmer_prefilter.KmerPrefilter.construct(
+                    self.keys, 40, false_positive_rate=rate).contains(
+                        self.other_keys))
+                for rate in [0.2, 0.01]]
+        self.assertLess(fprs[1], fprs[0])
+        self.assertLess(fprs[1], 0.05)
+
+    def test_bitmap(self):
+        # Whole keys fit in the bitmap, so it is exact
+        keys = self.keys & np.uint64(2**16 - 1)
+        prefilter = kmer_prefilter.KmerPrefilter.construct(keys, 16)
+        self.assertEqual(prefilter.kind, 'bitmap')
+        self.assertEqual(prefilter.shift, 0)
+        others = np.setdiff1d(np.arange(2**16, dtype=np.uint64), keys)
+        self.check_accepts_keys(prefilter, keys, others)
+        self.assertFalse(np.any(prefilter.contains(others)))
+
+        # Only prefixes of keys fit in the bitmap
+        prefilter = kmer_prefilter.KmerPrefilter.construct(
+            self.keys, 40, bits_per_key=4, kind='bitmap')
+        self.assertEqual(prefilter.kind, 'bitmap')
+        self.assertEqual(prefilter.shift, 40 - prefilter.log2_num_bits)
+        self.check_accepts_keys(prefilter, self.keys, self.other_keys)
+        self.assertLess(np.mean(prefilter.contains(self.other_keys)), 0.5)
+
+    def test_params(self):
+        prefilter = kmer_prefilter.KmerPrefilter.construct(self.keys, 40)
+        copy = kmer_prefilter.KmerPrefilter(prefilter.words.copy(),
+                                            **prefilter.params())
+        self.assertEqual(copy.contains(self.other_keys).tolist(),
+                         prefilter.contains(self.other_keys).tolist())
+
+    def test_empty(self):
+        prefilter = kmer_prefilter.KmerPrefilter.construct(
+            np.zeros(0, dtype=np.uint64), 40)
+        self.assertFalse(np.any(prefilter.contains(self.other_keys)))
+        self.assertEqual(prefilter.fill_fraction(), 0.0)
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            kmer_prefilter.KmerPrefilter.construct(
+                self.keys, 40, bits_per_key=10, false_positive_rate=0.01)
+        with self.assertRaises(ValueError):
+            kmer_prefilter.KmerPrefilter.construct(
+                self.keys, 40, false_positive_rate=1.5)
+        with self.assertRaises(ValueError):
+            kmer_prefilter.KmerPrefilter.construct(
+                self.keys, 40, kind='unknown')
@@ -3,6 +3,8 @@
 
 import unittest
 
+import numpy as np
+
 from catch.utils import longest_common_substring as lcf
 
 __author__ = 'Hayden Metsky <hayden@mit.edu>'
@@ -156,3 +158,75 @@ class TestLCSAroundAnchorWithKMismatches(unittest.TestCase):
         a = 'ABCDEFGHIJKLM'
         b = 'ABZDEFSTIJWXY'
         self.assertEqual(lcf.k_lcf_around_anchor(a, b, 3, 6, 3), (10, 0))
+
+
+class TestLCSAroundAnchorsWithKMismatches(unittest.TestCase):
+    """Tests the k_lcf_around_anchors function.
+    """
+
+    def test_same_as_around_anchor(self):
+        np.random.seed(1)
+        num_rows, num_cols = 500, 30
+        a = np.random.randint(0, 3, size=(num_rows, num_cols))
+        b = np.random.randint(0, 3, size=(num_rows, num_cols))
+        lengths = np.random.randint(5, num_cols + 1, size=num_rows)
+        anchor_start = np.array([np.random.randint(0, l - 4)
+                                 for l in lengths])
+        anchor_end = anchor_start + np.random.randint(1, 5, size=num_rows)
+        anchor_end = np.minimum(anchor_end, lengths)
+        for r in range(num_rows):
+            # Make the anchors shared
+            b[r, anchor_start[r]:anchor_end[r]] = \
+                a[r, anchor_start[r]:anchor_end[r]]
+        for k in range(0, 5):
+            l, s = lcf.k_lcf_around_anchors(a, b, lengths, anchor_start,
+                                            anchor_end, k)
+            for r in range(num_rows):
+                expected = lcf.k_lcf_around_anchor(
+                    a[r, :lengths[r]], b[r, :lengths[r]],
+                    anchor_start[r], anchor_end[r], k)
+                self.assertEqual((l[r], s[r]), expected)
+
+    def test_strings(self):
+        a = np.array([list('ABCDEFGHIJKLM'), list('ABCDEFGHIJKLM')])
+        b = np.array([list('XBZDEFGTUJKLM'), list('ABZDEFSTUVWXY')])
+        l, s = lcf.k_lcf_around_anchors(a, b, [13, 13], [3, 3], [6, 6], 2)
+        self.assertEqual(list(l), [10, 7])
+        self.assertEqual(list(s), [3, 0])
+
+    def test_no_rows(self):
+        a = np.zeros((0, 10), dtype=np.uint8)
+        l, s = lcf.k_lcf_around_anchors(a, a, [], [], [], 1)
+        self.assertEqual(len(l), 0)
+        self.assertEqual(len(s), 0)
+
+    def test_more_mismatches_than_columns(self):
+        a = np.array([list('ABCD')])
+        b = np.array([list('XBCY')])
+        l, s = lcf.k_lcf_around_anchors(a, b, [4], [1], [3], 10)
+        self.assertEqual((l[0], s[0]), (4, 0))
+        l, s = lcf.k_lcf_around_anchors(a, b, [3], [1], [3], 0)
+        self.assertEqual((l[0], s[0]), (2, 1))
+
+    def test_for_each_k_same_as_each_call(self):
+        np.random.seed(2)
+        num_rows, num_cols = 300, 40
+        a = np.random.randint(0, 4, size=(num_rows, num_cols))
+        b = np.random.randint(0, 4, size=(num_rows, num_cols))
+        lengths = np.random.randint(5, num_cols + 1, size=num_rows)
+        anchor_start = np.array([np.random.randint(0, l - 4)
+                                 for l in lengths])
+        anchor_end = np.minimum(anchor_start + 3, lengths)
+        for r in range(num_rows):
+            b[r, anchor_start[r]:anchor_end[r]] = \
+                a[r, anchor_start[r]:anchor_end[r]]
+        ks = [3, 0, 6, 1, 50]
+        results = lcf.k_lcf_around_anchors_for_each_k(
+            a, b, lengths, anchor_start, anchor_end, ks)
+        self.assertEqual(len(results), len(ks))
+        for k, (l, s) in zip(ks, results):
+            for r in range(num_rows):
+                expected = lcf.k_lcf_around_anchor(
+                    a[r, :lengths[r]], b[r, :lengths[r]],
+                    anchor_start[r], anchor_end[r], k)
+                self.assertEqual((l[r], s[r]), expected)
@@ -0,0 +1,97 @@
+"""Tests for probe_cover_cache module.
+"""
+
+import logging
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from catch import genome
+from catch import probe
+from catch.utils import probe_cover_cache
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestProbeCoverCache(unittest.TestCase):
+    """Tests writing and loading probe covers, and computing keys.
+    """
+
+    def setUp(self):
+        # Disable logging
+        logging.disable(logging.INFO)
+
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'cache')
+
+        self.probes = [probe.Probe.from_str(s)
+                       for s in ['ATCGAT', 'GGCCAA', 'TTTTTT']]
+        self.target_genomes = [
+            [genome.Genome.from_one_seq('ATCGATGGCCAA'),
+             genome.Genome.from_chrs({'chr1': 'TTTTTTT', 'chr2': 'ATCGAT'})],
+            [genome.Genome.from_one_seq('GGCCAAGG')]]
+        self.params = {'mismatches': 0, 'lcf_thres': 6}
+
+    def key(self, probes=None, target_genomes=None, params=None):
+        return probe_cover_cache.cache_key(
+            probes if probes is not None else self.probes,
+            (target_genomes if target_genomes is not None
+             else self.target_genomes),
+            params if params is not None else self.params)
+
+    def test_key_is_deterministic(self):
+        self.assertEqual(self.key(), self.key())
+        # The order of params should not matter
+        self.assertEqual(self.key(params={'lcf_thres': 6, 'mismatches': 0}),
+                         self.key())
+
+    def test_key_changes_with_input(self):
+        key = self.key()
+        self.assertNotEqual(self.key(probes=self.probes[::-1]), key)
+        self.assertNotEqual(self.key(probes=self.probes[:2]), key)
+        self.assertNotEqual(self.key(params={'mismatches': 1,
+                                             'lcf_thres': 6}), key)
+        # Moving a genome into another grouping should change the key
+        self.assertNotEqual(
+            self.key(target_genomes=[self.target_genomes[0] +
+                                     self.target_genomes[1]]), key)
+        # Splitting a sequence into two should change the key
+        self.assertNotEqual(
+            self.key(target_genomes=[
+                [genome.Genome.from_chrs({'chr1': 'ATCGAT',
+                                          'chr2': 'GGCCAA'}),
+                 self.target_genomes[0][1]],
+                self.target_genomes[1]]), key)
+
+    def test_write_and_load(self):
+        key = self.key()
+        self.assertIsNone(probe_cover_cache.load(self.cache_dir, key))
+
+        covers = {
+            'seq_universe': np.array([[0, 0], [0, 1], [0, 1], [1, 0]]),
+            'seq_offset': np.array([0, 0, 7, 0]),
+            'seq_len': np.array([12, 7, 6, 8]),
+            'cover_set_id': np.array([0, 1, 2, 0, 1]),
+            'cover_seq': np.array([0, 0, 1, 2, 3]),
+            'cover_start': np.array([0, 6, 0, 0, 0]),
+            'cover_end': np.array([6, 12, 6, 6, 6])
+        }
+        probe_cover_cache.write(self.cache_dir, key, covers)
+        self.assertEqual(os.listdir(self.cache_dir),
+                         ['probe_covers.%s.npz' % key])
+
+        loaded = probe_cover_cache.load(self.cache_dir, key)
+        self.assertEqual(set(loaded.keys()), set(covers.keys()))
+        for name in covers.keys():
+            np.testing.assert_array_equal(loaded[name], covers[name])
+
+        self.assertIsNone(probe_cover_cache.load(self.cache_dir,
+                                                 self.key(probes=[])))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+        # Re-enable logging
+        logging.disable(logging.NOTSET)
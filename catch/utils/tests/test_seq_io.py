@@ -2,6 +2,7 @@
 """
 
 from collections import OrderedDict
+import gzip
 import logging
 import tempfile
 import unittest
@@ -160,3 +161,100 @@ class TestFastaEmptyLineRead(unittest.TestCase):
 
         # Re-enable logging
         logging.disable(logging.NOTSET)
+
+
+class TestFastaRecordsRead(unittest.TestCase):
+    """Tests reading records with changes to the sequence.
+    """
+
+    def setUp(self):
+        # Disable logging
+        logging.disable(logging.INFO)
+
+        self.contents = (">genome_1 description\r\n"
+                         "ATacg-\r\n"
+                         "TAyGC \r\n"
+                         ">genome_2\n"
+                         "\n"
+                         ">genome_3\n"
+                         "AT-R\n"
+                         "\n"
+                         "kmN\n")
+
+        # Write the temporary fasta file, and a gzip'd version of it
+        self.fasta = tempfile.NamedTemporaryFile(mode='w')
+        self.fasta.write(self.contents)
+        self.fasta.seek(0)
+        self.fasta_gz = tempfile.NamedTemporaryFile(suffix='.fasta.gz')
+        with gzip.open(self.fasta_gz.name, 'wt') as f:
+            f.write(self.contents)
+
+    def test_records(self):
+        expected = [("genome_1 description", "ATACGTANGC"),
+                    ("genome_2", ""),
+                    ("genome_3", "ATNNNN")]
+        for fn in [self.fasta.name, self.fasta_gz.name]:
+            records = list(seq_io.iterate_fasta_records(fn))
+            self.assertEqual(records, expected)
+
+    def test_records_without_changes(self):
+        expected = [("genome_1 description", "ATacg-TAyGC"),
+                    ("genome_2", ""),
+                    ("genome_3", "AT-RkmN")]
+        records = list(seq_io.iterate_fasta_records(
+            self.fasta.name, replace_degenerate=False, skip_gaps=False,
+            make_uppercase=False))
+        self.assertEqual(records, expected)
+
+    def test_read(self):
+        expected = OrderedDict()
+        expected["genome_1 description"] = "ATACGTANGC"
+        expected["genome_2"] = ""
+        expected["genome_3"] = "ATNNNN"
+        self.assertEqual(seq_io.read_fasta(self.fasta_gz.name), expected)
+
+    def test_iterate(self):
+        # iterate_fasta() does not change case or skip gaps, and it
+        # skips empty sequences
+        self.assertEqual(list(seq_io.iterate_fasta(self.fasta.name)),
+                         ["ATacg-TAyGC", "AT-NkmN"])
+
+    def test_seq_before_header(self):
+        with tempfile.NamedTemporaryFile(mode='w') as f:
+            f.write("ATCG\n>genome_1\nATCG\n")
+            f.seek(0)
+            with self.assertRaises(ValueError):
+                list(seq_io.iterate_fasta_records(f.name))
+            self.assertEqual(list(seq_io.iterate_fasta_records(
+                                 f.name, allow_missing_header=True)),
+                             [(None, "ATCG"), ("genome_1", "ATCG")])
+            # As before records were read with iterate_fasta_records(),
+            # iterate_fasta() reads the lines before the header as a
+            # sequence
+            self.assertEqual(list(seq_io.iterate_fasta(f.name)),
+                             ["ATCG", "ATCG"])
+
+    def test_empty_lines_before_header(self):
+        with tempfile.NamedTemporaryFile(mode='w') as f:
+            f.write("\n\n>genome_1\nATCG\n")
+            f.seek(0)
+            for allow_missing_header in [False, True]:
+                self.assertEqual(
+                    list(seq_io.iterate_fasta_records(
+                        f.name, allow_missing_header=allow_missing_header)),
+                    [("genome_1", "ATCG")])
+
+    def test_genomes_with_repeated_header(self):
+        with tempfile.NamedTemporaryFile(mode='w') as f:
+            f.write(">a\nAAAA\n>b\nCCCC\n>a\nGGGG\n")
+            f.seek(0)
+            genomes = seq_io.read_genomes_from_fasta(f.name)
+        self.assertEqual(genomes, [genome.Genome.from_one_seq("GGGG"),
+                                   genome.Genome.from_one_seq("CCCC")])
+
+    def tearDown(self):
+        self.fasta.close()
+        self.fasta_gz.close()
+
+        # Re-enable logging
+        logging.disable(logging.NOTSET)
@@ -0,0 +1,56 @@
+"""Tests for sequence_dedup module.
+"""
+
+import unittest
+
+from catch.utils import sequence_dedup
+
+__author__ = 'Hayden Metsky <hayden@mit.edu>'
+
+
+class TestRepeatedSequences(unittest.TestCase):
+    """Tests the RepeatedSequences class.
+    """
+
+    def test_counts(self):
+        repeated = sequence_dedup.RepeatedSequences(
+            ['ACGT', 'AC', 'ACGT', 'GG', 'AC', 'ACGT'])
+        self.assertEqual(repeated.is_first,
+                         [True, True, False, True, False, False])
+        self.assertEqual(repeated.num_sequences, 6)
+        self.assertEqual(repeated.num_bases, 18)
+        self.assertEqual(repeated.num_distinct_sequences, 3)
+        self.assertEqual(repeated.num_distinct_bases, 8)
+
+    def test_reuse_outputs(self):
+        sequences = ['ACGT', 'AC', 'ACGT', 'GG', 'AC', 'ACGT']
+        repeated = sequence_dedup.RepeatedSequences(sequences)
+        outputs = []
+        for sequence, is_first in zip(sequences, repeated.is_first):
+            if is_first:
+                output = sequence.lower()
+                repeated.add(sequence, output)
+            else:
+                output = repeated.take(sequence)
+            outputs += [output]
+        self.assertEqual(outputs, [s.lower() for s in sequences])
+
+        # All outputs should be released after their last occurrence
+        self.assertEqual(repeated._outputs, {})
+        self.assertEqual(repeated._num_left, {})
+
+    def test_only_repeated_outputs_held(self):
+        repeated = sequence_dedup.RepeatedSequences(['AC', 'GT', 'AC'])
+        repeated.add('AC', 1)
+        repeated.add('GT', 2)
+        self.assertEqual(repeated._outputs, {'AC': 1})
+        self.assertEqual(repeated.take('AC'), 1)
+        self.assertEqual(repeated._outputs, {})
+        with self.assertRaises(KeyError):
+            repeated.take('GT')
+
+    def test_empty(self):
+        repeated = sequence_dedup.RepeatedSequences([])
+        self.assertEqual(repeated.is_first, [])
+        self.assertEqual(repeated.num_sequences, 0)
+        repeated.log_savings()
@@ -497,6 +497,35 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
                                                  use_intervalsets=True),
                          desired_output)
 
+    def test_with_coverage_arrays(self):
+        sets = {
+            0: {0: interval.IntervalSet([(1, 100)]),
+                1: (1, 5)},
+            1: {0: (20, 30)},
+            2: {0: interval.IntervalSet([(40, 50)]),
+                1: (20, 50)}
+        }
+
+        universe_p = {0: 1.0, 1: 0.1}
+        desired_output = {0}
+        self.assertEqual(sc.approx_multiuniverse(sets,
+                                                 universe_p=universe_p,
+                                                 use_coverage_arrays=True),
+                         desired_output)
+
+        universe_p = {0: 1.0, 1: 1.0}
+        desired_output = {0, 2}
+        self.assertEqual(sc.approx_multiuniverse(sets,
+                                                 universe_p=universe_p,
+                                                 use_coverage_arrays=True),
+                         desired_output)
+
+    def test_coverage_arrays_conflicting_options(self):
+        sets = {0: {0: (1, 5)}}
+        with self.assertRaises(ValueError):
+            sc.approx_multiuniverse(sets, use_intervalsets=True,
+                                    use_coverage_arrays=True)
+
     def verify_partial_cover(self, sets, universe_p, output):
         """Verify the coverage achieved in each universe.
 
@@ -555,7 +584,52 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
         output_intervalsets = self.run_random(False, True, True)
         self.assertEqual(output_set, output_intervalsets)
 
-    def run_random(self, use_arrays, use_intervalsets, make_contiguous):
+    def test_random_coverage_arrays(self):
+        output_intervalsets = self.run_random(False, True, True)
+        output_coverage_arrays = self.run_random(False, False, True,
+                                                 use_coverage_arrays=True)
+        self.assertEqual(output_intervalsets, output_coverage_arrays)
+
+    def test_random_lazy_greedy(self):
+        output_scan = self.run_random(False, False, False)
+        output_lazy = self.run_random(False, False, False,
+                                      use_lazy_greedy=True)
+        self.assertEqual(output_scan, output_lazy)
+        output_scan = self.run_random(False, True, True)
+        output_lazy = self.run_random(False, True, True,
+                                      use_lazy_greedy=True)
+        self.assertEqual(output_scan, output_lazy)
+
+    def test_lazy_greedy_with_ties_and_ranks(self):
+        # With integer costs, many sets have equal ratios; the lazy greedy
+        # approach must break ties the same way as the full scan
+        np.random.seed(2)
+        for n in range(50):
+            num_universes = np.random.randint(1, 4)
+            num_sets = np.random.randint(20, 200)
+            sets = {}
+            for set_id in range(num_sets):
+                sets[set_id] = {}
+                for universe_id in range(num_universes):
+                    size = np.random.randint(0, 6)
+                    if size > 0:
+                        sets[set_id][universe_id] = set(
+                            np.random.randint(0, 40, size=size))
+            costs = {set_id: np.random.randint(1, 3)
+                     for set_id in range(num_sets)}
+            ranks = {set_id: np.random.randint(0, 3)
+                     for set_id in range(num_sets)}
+            universe_p = {universe_id: np.random.choice([0.5, 0.9, 1.0])
+                          for universe_id in range(num_universes)}
+            output_scan = sc.approx_multiuniverse(sets, costs, universe_p,
+                                                  ranks=ranks)
+            output_lazy = sc.approx_multiuniverse(sets, costs, universe_p,
+                                                  ranks=ranks,
+                                                  use_lazy_greedy=True)
+            self.assertEqual(output_scan, output_lazy)
+
+    def run_random(self, use_arrays, use_intervalsets, make_contiguous,
+                   use_lazy_greedy=False, use_coverage_arrays=False):
         """Run tests with randomly generated instances of set cover.
 
         This generates random instances of set cover, computes the
@@ -573,6 +647,11 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
             make_contiguous: when True, the elements (integers) put
                 into the sets form contigous stretches (when False,
                 they tend to be spaced apart)
+            use_lazy_greedy: when True, solve set cover with the lazy
+                greedy approach
+            use_coverage_arrays: when True, solve set cover where the
+                input sets are given as they are for use_intervalsets
+                but the universes are stored as coverage arrays
         """
         np.random.seed(1)
         weight_fracs = []
@@ -632,7 +711,7 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
                 for universe_id in range(num_universes)
             }
             # Compute the set cover
-            if use_intervalsets:
+            if use_intervalsets or use_coverage_arrays:
                 sets_as_intervalsets = {}
                 for set_id in sets.keys():
                     sets_as_intervalsets[set_id] = {}
@@ -655,7 +734,9 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
                 output = sc.approx_multiuniverse(sets_as_intervalsets, costs,
                                                  universe_p,
                                                  use_arrays=False,
-                                                 use_intervalsets=True)
+                                                 use_intervalsets=use_intervalsets,
+                                                 use_lazy_greedy=use_lazy_greedy,
+                                                 use_coverage_arrays=use_coverage_arrays)
             elif use_arrays:
                 sets_as_arrays = {}
                 for set_id in sets.keys():
@@ -667,11 +748,13 @@ class TestSetCoverApproxMultiuniverse(unittest.TestCase):
                 output = sc.approx_multiuniverse(sets_as_arrays, costs,
                                                  universe_p,
                                                  use_arrays=True,
-                                                 use_intervalsets=False)
+                                                 use_intervalsets=False,
+                                                 use_lazy_greedy=use_lazy_greedy)
             else:
                 output = sc.approx_multiuniverse(sets, costs, universe_p,
                                                  use_arrays=False,
-                                                 use_intervalsets=False)
+                                                 use_intervalsets=False,
+                                                 use_lazy_greedy=use_lazy_greedy)
             self.verify_partial_cover(sets, universe_p, output)
             weight_fracs += [self.weight_frac(costs, output)]
             outputs += [output]
@@ -14,7 +14,8 @@ setup(name='catch',
       author='Hayden Metsky',
       author_email='hayden@mit.edu',
       packages=find_packages(),
-      install_requires=['numpy>=1.9.0', 'scipy>=1.0.0'],
+      python_requires='>=3.8',
+      install_requires=['numpy>=1.20.0', 'scipy>=1.3.2'],
       scripts=[
           'bin/analyze_probe_coverage.py',
           'bin/design.py',